@@ -0,0 +1,294 @@
+"""
+随机账户抽样模块
+
+在内存中维护账户ID列表与标签倒排索引（account_tags），随机抽样时：
+- 按 include/exclude 标签在内存中求出候选ID集合（总数即集合大小，无需 COUNT(*)）
+- 用 random.sample 选出本页ID，再按主键 IN 查询取回账户记录
+
+索引刷新策略：
+- 新增账户按 id > 已加载最大ID 增量加载
+- 单个账户修改标签、删除账户时直接在内存中增量更新索引；批量删除等操作标记为
+  需要全量重建；另按固定间隔全量重建，感知其他进程的修改
+"""
+
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import (
+    ACCOUNT_SAMPLER_CANDIDATE_CACHE_SIZE,
+    ACCOUNT_SAMPLER_FULL_REFRESH_INTERVAL,
+    ACCOUNT_SAMPLER_REFRESH_INTERVAL,
+)
+from logger_config import logger
+
+CandidateKey = Tuple[Tuple[str, ...], Tuple[str, ...]]
+
+
+class AccountSampler:
+    """账户ID蓄水池 + 标签倒排索引（线程安全）"""
+
+    def __init__(
+        self,
+        refresh_interval: float = ACCOUNT_SAMPLER_REFRESH_INTERVAL,
+        full_refresh_interval: float = ACCOUNT_SAMPLER_FULL_REFRESH_INTERVAL,
+        candidate_cache_size: int = ACCOUNT_SAMPLER_CANDIDATE_CACHE_SIZE,
+    ):
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.candidate_cache_size = candidate_cache_size
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._ids: Set[int] = set()
+        self._tag_index: Dict[str, Set[int]] = {}
+        # 账户ID -> 标签集合（倒排索引的反向映射，用于增量更新）
+        self._account_tags: Dict[int, Set[str]] = {}
+        self._max_id = 0
+        self._full_loaded_at: Optional[float] = None
+        self._refreshed_at: Optional[float] = None
+        self._needs_full = True
+        self._needs_incremental = False
+        # 正在从数据库加载索引（加载结果可能不包含期间的增量更新）
+        self._reloading = False
+        self._candidates: Dict[CandidateKey, List[int]] = {}
+        self._stats = {
+            "samples": 0,
+            "full_reloads": 0,
+            "incremental_refreshes": 0,
+            "incremental_updates": 0,
+            "retries": 0,
+        }
+
+    def invalidate(self, full: bool = True) -> None:
+        """
+        标记索引需要刷新
+
+        Args:
+            full: True 表示需要全量重建（标签修改、删除账户）；False 只需增量加载新增账户
+        """
+        with self._lock:
+            if full:
+                self._needs_full = True
+            else:
+                self._needs_incremental = True
+
+    def update_account_tags(self, account_id: int, tags: Iterable[str]) -> None:
+        """
+        增量更新单个账户的标签（账户标签修改后调用，不触发全量重建）
+
+        Args:
+            account_id: 账户ID
+            tags: 账户的完整标签列表
+        """
+        with self._lock:
+            if self._reloading:
+                # 正在加载的快照可能不包含这次修改，加载完成后再全量重建一次
+                self._needs_full = True
+                return
+            if account_id not in self._ids:
+                # 尚未载入索引的新账户由增量加载带上标签
+                self._needs_incremental = True
+                return
+            new_tags = {tag for tag in tags if tag}
+            old_tags = self._account_tags.get(account_id, set())
+            if new_tags == old_tags:
+                return
+            for tag in old_tags - new_tags:
+                members = self._tag_index.get(tag)
+                if members is not None:
+                    members.discard(account_id)
+                    if not members:
+                        del self._tag_index[tag]
+            for tag in new_tags - old_tags:
+                self._tag_index.setdefault(tag, set()).add(account_id)
+            if new_tags:
+                self._account_tags[account_id] = new_tags
+            else:
+                self._account_tags.pop(account_id, None)
+            self._drop_candidates(old_tags ^ new_tags)
+            self._stats["incremental_updates"] += 1
+
+    def remove_account(self, account_id: int) -> None:
+        """从索引中移除单个账户（删除账户后调用，不触发全量重建）"""
+        with self._lock:
+            if self._reloading:
+                self._needs_full = True
+                return
+            if account_id not in self._ids:
+                return
+            self._ids.discard(account_id)
+            for tag in self._account_tags.pop(account_id, set()):
+                members = self._tag_index.get(tag)
+                if members is not None:
+                    members.discard(account_id)
+                    if not members:
+                        del self._tag_index[tag]
+            # 所有候选集都可能包含该账户
+            self._candidates = {}
+            self._stats["incremental_updates"] += 1
+
+    def sample(
+        self,
+        dao,
+        include_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None,
+        page: int = 1,
+        page_size: int = 10,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        随机抽取一页账户
+
+        Args:
+            dao: AccountDAO 实例（提供 load_sampling_index / get_by_ids）
+            include_tags: 必须同时包含的标签
+            exclude_tags: 必须不包含的标签
+            page: 页码（从1开始）
+            page_size: 每页数量
+
+        Returns:
+            (账户列表, 符合条件的总数)
+        """
+        key = (
+            tuple(sorted({tag for tag in include_tags or [] if tag})),
+            tuple(sorted({tag for tag in exclude_tags or [] if tag})),
+        )
+        offset = (page - 1) * page_size
+        for attempt in range(2):
+            self._ensure_fresh(dao)
+            candidates = self._get_candidates(key)
+            total = len(candidates)
+            if offset >= total:
+                return [], total
+
+            wanted = min(page_size, total - offset)
+            sampled_ids = random.sample(candidates, wanted)
+            records = dao.get_by_ids(sampled_ids)
+            with self._lock:
+                self._stats["samples"] += 1
+            if len(records) == wanted or attempt == 1:
+                # 按抽样顺序返回，保持结果的随机顺序
+                by_id = {record["id"]: record for record in records}
+                return [by_id[account_id] for account_id in sampled_ids if account_id in by_id], total
+
+            # 部分账户已被其他进程删除，全量重建后重新抽样一次
+            with self._lock:
+                self._stats["retries"] += 1
+            self.invalidate(full=True)
+        return [], 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["accounts"] = len(self._ids)
+            stats["tags"] = len(self._tag_index)
+            stats["cached_candidate_sets"] = len(self._candidates)
+        return stats
+
+    def _refresh_mode(self, now: float) -> Optional[str]:
+        """返回需要执行的刷新类型（调用方需持有 self._lock）"""
+        if (
+            self._needs_full
+            or self._full_loaded_at is None
+            or now - self._full_loaded_at >= self.full_refresh_interval
+        ):
+            return "full"
+        if self._needs_incremental or now - self._refreshed_at >= self.refresh_interval:
+            return "incremental"
+        return None
+
+    def _ensure_fresh(self, dao) -> None:
+        with self._lock:
+            if self._refresh_mode(time.monotonic()) is None:
+                return
+
+        with self._refresh_lock:
+            # 等待刷新锁期间其他线程可能已经完成刷新，重新判断
+            with self._lock:
+                mode = self._refresh_mode(time.monotonic())
+                if mode is None:
+                    return
+                full = mode == "full"
+                after_id = 0 if full else self._max_id
+                if full:
+                    self._needs_full = False
+                self._needs_incremental = False
+                self._reloading = True
+
+            try:
+                ids, tag_pairs = dao.load_sampling_index(after_id)
+            except Exception:
+                with self._lock:
+                    self._reloading = False
+                    if full:
+                        self._needs_full = True
+                    else:
+                        self._needs_incremental = True
+                raise
+            loaded_at = time.monotonic()
+
+            with self._lock:
+                self._reloading = False
+                if full:
+                    self._ids = set()
+                    self._tag_index = {}
+                    self._account_tags = {}
+                    self._max_id = 0
+                    self._full_loaded_at = loaded_at
+                    self._stats["full_reloads"] += 1
+                else:
+                    self._stats["incremental_refreshes"] += 1
+                self._add(ids, tag_pairs)
+                self._refreshed_at = loaded_at
+                if full or ids:
+                    self._candidates = {}
+                account_count = len(self._ids)
+        if full:
+            logger.debug(f"Account sampler index rebuilt: {account_count} accounts")
+
+    def _add(self, ids: Iterable[int], tag_pairs: Iterable[Tuple[int, str]]) -> None:
+        for account_id in ids:
+            self._ids.add(account_id)
+            if account_id > self._max_id:
+                self._max_id = account_id
+        for account_id, tag in tag_pairs:
+            self._tag_index.setdefault(tag, set()).add(account_id)
+            self._account_tags.setdefault(account_id, set()).add(tag)
+
+    def _drop_candidates(self, tags: Set[str]) -> None:
+        """丢弃涉及指定标签的候选集缓存（调用方需持有 self._lock）"""
+        if not tags:
+            return
+        self._candidates = {
+            key: candidates
+            for key, candidates in self._candidates.items()
+            if tags.isdisjoint(key[0]) and tags.isdisjoint(key[1])
+        }
+
+    def _get_candidates(self, key: CandidateKey) -> List[int]:
+        with self._lock:
+            cached = self._candidates.get(key)
+            if cached is not None:
+                return cached
+
+            include_tags, exclude_tags = key
+            if include_tags:
+                tag_sets = sorted(
+                    (self._tag_index.get(tag, set()) for tag in include_tags),
+                    key=len,
+                )
+                candidate_set = set(tag_sets[0]).intersection(*tag_sets[1:]) & self._ids
+            else:
+                candidate_set = set(self._ids)
+            for tag in exclude_tags:
+                candidate_set -= self._tag_index.get(tag, set())
+
+            candidates = list(candidate_set)
+            if len(self._candidates) >= self.candidate_cache_size:
+                self._candidates.clear()
+            self._candidates[key] = candidates
+            return candidates
+
+
+# 全局实例
+account_sampler = AccountSampler()
@@ -4,7 +4,9 @@
 提供账户凭证管理、账户列表查询，以及 v1 路由到统一服务层的适配辅助函数。
 """
 
-from typing import Optional, Any
+import json
+import time
+from typing import AsyncIterator, Optional, Any
 from datetime import datetime
 
 from fastapi import HTTPException, Request
@@ -22,6 +24,12 @@ from logger_config import logger
 
 _default_account_lifecycle_service: Any = None
 
+# 流式邮件列表的输出格式：NDJSON 每行一个 JSON；SSE 使用 email/summary/error 三种事件
+MESSAGE_STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
 
 def _serialize_datetime(dt: Optional[Any]) -> Optional[str]:
     """将 datetime 对象转换为 ISO 格式字符串"""
@@ -479,3 +487,97 @@ async def get_all_accounts(
     except Exception as e:
         logger.error(f"Error getting accounts list: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _encode_message_stream_frame(stream_format: str, event: str, payload: dict[str, Any]) -> str:
+    """编码一帧流式输出：NDJSON 的邮件行为邮件本身，汇总/错误行为 {"summary": ...} / {"error": ...}"""
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+    line = payload if event == "email" else {event: payload}
+    return json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+
+async def open_message_stream_via_gateway(
+    mail_gateway: Any,
+    credentials: AccountCredentials,
+    *,
+    stream_format: str,
+    folder: str,
+    max_count: int,
+    strategy_mode: Optional[str] = None,
+    override_provider: Optional[str] = None,
+    sender_search: Optional[str] = None,
+    subject_search: Optional[str] = None,
+    sort_by: str = "date",
+    sort_order: str = "desc",
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    打开流式邮件列表，返回逐帧输出的文本迭代器
+
+    在返回前先取到第一批邮件：取第一批之前的错误（权限、凭证、上游不可用等）仍以普通 HTTP 错误返回；
+    之后的错误以 error 帧结束流。最后一帧为汇总信息。
+    """
+    stream_method = getattr(mail_gateway, "stream_messages", None)
+    if not callable(stream_method):
+        raise AttributeError("MailGateway.stream_messages is required for streaming read path")
+
+    start_ts = time.time()
+    batches = stream_method(
+        credentials,
+        folder=folder,
+        max_count=max_count,
+        strategy_mode=strategy_mode or credentials.strategy_mode,
+        override_provider=override_provider,
+        sender_search=sender_search,
+        subject_search=subject_search,
+        sort_by=sort_by,
+        sort_order=sort_order,
+        start_time=start_time,
+        end_time=end_time,
+    )
+    try:
+        pending = await batches.__anext__()
+    except StopAsyncIteration:
+        pending = None
+    except BaseException:
+        await batches.aclose()
+        raise
+    first_batch_ms = int((time.time() - start_ts) * 1000)
+
+    async def _iter_frames() -> AsyncIterator[str]:
+        nonlocal pending
+        provider_name = None
+        sent = 0
+        try:
+            while pending is not None:
+                provider_name, batch = pending
+                for item in batch:
+                    sent += 1
+                    yield _encode_message_stream_frame(stream_format, "email", _model_to_dict(item))
+                try:
+                    pending = await batches.__anext__()
+                except StopAsyncIteration:
+                    pending = None
+            yield _encode_message_stream_frame(stream_format, "summary", {
+                "email_id": credentials.email,
+                "folder_view": folder,
+                "provider": provider_name,
+                "total_emails": sent,
+                "truncated": sent >= max_count,
+                "first_batch_ms": first_batch_ms,
+                "fetch_time_ms": int((time.time() - start_ts) * 1000),
+            })
+        except HTTPException as exc:
+            logger.warning(f"Message stream for {credentials.email} aborted after {sent} emails: {exc.detail}")
+            yield _encode_message_stream_frame(
+                stream_format, "error", {"status_code": exc.status_code, "detail": exc.detail}
+            )
+        except Exception as exc:
+            logger.error(f"Message stream for {credentials.email} failed after {sent} emails: {exc}")
+            yield _encode_message_stream_frame(stream_format, "error", {"status_code": 500, "detail": str(exc)})
+        finally:
+            await batches.aclose()
+
+    return _iter_frames()
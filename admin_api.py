@@ -4,17 +4,30 @@
 提供数据表管理和系统配置管理的API接口
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import base64
+import json
+import re
 import sqlite3
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 import auth
 import database as db
 import cache_service
+from cache_maintenance import cache_maintenance_scheduler, cache_occupancy
+from cache_write_behind import cache_write_behind
+from config import SQL_CONSOLE_MAX_ROWS, SQL_CONSOLE_STREAM_MAX_ROWS
+from graph_batch import graph_batch
+from graph_notifications import graph_subscriptions
+from graph_throttle import graph_throttle
 from logger_config import logger
 from datetime import datetime
+from query_stats import query_stats
+from sql_console import QUERY_ID_PATTERN, SqlConsoleQuery, iter_query_events, sql_console_registry
 from verification_rule_service import (
     create_verification_rule,
     delete_verification_rule,
@@ -84,6 +97,7 @@ class TableInfo(BaseModel):
     """表信息模型"""
     name: str
     record_count: int
+    record_count_is_estimate: bool = False
 
 
 class TableListResponse(BaseModel):
@@ -236,9 +250,14 @@ class VerificationRuleTestResponse(BaseModel):
 # ============================================================================
 
 @router.get("/tables", response_model=TableListResponse)
-async def get_tables(admin: dict = Depends(auth.get_current_admin)):
+async def get_tables(
+    estimate: bool = Query(False, description="使用统计信息估算记录数（大表浏览时避免逐表 COUNT(*)）"),
+    admin: dict = Depends(auth.get_current_admin)
+):
     """
     获取所有数据表列表
+
+    默认返回精确记录数；estimate=true 时返回估算值并标记 record_count_is_estimate。
     """
     try:
         tables = db.get_all_tables()
@@ -246,9 +265,14 @@ async def get_tables(admin: dict = Depends(auth.get_current_admin)):
         table_info_list = []
         for table_name in tables:
             try:
-                # 获取表记录数
-                data, total = db.get_table_data(table_name, page=1, page_size=1)
-                table_info_list.append(TableInfo(name=table_name, record_count=total))
+                if estimate:
+                    total = db.estimate_table_row_count(table_name)
+                else:
+                    # 获取表记录数
+                    _, total = db.get_table_data(table_name, page=1, page_size=1)
+                table_info_list.append(
+                    TableInfo(name=table_name, record_count=total, record_count_is_estimate=estimate)
+                )
             except sqlite3.DatabaseError as e:
                 # 如果某个表损坏，记录错误但继续处理其他表
                 error_msg = str(e)
@@ -316,10 +340,15 @@ async def get_table_data(
     sort_by: Optional[str] = Query(None, description="排序字段"),
     sort_order: str = Query("asc", description="排序方向（asc/desc）"),
     field_search: Optional[str] = Query(None, description="字段搜索（JSON格式：{\"字段名\":\"搜索值\"}）"),
+    mode: str = Query("page", pattern="^(page|browse)$", description="page: 页码分页；browse: 主键游标分页（适合大表）"),
+    after: Optional[str] = Query(None, description="浏览模式游标（上一页返回的 next_cursor）"),
     admin: dict = Depends(auth.get_current_admin)
 ):
     """
     获取表数据（支持分页、搜索、排序和字段筛选）
+    
+    browse 模式按主键 keyset 分页，搜索仅作用于有索引的列（前缀/等值匹配），
+    总数为估算值，不会触发全表 COUNT(*) 和扫描。
     """
     # 验证表是否存在
     tables = db.get_all_tables()
@@ -335,6 +364,31 @@ async def get_table_data(
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="字段搜索参数格式错误，应为JSON格式")
     
+    if mode == "browse":
+        try:
+            browse_result = await asyncio.to_thread(
+                db.browse_table_data,
+                table_name,
+                page_size,
+                after=after,
+                search=search,
+                sort_order=sort_order,
+                field_search=field_search_dict,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "table_name": table_name,
+            "mode": "browse",
+            "page_size": page_size,
+            "total_records": browse_result["estimated_total"],
+            "total_is_estimate": True,
+            "next_cursor": browse_result["next_cursor"],
+            "primary_key": browse_result["primary_key"],
+            "searchable_columns": browse_result["searchable_columns"],
+            "records": browse_result["data"],
+        }
+    
     data, total = db.get_table_data(
         table_name, 
         page, 
@@ -357,6 +411,25 @@ async def get_table_data(
     }
 
 
+# 表编辑器写入这些表后需要清空认证主体缓存（用户、API Key 等）
+_PRINCIPAL_TABLES = {"users", "system_config"}
+
+
+def _invalidate_table_caches(table_name: str, account_emails: Tuple[Optional[str], ...] = ()) -> None:
+    """
+    表编辑器直接写表后，使依赖该表的缓存失效
+
+    Args:
+        table_name: 表名
+        account_emails: 写 accounts 表时受影响的邮箱（修改邮箱时包含新旧两个）
+    """
+    if table_name in _PRINCIPAL_TABLES:
+        cache_service.invalidate_principal_cache()
+    for email in dict.fromkeys(account_emails):
+        if email:
+            cache_service.invalidate_account_record(email)
+
+
 @router.post("/tables/{table_name}", response_model=MessageResponse)
 async def create_table_record(
     table_name: str,
@@ -373,6 +446,10 @@ async def create_table_record(
     
     try:
         record_id = db.insert_table_record(table_name, request.data)
+        account_emails: Tuple[Optional[str], ...] = ()
+        if table_name == "accounts":
+            account_emails = (db.resync_account_tags_by_id(record_id),)
+        _invalidate_table_caches(table_name, account_emails)
         return MessageResponse(message=f"记录创建成功，ID: {record_id}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"创建记录失败: {str(e)}")
@@ -394,9 +471,16 @@ async def update_table_record(
         raise HTTPException(status_code=404, detail=f"表 {table_name} 不存在")
     
     try:
+        # 记录修改前的邮箱：邮箱本身被修改时旧邮箱的账户记录缓存也要失效
+        old_email = db.get_account_email_by_id(record_id) if table_name == "accounts" else None
         success = db.update_table_record(table_name, record_id, request.data)
         
         if success:
+            account_emails: Tuple[Optional[str], ...] = ()
+            if table_name == "accounts":
+                # accounts.tags 可能被直接修改，重新同步标签筛选使用的 account_tags
+                account_emails = (old_email, db.resync_account_tags_by_id(record_id))
+            _invalidate_table_caches(table_name, account_emails)
             return MessageResponse(message=f"记录 {record_id} 更新成功")
         else:
             raise HTTPException(status_code=404, detail=f"记录 {record_id} 不存在")
@@ -421,9 +505,17 @@ async def delete_table_record(
         raise HTTPException(status_code=404, detail=f"表 {table_name} 不存在")
     
     try:
-        success = db.delete_table_record(table_name, record_id)
+        account_emails: Tuple[Optional[str], ...] = ()
+        if table_name == "accounts":
+            # 账户需要同时删除标签关联并更新抽样索引
+            deleted_email = db.delete_account_by_id(record_id)
+            success = deleted_email is not None
+            account_emails = (deleted_email,)
+        else:
+            success = db.delete_table_record(table_name, record_id)
         
         if success:
+            _invalidate_table_caches(table_name, account_emails)
             return MessageResponse(message=f"记录 {record_id} 删除成功")
         else:
             raise HTTPException(status_code=404, detail=f"记录 {record_id} 不存在")
@@ -608,6 +700,8 @@ class CacheStatistics(BaseModel):
     emails_cache: Dict[str, Any]
     details_cache: Dict[str, Any]
     hit_rate: Optional[float] = None
+    maintenance: Optional[Dict[str, Any]] = None
+    write_behind: Optional[Dict[str, Any]] = None
 
 
 class CacheManagementResponse(BaseModel):
@@ -633,6 +727,8 @@ async def get_cache_statistics(admin: dict = Depends(auth.get_current_admin)):
         
         # 合并统计信息
         stats['lru_cache'] = lru_stats
+        stats['maintenance'] = cache_maintenance_scheduler.get_stats()
+        stats['write_behind'] = cache_write_behind.get_stats()
         
         # 计算缓存命中率（基于access_count）
         with db.get_db_connection() as conn:
@@ -704,6 +800,59 @@ async def get_cache_statistics(admin: dict = Depends(auth.get_current_admin)):
         raise HTTPException(status_code=500, detail=f"获取缓存统计失败: {str(e)}")
 
 
+@router.get("/db/query-stats")
+async def get_query_stats(
+    sort_by: str = Query("total_ms", pattern="^(total_ms|count|max_ms|avg_ms|slow_count)$", description="排序字段"),
+    limit: int = Query(50, ge=1, le=500, description="返回的指纹/慢查询条数"),
+    admin: dict = Depends(auth.get_current_admin)
+):
+    """
+    获取SQL语句统计
+    
+    按SQL指纹聚合的调用次数、耗时直方图与分位数，慢查询日志，以及慢查询的执行计划
+    """
+    return query_stats.snapshot(sort_by=sort_by, limit=limit)
+
+
+@router.post("/db/query-stats/reset", response_model=MessageResponse)
+async def reset_query_stats(admin: dict = Depends(auth.get_current_admin)):
+    """清空SQL语句统计"""
+    query_stats.reset()
+    return MessageResponse(message="SQL语句统计已清空")
+
+
+@router.get("/graph/throttle-stats")
+async def get_graph_throttle_stats(
+    top: int = Query(10, ge=1, le=100, description="返回限流次数最多的邮箱数"),
+    admin: dict = Depends(auth.get_current_admin)
+):
+    """
+    获取 Graph 限流指标
+
+    请求数、被限流（429/503）次数、重试与退避时间、令牌桶等待时间，以及限流最多的邮箱
+    """
+    return {
+        "throttle": graph_throttle.get_stats(top=top),
+        "batch": graph_batch.get_stats(),
+    }
+
+
+@router.get("/graph/subscriptions")
+async def get_graph_subscription_stats(
+    email: Optional[str] = Query(None, description="查看指定账户的订阅（可选）"),
+    admin: dict = Depends(auth.get_current_admin)
+):
+    """
+    获取 Graph 变更通知指标
+
+    订阅创建/续期次数、收到/拒绝的通知数、预取与失效次数；指定账户时同时返回其订阅记录
+    """
+    result: Dict[str, Any] = {"notifications": graph_subscriptions.get_stats()}
+    if email:
+        result["subscriptions"] = await asyncio.to_thread(db.list_graph_subscriptions, email)
+    return result
+
+
 @router.delete("/cache/{email_id}", response_model=CacheManagementResponse)
 async def clear_account_cache(
     email_id: str,
@@ -770,6 +919,7 @@ async def clear_all_cache(admin: dict = Depends(auth.get_current_admin)):
             cursor.execute("DELETE FROM emails_cache")
             cursor.execute("DELETE FROM email_details_cache")
             conn.commit()
+        cache_occupancy.invalidate()
         
         return CacheManagementResponse(
             message="已清除所有缓存（包括LRU内存缓存和SQLite缓存）",
@@ -809,6 +959,168 @@ async def trigger_lru_cleanup(admin: dict = Depends(auth.get_current_admin)):
         raise HTTPException(status_code=500, detail=f"LRU清理失败: {str(e)}")
 
 
+class CacheSearchItem(BaseModel):
+    """跨账户缓存检索结果项"""
+    email_account: str
+    provider: Optional[str] = None
+    message_id: str
+    folder: Optional[str] = None
+    subject: Optional[str] = None
+    from_email: Optional[str] = None
+    date: Optional[str] = None
+    is_read: bool = False
+    has_attachments: bool = False
+    verification_code: Optional[str] = None
+    body_preview: Optional[str] = None
+    has_detail: bool = False
+
+
+class CacheSearchResponse(BaseModel):
+    """跨账户缓存检索响应模型"""
+    items: List[CacheSearchItem]
+    page_size: int
+    next_cursor: Optional[str] = None
+
+
+CACHE_SEARCH_STREAM_MAX_RESULTS = 10000  # 流式检索单次最多返回条数
+
+
+def _encode_cache_search_cursor(cursor: Optional[Dict[str, Any]]) -> Optional[str]:
+    """将键集游标编码为不透明字符串"""
+    if not cursor:
+        return None
+    payload = json.dumps(
+        {"date": _convert_datetime_to_str(cursor["date"]), "id": cursor["id"]},
+        ensure_ascii=False,
+    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_cache_search_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """解析键集游标，返回 (after_date, after_id)"""
+    if not cursor:
+        return None, None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return str(payload["date"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="游标参数格式错误")
+
+
+def _build_cache_search_item(email: Dict[str, Any]) -> CacheSearchItem:
+    return CacheSearchItem(
+        email_account=email["email_account"],
+        provider=email.get("provider"),
+        message_id=email["message_id"],
+        folder=email.get("folder"),
+        subject=email.get("subject"),
+        from_email=email.get("from_email"),
+        date=_convert_datetime_to_str(email.get("date")),
+        is_read=email.get("is_read", False),
+        has_attachments=email.get("has_attachments", False),
+        verification_code=email.get("verification_code"),
+        body_preview=email.get("body_preview"),
+        has_detail=email.get("has_detail", False),
+    )
+
+
+@router.get("/cache/search", response_model=CacheSearchResponse)
+async def search_cache(
+    sender: Optional[str] = Query(None, description="发件人前缀（不区分大小写）"),
+    subject: Optional[str] = Query(None, description="主题模糊搜索"),
+    start_time: Optional[str] = Query(None, description="开始时间（ISO格式）"),
+    end_time: Optional[str] = Query(None, description="结束时间（ISO格式）"),
+    verification_code: Optional[str] = Query(None, description="验证码精确匹配"),
+    has_verification_code: Optional[bool] = Query(None, description="是否包含验证码"),
+    email_account: Optional[str] = Query(None, description="限定邮箱账户（可选）"),
+    page_size: int = Query(100, ge=1, le=500, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    admin: dict = Depends(auth.get_current_admin)
+):
+    """
+    跨账户检索邮件缓存
+
+    在所有账户的邮件列表缓存与详情缓存中按发件人、主题、时间、验证码筛选，
+    按时间倒序键集分页返回，使用 next_cursor 获取下一页。
+    """
+    after_date, after_id = _decode_cache_search_cursor(cursor)
+    try:
+        emails, next_cursor = await asyncio.to_thread(
+            db.search_cached_emails_across_accounts,
+            email_account=email_account,
+            sender_search=sender,
+            subject_search=subject,
+            start_time=start_time,
+            end_time=end_time,
+            verification_code=verification_code,
+            has_verification_code=has_verification_code,
+            after_date=after_date,
+            after_id=after_id,
+            page_size=page_size,
+        )
+    except Exception as e:
+        logger.error(f"跨账户缓存检索失败: {e}")
+        raise HTTPException(status_code=500, detail=f"缓存检索失败: {str(e)}")
+
+    return CacheSearchResponse(
+        items=[_build_cache_search_item(email) for email in emails],
+        page_size=page_size,
+        next_cursor=_encode_cache_search_cursor(next_cursor),
+    )
+
+
+@router.get("/cache/search/stream")
+async def stream_cache_search(
+    sender: Optional[str] = Query(None, description="发件人前缀（不区分大小写）"),
+    subject: Optional[str] = Query(None, description="主题模糊搜索"),
+    start_time: Optional[str] = Query(None, description="开始时间（ISO格式）"),
+    end_time: Optional[str] = Query(None, description="结束时间（ISO格式）"),
+    verification_code: Optional[str] = Query(None, description="验证码精确匹配"),
+    has_verification_code: Optional[bool] = Query(None, description="是否包含验证码"),
+    email_account: Optional[str] = Query(None, description="限定邮箱账户（可选）"),
+    page_size: int = Query(200, ge=1, le=500, description="每批读取数量"),
+    max_results: int = Query(1000, ge=1, le=CACHE_SEARCH_STREAM_MAX_RESULTS, description="最多返回条数"),
+    cursor: Optional[str] = Query(None, description="起始游标（可选）"),
+    admin: dict = Depends(auth.get_current_admin)
+):
+    """
+    跨账户检索邮件缓存（NDJSON 流式输出）
+
+    按批次读取并逐行输出结果，结束时输出一行 {"next_cursor": ...} 便于断点续查。
+    """
+    after_date, after_id = _decode_cache_search_cursor(cursor)
+
+    async def _iter_results():
+        nonlocal after_date, after_id
+        sent = 0
+        next_cursor = None
+        while sent < max_results:
+            batch_size = min(page_size, max_results - sent)
+            emails, next_cursor = await asyncio.to_thread(
+                db.search_cached_emails_across_accounts,
+                email_account=email_account,
+                sender_search=sender,
+                subject_search=subject,
+                start_time=start_time,
+                end_time=end_time,
+                verification_code=verification_code,
+                has_verification_code=has_verification_code,
+                after_date=after_date,
+                after_id=after_id,
+                page_size=batch_size,
+            )
+            for email in emails:
+                yield _build_cache_search_item(email).model_dump_json() + "\n"
+            sent += len(emails)
+            if not next_cursor:
+                break
+            after_date = _convert_datetime_to_str(next_cursor["date"])
+            after_id = next_cursor["id"]
+        yield json.dumps({"next_cursor": _encode_cache_search_cursor(next_cursor)}) + "\n"
+
+    return StreamingResponse(_iter_results(), media_type="application/x-ndjson")
+
+
 # ============================================================================
 # 用户管理API（仅管理员可访问）
 # ============================================================================
@@ -1263,6 +1575,8 @@ class SqlExecuteRequest(BaseModel):
     """SQL执行请求模型"""
     sql: str
     max_rows: Optional[int] = 10000  # 最大返回行数限制
+    timeout_seconds: Optional[float] = Field(None, gt=0)  # 语句超时（秒），默认 SQL_CONSOLE_STATEMENT_TIMEOUT
+    query_id: Optional[str] = None  # 客户端指定的查询ID，用于取消；不指定时自动生成
 
 
 class SqlExecuteResponse(BaseModel):
@@ -1272,6 +1586,9 @@ class SqlExecuteResponse(BaseModel):
     row_count: Optional[int] = None
     execution_time_ms: int
     error_message: Optional[str] = None
+    query_id: Optional[str] = None
+    truncated: bool = False
+    cancelled: bool = False
 
 
 class SqlQueryHistoryItem(BaseModel):
@@ -1318,6 +1635,40 @@ class SqlQueryFavoriteCreateRequest(BaseModel):
     description: Optional[str] = None
 
 
+def _build_sql_console_query(request: SqlExecuteRequest, admin: dict) -> SqlConsoleQuery:
+    if request.query_id is not None and not QUERY_ID_PATTERN.match(request.query_id):
+        raise HTTPException(status_code=400, detail="query_id 只能包含字母、数字、下划线和短横线（最长64位）")
+    return SqlConsoleQuery(
+        request.sql,
+        query_id=request.query_id,
+        created_by=admin.get('username'),
+        timeout_seconds=request.timeout_seconds,
+    )
+
+
+# 只读语句；其余语句可能改动用户或系统配置，执行后清空认证主体缓存
+_READ_ONLY_SQL_RE = re.compile(r"^\s*(SELECT|VALUES|TABLE|EXPLAIN)\b", re.IGNORECASE)
+
+
+def _invalidate_caches_after_sql(sql: str) -> None:
+    if not _READ_ONLY_SQL_RE.match(sql):
+        cache_service.invalidate_principal_cache()
+
+
+def _save_sql_history_safely(
+    sql_query: str,
+    result_count: Optional[int],
+    execution_time_ms: int,
+    status: str,
+    error_message: Optional[str],
+    created_by: Optional[str]
+):
+    try:
+        _save_sql_history(sql_query, result_count, execution_time_ms, status, error_message, created_by)
+    except Exception as e:
+        logger.warning(f"Failed to save SQL history: {e}")
+
+
 @router.post("/sql/execute", response_model=SqlExecuteResponse)
 async def execute_sql(
     request: SqlExecuteRequest,
@@ -1326,120 +1677,123 @@ async def execute_sql(
     """
     执行SQL查询（支持所有SQL语句，包括INSERT/UPDATE/DELETE）
     
+    SQL 在独立线程中执行并按批读取，最多读取 max_rows 行；
+    超过 timeout_seconds 或通过 /sql/{query_id}/cancel 取消时中止执行。
     注意：此接口允许执行所有SQL语句，请谨慎使用
     """
-    import time
-    start_time = time.time()
-    
+    max_rows = min(request.max_rows or SQL_CONSOLE_MAX_ROWS, SQL_CONSOLE_MAX_ROWS)
+    query = _build_sql_console_query(request, admin)
+
+    data: List[Dict[str, Any]] = []
+    result: Dict[str, Any] = {}
     try:
-        # 限制最大返回行数
-        max_rows = min(request.max_rows or 10000, 10000)
-        
-        with db.get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # 执行SQL
-            cursor.execute(request.sql)
-            
-            # 判断是查询还是DML语句
-            sql_upper = request.sql.strip().upper()
-            is_select = sql_upper.startswith('SELECT')
-            
-            if is_select:
-                # SELECT查询，返回结果
-                rows = cursor.fetchall()
-                row_count = len(rows)
-                
-                # 限制返回行数
-                if row_count > max_rows:
-                    rows = rows[:max_rows]
-                    logger.warning(f"SQL query returned {row_count} rows, limited to {max_rows}")
-                
-                # 转换为字典列表
-                if rows:
-                    if isinstance(rows[0], dict):
-                        data = list(rows)
-                    else:
-                        # 获取列名
-                        if hasattr(cursor, 'description') and cursor.description:
-                            columns = [desc[0] for desc in cursor.description]
-                            data = [dict(zip(columns, row)) for row in rows]
-                        else:
-                            data = [{"result": str(row)} for row in rows]
-                else:
-                    data = []
-                
-                execution_time_ms = int((time.time() - start_time) * 1000)
-                
-                # 保存历史记录
-                try:
-                    _save_sql_history(
-                        request.sql,
-                        row_count,
-                        execution_time_ms,
-                        'success',
-                        None,
-                        admin.get('username')
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to save SQL history: {e}")
-                
-                return SqlExecuteResponse(
-                    success=True,
-                    data=data,
-                    row_count=row_count,
-                    execution_time_ms=execution_time_ms
-                )
-            else:
-                # DML语句（INSERT/UPDATE/DELETE），返回影响行数
-                conn.commit()
-                affected_rows = cursor.rowcount
-                execution_time_ms = int((time.time() - start_time) * 1000)
-                
-                # 保存历史记录
-                try:
-                    _save_sql_history(
-                        request.sql,
-                        affected_rows,
-                        execution_time_ms,
-                        'success',
-                        None,
-                        admin.get('username')
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to save SQL history: {e}")
-                
-                return SqlExecuteResponse(
-                    success=True,
-                    data=[{"affected_rows": affected_rows}],
-                    row_count=affected_rows,
-                    execution_time_ms=execution_time_ms
-                )
-                
-    except Exception as e:
-        execution_time_ms = int((time.time() - start_time) * 1000)
-        error_message = str(e)
+        async for kind, payload in iter_query_events(query, max_rows=max_rows):
+            if kind == "rows":
+                data.extend(payload)
+            elif kind in ("end", "error"):
+                result = payload
+                result["kind"] = kind
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    _invalidate_caches_after_sql(request.sql)
+
+    execution_time_ms = result.get("execution_time_ms", 0)
+    if result.get("kind") == "error":
+        error_message = result["message"]
         logger.error(f"SQL execution error: {error_message}")
-        
-        # 保存错误历史记录
-        try:
-            _save_sql_history(
-                request.sql,
-                None,
-                execution_time_ms,
-                'error',
-                error_message,
-                admin.get('username')
-            )
-        except Exception as save_error:
-            logger.warning(f"Failed to save SQL error history: {save_error}")
-        
+        _save_sql_history_safely(
+            request.sql, None, execution_time_ms, 'error', error_message, admin.get('username')
+        )
         return SqlExecuteResponse(
             success=False,
             execution_time_ms=execution_time_ms,
-            error_message=error_message
+            error_message=error_message,
+            query_id=query.query_id,
+            cancelled=result.get("cancelled", False),
         )
 
+    row_count = result.get("row_count", 0)
+    if result.get("truncated"):
+        logger.warning(f"SQL query returned more than {max_rows} rows, limited to {max_rows}")
+    if "affected_rows" in result:
+        data = [{"affected_rows": result["affected_rows"]}]
+
+    _save_sql_history_safely(
+        request.sql, row_count, execution_time_ms, 'success', None, admin.get('username')
+    )
+    return SqlExecuteResponse(
+        success=True,
+        data=data,
+        row_count=row_count,
+        execution_time_ms=execution_time_ms,
+        query_id=query.query_id,
+        truncated=result.get("truncated", False),
+    )
+
+
+@router.post("/sql/execute/stream")
+async def execute_sql_stream(
+    request: SqlExecuteRequest,
+    admin: dict = Depends(auth.get_current_admin)
+):
+    """
+    流式执行SQL查询，以 NDJSON 逐行输出结果
+
+    输出格式（每行一个 JSON 对象）：
+    - {"type": "start", "query_id": ...}
+    - {"type": "columns", "columns": [...]}
+    - {"type": "row", "data": {...}}（每行结果一条）
+    - {"type": "end", "row_count": ..., "truncated": ..., "execution_time_ms": ...}
+      或 {"type": "error", "message": ..., "cancelled": ...}
+
+    客户端断开连接时会取消正在执行的查询。
+    """
+    max_rows = min(request.max_rows or SQL_CONSOLE_STREAM_MAX_ROWS, SQL_CONSOLE_STREAM_MAX_ROWS)
+    query = _build_sql_console_query(request, admin)
+    if any(item["query_id"] == query.query_id for item in sql_console_registry.list_running()):
+        raise HTTPException(status_code=409, detail=f"Query id already running: {query.query_id}")
+
+    async def _iter_lines():
+        yield json.dumps({"type": "start", "query_id": query.query_id}) + "\n"
+        async for kind, payload in iter_query_events(query, max_rows=max_rows):
+            if kind == "columns":
+                yield json.dumps({"type": "columns", "columns": payload}) + "\n"
+            elif kind == "rows":
+                yield "".join(
+                    json.dumps({"type": "row", "data": row}, ensure_ascii=False, default=str) + "\n"
+                    for row in payload
+                )
+            else:
+                _invalidate_caches_after_sql(request.sql)
+                if kind == "error":
+                    _save_sql_history_safely(
+                        request.sql, None, payload.get("execution_time_ms", 0), 'error',
+                        payload.get("message"), admin.get('username')
+                    )
+                else:
+                    _save_sql_history_safely(
+                        request.sql, payload.get("row_count"), payload.get("execution_time_ms", 0),
+                        'success', None, admin.get('username')
+                    )
+                yield json.dumps({"type": kind, **payload}, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(_iter_lines(), media_type="application/x-ndjson")
+
+
+@router.get("/sql/running")
+async def list_running_sql(admin: dict = Depends(auth.get_current_admin)):
+    """列出正在执行的SQL查询"""
+    return {"queries": sql_console_registry.list_running()}
+
+
+@router.post("/sql/{query_id}/cancel")
+async def cancel_sql(query_id: str, admin: dict = Depends(auth.get_current_admin)):
+    """按 query_id 取消正在执行的SQL查询"""
+    if not sql_console_registry.cancel(query_id):
+        raise HTTPException(status_code=404, detail="查询不存在或已结束")
+    logger.info(f"SQL query {query_id} cancelled by {admin.get('username')}")
+    return {"message": "已发送取消请求", "query_id": query_id}
+
 
 def _save_sql_history(
     sql_query: str,
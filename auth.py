@@ -16,6 +16,7 @@ from jose import JWTError, jwt
 import bcrypt
 from pydantic import BaseModel, Field
 
+import cache_service
 import database as db
 from logger_config import logger
 
@@ -203,6 +204,52 @@ def verify_api_key(api_key: str) -> bool:
     return api_key == stored_key
 
 
+def _load_api_key_principal(api_key: str) -> Optional[dict]:
+    """
+    校验API Key并加载其对应的用户（第一个启用的管理员）
+    
+    Args:
+        api_key: API Key值
+        
+    Returns:
+        管理员信息字典或None
+    """
+    if not verify_api_key(api_key):
+        return None
+    
+    admins = db.get_users_by_role("admin")
+    if admins:
+        user = admins[0]
+        if user.get('is_active'):
+            return user
+    return None
+
+
+async def _get_api_key_principal(api_key: str) -> Optional[dict]:
+    """
+    获取API Key对应的用户（按API Key指纹缓存，未命中时在API请求线程池中查询数据库）
+    
+    Args:
+        api_key: API Key值
+        
+    Returns:
+        管理员信息字典或None
+    """
+    fingerprint = cache_service.get_api_key_fingerprint(api_key)
+    user = cache_service.get_cached_principal("api_key", fingerprint)
+    if user is not None:
+        return user
+    
+    # 使用API请求专用线程池，避免被后台任务阻塞（延迟导入避免循环依赖）
+    generation = cache_service.get_principal_cache_generation()
+    loop = asyncio.get_event_loop()
+    import main
+    user = await loop.run_in_executor(main.api_requests_executor, _load_api_key_principal, api_key)
+    if user is not None:
+        cache_service.set_cached_principal("api_key", fingerprint, user, generation)
+    return user
+
+
 def authenticate_user(username: str, password: str) -> Optional[dict]:
     """
     验证用户名和密码
@@ -288,16 +335,9 @@ async def get_current_user(
     # 方式1: 尝试从 X-API-Key 头获取 API Key
     api_key = request.headers.get("X-API-Key")
     if api_key:
-        if verify_api_key(api_key):
-            # API Key认证成功，返回默认管理员（第一个管理员）
-            # 使用API请求专用线程池，避免被后台任务阻塞（延迟导入避免循环依赖）
-            loop = asyncio.get_event_loop()
-            import main
-            admins = await loop.run_in_executor(main.api_requests_executor, db.get_users_by_role, "admin")
-            if admins:
-                user = admins[0]
-                if user.get('is_active'):
-                    return user
+        user = await _get_api_key_principal(api_key)
+        if user:
+            return user
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -306,16 +346,9 @@ async def get_current_user(
     
     # 方式2: 尝试从 Authorization 头获取 API Key (格式: ApiKey <key>)
     if credentials and credentials.scheme.lower() == "apikey":
-        if verify_api_key(credentials.credentials):
-            # API Key认证成功
-            # 使用API请求专用线程池，避免被后台任务阻塞（延迟导入避免循环依赖）
-            loop = asyncio.get_event_loop()
-            import main
-            admins = await loop.run_in_executor(main.api_requests_executor, db.get_users_by_role, "admin")
-            if admins:
-                user = admins[0]
-                if user.get('is_active'):
-                    return user
+        user = await _get_api_key_principal(credentials.credentials)
+        if user:
+            return user
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -328,15 +361,23 @@ async def get_current_user(
         token = credentials.credentials
         token_data = verify_token(token)
         
-        # 使用API请求专用线程池，避免被后台任务阻塞（延迟导入避免循环依赖）
-        db_query_start = time.perf_counter()
-        loop = asyncio.get_event_loop()
-        import main
-        user = await loop.run_in_executor(main.api_requests_executor, db.get_user_by_username, token_data.username)
-        db_query_time = time.perf_counter() - db_query_start
-        
-        if db_query_time > 0.1:  # 如果数据库查询超过100ms，记录警告
-            logger.warning(f"Slow database query in get_current_user: {db_query_time:.3f}s for user {token_data.username}")
+        # 优先使用认证主体缓存，未命中再查询数据库
+        db_query_time = 0.0
+        user = cache_service.get_cached_principal("user", token_data.username)
+        if user is None:
+            # 使用API请求专用线程池，避免被后台任务阻塞（延迟导入避免循环依赖）
+            generation = cache_service.get_principal_cache_generation()
+            db_query_start = time.perf_counter()
+            loop = asyncio.get_event_loop()
+            import main
+            user = await loop.run_in_executor(main.api_requests_executor, db.get_user_by_username, token_data.username)
+            db_query_time = time.perf_counter() - db_query_start
+            
+            if db_query_time > 0.1:  # 如果数据库查询超过100ms，记录警告
+                logger.warning(f"Slow database query in get_current_user: {db_query_time:.3f}s for user {token_data.username}")
+            
+            if user is not None:
+                cache_service.set_cached_principal("user", token_data.username, user, generation)
         
         if user is None:
             raise HTTPException(
@@ -0,0 +1,114 @@
+"""
+邮件正文二进制编解码模块
+
+邮件详情缓存以二进制（SQLite BLOB / PostgreSQL BYTEA）存储正文，
+首字节为编码标记，解码时按标记直接选择解码器，无需猜测数据是否被压缩：
+
+- 0x00: 原始 UTF-8（正文较短，不压缩）
+- 0x01: zlib
+- 0x02: zlib + HTML 邮件预置字典（v1）
+
+预置字典由常见 HTML 邮件模板片段组成，对短小的 HTML 正文压缩率提升明显；
+后续如需更新字典，新增一个编码标记即可，旧数据仍可按原标记解码。
+"""
+
+import zlib
+from typing import Any, Optional
+
+from config import COMPRESS_BODY_THRESHOLD
+
+BODY_CODEC_RAW = 0x00
+BODY_CODEC_ZLIB = 0x01
+BODY_CODEC_ZLIB_HTML_DICT_V1 = 0x02
+
+# zlib 预置字典：越常出现的片段越靠后（zlib 对靠近窗口末尾的匹配编码更短）
+HTML_BODY_DICTIONARY_V1 = (
+    b'<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" '
+    b'"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">'
+    b'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:v="urn:schemas-microsoft-com:vml" '
+    b'xmlns:o="urn:schemas-microsoft-com:office:office">'
+    b'<!--[if mso]><xml><o:OfficeDocumentSettings><o:AllowPNG/><o:PixelsPerInch>96'
+    b'</o:PixelsPerInch></o:OfficeDocumentSettings></xml><![endif]-->'
+    b'<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'
+    b'<meta name="viewport" content="width=device-width, initial-scale=1.0">'
+    b'<meta http-equiv="X-UA-Compatible" content="IE=edge">'
+    b'@media only screen and (max-width:600px){'
+    b'font-family:-apple-system,BlinkMacSystemFont,"Segoe UI",Roboto,Helvetica,Arial,sans-serif;'
+    b'font-family:Arial,Helvetica,sans-serif;font-size:14px;line-height:20px;color:#333333;'
+    b'mso-table-lspace:0pt;mso-table-rspace:0pt;border-collapse:collapse;'
+    b'-webkit-text-size-adjust:100%;-ms-text-size-adjust:100%;'
+    b'text-decoration:none;display:block;margin:0 auto;max-width:600px;width:100%;'
+    b'background-color:#ffffff;padding:0;margin:0;border:0;outline:none;'
+    b'Unsubscribe</a> | <a href="https://'
+    b'Privacy Policy</a>Terms of Service</a>All rights reserved.'
+    b'This email was sent to If you did not request this, please ignore this email.'
+    b'Your verification code is: This code will expire in 10 minutes.'
+    b'<img src="https://" alt="" width="" height="" border="0" style="display:block;">'
+    b'<table role="presentation" width="100%" cellspacing="0" cellpadding="0" border="0" align="center">'
+    b'<table width="100%" cellpadding="0" cellspacing="0" border="0">'
+    b'</span></td></tr></table></td></tr></tbody></table></div></center></body></html>'
+    b'<tr><td align="center" valign="top" style="padding:'
+    b'<td style="font-family:Arial,sans-serif;font-size:16px;line-height:24px;color:#333333;">'
+    b'<p style="margin:0;"></p><br><br/><div style="'
+    b'<span style="font-size:'
+    b'<a href="https://" target="_blank" style="color:#0067b8;text-decoration:none;">'
+    b'</div></td></tr><tr><td></td></tr></table></body></html>'
+)
+
+
+def encode_body(text: Optional[str], is_html: bool = False) -> Optional[bytes]:
+    """
+    将正文编码为带编码标记的二进制
+
+    Args:
+        text: 正文
+        is_html: 是否为 HTML 正文（HTML 使用预置字典压缩）
+
+    Returns:
+        二进制数据；正文为 None 时返回 None
+    """
+    if text is None:
+        return None
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESS_BODY_THRESHOLD:
+        return bytes([BODY_CODEC_RAW]) + raw
+
+    if is_html:
+        compressor = zlib.compressobj(level=6, zdict=HTML_BODY_DICTIONARY_V1)
+        compressed = compressor.compress(raw) + compressor.flush()
+        codec = BODY_CODEC_ZLIB_HTML_DICT_V1
+    else:
+        compressed = zlib.compress(raw, 6)
+        codec = BODY_CODEC_ZLIB
+
+    # 压缩无收益时保存原文，避免解码开销
+    if len(compressed) >= len(raw):
+        return bytes([BODY_CODEC_RAW]) + raw
+    return bytes([codec]) + compressed
+
+
+def decode_body(data: Any) -> Optional[str]:
+    """
+    按编码标记解码正文二进制
+
+    Args:
+        data: bytes / memoryview（psycopg2 BYTEA）/ None
+
+    Returns:
+        正文文本
+    """
+    if data is None:
+        return None
+    data = bytes(data)
+    if not data:
+        return ""
+
+    codec, payload = data[0], data[1:]
+    if codec == BODY_CODEC_RAW:
+        return payload.decode("utf-8")
+    if codec == BODY_CODEC_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if codec == BODY_CODEC_ZLIB_HTML_DICT_V1:
+        decompressor = zlib.decompressobj(zdict=HTML_BODY_DICTIONARY_V1)
+        return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+    raise ValueError(f"Unknown body codec marker: {codec}")
@@ -0,0 +1,261 @@
+"""
+缓存后台维护模块
+
+维护邮件缓存表的占用计数器，并在后台按 LRU 策略分批、限速地淘汰缓存，
+避免每次写入缓存时都执行全表 COUNT(*)/SUM 聚合和大批量删除；
+同时分批把旧格式（base64 文本）的详情正文迁移为二进制格式
+"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from config import (
+    CACHE_MAINTENANCE_INTERVAL,
+    CACHE_OCCUPANCY_RESYNC_INTERVAL,
+    DETAIL_BODY_MIGRATION_BATCH_SIZE,
+    LRU_CLEANUP_CHUNK_PAUSE,
+    LRU_CLEANUP_CHUNK_SIZE,
+    LRU_CLEANUP_MAX_CHUNKS_PER_RUN,
+    LRU_CLEANUP_TARGET_RATIO,
+    LRU_CLEANUP_THRESHOLD,
+    MAX_EMAIL_DETAILS_CACHE_COUNT,
+    MAX_EMAILS_CACHE_COUNT,
+    VERIFICATION_DETECTION_PRUNE_INTERVAL,
+)
+from logger_config import logger
+
+# 缓存表 -> 最大记录数
+CACHE_TABLE_LIMITS = {
+    "emails_cache": MAX_EMAILS_CACHE_COUNT,
+    "email_details_cache": MAX_EMAIL_DETAILS_CACHE_COUNT,
+}
+
+
+class CacheOccupancyTracker:
+    """
+    缓存占用计数器（线程安全）
+
+    写入路径只做内存累加；upsert 覆盖已有记录时计数会偏高，
+    因此计数仅作为触发条件，真正淘汰前会用一次精确统计校准。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {
+            table_name: {"count": 0, "size_bytes": 0} for table_name in CACHE_TABLE_LIMITS
+        }
+        self._synced_at: Optional[float] = None
+        self._last_synced_at: Optional[str] = None
+
+    def record_write(self, table_name: str, rows: int, size_bytes: int = 0) -> None:
+        """记录一次缓存写入"""
+        if rows <= 0 or table_name not in self._counts:
+            return
+        with self._lock:
+            self._counts[table_name]["count"] += rows
+            self._counts[table_name]["size_bytes"] += max(0, size_bytes)
+
+    def record_delete(self, table_name: str, rows: int, size_bytes: int = 0) -> None:
+        """记录一次缓存删除"""
+        if rows <= 0 or table_name not in self._counts:
+            return
+        with self._lock:
+            counts = self._counts[table_name]
+            counts["count"] = max(0, counts["count"] - rows)
+            counts["size_bytes"] = max(0, counts["size_bytes"] - max(0, size_bytes))
+
+    def invalidate(self) -> None:
+        """标记计数失效（批量清空缓存后调用），下一轮维护时重新校准"""
+        with self._lock:
+            self._synced_at = None
+
+    def needs_resync(self, interval: float = CACHE_OCCUPANCY_RESYNC_INTERVAL) -> bool:
+        with self._lock:
+            return self._synced_at is None or time.monotonic() - self._synced_at >= interval
+
+    def resync(self, occupancy: Dict[str, Dict[str, int]]) -> None:
+        """使用精确统计结果覆盖计数"""
+        with self._lock:
+            for table_name, counts in occupancy.items():
+                if table_name in self._counts:
+                    self._counts[table_name] = {
+                        "count": int(counts.get("count", 0)),
+                        "size_bytes": int(counts.get("size_bytes", 0)),
+                    }
+            self._synced_at = time.monotonic()
+            self._last_synced_at = datetime.now().isoformat()
+
+    def count(self, table_name: str) -> int:
+        with self._lock:
+            return self._counts[table_name]["count"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            tables = {}
+            for table_name, counts in self._counts.items():
+                max_count = CACHE_TABLE_LIMITS[table_name]
+                tables[table_name] = {
+                    "count": counts["count"],
+                    "size_bytes": counts["size_bytes"],
+                    "max_count": max_count,
+                    "usage_percent": round(counts["count"] / max_count * 100, 2) if max_count else 0,
+                }
+            return {"tables": tables, "last_synced_at": self._last_synced_at}
+
+
+class CacheMaintenanceScheduler:
+    """缓存 LRU 淘汰调度器：每轮只在超过阈值时分批删除，单轮删除量有上限"""
+
+    def __init__(self, tracker: CacheOccupancyTracker):
+        self.tracker = tracker
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "runs": 0,
+            "total_deleted_emails": 0,
+            "total_deleted_details": 0,
+            "last_run_at": None,
+            "last_result": None,
+            "last_error": None,
+            "migrated_detail_bodies": 0,
+            "pruned_detection_records": 0,
+            "dropped_detection_partitions": 0,
+        }
+        self._legacy_migration_done = False
+        self._detection_pruned_at: Optional[float] = None
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        执行一轮维护（同步方法，应在线程池中运行）
+
+        Returns:
+            {'deleted_emails': int, 'deleted_details': int}
+        """
+        from dao.email_detail_cache_dao import EmailDetailCacheDAO
+
+        dao = EmailDetailCacheDAO()
+        resynced = False
+        if self.tracker.needs_resync():
+            self.tracker.resync(dao.get_occupancy())
+            resynced = True
+
+        deleted = {"emails_cache": 0, "email_details_cache": 0}
+        try:
+            for table_name, max_count in CACHE_TABLE_LIMITS.items():
+                if self.tracker.count(table_name) <= max_count * LRU_CLEANUP_THRESHOLD:
+                    continue
+
+                # 计数是估算值，淘汰前先精确校准一次，避免误删
+                if not resynced:
+                    self.tracker.resync(dao.get_occupancy())
+                    resynced = True
+                    if self.tracker.count(table_name) <= max_count * LRU_CLEANUP_THRESHOLD:
+                        continue
+
+                deleted[table_name] = self._evict(dao, table_name, max_count)
+        except Exception as e:
+            with self._lock:
+                self._stats["last_error"] = str(e)
+            raise
+
+        result = {
+            "deleted_emails": deleted["emails_cache"],
+            "deleted_details": deleted["email_details_cache"],
+        }
+        self._migrate_legacy_bodies(dao)
+        self._prune_detection_records()
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["total_deleted_emails"] += result["deleted_emails"]
+            self._stats["total_deleted_details"] += result["deleted_details"]
+            self._stats["last_run_at"] = datetime.now().isoformat()
+            self._stats["last_result"] = result
+            self._stats["last_error"] = None
+        if result["deleted_emails"] or result["deleted_details"]:
+            logger.info(f"Cache maintenance evicted entries: {result}")
+        return result
+
+    def _evict(self, dao, table_name: str, max_count: int) -> int:
+        target = int(max_count * LRU_CLEANUP_TARGET_RATIO)
+        budget = min(
+            self.tracker.count(table_name) - target,
+            LRU_CLEANUP_CHUNK_SIZE * LRU_CLEANUP_MAX_CHUNKS_PER_RUN,
+        )
+        victims = dao.select_lru_victims(table_name, budget)
+
+        total_deleted = 0
+        for offset in range(0, len(victims), LRU_CLEANUP_CHUNK_SIZE):
+            chunk = victims[offset:offset + LRU_CLEANUP_CHUNK_SIZE]
+            deleted = dao.delete_cache_rows(table_name, [record_id for record_id, _ in chunk])
+            self.tracker.record_delete(table_name, deleted, sum(size for _, size in chunk))
+            total_deleted += deleted
+            if offset + LRU_CLEANUP_CHUNK_SIZE < len(victims) and LRU_CLEANUP_CHUNK_PAUSE > 0:
+                time.sleep(LRU_CLEANUP_CHUNK_PAUSE)
+        return total_deleted
+
+    def _migrate_legacy_bodies(self, dao) -> None:
+        """每轮迁移一小批旧格式正文，全部迁移完成后不再查询"""
+        if self._legacy_migration_done or DETAIL_BODY_MIGRATION_BATCH_SIZE <= 0:
+            return
+        try:
+            migrated = dao.migrate_legacy_bodies(DETAIL_BODY_MIGRATION_BATCH_SIZE)
+        except Exception as e:
+            logger.warning(f"Legacy detail body migration failed: {e}")
+            return
+        with self._lock:
+            self._stats["migrated_detail_bodies"] += migrated
+        if migrated == 0:
+            self._legacy_migration_done = True
+            logger.info("Legacy detail body migration completed")
+
+    def _prune_detection_records(self) -> None:
+        """按间隔清理过期的验证码识别记录（PostgreSQL 同时维护按天分区）"""
+        now = time.monotonic()
+        if (
+            self._detection_pruned_at is not None
+            and now - self._detection_pruned_at < VERIFICATION_DETECTION_PRUNE_INTERVAL
+        ):
+            return
+        self._detection_pruned_at = now
+
+        import database as db
+
+        try:
+            result = db.prune_verification_detection_records()
+        except Exception as e:
+            logger.warning(f"Verification detection record pruning failed: {e}")
+            return
+        with self._lock:
+            self._stats["pruned_detection_records"] += result["deleted_rows"]
+            self._stats["dropped_detection_partitions"] += result["dropped_partitions"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["occupancy"] = self.tracker.snapshot()
+        return stats
+
+
+# 全局实例
+cache_occupancy = CacheOccupancyTracker()
+cache_maintenance_scheduler = CacheMaintenanceScheduler(cache_occupancy)
+
+
+async def cache_maintenance_background_task(executor=None):
+    """后台缓存维护任务：定期在线程池中执行一轮 LRU 维护"""
+    logger.info(f"Cache maintenance background task started (interval: {CACHE_MAINTENANCE_INTERVAL}s)")
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                await loop.run_in_executor(executor, cache_maintenance_scheduler.run_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error in cache maintenance background task")
+            await asyncio.sleep(CACHE_MAINTENANCE_INTERVAL)
+    except asyncio.CancelledError:
+        logger.info("Cache maintenance background task stopped")
+        raise
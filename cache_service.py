@@ -5,14 +5,17 @@
 提供邮件列表、邮件详情、access_token 的统一缓存管理
 """
 
+import copy
+import hashlib
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 from cachetools import LRUCache, TTLCache
 from cachetools.keys import hashkey
 
-from config import CACHE_EXPIRE_TIME
+from config import CACHE_EXPIRE_TIME, GRAPH_SUBSCRIPTION_FOLDERS
 from logger_config import logger
 
 # ============================================================================
@@ -34,6 +37,16 @@ ACCESS_TOKEN_CACHE_TTL = 86400  # 24小时 = 86400秒
 # 分享页邮件列表缓存：最大500个条目，每个条目缓存10秒
 SHARE_EMAIL_LIST_CACHE_SIZE = 100
 SHARE_EMAIL_LIST_CACHE_TTL = 10  # 10秒
+# 已订阅 Graph 变更通知的账户：邮箱变化时会收到推送并主动失效缓存，分享页列表可以缓存更久
+SHARE_EMAIL_LIST_PUSH_CACHE_TTL = 300  # 5分钟
+
+# 账户记录缓存：最大5000个条目，每个条目缓存60秒（本进程内的写操作会立即失效对应条目）
+ACCOUNT_RECORD_CACHE_SIZE = 5000
+ACCOUNT_RECORD_CACHE_TTL = 60
+
+# 认证主体缓存：最大1000个条目，每个条目缓存30秒（用户、权限、API Key 变更会立即清空）
+PRINCIPAL_CACHE_SIZE = 1000
+PRINCIPAL_CACHE_TTL = 30
 
 # ============================================================================
 # LRU 缓存实例
@@ -46,6 +59,21 @@ email_detail_cache: LRUCache = LRUCache(maxsize=EMAIL_DETAIL_CACHE_SIZE)
 access_token_cache: TTLCache = TTLCache(maxsize=ACCESS_TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_CACHE_TTL)
 # 分享页邮件列表缓存（10秒TTL）
 share_email_list_cache: TTLCache = TTLCache(maxsize=SHARE_EMAIL_LIST_CACHE_SIZE, ttl=SHARE_EMAIL_LIST_CACHE_TTL)
+# 已订阅变更通知账户的分享页邮件列表缓存（5分钟TTL，收到通知时按账户失效）
+share_email_list_push_cache: TTLCache = TTLCache(maxsize=SHARE_EMAIL_LIST_CACHE_SIZE, ttl=SHARE_EMAIL_LIST_PUSH_CACHE_TTL)
+# 当前有完整且未过期的 Graph 变更通知订阅的账户（由订阅管理器维护）
+_push_invalidated_accounts: frozenset = frozenset()
+# 账户记录缓存（会在线程池中并发访问，读写需加锁）
+account_record_cache: TTLCache = TTLCache(maxsize=ACCOUNT_RECORD_CACHE_SIZE, ttl=ACCOUNT_RECORD_CACHE_TTL)
+_account_record_cache_lock = threading.Lock()
+_account_record_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+# 每次失效递增；读库前记下代数，回填时代数已变化说明期间有写入，放弃回填避免缓存旧数据
+_account_record_cache_generation = 0
+# 认证主体缓存（JWT 用户名 / API Key 指纹 -> 用户信息）
+principal_cache: TTLCache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+_principal_cache_lock = threading.Lock()
+_principal_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_principal_cache_generation = 0
 
 # ============================================================================
 # 缓存键生成函数
@@ -372,6 +400,196 @@ def clear_cached_access_token(email: str) -> None:
         logger.debug(f"Cleared access token cache for {email}")
 
 
+def get_cached_access_token_expiry(email: str) -> Optional[str]:
+    """
+    获取缓存的 Access Token 过期时间（仅读内存，用于日志）
+    
+    Args:
+        email: 邮箱地址
+        
+    Returns:
+        过期时间（ISO格式）或 None
+    """
+    token_data = access_token_cache.get(get_access_token_cache_key(email))
+    if isinstance(token_data, dict):
+        return token_data.get('expires_at')
+    return None
+
+
+# ============================================================================
+# 账户记录缓存操作
+# ============================================================================
+
+def get_account_record_cache_key(email: str) -> Tuple:
+    """
+    生成账户记录缓存键
+    
+    Args:
+        email: 邮箱地址
+        
+    Returns:
+        缓存键元组
+    """
+    return hashkey('account_record', email)
+
+
+def get_cached_account_record(email: str) -> Optional[Dict[str, Any]]:
+    """
+    获取缓存的账户记录（返回副本，调用方可以随意修改）
+    
+    Args:
+        email: 邮箱地址
+        
+    Returns:
+        账户记录字典或 None
+    """
+    cache_key = get_account_record_cache_key(email)
+    with _account_record_cache_lock:
+        record = account_record_cache.get(cache_key)
+        if record is None:
+            _account_record_cache_stats['misses'] += 1
+            return None
+        _account_record_cache_stats['hits'] += 1
+    return copy.deepcopy(record)
+
+
+def get_account_record_cache_generation() -> int:
+    """获取账户记录缓存的失效代数（读库前调用，回填时传给 set_cached_account_record）"""
+    with _account_record_cache_lock:
+        return _account_record_cache_generation
+
+
+def set_cached_account_record(
+    email: str,
+    record: Dict[str, Any],
+    generation: Optional[int] = None
+) -> None:
+    """
+    设置账户记录缓存
+    
+    Args:
+        email: 邮箱地址
+        record: 账户记录字典
+        generation: 读库前获取的失效代数；期间发生过失效则不回填
+    """
+    cache_key = get_account_record_cache_key(email)
+    record = copy.deepcopy(record)
+    with _account_record_cache_lock:
+        if generation is not None and generation != _account_record_cache_generation:
+            return
+        account_record_cache[cache_key] = record
+
+
+def invalidate_account_record(email: str) -> None:
+    """
+    使指定邮箱的账户记录缓存失效（账户更新、删除、令牌变更后调用）
+    
+    Args:
+        email: 邮箱地址
+    """
+    global _account_record_cache_generation
+    cache_key = get_account_record_cache_key(email)
+    with _account_record_cache_lock:
+        _account_record_cache_generation += 1
+        if account_record_cache.pop(cache_key, None) is not None:
+            _account_record_cache_stats['invalidations'] += 1
+
+
+# ============================================================================
+# 认证主体缓存操作
+# ============================================================================
+
+def get_api_key_fingerprint(api_key: str) -> str:
+    """
+    计算 API Key 指纹（缓存键中不保存原始 API Key）
+    
+    Args:
+        api_key: API Key值
+        
+    Returns:
+        SHA-256 十六进制摘要
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def get_principal_cache_key(kind: str, identifier: str) -> Tuple:
+    """
+    生成认证主体缓存键
+    
+    Args:
+        kind: 认证方式（user / api_key）
+        identifier: 用户名或 API Key 指纹
+        
+    Returns:
+        缓存键元组
+    """
+    return hashkey('principal', kind, identifier)
+
+
+def get_cached_principal(kind: str, identifier: str) -> Optional[Dict[str, Any]]:
+    """
+    获取缓存的认证主体（返回副本）
+    
+    Args:
+        kind: 认证方式（user / api_key）
+        identifier: 用户名或 API Key 指纹
+        
+    Returns:
+        用户信息字典或 None
+    """
+    cache_key = get_principal_cache_key(kind, identifier)
+    with _principal_cache_lock:
+        principal = principal_cache.get(cache_key)
+        if principal is None:
+            _principal_cache_stats['misses'] += 1
+            return None
+        _principal_cache_stats['hits'] += 1
+    return copy.deepcopy(principal)
+
+
+def get_principal_cache_generation() -> int:
+    """获取认证主体缓存的失效代数（读库前调用，回填时传给 set_cached_principal）"""
+    with _principal_cache_lock:
+        return _principal_cache_generation
+
+
+def set_cached_principal(
+    kind: str,
+    identifier: str,
+    principal: Dict[str, Any],
+    generation: Optional[int] = None
+) -> None:
+    """
+    设置认证主体缓存
+    
+    Args:
+        kind: 认证方式（user / api_key）
+        identifier: 用户名或 API Key 指纹
+        principal: 用户信息字典
+        generation: 读库前获取的失效代数；期间发生过失效则不回填
+    """
+    cache_key = get_principal_cache_key(kind, identifier)
+    principal = copy.deepcopy(principal)
+    with _principal_cache_lock:
+        if generation is not None and generation != _principal_cache_generation:
+            return
+        principal_cache[cache_key] = principal
+
+
+def invalidate_principal_cache() -> None:
+    """
+    清空认证主体缓存（用户、角色、权限、绑定账户或 API Key 变更后调用）
+    
+    API Key 认证返回的是第一个管理员，任意用户变更都可能影响它，因此整体清空
+    """
+    global _principal_cache_generation
+    with _principal_cache_lock:
+        _principal_cache_generation += 1
+        if len(principal_cache):
+            _principal_cache_stats['invalidations'] += 1
+        principal_cache.clear()
+
+
 # ============================================================================
 # 缓存清理操作
 # ============================================================================
@@ -385,22 +603,22 @@ def clear_email_cache(email: str = None) -> None:
     """
     if email:
         # 清除特定邮箱的缓存
-        keys_to_delete = []
+        list_keys = []
         for key in list(email_list_cache.keys()):
-            if len(key) > 1 and key[1] == email:  # key[1] 是 email
-                keys_to_delete.append(key)
-        for key in keys_to_delete:
+            if len(key) > 2 and key[2] == email:  # key[2] 是 email（key[1] 是 provider）
+                list_keys.append(key)
+        for key in list_keys:
             del email_list_cache[key]
         
-        keys_to_delete = []
+        detail_keys = []
         for key in list(email_detail_cache.keys()):
-            if len(key) > 1 and key[1] == email:  # key[1] 是 email
-                keys_to_delete.append(key)
-        for key in keys_to_delete:
+            if len(key) > 2 and key[2] == email:  # key[2] 是 email（key[1] 是 provider）
+                detail_keys.append(key)
+        for key in detail_keys:
             del email_detail_cache[key]
         
         logger.info(f"Cleared email cache for {email} "
-                   f"({len(keys_to_delete)} list entries, {len(keys_to_delete)} detail entries)")
+                   f"({len(list_keys)} list entries, {len(detail_keys)} detail entries)")
     else:
         # 清除所有缓存
         list_count = len(email_list_cache)
@@ -412,17 +630,21 @@ def clear_email_cache(email: str = None) -> None:
 
 def clear_all_cache() -> None:
     """
-    清除所有缓存（包括邮件、access token和分享页缓存）
+    清除所有缓存（包括邮件、access token、分享页、账户记录和认证主体缓存）
     """
     list_count = len(email_list_cache)
     detail_count = len(email_detail_cache)
     token_count = len(access_token_cache)
-    share_count = len(share_email_list_cache)
+    share_count = len(share_email_list_cache) + len(share_email_list_push_cache)
     
     email_list_cache.clear()
     email_detail_cache.clear()
     access_token_cache.clear()
     share_email_list_cache.clear()
+    share_email_list_push_cache.clear()
+    with _account_record_cache_lock:
+        account_record_cache.clear()
+    invalidate_principal_cache()
     
     logger.info(f"Cleared all caches ({list_count} list, {detail_count} detail, {token_count} token, {share_count} share entries)")
 
@@ -449,10 +671,11 @@ def get_cached_share_email_list(
     """
     cache_key = get_share_email_list_cache_key(token, page, page_size)
     
-    if cache_key in share_email_list_cache:
-        cached_data = share_email_list_cache[cache_key]
-        logger.debug(f"Cache hit for share email list: {token}:{page}")
-        return cached_data
+    for cache in (share_email_list_cache, share_email_list_push_cache):
+        if cache_key in cache:
+            cached_data = cache[cache_key]
+            logger.debug(f"Cache hit for share email list: {token}:{page}")
+            return cached_data
     
     return None
 
@@ -461,20 +684,74 @@ def set_cached_share_email_list(
     token: str,
     page: int,
     page_size: int,
-    data: Dict[str, Any]
+    data: Dict[str, Any],
+    folders: Optional[Iterable[str]] = None
 ) -> None:
     """
     设置分享页邮件列表缓存
     
+    只有结果非空、且读取范围完全在变更通知订阅的文件夹内时才使用长 TTL 缓存：
+    空结果（包括获取超时或失败时返回的空列表）和超出订阅范围的结果（例如读取 /me/messages）
+    收不到对应的推送失效，始终使用短 TTL 缓存
+    
     Args:
         token: 分享码
         page: 页码
         page_size: 每页大小
         data: 要缓存的数据
+        folders: 结果读取的 Graph 文件夹（None 表示整个邮箱）
     """
     cache_key = get_share_email_list_cache_key(token, page, page_size)
-    share_email_list_cache[cache_key] = data
-    logger.debug(f"Cache set for share email list: {token}:{page} (cache size: {len(share_email_list_cache)})")
+    use_push_cache = (
+        bool(data.get('emails'))
+        and push_covers_folders(folders)
+        and is_push_invalidated(data.get('email_id'))
+    )
+    cache = share_email_list_push_cache if use_push_cache else share_email_list_cache
+    cache[cache_key] = data
+    logger.debug(f"Cache set for share email list: {token}:{page} (cache size: {len(cache)})")
+
+
+def set_push_invalidated_accounts(emails) -> None:
+    """
+    设置已订阅 Graph 变更通知的账户（这些账户的分享页列表使用更长的缓存时间）
+    
+    Args:
+        emails: 邮箱地址集合
+    """
+    global _push_invalidated_accounts
+    _push_invalidated_accounts = frozenset(emails)
+
+
+def is_push_invalidated(email: Optional[str]) -> bool:
+    """账户的缓存是否由 Graph 变更通知主动失效"""
+    return bool(email) and email in _push_invalidated_accounts
+
+
+def push_covers_folders(folders: Optional[Iterable[str]]) -> bool:
+    """变更通知订阅是否覆盖这些 Graph 文件夹（None 表示整个邮箱，订阅不覆盖）"""
+    return folders is not None and set(folders) <= set(GRAPH_SUBSCRIPTION_FOLDERS)
+
+
+def clear_share_email_cache_for_account(email: str) -> int:
+    """
+    清除某个邮箱账户的所有分享页邮件列表缓存（与分享码无关）
+    
+    Args:
+        email: 邮箱地址
+        
+    Returns:
+        清除的条目数
+    """
+    cleared = 0
+    for cache in (share_email_list_cache, share_email_list_push_cache):
+        for key, value in list(cache.items()):
+            if isinstance(value, dict) and value.get('email_id') == email:
+                cache.pop(key, None)
+                cleared += 1
+    if cleared:
+        logger.info(f"Cleared share email cache for account {email} ({cleared} entries)")
+    return cleared
 
 
 def clear_share_email_cache(token: str = None) -> None:
@@ -487,17 +764,18 @@ def clear_share_email_cache(token: str = None) -> None:
     if token:
         # 清除特定token的缓存
         keys_to_delete = []
-        for key in list(share_email_list_cache.keys()):
-            if len(key) > 1 and key[1] == token:  # key[1] 是 token
-                keys_to_delete.append(key)
-        for key in keys_to_delete:
-            del share_email_list_cache[key]
+        for cache in (share_email_list_cache, share_email_list_push_cache):
+            for key in list(cache.keys()):
+                if len(key) > 1 and key[1] == token:  # key[1] 是 token
+                    keys_to_delete.append(key)
+                    cache.pop(key, None)
         
         logger.info(f"Cleared share email cache for token {token} ({len(keys_to_delete)} entries)")
     else:
         # 清除所有缓存
-        cache_count = len(share_email_list_cache)
+        cache_count = len(share_email_list_cache) + len(share_email_list_push_cache)
         share_email_list_cache.clear()
+        share_email_list_push_cache.clear()
         logger.info(f"Cleared all share email cache ({cache_count} entries)")
 
 
@@ -528,5 +806,23 @@ def get_cache_stats() -> Dict[str, Any]:
             'size': len(share_email_list_cache),
             'max_size': SHARE_EMAIL_LIST_CACHE_SIZE,
             'ttl': SHARE_EMAIL_LIST_CACHE_TTL
+        },
+        'share_email_list_push_cache': {
+            'size': len(share_email_list_push_cache),
+            'max_size': SHARE_EMAIL_LIST_CACHE_SIZE,
+            'ttl': SHARE_EMAIL_LIST_PUSH_CACHE_TTL,
+            'accounts': len(_push_invalidated_accounts)
+        },
+        'account_record_cache': {
+            'size': len(account_record_cache),
+            'max_size': ACCOUNT_RECORD_CACHE_SIZE,
+            'ttl': ACCOUNT_RECORD_CACHE_TTL,
+            **_account_record_cache_stats
+        },
+        'principal_cache': {
+            'size': len(principal_cache),
+            'max_size': PRINCIPAL_CACHE_SIZE,
+            'ttl': PRINCIPAL_CACHE_TTL,
+            **_principal_cache_stats
         }
     }
@@ -0,0 +1,295 @@
+"""
+缓存写回（write-behind）模块
+
+邮件列表/详情从上游解析完成后只需放入内存待写队列即可返回响应，
+由专用写线程按账户（缓存命名空间）合并 upsert 后批量落库：
+
+- 同一账户同一 message_id 的多次写入只保留最新一条
+- 待写记录总数有上限，队列满时丢弃新的写入并计数（缓存写入是尽力而为的）
+- 写线程未启动时（脚本、测试等场景）退化为同步写入
+- 清空账户缓存时递增该账户命名空间的代数（epoch），写线程已取出但尚未写入的
+  旧代数记录会被跳过，避免清空后又被写回
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import CACHE_WRITE_BEHIND_FLUSH_INTERVAL, CACHE_WRITE_BEHIND_MAX_PENDING
+from logger_config import logger
+
+CACHE_KIND_EMAILS = "emails"
+CACHE_KIND_DETAILS = "details"
+
+
+class CacheWriteBehindQueue:
+    """按账户合并缓存写入的有界队列 + 专用写线程"""
+
+    def __init__(
+        self,
+        max_pending: int = CACHE_WRITE_BEHIND_MAX_PENDING,
+        flush_interval: float = CACHE_WRITE_BEHIND_FLUSH_INTERVAL,
+    ):
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._condition = threading.Condition()
+        # (kind, namespace) -> {message_id: record}
+        self._pending: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self._pending_count = 0
+        # namespace -> 代数，每次 discard 递增
+        self._epochs: Dict[str, int] = {}
+        # 串行化批量写入与 discard：discard 返回时不会有旧代数的写入仍在进行
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats: Dict[str, Any] = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "flushed_rows": 0,
+            "flush_batches": 0,
+            "failed_rows": 0,
+            "stale_skipped": 0,
+            "max_queue_depth": 0,
+            "last_flush_at": None,
+            "last_error": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """启动写线程"""
+        if self.running:
+            return
+        with self._condition:
+            self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name="cache-write-behind",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info(
+            f"Cache write-behind writer started (max_pending: {self.max_pending}, "
+            f"flush_interval: {self.flush_interval}s)"
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止写线程，退出前写入剩余的待写记录"""
+        thread = self._thread
+        if thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("Cache write-behind writer did not stop within timeout")
+        else:
+            logger.info("Cache write-behind writer stopped")
+        self._thread = None
+
+    def submit_emails(
+        self,
+        email_account: str,
+        emails: List[Dict[str, Any]],
+        provider: Optional[str] = None,
+    ) -> bool:
+        """提交邮件列表缓存写入"""
+        if not self.running:
+            import database as db
+            return db.cache_emails(email_account, emails, provider=provider)
+        return self._enqueue(CACHE_KIND_EMAILS, email_account, provider, emails)
+
+    def submit_email_detail(
+        self,
+        email_account: str,
+        email_detail: Dict[str, Any],
+        provider: Optional[str] = None,
+    ) -> bool:
+        """提交邮件详情缓存写入"""
+        if not self.running:
+            import database as db
+            return db.cache_email_detail(email_account, email_detail, provider=provider)
+        return self._enqueue(CACHE_KIND_DETAILS, email_account, provider, [email_detail])
+
+    def discard(self, email_account: str) -> int:
+        """丢弃账户所有命名空间下尚未落库的写入（清空账户缓存时调用，避免旧数据被写回）"""
+        import database as db
+
+        namespaces = set(db._iter_email_cache_namespaces(email_account, None))
+        with self._condition:
+            for namespace in namespaces:
+                self._epochs[namespace] = self._epochs.get(namespace, 0) + 1
+            keys = [key for key in self._pending if key[1] in namespaces]
+            discarded = 0
+            for key in keys:
+                discarded += len(self._pending.pop(key))
+            self._pending_count -= discarded
+        # 等待正在进行的写入结束；之后写线程会按代数跳过已被清空的记录
+        with self._write_lock:
+            pass
+        return discarded
+
+    def discard_messages(
+        self,
+        email_account: str,
+        message_ids: List[str],
+        provider: Optional[str] = None,
+    ) -> int:
+        """丢弃指定邮件尚未落库的列表/详情写入（增量同步删除邮件时调用，避免被删邮件又被写回）"""
+        import database as db
+
+        namespace = db._build_email_cache_namespace(email_account, provider)
+        discarded = 0
+        with self._condition:
+            for kind in (CACHE_KIND_EMAILS, CACHE_KIND_DETAILS):
+                bucket = self._pending.get((kind, namespace))
+                if not bucket:
+                    continue
+                for message_id in message_ids:
+                    if bucket.pop(message_id, None) is not None:
+                        discarded += 1
+                if not bucket:
+                    self._pending.pop((kind, namespace), None)
+            self._pending_count -= discarded
+        return discarded
+
+    def flush(self) -> int:
+        """立即写入当前所有待写记录（同步），返回成功写入的记录数"""
+        batch, epochs = self._take_batch()
+        return self._write_batch(batch, epochs)
+
+    def _take_batch(self) -> Tuple[Dict[Tuple[str, str], Dict[str, Dict[str, Any]]], Dict[str, int]]:
+        """取出所有待写记录，同时记下各命名空间当前的代数"""
+        with self._condition:
+            batch = self._pending
+            self._pending = {}
+            self._pending_count = 0
+            epochs = {namespace: self._epochs.get(namespace, 0) for _, namespace in batch}
+        return batch, epochs
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            stats = dict(self._stats)
+            stats["queue_depth"] = self._pending_count
+            stats["pending_accounts"] = len({namespace for _, namespace in self._pending})
+        stats["running"] = self.running
+        stats["max_pending"] = self.max_pending
+        return stats
+
+    def _enqueue(
+        self,
+        kind: str,
+        email_account: str,
+        provider: Optional[str],
+        records: List[Dict[str, Any]],
+    ) -> bool:
+        import database as db
+
+        namespace = db._build_email_cache_namespace(email_account, provider)
+        with self._condition:
+            bucket = self._pending.get((kind, namespace))
+            new_records = [
+                record for record in records
+                if record.get("message_id") and not (bucket and record["message_id"] in bucket)
+            ]
+            if self._pending_count + len(new_records) > self.max_pending:
+                self._stats["dropped"] += len(records)
+                logger.warning(
+                    f"Cache write-behind queue full ({self._pending_count}/{self.max_pending}), "
+                    f"dropped {len(records)} {kind} writes for {namespace}"
+                )
+                return False
+
+            if bucket is None:
+                bucket = self._pending.setdefault((kind, namespace), {})
+            for record in records:
+                message_id = record.get("message_id")
+                if not message_id:
+                    continue
+                if message_id in bucket:
+                    self._stats["coalesced"] += 1
+                bucket[message_id] = dict(record)
+            self._pending_count += len(new_records)
+            self._stats["enqueued"] += len(records)
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._pending_count)
+            self._condition.notify()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                # 留出合并窗口，让同一账户的后续写入并入本批；停止时立即结束窗口
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error in cache write-behind writer")
+            if stopping:
+                return
+
+    def _write_batch(
+        self,
+        batch: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]],
+        epochs: Dict[str, int],
+    ) -> int:
+        if not batch:
+            return 0
+
+        from dao.email_cache_dao import EmailCacheDAO
+        from dao.email_detail_cache_dao import EmailDetailCacheDAO
+
+        email_dao = EmailCacheDAO()
+        detail_dao = EmailDetailCacheDAO()
+        written = 0
+        failed = 0
+        skipped = 0
+        last_error = None
+        for (kind, namespace), records_by_id in batch.items():
+            records = list(records_by_id.values())
+            with self._write_lock:
+                with self._condition:
+                    stale = self._epochs.get(namespace, 0) != epochs.get(namespace, 0)
+                if stale:
+                    # 取出后账户缓存被清空，这些记录已过期
+                    skipped += len(records)
+                    continue
+                try:
+                    if kind == CACHE_KIND_EMAILS:
+                        ok = email_dao.cache_emails(namespace, records)
+                        count = len(records) if ok else 0
+                    else:
+                        count = detail_dao.cache_details_many(namespace, records)
+                except Exception as e:
+                    count = 0
+                    last_error = str(e)
+            written += count
+            failed += len(records) - count
+
+        with self._condition:
+            self._stats["flushed_rows"] += written
+            self._stats["failed_rows"] += failed
+            self._stats["stale_skipped"] += skipped
+            self._stats["flush_batches"] += 1
+            self._stats["last_flush_at"] = datetime.now().isoformat()
+            if failed:
+                self._stats["last_error"] = last_error or f"{failed} cache rows failed to write"
+        if failed:
+            logger.warning(f"Cache write-behind flush failed for {failed} rows")
+        return written
+
+
+# 全局实例
+cache_write_behind = CacheWriteBehindQueue()
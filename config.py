@@ -46,6 +46,12 @@ MAX_CONNECTIONS = 5
 CONNECTION_TIMEOUT = 30
 SOCKET_TIMEOUT = 15
 
+# HTTP客户端池（Graph API 与 OAuth2 令牌端点共享长连接）
+HTTP_CLIENT_HTTP2 = True  # 启用 HTTP/2 多路复用（需要安装 h2，未安装时回退到 HTTP/1.1）
+HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST = 100  # 每个主机的最大连接数
+HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS = 20  # 每个主机保持的最大空闲连接数
+HTTP_CLIENT_KEEPALIVE_EXPIRY = 120.0  # 空闲连接保持时间（秒）
+
 # ============================================================================
 # 缓存配置
 # ============================================================================
@@ -57,6 +63,20 @@ MAX_CACHE_SIZE_MB = 500  # 最大缓存大小（MB）
 MAX_EMAILS_CACHE_COUNT = 10000  # 最大邮件列表缓存数量
 MAX_EMAIL_DETAILS_CACHE_COUNT = 5000  # 最大邮件详情缓存数量
 LRU_CLEANUP_THRESHOLD = 0.9  # LRU清理阈值（90%时触发）
+LRU_CLEANUP_TARGET_RATIO = 0.7  # LRU清理目标（清理到上限的70%）
+
+# 缓存后台维护配置
+CACHE_MAINTENANCE_ENABLED = True  # 是否启用后台缓存维护（替代写入时的同步LRU检查）
+CACHE_MAINTENANCE_INTERVAL = 60  # 后台维护检查间隔（秒）
+CACHE_OCCUPANCY_RESYNC_INTERVAL = 60 * 60  # 占用计数器精确校准间隔（秒）
+LRU_CLEANUP_CHUNK_SIZE = 500  # 每批删除的记录数
+LRU_CLEANUP_CHUNK_PAUSE = 0.2  # 每批删除之间的间隔（秒），限制删除速率
+LRU_CLEANUP_MAX_CHUNKS_PER_RUN = 20  # 每轮维护最多删除的批次数
+
+# 缓存写回（write-behind）配置
+CACHE_WRITE_BEHIND_ENABLED = True  # 是否启用缓存写回（列表/详情缓存由后台写线程批量落库）
+CACHE_WRITE_BEHIND_MAX_PENDING = 5000  # 待写记录上限，超过后丢弃新的写入
+CACHE_WRITE_BEHIND_FLUSH_INTERVAL = 0.5  # 合并窗口（秒），窗口内同一账户的写入合并为一批
 
 # 缓存预热配置
 CACHE_WARMUP_ENABLED = False  # 是否启用缓存预热（已停用，避免自动请求邮件列表）
@@ -65,6 +85,7 @@ CACHE_WARMUP_EMAILS_PER_ACCOUNT = 100  # 每个账户预热邮件数
 
 # 正文压缩配置
 COMPRESS_BODY_THRESHOLD = 1024  # 超过1KB的正文才压缩（字节）
+DETAIL_BODY_MIGRATION_BATCH_SIZE = 200  # 每轮后台维护迁移的旧格式（base64文本）正文记录数
 
 # ============================================================================
 # 日志配置
@@ -74,6 +95,8 @@ LOG_DIR = "logs"
 LOG_FILE = "outlook_manager.log"
 LOG_RETENTION_DAYS = 7  # 保留7天日志
 LOG_MAX_SIZE = "50 MB"  # 单个日志文件最大大小
+LOG_HOT_PATH_LEVEL = os.getenv("LOG_HOT_PATH_LEVEL", "INFO").upper()  # 热路径结构化日志的最低级别，低于该级别的事件不格式化直接丢弃
+LOG_HOT_PATH_SAMPLE_RATE = float(os.getenv("LOG_HOT_PATH_SAMPLE_RATE", "1.0"))  # 按请求采样比例（0~1），未采中的请求只记录 WARNING 及以上事件
 
 # 确保日志目录存在
 Path(LOG_DIR).mkdir(exist_ok=True)
@@ -96,10 +119,48 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))  # 最小连接数
 DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "15"))  # 最大连接数 = POOL_SIZE + MAX_OVERFLOW
 DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # 连接超时（秒）
+PREPARED_STATEMENTS_ENABLED = True  # 热点查询在每个连接上 PREPARE 一次后使用 EXECUTE（仅PostgreSQL）
 
 # SQLite数据库文件路径（当DB_TYPE='sqlite'时使用）
 DB_FILE = os.getenv("DB_FILE", "data.db")
 
+# ============================================================================
+# SQL语句统计配置
+# ============================================================================
+
+QUERY_STATS_ENABLED = True  # 是否为每条SQL语句计时并按指纹聚合
+SLOW_QUERY_THRESHOLD_MS = 200  # 慢查询阈值（毫秒），超过后记录慢查询日志并采集执行计划
+QUERY_PLAN_CAPTURE_INTERVAL = 300  # 同一指纹两次采集执行计划的最小间隔（秒）
+QUERY_STATS_MAX_FINGERPRINTS = 500  # 最多跟踪的SQL指纹数量
+SLOW_QUERY_LOG_SIZE = 100  # 慢查询日志保留条数
+
+# ============================================================================
+# 随机账户抽样配置
+# ============================================================================
+
+ACCOUNT_SAMPLER_REFRESH_INTERVAL = 30  # 增量加载新增账户的间隔（秒）
+ACCOUNT_SAMPLER_FULL_REFRESH_INTERVAL = 600  # 全量重建账户ID与标签索引的间隔（秒），用于感知其他进程的修改
+ACCOUNT_SAMPLER_CANDIDATE_CACHE_SIZE = 64  # 缓存的标签筛选候选集数量
+
+# ============================================================================
+# 验证码识别记录配置
+# ============================================================================
+
+VERIFICATION_DETECTION_RETENTION_DAYS = 30  # 识别记录保留天数
+VERIFICATION_DETECTION_PARTITION_PREMAKE_DAYS = 3  # PostgreSQL 提前创建的按天分区数
+VERIFICATION_DETECTION_PRUNE_INTERVAL = 3600  # 过期记录清理间隔（秒），由缓存维护任务触发
+VERIFICATION_DETECTION_PRUNE_BATCH_SIZE = 5000  # SQLite 每批删除的过期记录数
+
+# ============================================================================
+# SQL控制台配置
+# ============================================================================
+
+SQL_CONSOLE_STATEMENT_TIMEOUT = 30  # 默认语句超时（秒）
+SQL_CONSOLE_MAX_TIMEOUT = 300  # 允许请求指定的最大语句超时（秒）
+SQL_CONSOLE_FETCH_BATCH_SIZE = 500  # 每批从游标读取的行数
+SQL_CONSOLE_MAX_ROWS = 10000  # 非流式执行最多返回的行数
+SQL_CONSOLE_STREAM_MAX_ROWS = 1000000  # 流式执行最多返回的行数
+
 # ============================================================================
 # 应用配置
 # ============================================================================
@@ -125,6 +186,52 @@ EMAIL_SYNC_INTERVAL = 60 * 60 * 1
 # 每次同步获取的邮件页数（page_size=100，即每次最多100封）
 EMAIL_SYNC_PAGE_SIZE = 100
 
+# ============================================================================
+# Graph 增量同步配置
+# ============================================================================
+
+# 是否启用 Graph delta 增量同步（首轮会镜像整个文件夹，之后只拉取变更）
+GRAPH_DELTA_SYNC_ENABLED = False
+GRAPH_DELTA_SYNC_INTERVAL = 5 * 60  # 增量同步间隔（秒）
+GRAPH_DELTA_SYNC_FOLDERS = ("inbox", "junkemail")  # 同步的文件夹
+GRAPH_DELTA_SYNC_PAGE_SIZE = 200  # 每页最多返回的变更数（Prefer: odata.maxpagesize）
+GRAPH_DELTA_SYNC_MAX_PAGES_PER_RUN = 50  # 单个文件夹每轮最多处理的页数（超出部分下一轮继续）
+GRAPH_DELTA_SYNC_CONCURRENCY = 4  # 同时同步的账户数
+
+# ============================================================================
+# Graph 批量请求配置
+# ============================================================================
+
+GRAPH_BATCH_MAX_REQUESTS = 20  # 每个 $batch 请求的最大子请求数（Graph 上限为 20）
+GRAPH_BATCH_CONCURRENCY = 4  # 同时发送的 $batch 请求数
+GRAPH_BATCH_MAX_RETRIES = 3  # 被限流（429/503）子请求的最大重试次数
+GRAPH_BATCH_MAX_RETRY_AFTER = 30  # 单次重试的最长等待时间（秒）
+
+# ============================================================================
+# Graph 限流配置
+# ============================================================================
+
+GRAPH_THROTTLE_MAILBOX_CONCURRENCY = 4  # 单个邮箱的最大并发请求数（Graph 按邮箱限制并发）
+GRAPH_THROTTLE_RATE = 50  # 全局令牌桶速率（请求/秒，0 表示不限速）
+GRAPH_THROTTLE_BURST = 100  # 全局令牌桶容量（允许的突发请求数）
+GRAPH_THROTTLE_MAX_RETRIES = 3  # 429/503 的最大重试次数
+GRAPH_THROTTLE_BASE_DELAY = 1.0  # 没有 Retry-After 时的指数退避基数（秒）
+GRAPH_THROTTLE_MAX_DELAY = 60  # 单次退避的最长等待时间（秒）
+
+# ============================================================================
+# Graph 变更通知配置
+# ============================================================================
+
+# 是否为 Graph 账户创建变更通知订阅（需要 Graph 能访问到的 HTTPS 回调地址）
+GRAPH_NOTIFICATIONS_ENABLED = False
+GRAPH_NOTIFICATION_URL = os.getenv("GRAPH_NOTIFICATION_URL", "")  # 回调地址，如 https://example.com/graph/notifications
+GRAPH_SUBSCRIPTION_FOLDERS = ("inbox", "junkemail")  # 订阅的文件夹
+GRAPH_SUBSCRIPTION_LIFETIME_MINUTES = 4200  # 订阅有效期（分钟，Outlook 邮件资源上限约 4230 分钟）
+GRAPH_SUBSCRIPTION_RENEW_BEFORE = 12 * 60 * 60  # 距离过期不足该时间（秒）时续期
+GRAPH_SUBSCRIPTION_CHECK_INTERVAL = 30 * 60  # 订阅创建/续期检查间隔（秒）
+GRAPH_SUBSCRIPTION_CONCURRENCY = 4  # 同时处理的账户数
+GRAPH_NOTIFICATION_PREFETCH = True  # 收到通知后预取变更的邮件写入缓存（关闭时只清除该账户的 Graph 列表缓存）
+
 # 刷新token间隔（秒）- 默认1天
 REFRESH_TOKEN_INTERVAL = 60 * 60 * 24
 
@@ -12,6 +12,8 @@ from .email_cache_dao import EmailCacheDAO
 from .email_detail_cache_dao import EmailDetailCacheDAO
 from .share_token_dao import ShareTokenDAO
 from .batch_import_task_dao import BatchImportTaskDAO, BatchImportTaskItemDAO
+from .graph_delta_state_dao import GraphDeltaStateDAO
+from .graph_subscription_dao import GraphSubscriptionDAO
 
 __all__ = [
     'BaseDAO',
@@ -24,5 +26,7 @@ __all__ = [
     'ShareTokenDAO',
     'BatchImportTaskDAO',
     'BatchImportTaskItemDAO',
+    'GraphDeltaStateDAO',
+    'GraphSubscriptionDAO',
 ]
 
@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
 from .base_dao import BaseDAO, get_db_connection
+import cache_service
+from account_sampler import account_sampler
 from config import DB_TYPE
 from logger_config import logger
 
@@ -70,6 +72,71 @@ class AccountDAO(BaseDAO):
         )
         return account
     
+    def _get_account_id(self, cursor, email: str) -> Optional[int]:
+        """在调用方的事务中按邮箱查询账户ID"""
+        placeholder = self._get_param_placeholder()
+        cursor.execute(f"SELECT id FROM accounts WHERE email = {placeholder}", (email,))
+        row = cursor.fetchone()
+        return row["id"] if row else None
+
+    def _sync_tags(self, cursor, email: str, tags: List[str]) -> Optional[int]:
+        """
+        在同一事务中将账户标签同步到 account_tags 表
+
+        Args:
+            cursor: 数据库游标（由调用方负责提交）
+            email: 邮箱地址
+            tags: 账户的完整标签列表
+
+        Returns:
+            账户ID（账户不存在时为 None）
+        """
+        placeholder = self._get_param_placeholder()
+        account_id = self._get_account_id(cursor, email)
+        if account_id is None:
+            return None
+        cursor.execute(f"DELETE FROM account_tags WHERE account_id = {placeholder}", (account_id,))
+        unique_tags = list(dict.fromkeys(tag for tag in tags if isinstance(tag, str) and tag))
+        if unique_tags:
+            cursor.executemany(
+                f"""
+                INSERT INTO account_tags (account_id, tag)
+                VALUES ({placeholder}, {placeholder})
+                ON CONFLICT DO NOTHING
+                """,
+                [(account_id, tag) for tag in unique_tags]
+            )
+        return account_id
+
+    def _build_tag_conditions(
+        self,
+        include_tags: Optional[List[str]],
+        exclude_tags: Optional[List[str]],
+    ) -> Tuple[List[str], List[Any]]:
+        """
+        基于 account_tags 表构建标签筛选条件
+
+        Args:
+            include_tags: 必须同时包含的标签列表
+            exclude_tags: 必须不包含的标签列表
+
+        Returns:
+            (条件列表, 参数列表)
+        """
+        placeholder = self._get_param_placeholder()
+        conditions: List[str] = []
+        params: List[Any] = []
+        for tag in include_tags or []:
+            conditions.append(f"id IN (SELECT account_id FROM account_tags WHERE tag = {placeholder})")
+            params.append(tag)
+        if exclude_tags:
+            in_placeholders = ", ".join([placeholder] * len(exclude_tags))
+            conditions.append(
+                f"id NOT IN (SELECT account_id FROM account_tags WHERE tag IN ({in_placeholders}))"
+            )
+            params.extend(exclude_tags)
+        return conditions, params
+
     def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
         根据邮箱地址获取账户信息
@@ -80,15 +147,121 @@ class AccountDAO(BaseDAO):
         Returns:
             账户信息字典或None
         """
+        cached = cache_service.get_cached_account_record(email)
+        if cached is not None:
+            return cached
+        
+        generation = cache_service.get_account_record_cache_generation()
         placeholder = self._get_param_placeholder()
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM accounts WHERE email = {placeholder}", (email,))
+            self._execute_prepared(
+                cursor,
+                "accounts_get_by_email",
+                f"SELECT * FROM accounts WHERE email = {placeholder}",
+                (email,)
+            )
             row = cursor.fetchone()
             
             if row:
-                return self._normalize_account_record(dict(row))
+                account = self._normalize_account_record(dict(row))
+                cache_service.set_cached_account_record(email, account, generation)
+                return account
             return None
+
+    def preload_cache(self, emails: Optional[List[str]] = None, chunk_size: int = 500) -> int:
+        """
+        批量预加载账户记录缓存
+        
+        Args:
+            emails: 要预加载的邮箱列表；为 None 时按创建时间倒序预加载，直到缓存容量上限
+            chunk_size: 每条 IN 查询的最大邮箱数
+            
+        Returns:
+            预加载的账户数
+        """
+        generation = cache_service.get_account_record_cache_generation()
+        placeholder = self._get_param_placeholder()
+        rows: List[Dict[str, Any]] = []
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if emails is None:
+                cursor.execute(
+                    f"SELECT * FROM accounts ORDER BY created_at DESC, id DESC LIMIT {placeholder}",
+                    (cache_service.ACCOUNT_RECORD_CACHE_SIZE,)
+                )
+                rows.extend(dict(row) for row in cursor.fetchall())
+            else:
+                rows.extend(self._fetch_by_emails(cursor, emails, "*", chunk_size))
+        
+        for row in rows:
+            account = self._normalize_account_record(row)
+            cache_service.set_cached_account_record(account["email"], account, generation)
+        logger.info(f"Preloaded {len(rows)} account records into cache")
+        return len(rows)
+    
+    def _fetch_by_emails(
+        self,
+        cursor,
+        emails: List[str],
+        columns: str = "*",
+        chunk_size: int = 500
+    ) -> List[Dict[str, Any]]:
+        """
+        按邮箱分块批量查询账户行（SQLite 使用 IN，PostgreSQL 使用 = ANY 数组参数）
+        
+        Args:
+            cursor: 数据库游标
+            emails: 邮箱列表（会去重）
+            columns: 查询的列
+            chunk_size: 每条查询的最大邮箱数
+            
+        Returns:
+            账户行字典列表（未做字段规范化）
+        """
+        unique_emails = list(dict.fromkeys(emails))
+        rows: List[Dict[str, Any]] = []
+        for offset in range(0, len(unique_emails), chunk_size):
+            chunk = unique_emails[offset:offset + chunk_size]
+            if DB_TYPE == "postgresql":
+                cursor.execute(f"SELECT {columns} FROM accounts WHERE email = ANY(%s)", (chunk,))
+            else:
+                in_placeholders = ", ".join(["?"] * len(chunk))
+                cursor.execute(f"SELECT {columns} FROM accounts WHERE email IN ({in_placeholders})", chunk)
+            rows.extend(dict(row) for row in cursor.fetchall())
+        return rows
+
+    def get_many_by_emails(self, emails: List[str], chunk_size: int = 500) -> Dict[str, Dict[str, Any]]:
+        """
+        按邮箱批量获取账户信息（优先读取账户记录缓存，未命中的邮箱分块查询并回填缓存）
+        
+        Args:
+            emails: 邮箱地址列表
+            chunk_size: 每条查询的最大邮箱数
+            
+        Returns:
+            {邮箱: 账户信息} 字典，不存在的邮箱不包含在内
+        """
+        accounts: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for email in dict.fromkeys(emails):
+            cached = cache_service.get_cached_account_record(email)
+            if cached is not None:
+                accounts[email] = cached
+            else:
+                missing.append(email)
+        
+        if missing:
+            generation = cache_service.get_account_record_cache_generation()
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                rows = self._fetch_by_emails(cursor, missing, "*", chunk_size)
+            for row in rows:
+                account = self._normalize_account_record(row)
+                cache_service.set_cached_account_record(account["email"], account, generation)
+                accounts[account["email"]] = account
+        
+        return accounts
     
     def get_all(
         self,
@@ -117,12 +290,9 @@ class AccountDAO(BaseDAO):
             conditions.append(f"email LIKE {placeholder}")
             params.append(f"%{email_search}%")
         
-        # 对于PostgreSQL，tags是jsonb类型，需要转换为文本才能使用LIKE
-        # 对于SQLite，tags是TEXT类型，可以直接使用LIKE
-        tags_column = "tags::text" if DB_TYPE == "postgresql" else "tags"
-        
+        # 在 account_tags 表上模糊匹配，避免扫描 accounts.tags 的 JSON 文本
         if tag_search:
-            conditions.append(f"{tags_column} LIKE {placeholder}")
+            conditions.append(f"id IN (SELECT account_id FROM account_tags WHERE tag LIKE {placeholder})")
             params.append(f"%{tag_search}%")
         
         where_clause = self._build_where_clause(conditions, params)
@@ -203,26 +373,10 @@ class AccountDAO(BaseDAO):
         if tag_search and not include_tags:
             include_tags = [tag.strip() for tag in tag_search.split(",") if tag.strip()]
         
-        # 包含标签筛选（必须同时包含所有指定标签）
-        if include_tags:
-            for tag in include_tags:
-                if DB_TYPE == "postgresql":
-                    # PostgreSQL 使用 JSONB 包含运算符，可命中 GIN 索引
-                    conditions.append(f"tags @> {placeholder}::jsonb")
-                    params.append(json.dumps([tag], ensure_ascii=False))
-                else:
-                    conditions.append(f"tags LIKE {placeholder}")
-                    params.append(f'%"{tag}"%')  # JSON格式的标签匹配
-        
-        # 排除标签筛选（必须不包含任何指定标签）
-        if exclude_tags:
-            for tag in exclude_tags:
-                if DB_TYPE == "postgresql":
-                    conditions.append(f"NOT (tags @> {placeholder}::jsonb)")
-                    params.append(json.dumps([tag], ensure_ascii=False))
-                else:
-                    conditions.append(f"tags NOT LIKE {placeholder}")
-                    params.append(f'%"{tag}"%')  # JSON格式的标签匹配
+        # 标签筛选：必须同时包含所有 include_tags，且不包含任何 exclude_tags（走 account_tags 索引）
+        tag_conditions, tag_params = self._build_tag_conditions(include_tags, exclude_tags)
+        conditions.extend(tag_conditions)
+        params.extend(tag_params)
         
         # 刷新状态筛选
         if refresh_status and refresh_status != 'all':
@@ -260,13 +414,9 @@ class AccountDAO(BaseDAO):
             conditions.append(f"(last_refresh_time >= {placeholder} AND last_refresh_time <= {placeholder})")
             params.append(refresh_start_date)
             params.append(refresh_end_date)
-            logger.info(f"[筛选] 添加日期范围筛选: {refresh_start_date} 至 {refresh_end_date}")
         
         where_clause = self._build_where_clause(conditions, params)
         
-        logger.info(f"[筛选] SQL WHERE子句: {where_clause}")
-        logger.info(f"[筛选] SQL参数: {params}")
-        
         # 使用稳定排序，避免函数表达式破坏索引可用性
         order_by = "created_at DESC, id DESC"
         
@@ -278,7 +428,7 @@ class AccountDAO(BaseDAO):
             order_by=order_by
         )
         
-        logger.info(f"[筛选] 符合条件的总数: {total}")
+        self.hot_log.debug("filter.query", where=where_clause, params=params, total=total)
         return [self._normalize_account_record(account) for account in records], total
     
     def create(
@@ -350,7 +500,10 @@ class AccountDAO(BaseDAO):
                 self._encode_json_text(capability_snapshot_json),
                 self._encode_json_text(provider_health_json),
             ))
+            self._sync_tags(cursor, email, tags)
             conn.commit()
+            cache_service.invalidate_account_record(email)
+            account_sampler.invalidate(full=False)
             
             logger.info(f"Created account: {email}")
             return self.get_by_email(email)
@@ -370,8 +523,10 @@ class AccountDAO(BaseDAO):
             return False
         
         # 处理 tags 字段
+        new_tags = None
         if 'tags' in kwargs:
-            kwargs['tags'] = json.dumps(kwargs['tags'], ensure_ascii=False)
+            new_tags = kwargs['tags'] or []
+            kwargs['tags'] = json.dumps(new_tags, ensure_ascii=False)
         if 'capability_snapshot_json' in kwargs:
             kwargs['capability_snapshot_json'] = self._encode_json_text(
                 kwargs['capability_snapshot_json']
@@ -395,9 +550,15 @@ class AccountDAO(BaseDAO):
                 f"UPDATE accounts SET {set_clause} WHERE email = {placeholder}",
                 values
             )
+            success = cursor.rowcount > 0
+            account_id = None
+            if success and new_tags is not None:
+                account_id = self._sync_tags(cursor, email, new_tags)
             conn.commit()
+            cache_service.invalidate_account_record(email)
+            if account_id is not None:
+                account_sampler.update_account_tags(account_id, new_tags)
             
-            success = cursor.rowcount > 0
             if success:
                 logger.info(f"Updated account: {email}")
             return success
@@ -419,39 +580,142 @@ class AccountDAO(BaseDAO):
         placeholder = self._get_param_placeholder()
         with get_db_connection() as conn:
             cursor = conn.cursor()
+            account_id = self._get_account_id(cursor, email)
+            if account_id is not None:
+                cursor.execute(f"DELETE FROM account_tags WHERE account_id = {placeholder}", (account_id,))
             cursor.execute(f"DELETE FROM accounts WHERE email = {placeholder}", (email,))
             conn.commit()
             
             success = cursor.rowcount > 0
+            cache_service.invalidate_account_record(email)
+            if success and account_id is not None:
+                account_sampler.remove_account(account_id)
             if success:
                 logger.info(f"Deleted account: {email}")
             return success
     
-    def get_access_token(self, email: str) -> Optional[Dict[str, str]]:
+    def get_email_by_id(self, account_id: int) -> Optional[str]:
         """
-        获取账户的缓存 access token 信息
+        按账户ID查询邮箱
         
         Args:
-            email: 邮箱地址
+            account_id: 账户ID
             
         Returns:
-            包含 access_token 和 token_expires_at 的字典，如果不存在则返回 None
+            账户邮箱（账户不存在时为 None）
         """
         placeholder = self._get_param_placeholder()
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                f"SELECT access_token, token_expires_at FROM accounts WHERE email = {placeholder}",
-                (email,)
-            )
+            cursor.execute(f"SELECT email FROM accounts WHERE id = {placeholder}", (account_id,))
             row = cursor.fetchone()
+            return row["email"] if row else None
+    
+    def resync_tags_by_id(self, account_id: int) -> Optional[str]:
+        """
+        按 accounts.tags 重新同步账户的 account_tags（表编辑器等直接写 accounts 表后调用）
+        
+        Args:
+            account_id: 账户ID
             
-            if row and row['access_token'] and row['token_expires_at']:
-                return {
-                    'access_token': row['access_token'],
-                    'token_expires_at': row['token_expires_at']
-                }
-            return None
+        Returns:
+            账户邮箱（账户不存在时为 None）
+        """
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT email, tags FROM accounts WHERE id = {placeholder}", (account_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            email = row["email"]
+            try:
+                tags = self._decode_tags(row["tags"])
+            except ValueError:
+                tags = None
+            if not isinstance(tags, list):
+                logger.warning(f"Account {email} has malformed tags, clearing its tag index")
+                tags = []
+            self._sync_tags(cursor, email, tags)
+            conn.commit()
+        account_sampler.update_account_tags(account_id, tags)
+        return email
+    
+    def delete_by_id(self, account_id: int) -> Optional[str]:
+        """
+        按账户ID删除账户及其标签关联（表编辑器删除 accounts 记录时使用）
+        
+        Args:
+            account_id: 账户ID
+            
+        Returns:
+            被删除账户的邮箱（账户不存在时为 None）
+        """
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT email FROM accounts WHERE id = {placeholder}", (account_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute(f"DELETE FROM account_tags WHERE account_id = {placeholder}", (account_id,))
+            cursor.execute(f"DELETE FROM accounts WHERE id = {placeholder}", (account_id,))
+            conn.commit()
+        account_sampler.remove_account(account_id)
+        logger.info(f"Deleted account: {row['email']}")
+        return row["email"]
+    
+    def delete_many_by_emails(self, emails: List[str], chunk_size: int = 500) -> List[str]:
+        """
+        批量删除账户（分块查询账户ID后按ID删除，同时删除标签关联）
+        
+        Args:
+            emails: 邮箱地址列表
+            chunk_size: 每条查询的最大邮箱数
+            
+        Returns:
+            实际删除的邮箱列表
+        """
+        placeholder = self._get_param_placeholder()
+        deleted: List[str] = []
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            rows = self._fetch_by_emails(cursor, emails, "id, email", chunk_size)
+            for offset in range(0, len(rows), chunk_size):
+                chunk = rows[offset:offset + chunk_size]
+                ids = [row["id"] for row in chunk]
+                in_placeholders = ", ".join([placeholder] * len(ids))
+                cursor.execute(f"DELETE FROM account_tags WHERE account_id IN ({in_placeholders})", ids)
+                cursor.execute(f"DELETE FROM accounts WHERE id IN ({in_placeholders})", ids)
+                deleted.extend(row["email"] for row in chunk)
+            conn.commit()
+        
+        for email in dict.fromkeys(emails):
+            cache_service.invalidate_account_record(email)
+        if deleted:
+            account_sampler.invalidate()
+            logger.info(f"Deleted {len(deleted)} accounts in batch")
+        return deleted
+    
+    def get_access_token(self, email: str) -> Optional[Dict[str, str]]:
+        """
+        获取账户的缓存 access token 信息
+        
+        Args:
+            email: 邮箱地址
+            
+        Returns:
+            包含 access_token 和 token_expires_at 的字典，如果不存在则返回 None
+        """
+        # 通过账户记录缓存读取，令牌更新时缓存会被失效
+        account = self.get_by_email(email)
+        
+        if account and account.get('access_token') and account.get('token_expires_at'):
+            return {
+                'access_token': account['access_token'],
+                'token_expires_at': account['token_expires_at']
+            }
+        return None
     
     def update_access_token(self, email: str, access_token: Optional[str], expires_at: Optional[str]) -> bool:
         """
@@ -472,7 +736,9 @@ class AccountDAO(BaseDAO):
         placeholder = self._get_param_placeholder()
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
+            self._execute_prepared(
+                cursor,
+                "accounts_update_access_token",
                 f"""
                 UPDATE accounts 
                 SET access_token = {placeholder}, token_expires_at = {placeholder}, updated_at = {placeholder}
@@ -481,13 +747,15 @@ class AccountDAO(BaseDAO):
                 (access_token, expires_at, datetime.now().isoformat(), email)
             )
             conn.commit()
+            cache_service.invalidate_account_record(email)
             
             success = cursor.rowcount > 0
             if success:
-                if access_token and expires_at:
-                    logger.info(f"Updated access token for account: {email}, expires at: {expires_at}")
-                else:
-                    logger.info(f"Cleared access token for account: {email}")
+                self.hot_log.info(
+                    "access_token.updated" if access_token and expires_at else "access_token.cleared",
+                    email=email,
+                    expires_at=expires_at,
+                )
             return success
     
     def get_random(
@@ -500,6 +768,9 @@ class AccountDAO(BaseDAO):
         """
         随机获取账户列表（支持标签筛选和分页）
         
+        在内存中的账户ID与标签索引上抽样，只按主键取回本页账户，
+        不再执行 ORDER BY RANDOM() 排序和 COUNT(*)。
+        
         Args:
             include_tags: 必须包含的标签列表
             exclude_tags: 必须不包含的标签列表
@@ -509,54 +780,59 @@ class AccountDAO(BaseDAO):
         Returns:
             (账户列表, 总数)
         """
-        placeholder = self._get_param_placeholder()
-        conditions = []
-        params = []
-        
-        # 包含标签筛选
-        if include_tags:
-            for tag in include_tags:
-                if DB_TYPE == "postgresql":
-                    conditions.append(f"tags @> {placeholder}::jsonb")
-                    params.append(json.dumps([tag], ensure_ascii=False))
-                else:
-                    conditions.append(f"tags LIKE {placeholder}")
-                    params.append(f'%"{tag}"%')  # JSON格式的标签匹配
-        
-        # 排除标签筛选
-        if exclude_tags:
-            for tag in exclude_tags:
-                if DB_TYPE == "postgresql":
-                    conditions.append(f"NOT (tags @> {placeholder}::jsonb)")
-                    params.append(json.dumps([tag], ensure_ascii=False))
-                else:
-                    conditions.append(f"tags NOT LIKE {placeholder}")
-                    params.append(f'%"{tag}"%')  # JSON格式的标签匹配
-        
-        where_clause = self._build_where_clause(conditions, params)
-        
-        # 获取总数
-        total = self.count(where_clause, params)
-        
-        # 获取随机分页数据
-        page = self._normalize_page(page)
-        page_size = self._normalize_page_size(page_size)
-        offset = (page - 1) * page_size
+        accounts, total = account_sampler.sample(
+            self,
+            include_tags=include_tags,
+            exclude_tags=exclude_tags,
+            page=self._normalize_page(page),
+            page_size=self._normalize_page_size(page_size),
+        )
+        self.hot_log.debug("random.query", count=len(accounts), total=total)
+        return accounts, total
+
+    def load_sampling_index(self, after_id: int = 0) -> Tuple[List[int], List[Tuple[int, str]]]:
+        """
+        加载随机抽样使用的账户ID和标签
         
+        Args:
+            after_id: 只加载 id 大于该值的账户（增量加载）
+            
+        Returns:
+            (账户ID列表, [(账户ID, 标签)])
+        """
+        placeholder = self._get_param_placeholder()
         with get_db_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute(f"SELECT id FROM accounts WHERE id > {placeholder}", (after_id,))
+            ids = [self._extract_scalar_value(row) for row in cursor.fetchall()]
             cursor.execute(
-                f"SELECT * FROM accounts WHERE {where_clause} ORDER BY RANDOM() LIMIT {placeholder} OFFSET {placeholder}",
-                params + [page_size, offset]
+                f"SELECT account_id, tag FROM account_tags WHERE account_id > {placeholder}",
+                (after_id,)
             )
-            rows = cursor.fetchall()
-            
-            accounts = []
-            for row in rows:
-                accounts.append(self._normalize_account_record(dict(row)))
+            tag_pairs = [(row["account_id"], row["tag"]) for row in cursor.fetchall()]
+        return ids, tag_pairs
+
+    def get_by_ids(self, ids: List[int], chunk_size: int = 500) -> List[Dict[str, Any]]:
+        """
+        按主键批量获取账户
+        
+        Args:
+            ids: 账户ID列表
+            chunk_size: 每条 IN 查询的最大ID数
             
-            logger.info(f"Random accounts query: {len(accounts)} accounts found (total: {total})")
-            return accounts, total
+        Returns:
+            账户列表（顺序不保证）
+        """
+        placeholder = self._get_param_placeholder()
+        accounts: List[Dict[str, Any]] = []
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for offset in range(0, len(ids), chunk_size):
+                chunk = ids[offset:offset + chunk_size]
+                in_placeholders = ", ".join([placeholder] * len(chunk))
+                cursor.execute(f"SELECT * FROM accounts WHERE id IN ({in_placeholders})", chunk)
+                accounts.extend(self._normalize_account_record(dict(row)) for row in cursor.fetchall())
+        return accounts
     
     def add_tag(self, email: str, tag: str) -> bool:
         """
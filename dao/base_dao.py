@@ -11,7 +11,8 @@ from typing import Any, Dict, List, Optional, Tuple
 # 导入database模块的get_db_connection和配置
 from database import get_db_connection
 from config import DB_TYPE
-from logger_config import logger
+from logger_config import get_structured_logger, logger
+from .prepared_statements import prepared_statements
 
 # 默认分页配置
 DEFAULT_PAGE_SIZE = 10
@@ -34,6 +35,8 @@ class BaseDAO:
             table_name: 表名
         """
         self.table_name = table_name
+        # 热路径日志（按级别和请求采样输出，字段惰性求值并脱敏）
+        self.hot_log = get_structured_logger(f"dao.{table_name}")
         self.default_page_size = DEFAULT_PAGE_SIZE
         self.max_page_size = DEFAULT_MAX_PAGE_SIZE
         self.max_single_query = DEFAULT_MAX_SINGLE_QUERY
@@ -142,7 +145,19 @@ class BaseDAO:
             '?' for SQLite, '%s' for PostgreSQL
         """
         return "%s" if DB_TYPE == "postgresql" else "?"
-    
+
+    def _execute_prepared(self, cursor, name: str, sql: str, params: Tuple[Any, ...] = ()) -> None:
+        """
+        执行固定形状的热点查询（PostgreSQL 下使用预编译语句）
+
+        Args:
+            cursor: 数据库游标
+            name: 预编译语句名，同一名称必须始终对应同一条 SQL
+            sql: SQL语句
+            params: 参数
+        """
+        prepared_statements.execute(cursor, name, sql, params)
+
     def _replace_sql_placeholders(self, sql: str) -> str:
         """
         替换SQL中的占位符
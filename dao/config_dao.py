@@ -6,7 +6,8 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from .base_dao import BaseDAO, get_db_connection
-from logger_config import logger
+import cache_service
+from logger_config import logger, redact_log_value
 
 
 class ConfigDAO(BaseDAO):
@@ -76,7 +77,9 @@ class ConfigDAO(BaseDAO):
             """, (key, value, description, datetime.now().isoformat()))
             
             conn.commit()
-            logger.info(f"Set config: {key} = {value}")
+            if key == "api_key":
+                cache_service.invalidate_principal_cache()
+            self.hot_log.info("set", key=key, value=lambda: redact_log_value(value, key))
             return cursor.rowcount > 0
     
     def delete_config(self, key: str) -> bool:
@@ -97,6 +100,8 @@ class ConfigDAO(BaseDAO):
             
             success = cursor.rowcount > 0
             if success:
+                if key == "api_key":
+                    cache_service.invalidate_principal_cache()
                 logger.info(f"Deleted config: {key}")
             return success
     
@@ -138,7 +143,7 @@ class ConfigDAO(BaseDAO):
         # 生成新的API Key
         new_key = secrets.token_urlsafe(32)
         self.set_api_key(new_key)
-        logger.info(f"Generated new API Key: {new_key}")
+        self.hot_log.info("api_key.generated", api_key=new_key)
         
         return new_key
 
@@ -5,10 +5,17 @@ EmailCacheDAO - 邮件列表缓存表数据访问对象
 from typing import Any, Dict, List, Optional, Tuple
 
 from .base_dao import BaseDAO, get_db_connection
+from cache_maintenance import cache_occupancy
 from config import DB_TYPE
+from email_utils import extract_email_address
 from logger_config import logger
 
 
+def _escape_like_pattern(value: str) -> str:
+    """转义 LIKE 通配符（以反斜杠为转义字符）"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 class EmailCacheDAO(BaseDAO):
     """邮件列表缓存表 DAO"""
     
@@ -19,7 +26,7 @@ class EmailCacheDAO(BaseDAO):
     
     def cache_emails(self, email_account: str, emails: List[Dict[str, Any]]) -> bool:
         """
-        批量缓存邮件列表（带LRU清理）
+        批量缓存邮件列表
         
         Args:
             email_account: 邮箱账号
@@ -38,13 +45,14 @@ class EmailCacheDAO(BaseDAO):
                 placeholder = self._get_param_placeholder()
                 upsert_sql = f"""
                     INSERT INTO emails_cache 
-                    (email_account, message_id, folder, subject, from_email, date, 
+                    (email_account, message_id, folder, subject, from_email, from_address, date, 
                      is_read, has_attachments, sender_initial, verification_code, body_preview, cache_size, created_at)
-                    VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, CURRENT_TIMESTAMP)
+                    VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, CURRENT_TIMESTAMP)
                     ON CONFLICT(email_account, message_id) DO UPDATE SET
                         folder = excluded.folder,
                         subject = excluded.subject,
                         from_email = excluded.from_email,
+                        from_address = excluded.from_address,
                         date = excluded.date,
                         is_read = excluded.is_read,
                         has_attachments = excluded.has_attachments,
@@ -74,6 +82,8 @@ class EmailCacheDAO(BaseDAO):
                         email.get('folder'),
                         email.get('subject'),
                         email.get('from_email'),
+                        # IMAP 的 from_email 为原始 From 头，检索按提取出的地址进行
+                        extract_email_address(email.get('from_email') or ''),
                         email.get('date'),
                         is_read_value,
                         has_attachments_value,
@@ -86,20 +96,14 @@ class EmailCacheDAO(BaseDAO):
                 cursor.executemany(upsert_sql, values)
                 
                 conn.commit()
-                logger.info(f"Cached {len(emails)} emails for account {email_account}")
+                self.hot_log.debug("cached", email=email_account, count=len(emails))
             
-            # 检查并触发LRU清理（延迟导入避免循环依赖）
-            try:
-                from dao.email_detail_cache_dao import EmailDetailCacheDAO
-                detail_dao = EmailDetailCacheDAO()
-                cache_stats = detail_dao.check_cache_size()
-                if (cache_stats['emails_cache']['usage_percent'] > 90 or 
-                    cache_stats['details_cache']['usage_percent'] > 90):
-                    logger.info("Cache usage high, triggering LRU cleanup")
-                    cleanup_result = detail_dao.cleanup_lru_cache()
-                    logger.info(f"LRU cleanup completed: {cleanup_result}")
-            except Exception as cleanup_error:
-                logger.warning(f"Skip LRU cleanup due to error: {cleanup_error}")
+            # 只累加占用计数，LRU 淘汰由后台维护任务（cache_maintenance）完成
+            cache_occupancy.record_write(
+                "emails_cache",
+                len(values),
+                sum(value[-1] for value in values)
+            )
             
             return True
         except Exception as e:
@@ -174,8 +178,12 @@ class EmailCacheDAO(BaseDAO):
         
         order_by = f"{sort_by} {sort_order.upper()}"
         
-        # 获取总数
-        total = self.count(where_clause, params)
+        # 查询形状由过滤条件组合与排序方式唯一确定，用作预编译语句名
+        shape = "".join(
+            "1" if flag else "0"
+            for flag in (folder and folder != 'all', sender_search, subject_search, start_time, end_time)
+        )
+        statement_suffix = f"{shape}_{sort_by}_{sort_order.lower()}"
         
         # 获取分页数据
         page = self._normalize_page(page)
@@ -184,14 +192,24 @@ class EmailCacheDAO(BaseDAO):
         
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f"""
+            # 获取总数
+            self._execute_prepared(
+                cursor,
+                f"emails_cache_count_{shape}",
+                f"SELECT COUNT(*) FROM emails_cache WHERE {where_clause}",
+                tuple(params)
+            )
+            total_value = self._extract_scalar_value(cursor.fetchone())
+            total = total_value if total_value is not None else 0
+            
+            self._execute_prepared(cursor, f"emails_cache_page_{statement_suffix}", f"""
                 SELECT message_id, folder, subject, from_email, date, 
                        is_read, has_attachments, sender_initial, verification_code, body_preview
                 FROM emails_cache 
                 WHERE {where_clause}
                 ORDER BY {order_by}
                 LIMIT {placeholder} OFFSET {placeholder}
-            """, params + [page_size, offset])
+            """, tuple(params + [page_size, offset]))
             
             rows = cursor.fetchall()
             
@@ -227,6 +245,144 @@ class EmailCacheDAO(BaseDAO):
             
             return emails, total
     
+    def search_across_accounts(
+        self,
+        email_accounts: Optional[List[str]] = None,
+        sender_search: Optional[str] = None,
+        subject_search: Optional[str] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        verification_code: Optional[str] = None,
+        has_verification_code: Optional[bool] = None,
+        after_date: Optional[str] = None,
+        after_id: Optional[int] = None,
+        page_size: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        跨账户检索邮件缓存（联合列表缓存与详情缓存）
+
+        使用 (date DESC, id DESC) 键集分页，配合 idx_emails_cache_date_id 索引，
+        翻页时不需要 OFFSET 与 COUNT(*)，百万级缓存下仍只扫描命中页附近的索引区间。
+        发件人按规范化地址（from_address）前缀匹配（不区分大小写），验证码分别在列表缓存和详情缓存中查找，
+        两者都能走对应的索引。返回的验证码优先取列表缓存，缺失时回退到详情缓存。
+
+        Args:
+            email_accounts: 限定的缓存命名空间列表（为空表示全部账户）
+            sender_search: 发件人前缀（不区分大小写，如 noreply@github）
+            subject_search: 主题模糊搜索
+            start_time: 开始时间 (ISO格式)
+            end_time: 结束时间 (ISO格式)
+            verification_code: 验证码精确匹配
+            has_verification_code: 仅返回带（或不带）验证码的邮件
+            after_date: 上一页最后一条记录的 date（键集游标）
+            after_id: 上一页最后一条记录的 id（键集游标）
+            page_size: 每页数量
+
+        Returns:
+            (邮件列表, 下一页游标或None)
+        """
+        placeholder = self._get_param_placeholder()
+        like_operator = "ILIKE" if DB_TYPE == "postgresql" else "LIKE"
+        code_expr = "COALESCE(c.verification_code, d.verification_code)"
+        conditions = ["c.date IS NOT NULL"]
+        params: List[Any] = []
+
+        if email_accounts is not None:
+            if not email_accounts:
+                return [], None
+            in_placeholders = ", ".join([placeholder] * len(email_accounts))
+            conditions.append(f"c.email_account IN ({in_placeholders})")
+            params.extend(email_accounts)
+
+        if sender_search:
+            # 在规范化的发件人地址（小写）上前缀匹配：SQLite 走 from_address COLLATE NOCASE 索引，
+            # PostgreSQL 走 from_address text_pattern_ops 索引
+            sender_prefix = _escape_like_pattern(sender_search.strip().lower()) + "%"
+            if DB_TYPE == "postgresql":
+                conditions.append(f"c.from_address LIKE {placeholder}")
+            else:
+                conditions.append(f"c.from_address LIKE {placeholder} ESCAPE '\\'")
+            params.append(sender_prefix)
+
+        if subject_search:
+            conditions.append(f"c.subject {like_operator} {placeholder}")
+            params.append(f"%{subject_search}%")
+
+        if start_time:
+            conditions.append(f"c.date >= {placeholder}")
+            params.append(start_time)
+
+        if end_time:
+            conditions.append(f"c.date <= {placeholder}")
+            params.append(end_time)
+
+        if verification_code:
+            # 列表缓存或详情缓存任一侧命中即可；拆成两个子查询后各自走验证码索引，
+            # 直接对 LEFT JOIN 两侧做 OR（或 COALESCE）只能全表扫描
+            conditions.append(f"""c.id IN (
+                SELECT id FROM emails_cache WHERE verification_code = {placeholder}
+                UNION
+                SELECT ec.id FROM email_details_cache dc
+                JOIN emails_cache ec
+                    ON ec.email_account = dc.email_account AND ec.message_id = dc.message_id
+                WHERE dc.verification_code = {placeholder}
+            )""")
+            params.extend([verification_code, verification_code])
+        elif has_verification_code is True:
+            conditions.append(f"({code_expr} IS NOT NULL AND {code_expr} <> '')")
+        elif has_verification_code is False:
+            conditions.append(f"({code_expr} IS NULL OR {code_expr} = '')")
+
+        if after_date is not None and after_id is not None:
+            conditions.append(
+                f"(c.date < {placeholder} OR (c.date = {placeholder} AND c.id < {placeholder}))"
+            )
+            params.extend([after_date, after_date, after_id])
+
+        where_clause = self._build_where_clause(conditions, params)
+        page_size = self._normalize_page_size(page_size)
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT c.id, c.email_account, c.message_id, c.folder, c.subject,
+                       c.from_email, c.date, c.is_read, c.has_attachments,
+                       {code_expr} AS verification_code, c.body_preview,
+                       CASE WHEN d.id IS NULL THEN 0 ELSE 1 END AS has_detail
+                FROM emails_cache c
+                LEFT JOIN email_details_cache d
+                    ON d.email_account = c.email_account AND d.message_id = c.message_id
+                WHERE {where_clause}
+                ORDER BY c.date DESC, c.id DESC
+                LIMIT {placeholder}
+            """, params + [page_size + 1])
+            rows = cursor.fetchall()
+
+        records = [self._dict_from_row(row) for row in rows[:page_size]]
+        emails = []
+        for record in records:
+            emails.append({
+                'id': record.get('id'),
+                'email_account': record.get('email_account'),
+                'message_id': record.get('message_id'),
+                'folder': record.get('folder'),
+                'subject': record.get('subject'),
+                'from_email': record.get('from_email'),
+                'date': record.get('date'),
+                'is_read': bool(record.get('is_read')),
+                'has_attachments': bool(record.get('has_attachments')),
+                'verification_code': record.get('verification_code'),
+                'body_preview': record.get('body_preview'),
+                'has_detail': bool(record.get('has_detail')),
+            })
+
+        next_cursor = None
+        if len(rows) > page_size and emails:
+            last = emails[-1]
+            next_cursor = {'date': last['date'], 'id': last['id']}
+
+        return emails, next_cursor
+
     def clear_by_account(self, email_account: str) -> bool:
         """
         清除指定账户的邮件缓存
@@ -257,6 +413,30 @@ class EmailCacheDAO(BaseDAO):
             [email_account, message_id]
         ) > 0
     
+    def delete_emails(self, email_account: str, message_ids: List[str], chunk_size: int = 500) -> int:
+        """
+        从缓存中批量删除指定邮件（分块 IN 删除）
+        
+        Args:
+            email_account: 邮箱账号
+            message_ids: 邮件ID列表
+            chunk_size: 每条 DELETE 的最大邮件数
+            
+        Returns:
+            删除的记录数
+        """
+        placeholder = self._get_param_placeholder()
+        unique_ids = list(dict.fromkeys(message_ids))
+        deleted = 0
+        for offset in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[offset:offset + chunk_size]
+            in_placeholders = ", ".join([placeholder] * len(chunk))
+            deleted += self.delete_by_condition(
+                f"email_account = {placeholder} AND message_id IN ({in_placeholders})",
+                [email_account, *chunk]
+            )
+        return deleted
+    
     def get_count_by_account(self, email_account: str, folder: Optional[str] = None) -> int:
         """
         获取账户的邮件总数（用于检测新邮件）
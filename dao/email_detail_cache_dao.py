@@ -2,11 +2,13 @@
 EmailDetailCacheDAO - 邮件详情缓存表数据访问对象
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from .base_dao import BaseDAO, get_db_connection
+from body_codec import decode_body, encode_body
+from cache_maintenance import cache_occupancy
 
-# 导入压缩工具函数（从 database 模块）
+# 导入旧格式（base64 + zlib）解压函数（从 database 模块），用于读取和迁移旧记录
 try:
     from database import compress_text, decompress_text
 except ImportError:
@@ -38,6 +40,12 @@ except ImportError:
 
 from logger_config import logger
 
+# 缓存表 -> 记录体积字段
+CACHE_SIZE_COLUMNS = {
+    'emails_cache': 'cache_size',
+    'email_details_cache': 'body_size',
+}
+
 
 class EmailDetailCacheDAO(BaseDAO):
     """邮件详情缓存表 DAO"""
@@ -47,9 +55,65 @@ class EmailDetailCacheDAO(BaseDAO):
         self.default_page_size = 100
         self.max_page_size = 500
     
+    def _detail_upsert_sql(self) -> str:
+        """邮件详情 upsert 语句（单条写入与批量写入共用）"""
+        placeholder = self._get_param_placeholder()
+        return f"""
+            INSERT INTO email_details_cache 
+            (email_account, message_id, subject, from_email, to_email, 
+             date, body_plain, body_html, body_plain_bin, body_html_bin,
+             verification_code, body_size, created_at)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, NULL, NULL, {placeholder}, {placeholder}, {placeholder}, {placeholder}, CURRENT_TIMESTAMP)
+            ON CONFLICT(email_account, message_id) DO UPDATE SET
+                subject = excluded.subject,
+                from_email = excluded.from_email,
+                to_email = excluded.to_email,
+                date = excluded.date,
+                body_plain = NULL,
+                body_html = NULL,
+                body_plain_bin = excluded.body_plain_bin,
+                body_html_bin = excluded.body_html_bin,
+                verification_code = excluded.verification_code,
+                body_size = excluded.body_size,
+                created_at = excluded.created_at
+        """
+
+    def _build_detail_upsert_params(
+        self, email_account: str, email_detail: Dict[str, Any]
+    ) -> Tuple[Tuple[Any, ...], int, int]:
+        """
+        编码正文并构造 upsert 参数
+
+        Returns:
+            (参数元组, 原始大小, 编码后大小)
+        """
+        body_plain = email_detail.get('body_plain')
+        body_html = email_detail.get('body_html')
+
+        original_size = (len(body_plain) if body_plain else 0) + (len(body_html) if body_html else 0)
+
+        encoded_plain = encode_body(body_plain)
+        encoded_html = encode_body(body_html, is_html=True)
+
+        compressed_size = (len(encoded_plain) if encoded_plain else 0) + (len(encoded_html) if encoded_html else 0)
+
+        params = (
+            email_account,
+            email_detail.get('message_id'),
+            email_detail.get('subject'),
+            email_detail.get('from_email'),
+            email_detail.get('to_email'),
+            email_detail.get('date'),
+            encoded_plain,
+            encoded_html,
+            email_detail.get('verification_code'),
+            compressed_size
+        )
+        return params, original_size, compressed_size
+
     def cache_detail(self, email_account: str, email_detail: Dict[str, Any]) -> bool:
         """
-        缓存单封邮件详情（带压缩）
+        缓存单封邮件详情（正文以带编码标记的二进制存储）
         
         Args:
             email_account: 邮箱账号
@@ -62,64 +126,119 @@ class EmailDetailCacheDAO(BaseDAO):
             with get_db_connection() as conn:
                 cursor = conn.cursor()
                 
-                # 压缩邮件正文
-                body_plain = email_detail.get('body_plain')
-                body_html = email_detail.get('body_html')
-                
-                original_size = (len(body_plain) if body_plain else 0) + (len(body_html) if body_html else 0)
-                
-                compressed_plain = compress_text(body_plain)
-                compressed_html = compress_text(body_html)
-                
-                compressed_size = (len(compressed_plain) if compressed_plain else 0) + (len(compressed_html) if compressed_html else 0)
-                
-                placeholder = self._get_param_placeholder()
-                
-                cursor.execute(f"""
-                    INSERT INTO email_details_cache 
-                    (email_account, message_id, subject, from_email, to_email, 
-                     date, body_plain, body_html, verification_code, body_size, created_at)
-                    VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, CURRENT_TIMESTAMP)
-                    ON CONFLICT(email_account, message_id) DO UPDATE SET
-                        subject = excluded.subject,
-                        from_email = excluded.from_email,
-                        to_email = excluded.to_email,
-                        date = excluded.date,
-                        body_plain = excluded.body_plain,
-                        body_html = excluded.body_html,
-                        verification_code = excluded.verification_code,
-                        body_size = excluded.body_size,
-                        created_at = excluded.created_at
-                """, (
-                    email_account,
-                    email_detail.get('message_id'),
-                    email_detail.get('subject'),
-                    email_detail.get('from_email'),
-                    email_detail.get('to_email'),
-                    email_detail.get('date'),
-                    compressed_plain,
-                    compressed_html,
-                    email_detail.get('verification_code'),
-                    compressed_size
-                ))
+                params, original_size, compressed_size = self._build_detail_upsert_params(
+                    email_account, email_detail
+                )
+                cursor.execute(self._detail_upsert_sql(), params)
                 
                 conn.commit()
+                cache_occupancy.record_write("email_details_cache", 1, compressed_size)
                 
-                if original_size > 0:
-                    compression_ratio = (1 - compressed_size / original_size) * 100
-                    logger.info(f"Cached email detail for {email_account}: {email_detail.get('message_id')} "
-                               f"(compressed {original_size} -> {compressed_size} bytes, {compression_ratio:.1f}% reduction)")
-                else:
-                    logger.info(f"Cached email detail for {email_account}: {email_detail.get('message_id')}")
+                self.hot_log.debug(
+                    "cached",
+                    email=email_account,
+                    message_id=email_detail.get("message_id"),
+                    original_bytes=original_size,
+                    compressed_bytes=compressed_size,
+                )
                 
                 return True
         except Exception as e:
             logger.error(f"Error caching email detail: {e}")
             return False
+
+    def cache_details_many(self, email_account: str, email_details: List[Dict[str, Any]]) -> int:
+        """
+        批量缓存邮件详情：单个连接、单次 executemany、单次提交
+        
+        Args:
+            email_account: 邮箱账号
+            email_details: 邮件详情数据列表
+            
+        Returns:
+            写入的记录数（失败时为 0）
+        """
+        # 同一批次内重复的 message_id 只保留最后一条，避免同一语句内重复冲突
+        details_by_id: Dict[Any, Dict[str, Any]] = {}
+        for email_detail in email_details:
+            if email_detail and email_detail.get('message_id'):
+                details_by_id[email_detail['message_id']] = email_detail
+        if not details_by_id:
+            return 0
+
+        try:
+            params_list = []
+            total_original = 0
+            total_compressed = 0
+            for email_detail in details_by_id.values():
+                params, original_size, compressed_size = self._build_detail_upsert_params(
+                    email_account, email_detail
+                )
+                params_list.append(params)
+                total_original += original_size
+                total_compressed += compressed_size
+
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(self._detail_upsert_sql(), params_list)
+                conn.commit()
+
+            cache_occupancy.record_write("email_details_cache", len(params_list), total_compressed)
+            self.hot_log.debug(
+                "cached_many",
+                email=email_account,
+                count=len(params_list),
+                original_bytes=total_original,
+                compressed_bytes=total_compressed,
+            )
+            return len(params_list)
+        except Exception as e:
+            logger.error(f"Error batch caching email details: {e}")
+            return 0
+    
+    def _decode_row_bodies(self, row_dict: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], bool]:
+        """
+        解码一行记录的正文
+        
+        Returns:
+            (body_plain, body_html, 是否为旧格式记录)
+        """
+        if row_dict.get('body_plain_bin') is not None or row_dict.get('body_html_bin') is not None:
+            return (
+                decode_body(row_dict.get('body_plain_bin')),
+                decode_body(row_dict.get('body_html_bin')),
+                False,
+            )
+        # 旧格式：TEXT 列中的 base64(zlib) 或原文
+        return (
+            decompress_text(row_dict.get('body_plain')),
+            decompress_text(row_dict.get('body_html')),
+            row_dict.get('body_plain') is not None or row_dict.get('body_html') is not None,
+        )
+    
+    def _build_binary_migration(
+        self,
+        record_id: int,
+        body_plain: Optional[str],
+        body_html: Optional[str]
+    ) -> Tuple[Optional[bytes], Optional[bytes], int, int]:
+        encoded_plain = encode_body(body_plain)
+        encoded_html = encode_body(body_html, is_html=True)
+        body_size = (len(encoded_plain) if encoded_plain else 0) + (len(encoded_html) if encoded_html else 0)
+        return encoded_plain, encoded_html, body_size, record_id
+    
+    def _migration_update_sql(self) -> str:
+        placeholder = self._get_param_placeholder()
+        return f"""
+            UPDATE email_details_cache
+            SET body_plain_bin = {placeholder}, body_html_bin = {placeholder},
+                body_size = {placeholder}, body_plain = NULL, body_html = NULL
+            WHERE id = {placeholder}
+        """
     
     def get_cached_detail(self, email_account: str, message_id: str) -> Optional[Dict[str, Any]]:
         """
-        获取缓存的邮件详情（自动解压缩）
+        获取缓存的邮件详情（按编码标记解码；命中旧格式记录时顺带迁移为二进制格式）
         
         Args:
             email_account: 邮箱账号
@@ -141,8 +260,8 @@ class EmailDetailCacheDAO(BaseDAO):
             """, (email_account, message_id))
             
             cursor.execute(f"""
-                SELECT message_id, subject, from_email, to_email, date, 
-                       body_plain, body_html, verification_code
+                SELECT id, message_id, subject, from_email, to_email, date, 
+                       body_plain, body_html, body_plain_bin, body_html_bin, verification_code
                 FROM email_details_cache 
                 WHERE email_account = {placeholder} AND message_id = {placeholder}
             """, (email_account, message_id))
@@ -151,18 +270,62 @@ class EmailDetailCacheDAO(BaseDAO):
             
             if row:
                 row_dict = dict(row) if not isinstance(row, dict) else row
+                body_plain, body_html, is_legacy = self._decode_row_bodies(row_dict)
+                if is_legacy:
+                    cursor.execute(
+                        self._migration_update_sql(),
+                        self._build_binary_migration(row_dict['id'], body_plain, body_html)
+                    )
+                    conn.commit()
                 return {
                     'message_id': row_dict.get('message_id'),
                     'subject': row_dict.get('subject'),
                     'from_email': row_dict.get('from_email'),
                     'to_email': row_dict.get('to_email'),
                     'date': row_dict.get('date'),
-                    'body_plain': decompress_text(row_dict.get('body_plain')),
-                    'body_html': decompress_text(row_dict.get('body_html')),
+                    'body_plain': body_plain,
+                    'body_html': body_html,
                     'verification_code': row_dict.get('verification_code')
                 }
             return None
     
+    def migrate_legacy_bodies(self, batch_size: int = 200) -> int:
+        """
+        将一批旧格式（TEXT + base64）正文迁移为二进制格式
+        
+        Args:
+            batch_size: 单批迁移的记录数
+            
+        Returns:
+            本批迁移的记录数（0 表示已无待迁移记录）
+        """
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, body_plain, body_html FROM email_details_cache
+                WHERE body_plain_bin IS NULL AND body_html_bin IS NULL
+                  AND (body_plain IS NOT NULL OR body_html IS NOT NULL)
+                LIMIT {placeholder}
+            """, (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+            
+            updates = []
+            for row in rows:
+                row_dict = dict(row)
+                updates.append(self._build_binary_migration(
+                    row_dict['id'],
+                    decompress_text(row_dict.get('body_plain')),
+                    decompress_text(row_dict.get('body_html')),
+                ))
+            cursor.executemany(self._migration_update_sql(), updates)
+            conn.commit()
+        
+        logger.info(f"Migrated {len(updates)} email detail bodies to binary storage")
+        return len(updates)
+    
     def clear_by_account(self, email_account: str) -> bool:
         """
         清除指定账户的邮件详情缓存
@@ -193,6 +356,62 @@ class EmailDetailCacheDAO(BaseDAO):
             [email_account, message_id]
         ) > 0
     
+    def delete_emails(self, email_account: str, message_ids: List[str], chunk_size: int = 500) -> int:
+        """
+        从缓存中批量删除指定邮件详情（分块 IN 删除）
+        
+        Args:
+            email_account: 邮箱账号
+            message_ids: 邮件ID列表
+            chunk_size: 每条 DELETE 的最大邮件数
+            
+        Returns:
+            删除的记录数
+        """
+        placeholder = self._get_param_placeholder()
+        unique_ids = list(dict.fromkeys(message_ids))
+        deleted = 0
+        for offset in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[offset:offset + chunk_size]
+            in_placeholders = ", ".join([placeholder] * len(chunk))
+            deleted += self.delete_by_condition(
+                f"email_account = {placeholder} AND message_id IN ({in_placeholders})",
+                [email_account, *chunk]
+            )
+        return deleted
+    
+    def get_occupancy(self) -> Dict[str, Dict[str, int]]:
+        """
+        精确统计两张缓存表的记录数与体积（全表聚合，仅用于校准与统计展示）
+        
+        Returns:
+            {'emails_cache': {'count', 'size_bytes'}, 'email_details_cache': {...}}
+        """
+        occupancy: Dict[str, Dict[str, int]] = {}
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for table_name, size_column in CACHE_SIZE_COLUMNS.items():
+                cursor.execute(
+                    f"SELECT COUNT(*) AS cnt, COALESCE(SUM({size_column}), 0) AS total_size FROM {table_name}"
+                )
+                row = cursor.fetchone()
+                try:
+                    if row is None:
+                        count, size_bytes = 0, 0
+                    elif hasattr(row, 'get'):
+                        # PostgreSQL RealDictRow 或 dict（支持字典访问）
+                        count = row.get('cnt', 0) or 0
+                        size_bytes = row.get('total_size', 0) or 0
+                    else:
+                        # 元组或列表格式（SQLite）
+                        count = row[0] if row and len(row) > 0 else 0
+                        size_bytes = row[1] if row and len(row) > 1 else 0
+                except (IndexError, TypeError, KeyError, AttributeError) as e:
+                    logger.error(f"Error extracting {table_name} stats: {e}, row type: {type(row)}")
+                    count, size_bytes = 0, 0
+                occupancy[table_name] = {'count': int(count or 0), 'size_bytes': int(size_bytes or 0)}
+        return occupancy
+
     def check_cache_size(self) -> Dict[str, Any]:
         """
         检查缓存大小和记录数
@@ -215,66 +434,77 @@ class EmailDetailCacheDAO(BaseDAO):
                 # SQLite: 使用 pragma
                 cursor.execute("SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()")
                 db_size_bytes = self._extract_scalar_value(cursor.fetchone()) or 0
+        
+        db_size_mb = db_size_bytes / (1024 * 1024)
+        occupancy = self.get_occupancy()
+        emails_count = occupancy['emails_cache']['count']
+        details_count = occupancy['email_details_cache']['count']
+        
+        return {
+            'db_size_mb': round(db_size_mb, 2),
+            'max_size_mb': MAX_CACHE_SIZE_MB,
+            'size_usage_percent': round((db_size_mb / MAX_CACHE_SIZE_MB) * 100, 2),
+            'emails_cache': {
+                'count': emails_count,
+                'max_count': MAX_EMAILS_CACHE_COUNT,
+                'size_bytes': occupancy['emails_cache']['size_bytes'],
+                'usage_percent': round((emails_count / MAX_EMAILS_CACHE_COUNT) * 100, 2)
+            },
+            'details_cache': {
+                'count': details_count,
+                'max_count': MAX_EMAIL_DETAILS_CACHE_COUNT,
+                'size_bytes': occupancy['email_details_cache']['size_bytes'],
+                'usage_percent': round((details_count / MAX_EMAIL_DETAILS_CACHE_COUNT) * 100, 2)
+            }
+        }
+
+    def select_lru_victims(self, table_name: str, limit: int) -> List[Tuple[int, int]]:
+        """
+        按 LRU 顺序选出待淘汰的记录（一次排序，供分批删除使用）
+        
+        Args:
+            table_name: emails_cache 或 email_details_cache
+            limit: 最多选出的记录数
             
-            db_size_mb = db_size_bytes / (1024 * 1024)
-            
-            # 获取邮件列表缓存统计
-            cursor.execute("SELECT COUNT(*) AS cnt, COALESCE(SUM(cache_size), 0) AS total_size FROM emails_cache")
-            row = cursor.fetchone()
-            try:
-                if row is None:
-                    emails_count = 0
-                    emails_size = 0
-                elif hasattr(row, 'get'):
-                    # PostgreSQL RealDictRow 或 dict（支持字典访问）
-                    emails_count = row.get('cnt', 0) or 0
-                    emails_size = row.get('total_size', 0) or 0
-                else:
-                    # 元组或列表格式（SQLite）
-                    emails_count = row[0] if row and len(row) > 0 else 0
-                    emails_size = row[1] if row and len(row) > 1 else 0
-            except (IndexError, TypeError, KeyError, AttributeError) as e:
-                logger.error(f"Error extracting emails cache stats: {e}, row type: {type(row)}")
-                emails_count = 0
-                emails_size = 0
-            
-            # 获取邮件详情缓存统计
-            cursor.execute("SELECT COUNT(*) AS cnt, COALESCE(SUM(body_size), 0) AS total_size FROM email_details_cache")
-            row = cursor.fetchone()
-            try:
-                if row is None:
-                    details_count = 0
-                    details_size = 0
-                elif hasattr(row, 'get'):
-                    # PostgreSQL RealDictRow 或 dict（支持字典访问）
-                    details_count = row.get('cnt', 0) or 0
-                    details_size = row.get('total_size', 0) or 0
-                else:
-                    # 元组或列表格式（SQLite）
-                    details_count = row[0] if row and len(row) > 0 else 0
-                    details_size = row[1] if row and len(row) > 1 else 0
-            except (IndexError, TypeError, KeyError, AttributeError) as e:
-                logger.error(f"Error extracting details cache stats: {e}, row type: {type(row)}")
-                details_count = 0
-                details_size = 0
+        Returns:
+            [(id, 记录体积), ...]
+        """
+        size_column = CACHE_SIZE_COLUMNS[table_name]
+        if limit <= 0:
+            return []
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, COALESCE({size_column}, 0) AS size_bytes FROM {table_name}
+                ORDER BY 
+                    COALESCE(access_count, 0) ASC,
+                    COALESCE(last_accessed_at, created_at) ASC
+                LIMIT {placeholder}
+            """, (limit,))
+            rows = cursor.fetchall()
+        return [(int(row['id']), int(row['size_bytes'] or 0)) for row in rows]
+
+    def delete_cache_rows(self, table_name: str, record_ids: List[int]) -> int:
+        """
+        按主键批量删除缓存记录（单个小事务）
+        
+        Args:
+            table_name: emails_cache 或 email_details_cache
+            record_ids: 记录ID列表
             
-            return {
-                'db_size_mb': round(db_size_mb, 2),
-                'max_size_mb': MAX_CACHE_SIZE_MB,
-                'size_usage_percent': round((db_size_mb / MAX_CACHE_SIZE_MB) * 100, 2),
-                'emails_cache': {
-                    'count': emails_count,
-                    'max_count': MAX_EMAILS_CACHE_COUNT,
-                    'size_bytes': emails_size,
-                    'usage_percent': round((emails_count / MAX_EMAILS_CACHE_COUNT) * 100, 2)
-                },
-                'details_cache': {
-                    'count': details_count,
-                    'max_count': MAX_EMAIL_DETAILS_CACHE_COUNT,
-                    'size_bytes': details_size,
-                    'usage_percent': round((details_count / MAX_EMAIL_DETAILS_CACHE_COUNT) * 100, 2)
-                }
-            }
+        Returns:
+            删除的记录数
+        """
+        if table_name not in CACHE_SIZE_COLUMNS or not record_ids:
+            return 0
+        placeholder = self._get_param_placeholder()
+        placeholders = ", ".join([placeholder] * len(record_ids))
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {table_name} WHERE id IN ({placeholders})", list(record_ids))
+            conn.commit()
+            return cursor.rowcount or 0
     
     def cleanup_lru_cache(self) -> Dict[str, int]:
         """
@@ -342,6 +572,8 @@ class EmailDetailCacheDAO(BaseDAO):
                     logger.info(f"LRU cleanup: deleted {deleted_details} email details from cache")
                 
                 conn.commit()
+                # 手动全量清理后让后台维护任务重新校准占用计数
+                cache_occupancy.invalidate()
                 
                 return {
                     'deleted_emails': deleted_emails,
@@ -0,0 +1,89 @@
+"""
+GraphDeltaStateDAO - Graph 增量同步状态表数据访问对象
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .base_dao import BaseDAO, get_db_connection
+from config import DB_TYPE
+from logger_config import logger
+
+
+class GraphDeltaStateDAO(BaseDAO):
+    """Graph 增量同步状态表 DAO"""
+
+    def __init__(self):
+        super().__init__("graph_delta_state")
+
+    def get_state(self, email_account: str, folder: str) -> Optional[Dict[str, Any]]:
+        """
+        获取账户文件夹的同步状态
+
+        Args:
+            email_account: 邮箱账号
+            folder: 文件夹名称
+
+        Returns:
+            状态字典（delta_link、is_complete、last_synced_at）或 None
+        """
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT * FROM graph_delta_state WHERE email_account = {placeholder} AND folder = {placeholder}",
+                (email_account, folder)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return None
+            state = dict(row)
+            state["is_complete"] = bool(state.get("is_complete"))
+            return state
+
+    def save_state(self, email_account: str, folder: str, delta_link: str, is_complete: bool) -> None:
+        """
+        保存同步进度
+
+        Args:
+            email_account: 邮箱账号
+            folder: 文件夹名称
+            delta_link: 下一次请求使用的链接（首轮同步未完成时为 nextLink，完成后为 deltaLink）
+            is_complete: 首轮同步是否已完成
+        """
+        placeholder = self._get_param_placeholder()
+        complete_value = is_complete if DB_TYPE == "postgresql" else (1 if is_complete else 0)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO graph_delta_state (email_account, folder, delta_link, is_complete, last_synced_at)
+                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+                ON CONFLICT(email_account, folder) DO UPDATE SET
+                    delta_link = excluded.delta_link,
+                    is_complete = excluded.is_complete,
+                    last_synced_at = excluded.last_synced_at
+            """, (email_account, folder, delta_link, complete_value, datetime.now().isoformat()))
+            conn.commit()
+
+    def delete_state(self, email_account: str, folder: Optional[str] = None) -> int:
+        """
+        删除同步状态（下次同步重新做全量同步）
+
+        Args:
+            email_account: 邮箱账号
+            folder: 文件夹名称，为 None 时删除账户的所有文件夹
+
+        Returns:
+            删除的记录数
+        """
+        placeholder = self._get_param_placeholder()
+        if folder is None:
+            deleted = self.delete_by_condition(f"email_account = {placeholder}", [email_account])
+        else:
+            deleted = self.delete_by_condition(
+                f"email_account = {placeholder} AND folder = {placeholder}",
+                [email_account, folder]
+            )
+        if deleted:
+            logger.info(f"Reset Graph delta sync state for {email_account} ({folder or 'all folders'})")
+        return deleted
@@ -0,0 +1,134 @@
+"""
+GraphSubscriptionDAO - Graph 变更通知订阅表数据访问对象
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .base_dao import BaseDAO, get_db_connection
+from logger_config import logger
+
+
+class GraphSubscriptionDAO(BaseDAO):
+    """Graph 变更通知订阅表 DAO"""
+
+    def __init__(self):
+        super().__init__("graph_subscriptions")
+
+    def get_subscription(self, subscription_id: str) -> Optional[Dict[str, Any]]:
+        """
+        按订阅ID获取订阅
+
+        Args:
+            subscription_id: Graph 返回的订阅ID
+
+        Returns:
+            订阅字典或 None
+        """
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT * FROM graph_subscriptions WHERE subscription_id = {placeholder}",
+                (subscription_id,)
+            )
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def list_for_account(self, email_account: str) -> List[Dict[str, Any]]:
+        """获取账户的所有订阅"""
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT * FROM graph_subscriptions WHERE email_account = {placeholder} ORDER BY folder",
+                (email_account,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def list_active_folder_counts(self, now: str) -> Dict[str, int]:
+        """
+        统计每个账户未过期的订阅文件夹数
+
+        Args:
+            now: 当前时间（UTC ISO 格式）
+
+        Returns:
+            {邮箱账号: 未过期订阅数}
+        """
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT email_account, COUNT(*) AS folder_count FROM graph_subscriptions
+                WHERE expiration_at > {placeholder}
+                GROUP BY email_account
+                """,
+                (now,)
+            )
+            return {row["email_account"]: row["folder_count"] for row in cursor.fetchall()}
+
+    def save_subscription(
+        self,
+        subscription_id: str,
+        email_account: str,
+        folder: str,
+        client_state: str,
+        expiration_at: str,
+    ) -> None:
+        """
+        保存订阅（同一账户同一文件夹只保留一个订阅）
+
+        Args:
+            subscription_id: Graph 返回的订阅ID
+            email_account: 邮箱账号
+            folder: 文件夹名称
+            client_state: 创建订阅时生成的校验值，通知中必须原样带回
+            expiration_at: 过期时间（UTC ISO 格式）
+        """
+        placeholder = self._get_param_placeholder()
+        now = datetime.now().isoformat()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DELETE FROM graph_subscriptions WHERE email_account = {placeholder} "
+                f"AND folder = {placeholder} AND subscription_id <> {placeholder}",
+                (email_account, folder, subscription_id)
+            )
+            cursor.execute(f"""
+                INSERT INTO graph_subscriptions
+                    (subscription_id, email_account, folder, client_state, expiration_at, created_at, updated_at)
+                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+                ON CONFLICT(subscription_id) DO UPDATE SET
+                    client_state = excluded.client_state,
+                    expiration_at = excluded.expiration_at,
+                    updated_at = excluded.updated_at
+            """, (subscription_id, email_account, folder, client_state, expiration_at, now, now))
+            conn.commit()
+
+    def update_expiration(self, subscription_id: str, expiration_at: str) -> bool:
+        """更新订阅过期时间（续期成功后调用）"""
+        placeholder = self._get_param_placeholder()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE graph_subscriptions SET expiration_at = {placeholder}, updated_at = {placeholder} "
+                f"WHERE subscription_id = {placeholder}",
+                (expiration_at, datetime.now().isoformat(), subscription_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def delete_subscription(self, subscription_id: str) -> int:
+        """删除订阅记录"""
+        placeholder = self._get_param_placeholder()
+        return self.delete_by_condition(f"subscription_id = {placeholder}", [subscription_id])
+
+    def delete_for_account(self, email_account: str) -> int:
+        """删除账户的所有订阅记录"""
+        placeholder = self._get_param_placeholder()
+        deleted = self.delete_by_condition(f"email_account = {placeholder}", [email_account])
+        if deleted:
+            logger.info(f"Removed {deleted} Graph subscription records for {email_account}")
+        return deleted
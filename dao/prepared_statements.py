@@ -0,0 +1,106 @@
+"""
+PreparedStatementRegistry - 热点查询的预编译语句注册表
+
+PostgreSQL 下，固定形状的热点查询（按邮箱查账户、按分享码查分享、按用户名查用户、
+邮件缓存分页等）在每个连接上首次执行时 PREPARE 一次，之后使用 EXECUTE，
+服务端在多次执行后切换为通用执行计划，省去每次请求的解析与规划开销。
+
+SQLite 本身按连接缓存已编译语句，直接执行原 SQL 即可。
+"""
+
+import re
+import threading
+import weakref
+from typing import Any, Dict, Sequence, Set
+
+from config import DB_TYPE, PREPARED_STATEMENTS_ENABLED
+from logger_config import get_structured_logger
+
+_PLACEHOLDER_RE = re.compile(r"%s")
+_STATEMENT_NAME_RE = re.compile(r"^[a-z_][a-z0-9_]{0,62}$")
+
+# 每次执行都会经过这里，只输出结构化的 DEBUG 事件
+hot_log = get_structured_logger("dao.prepared_statements")
+
+
+def to_positional_parameters(sql: str) -> str:
+    """将 psycopg2 的 %s 占位符转换为 PREPARE 使用的 $1, $2 ..."""
+    counter = iter(range(1, 10000))
+    return _PLACEHOLDER_RE.sub(lambda _match: f"${next(counter)}", sql)
+
+
+class PreparedStatementRegistry:
+    """
+    预编译语句注册表（线程安全）
+
+    同一名称必须始终对应同一条 SQL；每个连接上已 PREPARE 的语句名按连接弱引用记录，
+    连接关闭后记录自动释放。
+    """
+
+    def __init__(self, enabled: bool = PREPARED_STATEMENTS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._statements: Dict[str, str] = {}
+        self._prepared: "weakref.WeakKeyDictionary[Any, Set[str]]" = weakref.WeakKeyDictionary()
+        self._stats = {"prepares": 0, "executions": 0}
+
+    def _register(self, name: str, sql: str) -> None:
+        if not _STATEMENT_NAME_RE.match(name):
+            raise ValueError(f"Invalid prepared statement name: {name}")
+        with self._lock:
+            registered = self._statements.setdefault(name, sql)
+        if registered != sql:
+            raise ValueError(f"Prepared statement {name} is already registered with different SQL")
+
+    def execute(self, cursor, name: str, sql: str, params: Sequence[Any] = ()) -> None:
+        """
+        执行一条热点查询
+
+        Args:
+            cursor: 数据库游标
+            name: 语句名（小写字母、数字、下划线）
+            sql: SQL（使用当前数据库的参数占位符）
+            params: 参数
+        """
+        if not self.enabled or DB_TYPE != "postgresql":
+            cursor.execute(sql, params)
+            return
+
+        self._register(name, sql)
+        connection = cursor.connection
+        with self._lock:
+            prepared_names = self._prepared.setdefault(connection, set())
+            needs_prepare = name not in prepared_names
+
+        if needs_prepare:
+            cursor.execute(f"PREPARE {name} AS {to_positional_parameters(sql)}")
+            with self._lock:
+                prepared_names.add(name)
+                self._stats["prepares"] += 1
+            hot_log.debug("prepared", name=name, connection=id(connection))
+
+        if params:
+            argument_list = ", ".join(["%s"] * len(params))
+            cursor.execute(f"EXECUTE {name} ({argument_list})", tuple(params))
+        else:
+            cursor.execute(f"EXECUTE {name}")
+        with self._lock:
+            self._stats["executions"] += 1
+
+    def forget_connection(self, connection) -> None:
+        """连接上的预编译语句失效时（如执行了 DISCARD ALL）清除记录"""
+        with self._lock:
+            self._prepared.pop(connection, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled and DB_TYPE == "postgresql",
+                "statements": sorted(self._statements),
+                "connections": len(self._prepared),
+                **self._stats,
+            }
+
+
+# 全局实例
+prepared_statements = PreparedStatementRegistry()
@@ -54,7 +54,12 @@ class ShareTokenDAO(BaseDAO):
         placeholder = self._get_param_placeholder()
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM share_tokens WHERE token = {placeholder}", (token,))
+            self._execute_prepared(
+                cursor,
+                "share_tokens_get_by_token",
+                f"SELECT * FROM share_tokens WHERE token = {placeholder}",
+                (token,)
+            )
             row = cursor.fetchone()
             if row:
                 data = dict(row)
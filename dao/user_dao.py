@@ -7,6 +7,7 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
 from .base_dao import BaseDAO, get_db_connection
+import cache_service
 from config import DB_TYPE
 from logger_config import logger
 
@@ -32,7 +33,12 @@ class UserDAO(BaseDAO):
         placeholder = self._get_param_placeholder()
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM users WHERE username = {placeholder}", (username,))
+            self._execute_prepared(
+                cursor,
+                "users_get_by_username",
+                f"SELECT * FROM users WHERE username = {placeholder}",
+                (username,)
+            )
             row = cursor.fetchone()
             
             if row:
@@ -168,6 +174,7 @@ class UserDAO(BaseDAO):
                 bound_accounts_json, permissions_json, is_active_val
             ))
             conn.commit()
+            cache_service.invalidate_principal_cache()
             logger.info(f"Created user: {username} (role: {role})")
             return self.get_by_username(username)
     
@@ -212,6 +219,7 @@ class UserDAO(BaseDAO):
             
             success = cursor.rowcount > 0
             if success:
+                cache_service.invalidate_principal_cache()
                 logger.info(f"Updated user: {username}")
             return success
     
@@ -249,6 +257,7 @@ class UserDAO(BaseDAO):
             
             success = cursor.rowcount > 0
             if success:
+                cache_service.invalidate_principal_cache()
                 logger.info(f"Updated password for user: {username}")
             return success
     
@@ -270,6 +279,7 @@ class UserDAO(BaseDAO):
             
             success = cursor.rowcount > 0
             if success:
+                cache_service.invalidate_principal_cache()
                 logger.info(f"Deleted user: {username}")
             return success
     
@@ -2,10 +2,17 @@
 VerificationRuleDAO - 验证码规则表数据访问对象
 """
 
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import Any, Dict, List, Optional
 
 from .base_dao import BaseDAO, get_db_connection
+from config import (
+    DB_TYPE,
+    VERIFICATION_DETECTION_PARTITION_PREMAKE_DAYS,
+    VERIFICATION_DETECTION_PRUNE_BATCH_SIZE,
+    VERIFICATION_DETECTION_RETENTION_DAYS,
+)
+from logger_config import logger
 
 
 class VerificationRuleDAO(BaseDAO):
@@ -449,7 +456,28 @@ class VerificationRuleDAO(BaseDAO):
 
 
 class VerificationDetectionRecordDAO(BaseDAO):
-    """验证码识别记录表 DAO"""
+    """
+    验证码识别记录表 DAO
+
+    同一账户、同一邮件、同一验证码只保留一条记录（列表页、详情页和刷新重复识别不再新增行）。
+    PostgreSQL 下按 detection_date 按天范围分区，过期分区整体删除；
+    SQLite 下为单表 + 唯一索引，过期记录按 created_at 分批删除。
+    """
+
+    PARTITION_PREFIX = "verification_detection_records_p"
+    DEFAULT_PARTITION = "verification_detection_records_default"
+    RECORD_COLUMNS = (
+        "email_account",
+        "message_id",
+        "detected_code",
+        "rule_id",
+        "rule_name",
+        "source",
+        "page_source",
+        "matched_sender",
+        "matched_subject",
+        "matched_body_excerpt",
+    )
 
     def __init__(self):
         super().__init__("verification_detection_records")
@@ -461,21 +489,22 @@ class VerificationDetectionRecordDAO(BaseDAO):
         email_account: str,
         message_id: str,
         detected_code: str,
-        source: str,
     ) -> Optional[Dict[str, Any]]:
         placeholder = self._get_param_placeholder()
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
+            self._execute_prepared(
+                cursor,
+                "verification_detection_records_find_existing",
                 f"""
                 SELECT * FROM verification_detection_records
                 WHERE email_account = {placeholder}
                   AND message_id = {placeholder}
                   AND detected_code = {placeholder}
-                  AND source = {placeholder}
-                ORDER BY id DESC
+                ORDER BY created_at ASC
+                LIMIT 1
                 """,
-                (email_account, message_id, detected_code, source),
+                (email_account, message_id, detected_code),
             )
             row = cursor.fetchone()
             return dict(row) if row else None
@@ -485,12 +514,165 @@ class VerificationDetectionRecordDAO(BaseDAO):
             data["email_account"],
             data["message_id"],
             data["detected_code"],
-            data["source"],
         )
         if existing:
             return existing
 
-        payload = data.copy()
-        payload["created_at"] = datetime.now().isoformat()
-        record_id = self.insert(payload)
-        return self.find_by_id(record_id) or {}
+        now = datetime.now()
+        columns = list(self.RECORD_COLUMNS) + ["created_at"]
+        values = [data.get(column) for column in self.RECORD_COLUMNS] + [now.isoformat()]
+        placeholder = self._get_param_placeholder()
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if DB_TYPE == "postgresql":
+                columns.append("detection_date")
+                values.append(now.date())
+                cursor.execute(
+                    f"""
+                    INSERT INTO verification_detection_records ({", ".join(columns)})
+                    VALUES ({", ".join([placeholder] * len(columns))})
+                    ON CONFLICT (email_account, message_id, detected_code, detection_date) DO NOTHING
+                    RETURNING *
+                    """,
+                    values,
+                )
+            else:
+                cursor.execute(
+                    f"""
+                    INSERT INTO verification_detection_records ({", ".join(columns)})
+                    VALUES ({", ".join([placeholder] * len(columns))})
+                    ON CONFLICT (email_account, message_id, detected_code) DO NOTHING
+                    RETURNING *
+                    """,
+                    values,
+                )
+            rows = cursor.fetchall()
+            conn.commit()
+
+        row = rows[0] if rows else None
+        if row:
+            return dict(row)
+        # 并发写入时由唯一键去重，返回先写入的那条记录
+        return self.find_existing(data["email_account"], data["message_id"], data["detected_code"]) or {}
+
+    def _partition_name(self, day: date) -> str:
+        return f"{self.PARTITION_PREFIX}{day.strftime('%Y%m%d')}"
+
+    def ensure_partitions(self, cursor, start_day: date, end_day: date) -> int:
+        """
+        创建 [start_day, end_day] 范围内缺失的按天分区及默认分区（仅PostgreSQL）
+
+        Args:
+            cursor: 数据库游标（由调用方负责提交）
+            start_day: 起始日期
+            end_day: 结束日期（包含）
+
+        Returns:
+            新创建的分区数
+        """
+        existing = set(self._list_partitions(cursor))
+        created = 0
+        day = start_day
+        while day <= end_day:
+            partition_name = self._partition_name(day)
+            if partition_name not in existing:
+                # 默认分区中已有该日期的数据时创建会失败，用保存点隔离，不影响后续分区
+                cursor.execute("SAVEPOINT create_detection_partition")
+                try:
+                    cursor.execute(
+                        f"""
+                        CREATE TABLE IF NOT EXISTS {partition_name}
+                        PARTITION OF verification_detection_records
+                        FOR VALUES FROM (%s) TO (%s)
+                        """,
+                        (day.isoformat(), (day + timedelta(days=1)).isoformat()),
+                    )
+                    cursor.execute("RELEASE SAVEPOINT create_detection_partition")
+                    created += 1
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT create_detection_partition")
+                    logger.warning(f"Failed to create partition {partition_name}: {e}")
+            day += timedelta(days=1)
+
+        if self.DEFAULT_PARTITION not in existing:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.DEFAULT_PARTITION} "
+                "PARTITION OF verification_detection_records DEFAULT"
+            )
+        return created
+
+    def _list_partitions(self, cursor) -> List[str]:
+        cursor.execute(
+            """
+            SELECT child.relname AS partition_name
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = 'verification_detection_records'
+            """
+        )
+        return [dict(row)["partition_name"] for row in cursor.fetchall()]
+
+    def prune_expired(
+        self,
+        retention_days: int = VERIFICATION_DETECTION_RETENTION_DAYS,
+        premake_days: int = VERIFICATION_DETECTION_PARTITION_PREMAKE_DAYS,
+        batch_size: int = VERIFICATION_DETECTION_PRUNE_BATCH_SIZE,
+    ) -> Dict[str, int]:
+        """
+        清理过期识别记录
+
+        PostgreSQL：提前创建后续几天的分区，删除早于保留期的整天分区；
+        SQLite：按 created_at 分批删除早于保留期的记录。
+
+        Returns:
+            {'created_partitions', 'dropped_partitions', 'deleted_rows'}
+        """
+        today = date.today()
+        cutoff = today - timedelta(days=retention_days)
+        result = {"created_partitions": 0, "dropped_partitions": 0, "deleted_rows": 0}
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if DB_TYPE == "postgresql":
+                result["created_partitions"] = self.ensure_partitions(
+                    cursor, today, today + timedelta(days=premake_days)
+                )
+                cutoff_name = self._partition_name(cutoff)
+                for partition_name in sorted(self._list_partitions(cursor)):
+                    if (
+                        partition_name.startswith(self.PARTITION_PREFIX)
+                        and len(partition_name) == len(cutoff_name)
+                        and partition_name < cutoff_name
+                    ):
+                        cursor.execute(f"DROP TABLE IF EXISTS {partition_name}")
+                        result["dropped_partitions"] += 1
+                cursor.execute(
+                    f"DELETE FROM {self.DEFAULT_PARTITION} WHERE detection_date < %s",
+                    (cutoff,),
+                )
+                result["deleted_rows"] = max(cursor.rowcount, 0)
+                conn.commit()
+            else:
+                while True:
+                    cursor.execute(
+                        """
+                        DELETE FROM verification_detection_records
+                        WHERE id IN (
+                            SELECT id FROM verification_detection_records
+                            WHERE created_at < ?
+                            LIMIT ?
+                        )
+                        """,
+                        (cutoff.isoformat(), batch_size),
+                    )
+                    deleted = max(cursor.rowcount, 0)
+                    conn.commit()
+                    result["deleted_rows"] += deleted
+                    if deleted < batch_size:
+                        break
+
+        if result["dropped_partitions"] or result["deleted_rows"]:
+            logger.info(f"Pruned verification detection records older than {cutoff}: {result}")
+        return result
@@ -5,6 +5,7 @@
 支持SQLite和PostgreSQL
 """
 
+import asyncio
 import json
 import os
 import sqlite3
@@ -12,8 +13,9 @@ import zlib
 import base64
 import threading
 import time
-from contextlib import contextmanager
-from datetime import datetime, timedelta
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
 from config import (
@@ -27,10 +29,14 @@ from config import (
     DB_PASSWORD,
     DB_POOL_SIZE,
     DB_MAX_OVERFLOW,
-    DB_POOL_TIMEOUT
+    DB_POOL_TIMEOUT,
+    VERIFICATION_DETECTION_PARTITION_PREMAKE_DAYS,
+    VERIFICATION_DETECTION_RETENTION_DAYS,
 )
 
+from email_utils import extract_email_address
 from logger_config import logger
+from query_stats import InstrumentedSqliteConnection, get_instrumented_postgresql_cursor_class
 
 # PostgreSQL连接池（延迟初始化）
 _postgresql_pool = None
@@ -97,7 +103,7 @@ def compress_text(text: Optional[str]) -> Optional[str]:
 
 def decompress_text(text: Optional[str]) -> Optional[str]:
     """
-    解压缩文本
+    解压缩文本（旧格式：base64(zlib)；新写入的详情正文使用 body_codec 二进制格式）
     
     Args:
         text: 压缩的base64编码字符串
@@ -118,6 +124,22 @@ def decompress_text(text: Optional[str]) -> Optional[str]:
         return text
 
 
+def _serialize_binary_values(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将记录中的二进制字段（BLOB/BYTEA）替换为可读的占位描述，便于 JSON 序列化
+    
+    Args:
+        record: 记录字典
+        
+    Returns:
+        处理后的记录字典
+    """
+    for key, value in record.items():
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            record[key] = f"<binary {len(bytes(value))} bytes>"
+    return record
+
+
 def _get_postgresql_connection():
     """
     获取PostgreSQL连接（使用psycopg2）
@@ -127,7 +149,6 @@ def _get_postgresql_connection():
     """
     try:
         import psycopg2
-        from psycopg2.extras import RealDictCursor
         
         conn = psycopg2.connect(
             host=DB_HOST,
@@ -137,8 +158,8 @@ def _get_postgresql_connection():
             password=DB_PASSWORD,
             connect_timeout=DB_POOL_TIMEOUT
         )
-        # 设置cursor_factory为RealDictCursor，返回字典式结果
-        conn.cursor_factory = RealDictCursor
+        # 设置cursor_factory为RealDictCursor（带语句计时），返回字典式结果
+        conn.cursor_factory = get_instrumented_postgresql_cursor_class()
         return conn
     except ImportError:
         logger.error("psycopg2-binary is required for PostgreSQL support. Install it with: pip install psycopg2-binary")
@@ -165,7 +186,6 @@ def _get_postgresql_pool():
 
         try:
             from psycopg2.pool import ThreadedConnectionPool
-            from psycopg2.extras import RealDictCursor
 
             min_conn = max(1, DB_POOL_SIZE)
             max_conn = max(min_conn, DB_POOL_SIZE + DB_MAX_OVERFLOW)
@@ -178,7 +198,7 @@ def _get_postgresql_pool():
                 user=DB_USER,
                 password=DB_PASSWORD,
                 connect_timeout=DB_POOL_TIMEOUT,
-                cursor_factory=RealDictCursor,
+                cursor_factory=get_instrumented_postgresql_cursor_class(),
             )
             logger.info(f"Initialized PostgreSQL pool: min={min_conn}, max={max_conn}")
             return _postgresql_pool
@@ -253,7 +273,7 @@ def get_db_connection():
         conn = None
         try:
             # 尝试连接数据库
-            conn = sqlite3.connect(DB_FILE, timeout=10.0)
+            conn = sqlite3.connect(DB_FILE, timeout=10.0, factory=InstrumentedSqliteConnection)
             conn.row_factory = sqlite3.Row  # 返回字典式结果
             
             # SQLite 连接级性能与一致性参数
@@ -343,6 +363,9 @@ def _init_postgresql_database() -> None:
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
+        # 旧版未分区的识别记录表先改名，由 schema 文件重建为分区表后再迁移数据
+        legacy_detection_table = _rename_legacy_detection_records_table(cursor)
+        
         # 读取并执行schema文件
         if schema_file.exists():
             logger.info("Creating PostgreSQL tables from schema file...")
@@ -443,11 +466,194 @@ def _init_postgresql_database() -> None:
             logger.info("Ensured legacy and microsoft access columns exist on accounts table")
         except Exception as e:
             logger.debug(f"accounts microsoft access column check: {e}")
+
+        try:
+            cursor.execute("ALTER TABLE emails_cache ADD COLUMN IF NOT EXISTS from_address VARCHAR(255)")
+            # 索引文件执行时旧表可能还没有 from_address 列，因此在加列之后创建
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_emails_cache_from_address_date "
+                "ON emails_cache(from_address text_pattern_ops, date DESC)"
+            )
+            logger.info("Ensured from_address column exists on emails_cache table")
+        except Exception as e:
+            logger.debug(f"emails_cache from_address column check: {e}")
+
+        try:
+            cursor.execute("ALTER TABLE email_details_cache ADD COLUMN IF NOT EXISTS body_plain_bin BYTEA")
+            cursor.execute("ALTER TABLE email_details_cache ADD COLUMN IF NOT EXISTS body_html_bin BYTEA")
+            logger.info("Ensured binary body columns exist on email_details_cache table")
+        except Exception as e:
+            logger.debug(f"email_details_cache binary body column check: {e}")
+        
+        try:
+            # 旧版 account_tags 没有外键：清理已删除账户遗留的标签后补上 ON DELETE CASCADE，
+            # 直接删除 accounts 记录（表编辑器、SQL 控制台）时标签随之删除
+            cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = 'account_tags_account_id_fkey'")
+            if cursor.fetchone() is None:
+                cursor.execute("""
+                    DELETE FROM account_tags
+                    WHERE NOT EXISTS (SELECT 1 FROM accounts WHERE accounts.id = account_tags.account_id)
+                """)
+                cursor.execute("""
+                    ALTER TABLE account_tags ADD CONSTRAINT account_tags_account_id_fkey
+                    FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+                """)
+                logger.info("Added ON DELETE CASCADE foreign key to account_tags table")
+        except Exception as e:
+            logger.debug(f"account_tags foreign key check: {e}")
+        
+        _init_detection_record_partitions(cursor, legacy_detection_table)
+        _backfill_account_tags(cursor)
+        _backfill_email_from_address(cursor)
         
         conn.commit()
         logger.info("PostgreSQL database initialized successfully")
 
 
+def _rename_legacy_detection_records_table(cursor) -> Optional[str]:
+    """
+    将旧版未分区的 verification_detection_records 表改名为 *_legacy
+
+    同时改名主键索引和序列、删除旧索引，避免与分区表的同名对象冲突。
+
+    Returns:
+        改名后的旧表名；表不存在或已是分区表时返回 None
+    """
+    cursor.execute(
+        """
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = 'verification_detection_records' AND n.nspname = current_schema()
+        """
+    )
+    relkind = _extract_scalar_value(cursor.fetchone())
+    if relkind != 'r':
+        return None
+    
+    legacy_table = "verification_detection_records_legacy"
+    logger.info("Converting verification_detection_records to a partitioned table...")
+    cursor.execute(f"ALTER TABLE verification_detection_records RENAME TO {legacy_table}")
+    cursor.execute(f"ALTER INDEX IF EXISTS verification_detection_records_pkey RENAME TO {legacy_table}_pkey")
+    cursor.execute(f"ALTER SEQUENCE IF EXISTS verification_detection_records_id_seq RENAME TO {legacy_table}_id_seq")
+    cursor.execute("DROP INDEX IF EXISTS idx_verification_detection_records_message")
+    cursor.execute("DROP INDEX IF EXISTS idx_verification_detection_records_rule")
+    return legacy_table
+
+
+def _init_detection_record_partitions(cursor, legacy_table: Optional[str]) -> None:
+    """创建保留期内的按天分区，并把旧表保留期内的记录去重后迁入分区表"""
+    dao = _get_verification_detection_record_dao()
+    today = date.today()
+    start_day = today - timedelta(days=VERIFICATION_DETECTION_RETENTION_DAYS)
+    if not legacy_table:
+        start_day = today
+    dao.ensure_partitions(
+        cursor,
+        start_day,
+        today + timedelta(days=VERIFICATION_DETECTION_PARTITION_PREMAKE_DAYS),
+    )
+    if not legacy_table:
+        return
+    
+    columns = ", ".join(dao.RECORD_COLUMNS)
+    cursor.execute(
+        f"""
+        INSERT INTO verification_detection_records ({columns}, created_at, detection_date)
+        SELECT DISTINCT ON (email_account, message_id, detected_code)
+               {columns}, created_at, created_at::date
+        FROM {legacy_table}
+        WHERE created_at >= %s
+        ORDER BY email_account, message_id, detected_code, created_at ASC
+        ON CONFLICT DO NOTHING
+        """,
+        (start_day,)
+    )
+    migrated = cursor.rowcount
+    cursor.execute(f"DROP TABLE {legacy_table}")
+    logger.info(f"Migrated {migrated} verification detection records into partitioned table")
+
+
+def _backfill_account_tags(cursor) -> None:
+    """
+    从 accounts.tags 回填规范化标签
+
+    只处理在 account_tags 中还没有任何记录的账户：升级后首次启动、上次回填中断，
+    或旧版本进程只写了 accounts.tags 的账户都会被补齐，已规范化的账户不受影响。
+    """
+    if DB_TYPE == "postgresql":
+        cursor.execute("""
+            INSERT INTO account_tags (account_id, tag)
+            SELECT accounts.id, tag_values.tag
+            FROM accounts
+            CROSS JOIN LATERAL jsonb_array_elements_text(accounts.tags) AS tag_values(tag)
+            WHERE jsonb_typeof(accounts.tags) = 'array' AND tag_values.tag <> ''
+              AND NOT EXISTS (SELECT 1 FROM account_tags existing WHERE existing.account_id = accounts.id)
+            ON CONFLICT DO NOTHING
+        """)
+    else:
+        cursor.execute("""
+            INSERT OR IGNORE INTO account_tags (account_id, tag)
+            SELECT accounts.id, tag_values.value
+            FROM accounts, json_each(accounts.tags) AS tag_values
+            WHERE json_valid(accounts.tags) AND json_type(accounts.tags) = 'array'
+              AND tag_values.type = 'text' AND tag_values.value <> ''
+              AND NOT EXISTS (SELECT 1 FROM account_tags existing WHERE existing.account_id = accounts.id)
+        """)
+    if cursor.rowcount > 0:
+        logger.info(f"Backfilled {cursor.rowcount} account tags into account_tags table")
+
+
+def _backfill_email_from_address(cursor, batch_size: int = 1000) -> None:
+    """
+    为邮件列表缓存回填规范化发件人地址（from_address）
+
+    升级前缓存的记录只有 from_email；IMAP 记录保存的是原始 From 头（如 "GitHub <noreply@github.com>"），
+    按地址前缀检索时需要从中提取出地址。已回填的记录 from_address 不为 NULL，重复启动时只命中索引。
+    """
+    placeholder = "%s" if DB_TYPE == "postgresql" else "?"
+    total = 0
+    while True:
+        cursor.execute(
+            f"""
+            SELECT id, from_email FROM emails_cache
+            WHERE from_address IS NULL AND from_email IS NOT NULL
+            LIMIT {int(batch_size)}
+            """
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            f"UPDATE emails_cache SET from_address = {placeholder} WHERE id = {placeholder}",
+            [(extract_email_address(row["from_email"]), row["id"]) for row in rows],
+        )
+        total += len(rows)
+    if total:
+        logger.info(f"Backfilled from_address for {total} cached emails")
+
+
+def _ensure_sqlite_detection_record_dedup_key(cursor) -> None:
+    """为 SQLite 识别记录表建立 (email_account, message_id, detected_code) 唯一键，建立前清理历史重复记录"""
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_verification_detection_records_dedup'"
+    )
+    if cursor.fetchone():
+        return
+    cursor.execute("""
+        DELETE FROM verification_detection_records
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM verification_detection_records
+            GROUP BY email_account, message_id, detected_code
+        )
+    """)
+    if cursor.rowcount > 0:
+        logger.info(f"Removed {cursor.rowcount} duplicate verification detection records")
+    cursor.execute("""
+        CREATE UNIQUE INDEX idx_verification_detection_records_dedup
+        ON verification_detection_records(email_account, message_id, detected_code)
+    """)
+
+
 def init_database() -> None:
     """
     初始化数据库，创建所有必要的表
@@ -487,6 +693,16 @@ def init_database() -> None:
             )
         """)
         
+        # 创建账户标签表（accounts.tags 的规范化索引，用于标签筛选）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS account_tags (
+                account_id INTEGER NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (tag, account_id),
+                FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+            )
+        """)
+        
         # 检查是否存在旧的 admins 表，如果存在则迁移到 users 表
         cursor.execute("""
             SELECT name FROM sqlite_master 
@@ -598,6 +814,14 @@ def init_database() -> None:
             # 列已存在，忽略错误
             pass
         
+        # 尝试添加 from_address 列（规范化的发件人地址，IMAP 的 from_email 保存的是原始 From 头）
+        try:
+            cursor.execute("ALTER TABLE emails_cache ADD COLUMN from_address TEXT")
+            logger.info("Added from_address column to emails_cache table")
+        except Exception:
+            # 列已存在，忽略错误
+            pass
+        
         # 创建邮件详情缓存表
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS email_details_cache (
@@ -662,6 +886,19 @@ def init_database() -> None:
         except Exception:
             pass
         
+        # 二进制正文列（带编码标记，见 body_codec），旧的 TEXT 正文列由后台逐步迁移
+        try:
+            cursor.execute("ALTER TABLE email_details_cache ADD COLUMN body_plain_bin BLOB")
+            logger.info("Added body_plain_bin column to email_details_cache table")
+        except Exception:
+            pass
+        
+        try:
+            cursor.execute("ALTER TABLE email_details_cache ADD COLUMN body_html_bin BLOB")
+            logger.info("Added body_html_bin column to email_details_cache table")
+        except Exception:
+            pass
+        
         # 添加 Access Token 缓存字段 - accounts
         try:
             cursor.execute("ALTER TABLE accounts ADD COLUMN access_token TEXT")
@@ -717,6 +954,8 @@ def init_database() -> None:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_created_at_id ON accounts(created_at DESC, id DESC)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_refresh_status_created_at_id ON accounts(refresh_status, created_at DESC, id DESC)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_refresh_status_last_refresh_time ON accounts(refresh_status, last_refresh_time)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_account_tags_account_id ON account_tags(account_id)")
+        _backfill_account_tags(cursor)
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at DESC, id DESC)")
@@ -733,8 +972,18 @@ def init_database() -> None:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_emails_cache_account_date ON emails_cache(email_account, date DESC)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_emails_cache_account_folder_date ON emails_cache(email_account, folder, date DESC)")
         
+        # 跨账户检索索引 - 按时间键集分页 / 发件人 / 验证码
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_emails_cache_date_id ON emails_cache(date DESC, id DESC)")
+        # 发件人前缀检索在规范化的 from_address 上使用 LIKE 'x%'，索引需与 LIKE 一样不区分大小写才能被使用
+        cursor.execute("DROP INDEX IF EXISTS idx_emails_cache_from_email_date")
+        cursor.execute("DROP INDEX IF EXISTS idx_emails_cache_from_email_nocase_date")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_emails_cache_from_address_date ON emails_cache(from_address COLLATE NOCASE, date DESC)")
+        _backfill_email_from_address(cursor)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_emails_cache_verification_code_date ON emails_cache(verification_code, date DESC)")
+        
         # 性能优化索引 - email_details_cache
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_details_cache_message ON email_details_cache(message_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_details_cache_verification_code ON email_details_cache(verification_code)")
         
         # LRU 相关索引
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_emails_cache_last_accessed ON emails_cache(last_accessed_at)")
@@ -836,6 +1085,8 @@ def init_database() -> None:
         """)
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_verification_detection_records_message ON verification_detection_records(email_account, message_id, created_at DESC)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_verification_detection_records_rule ON verification_detection_records(rule_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_verification_detection_records_created_at ON verification_detection_records(created_at)")
+        _ensure_sqlite_detection_record_dedup_key(cursor)
         
         # 创建批量导入任务表
         cursor.execute("""
@@ -878,6 +1129,32 @@ def init_database() -> None:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_batch_import_task_items_task_id ON batch_import_task_items(task_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_batch_import_task_items_status ON batch_import_task_items(status)")
         
+        # 创建 Graph 增量同步状态表（每个账户每个文件夹保存一个 delta/next 链接）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS graph_delta_state (
+                email_account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                delta_link TEXT NOT NULL,
+                is_complete INTEGER DEFAULT 0,
+                last_synced_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (email_account, folder)
+            )
+        """)
+        
+        # 创建 Graph 变更通知订阅表（每个账户每个文件夹一个订阅）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS graph_subscriptions (
+                subscription_id TEXT PRIMARY KEY,
+                email_account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                client_state TEXT NOT NULL,
+                expiration_at TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_graph_subscriptions_account ON graph_subscriptions(email_account)")
+        
         # 创建 SQL 查询历史记录表
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS sql_query_history (
@@ -935,6 +1212,8 @@ _batch_import_task_dao = None
 _batch_import_task_item_dao = None
 _verification_rule_dao = None
 _verification_detection_record_dao = None
+_graph_delta_state_dao = None
+_graph_subscription_dao = None
 
 def _get_account_dao():
     """获取 AccountDAO 实例（单例）"""
@@ -1016,11 +1295,33 @@ def _get_verification_detection_record_dao():
         _verification_detection_record_dao = VerificationDetectionRecordDAO()
     return _verification_detection_record_dao
 
+def _get_graph_delta_state_dao():
+    """获取 GraphDeltaStateDAO 实例（单例）"""
+    global _graph_delta_state_dao
+    if _graph_delta_state_dao is None:
+        from dao.graph_delta_state_dao import GraphDeltaStateDAO
+        _graph_delta_state_dao = GraphDeltaStateDAO()
+    return _graph_delta_state_dao
+
+def _get_graph_subscription_dao():
+    """获取 GraphSubscriptionDAO 实例（单例）"""
+    global _graph_subscription_dao
+    if _graph_subscription_dao is None:
+        from dao.graph_subscription_dao import GraphSubscriptionDAO
+        _graph_subscription_dao = GraphSubscriptionDAO()
+    return _graph_subscription_dao
+
 
 # Accounts 表操作 - 委托给 AccountDAO
 def get_account_by_email(email: str) -> Optional[Dict[str, Any]]:
     return _get_account_dao().get_by_email(email)
 
+def preload_account_cache(emails: Optional[List[str]] = None) -> int:
+    return _get_account_dao().preload_cache(emails)
+
+def get_accounts_by_emails(emails: List[str]) -> Dict[str, Dict[str, Any]]:
+    return _get_account_dao().get_many_by_emails(emails)
+
 def get_all_accounts_db(page: int = 1, page_size: int = 10, email_search: Optional[str] = None, tag_search: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
     return _get_account_dao().get_all(page, page_size, email_search, tag_search)
 
@@ -1074,6 +1375,18 @@ def update_account(email: str, **kwargs) -> bool:
 def delete_account(email: str) -> bool:
     return _get_account_dao().delete_account(email)
 
+def delete_accounts(emails: List[str]) -> List[str]:
+    return _get_account_dao().delete_many_by_emails(emails)
+
+def get_account_email_by_id(account_id: int) -> Optional[str]:
+    return _get_account_dao().get_email_by_id(account_id)
+
+def resync_account_tags_by_id(account_id: int) -> Optional[str]:
+    return _get_account_dao().resync_tags_by_id(account_id)
+
+def delete_account_by_id(account_id: int) -> Optional[str]:
+    return _get_account_dao().delete_by_id(account_id)
+
 def get_account_access_token(email: str) -> Optional[Dict[str, str]]:
     return _get_account_dao().get_access_token(email)
 
@@ -1210,6 +1523,10 @@ def create_verification_detection_record(data: Dict[str, Any]) -> Dict[str, Any]
     return _get_verification_detection_record_dao().record_success(data)
 
 
+def prune_verification_detection_records() -> Dict[str, int]:
+    return _get_verification_detection_record_dao().prune_expired()
+
+
 # 邮件缓存操作 - 委托给 EmailCacheDAO 和 EmailDetailCacheDAO
 def _normalize_email_cache_provider(provider: Optional[str]) -> Optional[str]:
     if provider is None:
@@ -1282,17 +1599,63 @@ def get_cached_emails(
     )
 
 
+# 批量写入邮件详情缓存时的待写队列（按命名空间分组）；为 None 表示逐条写入
+_pending_email_detail_cache: ContextVar[Optional[Dict[str, List[Dict[str, Any]]]]] = ContextVar(
+    "pending_email_detail_cache",
+    default=None,
+)
+
+
 def cache_email_detail(
     email_account: str,
     email_detail: Dict[str, Any],
     provider: Optional[str] = None,
 ) -> bool:
-    return _get_email_detail_cache_dao().cache_detail(
+    namespace = _build_email_cache_namespace(email_account, provider)
+    pending = _pending_email_detail_cache.get()
+    if pending is not None:
+        pending.setdefault(namespace, []).append(dict(email_detail))
+        return True
+    return _get_email_detail_cache_dao().cache_detail(namespace, email_detail)
+
+
+def cache_email_details_many(
+    email_account: str,
+    email_details: List[Dict[str, Any]],
+    provider: Optional[str] = None,
+) -> int:
+    return _get_email_detail_cache_dao().cache_details_many(
         _build_email_cache_namespace(email_account, provider),
-        email_detail,
+        email_details,
     )
 
 
+def _flush_pending_email_detail_cache(pending: Dict[str, List[Dict[str, Any]]]) -> int:
+    dao = _get_email_detail_cache_dao()
+    return sum(dao.cache_details_many(namespace, details) for namespace, details in pending.items())
+
+
+@asynccontextmanager
+async def batched_email_detail_cache():
+    """
+    在多封邮件详情并发获取期间合并详情缓存写入
+
+    作用域内（包括 asyncio.gather 子任务和 asyncio.to_thread 线程）的 cache_email_detail
+    调用只记录到待写队列，退出时在线程池中按命名空间各执行一次批量写入（单事务）。
+    """
+    pending: Dict[str, List[Dict[str, Any]]] = {}
+    token = _pending_email_detail_cache.set(pending)
+    try:
+        yield pending
+    finally:
+        _pending_email_detail_cache.reset(token)
+        if pending:
+            try:
+                await asyncio.to_thread(_flush_pending_email_detail_cache, pending)
+            except Exception as e:
+                logger.warning(f"Failed to flush batched email detail cache: {e}")
+
+
 def get_cached_email_detail(
     email_account: str,
     message_id: str,
@@ -1303,6 +1666,50 @@ def get_cached_email_detail(
         message_id,
     )
 
+
+def _split_email_cache_namespace(namespace: str) -> Tuple[str, Optional[str]]:
+    email_account, separator, provider = namespace.partition("::provider::")
+    if not separator:
+        return namespace, None
+    return email_account, provider or None
+
+
+def search_cached_emails_across_accounts(
+    email_account: Optional[str] = None,
+    provider: Optional[str] = None,
+    sender_search: Optional[str] = None,
+    subject_search: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    verification_code: Optional[str] = None,
+    has_verification_code: Optional[bool] = None,
+    after_date: Optional[str] = None,
+    after_id: Optional[int] = None,
+    page_size: int = 100,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    namespaces = (
+        _iter_email_cache_namespaces(email_account, provider)
+        if email_account
+        else None
+    )
+    emails, next_cursor = _get_email_cache_dao().search_across_accounts(
+        email_accounts=namespaces,
+        sender_search=sender_search,
+        subject_search=subject_search,
+        start_time=start_time,
+        end_time=end_time,
+        verification_code=verification_code,
+        has_verification_code=has_verification_code,
+        after_date=after_date,
+        after_id=after_id,
+        page_size=page_size,
+    )
+    for email in emails:
+        account, cache_provider = _split_email_cache_namespace(email["email_account"])
+        email["email_account"] = account
+        email["provider"] = cache_provider
+    return emails, next_cursor
+
 def check_cache_size() -> Dict[str, Any]:
     return _get_email_detail_cache_dao().check_cache_size()
 
@@ -1310,11 +1717,21 @@ def cleanup_lru_cache() -> Dict[str, int]:
     return _get_email_detail_cache_dao().cleanup_lru_cache()
 
 def clear_email_cache_db(email_account: str, provider: Optional[str] = None) -> bool:
+    from cache_write_behind import cache_write_behind
+
+    # 先丢弃尚未落库的写入，避免清空后旧数据又被写回
+    cache_write_behind.discard(email_account)
+    # 缓存清空后增量同步必须从头开始，否则 delta 链接之前的邮件不会再被写回
+    if provider in (None, "graph_api"):
+        _get_graph_delta_state_dao().delete_state(email_account)
     list_cleared = False
     detail_cleared = False
     for namespace in _iter_email_cache_namespaces(email_account, provider):
         list_cleared = _get_email_cache_dao().clear_by_account(namespace) or list_cleared
         detail_cleared = _get_email_detail_cache_dao().clear_by_account(namespace) or detail_cleared
+    if list_cleared or detail_cleared:
+        from cache_maintenance import cache_occupancy
+        cache_occupancy.invalidate()
     return list_cleared or detail_cleared
 
 
@@ -1330,6 +1747,66 @@ def delete_email_from_cache(
         detail_deleted = _get_email_detail_cache_dao().delete_email(namespace, message_id) or detail_deleted
     return list_deleted or detail_deleted
 
+def apply_email_cache_delta(
+    email_account: str,
+    changed_emails: List[Dict[str, Any]],
+    removed_message_ids: List[str],
+    provider: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    将一批增量变更应用到邮件缓存
+
+    新增/变更的邮件 upsert 到列表缓存并删除其详情缓存（详情按需重新获取），
+    已删除或移出文件夹的邮件从列表和详情缓存中删除。
+    """
+    from cache_write_behind import cache_write_behind
+
+    namespace = _build_email_cache_namespace(email_account, provider)
+    changed_ids = [email["message_id"] for email in changed_emails]
+    cache_write_behind.discard_messages(email_account, changed_ids + removed_message_ids, provider=provider)
+    if changed_emails:
+        _get_email_cache_dao().cache_emails(namespace, changed_emails)
+    removed = _get_email_cache_dao().delete_emails(namespace, removed_message_ids)
+    details_removed = _get_email_detail_cache_dao().delete_emails(namespace, changed_ids + removed_message_ids)
+    if removed or details_removed:
+        from cache_maintenance import cache_occupancy
+        cache_occupancy.invalidate()
+    return {"upserted": len(changed_emails), "removed": removed, "details_removed": details_removed}
+
+
+# Graph 增量同步状态 - 委托给 GraphDeltaStateDAO
+def get_graph_delta_state(email_account: str, folder: str) -> Optional[Dict[str, Any]]:
+    return _get_graph_delta_state_dao().get_state(email_account, folder)
+
+def save_graph_delta_state(email_account: str, folder: str, delta_link: str, is_complete: bool) -> None:
+    return _get_graph_delta_state_dao().save_state(email_account, folder, delta_link, is_complete)
+
+def delete_graph_delta_state(email_account: str, folder: Optional[str] = None) -> int:
+    return _get_graph_delta_state_dao().delete_state(email_account, folder)
+
+
+# Graph 变更通知订阅 - 委托给 GraphSubscriptionDAO
+def get_graph_subscription(subscription_id: str) -> Optional[Dict[str, Any]]:
+    return _get_graph_subscription_dao().get_subscription(subscription_id)
+
+def list_graph_subscriptions(email_account: str) -> List[Dict[str, Any]]:
+    return _get_graph_subscription_dao().list_for_account(email_account)
+
+def list_graph_subscription_folder_counts(now: str) -> Dict[str, int]:
+    return _get_graph_subscription_dao().list_active_folder_counts(now)
+
+def save_graph_subscription(subscription_id: str, email_account: str, folder: str, client_state: str, expiration_at: str) -> None:
+    return _get_graph_subscription_dao().save_subscription(subscription_id, email_account, folder, client_state, expiration_at)
+
+def update_graph_subscription_expiration(subscription_id: str, expiration_at: str) -> bool:
+    return _get_graph_subscription_dao().update_expiration(subscription_id, expiration_at)
+
+def delete_graph_subscription(subscription_id: str) -> int:
+    return _get_graph_subscription_dao().delete_subscription(subscription_id)
+
+def delete_graph_subscriptions_for_account(email_account: str) -> int:
+    return _get_graph_subscription_dao().delete_for_account(email_account)
+
 def get_email_count_by_account(email_account: str, folder: Optional[str] = None) -> int:
     return _get_email_cache_dao().get_count_by_account(email_account, folder)
 
@@ -1529,12 +2006,12 @@ def get_table_data(
                 cursor.execute(query, params + [page_size, offset])
                 rows = cursor.fetchall()
                 # PostgreSQL使用RealDictCursor，直接返回字典
-                result = [dict(row) for row in rows]
+                result = [_serialize_binary_values(dict(row)) for row in rows]
             else:
                 query = f"SELECT * FROM {table_name} WHERE {where_clause} {order_by_clause} LIMIT ? OFFSET ?"
                 cursor.execute(query, params + [page_size, offset])
                 rows = cursor.fetchall()
-                result = [dict(row) for row in rows]
+                result = [_serialize_binary_values(dict(row)) for row in rows]
             
             return result, total
         except Exception as e:
@@ -1545,6 +2022,240 @@ def get_table_data(
                 raise Exception(f"数据库表 {table_name} 可能已损坏，请运行修复脚本: {e}")
             raise
 
+# 浏览模式下允许做前缀匹配的文本列类型
+_TEXT_COLUMN_TYPES = ("char", "text", "clob")
+# 浏览模式下允许做等值匹配的整数列类型
+_INTEGER_COLUMN_TYPES = ("int",)
+
+
+def _validate_table_name(table_name: str) -> None:
+    if not table_name or not table_name.replace('_', '').replace('-', '').isalnum():
+        raise ValueError(f"Invalid table name: {table_name}")
+
+
+def get_indexed_columns(table_name: str) -> List[str]:
+    """
+    获取表中可以利用索引检索的列（主键及各索引的首列）
+    
+    Args:
+        table_name: 表名
+        
+    Returns:
+        列名列表
+    """
+    _validate_table_name(table_name)
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        if DB_TYPE == "postgresql":
+            cursor.execute("""
+                SELECT DISTINCT a.attname AS name
+                FROM pg_index i
+                JOIN pg_class t ON t.oid = i.indrelid
+                JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0]
+                WHERE t.relname = %s
+            """, (table_name,))
+            columns = {row['name'] for row in cursor.fetchall()}
+        else:
+            columns = set()
+            cursor.execute(f"PRAGMA index_list({table_name})")
+            for index_row in cursor.fetchall():
+                cursor.execute(f"PRAGMA index_info({index_row['name']})")
+                for info_row in cursor.fetchall():
+                    if info_row['seqno'] == 0 and info_row['name']:
+                        columns.add(info_row['name'])
+    
+    for col in get_table_schema(table_name):
+        if col.get('pk', 0) == 1:
+            columns.add(col['name'])
+    return sorted(columns)
+
+
+def estimate_table_row_count(table_name: str) -> int:
+    """
+    估算表记录数（不扫描全表）
+    
+    PostgreSQL 使用 pg_class.reltuples（未 ANALYZE 时退回 pg_stat_user_tables.n_live_tup）；
+    SQLite 使用 sqlite_stat1（未 ANALYZE 时退回 MAX(rowid)）。
+    
+    Args:
+        table_name: 表名
+        
+    Returns:
+        估算的记录数
+    """
+    _validate_table_name(table_name)
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        if DB_TYPE == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", (table_name,))
+            estimate = _extract_scalar_value(cursor.fetchone())
+            if estimate is not None and estimate <= 0:
+                # 分区表父表本身没有统计信息，汇总各分区的估算值
+                cursor.execute(
+                    """
+                    SELECT SUM(GREATEST(child.reltuples, 0))::bigint
+                    FROM pg_inherits
+                    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                    WHERE parent.relname = %s
+                    """,
+                    (table_name,)
+                )
+                partition_estimate = _extract_scalar_value(cursor.fetchone())
+                if partition_estimate is not None:
+                    estimate = partition_estimate
+            if estimate is None or estimate < 0:
+                cursor.execute(
+                    "SELECT n_live_tup FROM pg_stat_user_tables WHERE relname = %s",
+                    (table_name,)
+                )
+                estimate = _extract_scalar_value(cursor.fetchone())
+            return max(int(estimate or 0), 0)
+        
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        )
+        if cursor.fetchone():
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table_name,))
+            stat = _extract_scalar_value(cursor.fetchone())
+            if stat:
+                return int(str(stat).split()[0])
+        
+        try:
+            cursor.execute(f"SELECT MAX(rowid) FROM {table_name}")
+            return int(_extract_scalar_value(cursor.fetchone()) or 0)
+        except sqlite3.OperationalError:
+            # WITHOUT ROWID 表
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            return int(_extract_scalar_value(cursor.fetchone()) or 0)
+
+
+def _build_indexed_match_condition(
+    column: str,
+    column_type: str,
+    value: str,
+    param_placeholder: str,
+) -> Tuple[Optional[str], List[Any]]:
+    """
+    构建可以利用索引的匹配条件：文本列按前缀（范围条件），整数列按等值
+    
+    Returns:
+        (条件SQL, 参数)；值与列类型不匹配时条件为 None
+    """
+    normalized_type = (column_type or "").lower()
+    if any(keyword in normalized_type for keyword in _INTEGER_COLUMN_TYPES):
+        if value.lstrip("-").isdigit():
+            return f"{column} = {param_placeholder}", [int(value)]
+        return None, []
+    if any(keyword in normalized_type for keyword in _TEXT_COLUMN_TYPES):
+        return (
+            f"({column} >= {param_placeholder} AND {column} < {param_placeholder})",
+            [value, value + "\U0010ffff"],
+        )
+    return None, []
+
+
+def browse_table_data(
+    table_name: str,
+    page_size: int = 50,
+    after: Optional[str] = None,
+    search: Optional[str] = None,
+    sort_order: str = "asc",
+    field_search: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """
+    浏览模式获取表数据：按主键 keyset 分页，搜索只作用于有索引的列，总数使用估算值
+    
+    与 get_table_data 不同，不执行 COUNT(*)，也不使用 OFFSET 和全字段 LIKE，
+    适合浏览 emails_cache、verification_detection_records 等大表。
+    
+    Args:
+        table_name: 表名
+        page_size: 每页数量
+        after: 上一页返回的 next_cursor（上一页最后一条记录的主键值）
+        search: 搜索关键词（在有索引的列上做前缀/等值匹配）
+        sort_order: 主键排序方向（asc/desc）
+        field_search: 字段搜索字典 {字段名: 搜索值}，字段必须有索引
+        
+    Returns:
+        {'data', 'next_cursor', 'estimated_total', 'searchable_columns', 'primary_key'}
+    """
+    _validate_table_name(table_name)
+    
+    schema = get_table_schema(table_name)
+    column_types = {col['name']: col.get('type') or "" for col in schema}
+    primary_key = next((col['name'] for col in schema if col.get('pk', 0) == 1), None)
+    if not primary_key and 'id' in column_types:
+        primary_key = 'id'
+    if not primary_key:
+        raise ValueError(f"Table {table_name} has no primary key for keyset pagination")
+    
+    indexed_columns = get_indexed_columns(table_name)
+    searchable_columns = [col for col in indexed_columns if col in column_types]
+    param_placeholder = "%s" if DB_TYPE == "postgresql" else "?"
+    
+    conditions: List[str] = []
+    params: List[Any] = []
+    
+    if search:
+        search_conditions = []
+        for column in searchable_columns:
+            condition, condition_params = _build_indexed_match_condition(
+                column, column_types[column], search, param_placeholder
+            )
+            if condition:
+                search_conditions.append(condition)
+                params.extend(condition_params)
+        # 没有可匹配的索引列时返回空结果，而不是退化为全表扫描
+        conditions.append(f"({' OR '.join(search_conditions)})" if search_conditions else "1=0")
+    
+    if field_search:
+        for field, value in field_search.items():
+            if field not in searchable_columns:
+                raise ValueError(f"Field {field} is not indexed and cannot be searched in browse mode")
+            condition, condition_params = _build_indexed_match_condition(
+                field, column_types[field], str(value), param_placeholder
+            )
+            conditions.append(condition or "1=0")
+            params.extend(condition_params)
+    
+    descending = sort_order.lower() == "desc"
+    if after is not None:
+        cursor_value: Any = after
+        if any(keyword in column_types[primary_key].lower() for keyword in _INTEGER_COLUMN_TYPES):
+            try:
+                cursor_value = int(after)
+            except ValueError:
+                raise ValueError(f"Invalid cursor: {after}")
+        conditions.append(f"{primary_key} {'<' if descending else '>'} {param_placeholder}")
+        params.append(cursor_value)
+    
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    query = (
+        f"SELECT * FROM {table_name} WHERE {where_clause} "
+        f"ORDER BY {primary_key} {'DESC' if descending else 'ASC'} LIMIT {param_placeholder}"
+    )
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params + [page_size + 1])
+        rows = [dict(row) for row in cursor.fetchall()]
+    
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = str(rows[-1][primary_key])
+    
+    return {
+        "data": [_serialize_binary_values(row) for row in rows],
+        "next_cursor": next_cursor,
+        "estimated_total": estimate_table_row_count(table_name),
+        "searchable_columns": searchable_columns,
+        "primary_key": primary_key,
+    }
+
 def insert_table_record(table_name: str, data: Dict[str, Any]) -> int:
     """
     插入表记录
@@ -13,6 +13,9 @@ CREATE INDEX IF NOT EXISTS idx_accounts_created_at_id ON accounts(created_at DES
 CREATE INDEX IF NOT EXISTS idx_accounts_refresh_status_created_at_id ON accounts(refresh_status, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_accounts_refresh_status_last_refresh_time ON accounts(refresh_status, last_refresh_time);
 
+-- account_tags 表索引
+CREATE INDEX IF NOT EXISTS idx_account_tags_account_id ON account_tags(account_id);
+
 -- users 表索引
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
@@ -68,8 +71,16 @@ CREATE INDEX IF NOT EXISTS idx_emails_cache_account_folder ON emails_cache(email
 CREATE INDEX IF NOT EXISTS idx_emails_cache_account_date ON emails_cache(email_account, date DESC);
 CREATE INDEX IF NOT EXISTS idx_emails_cache_account_folder_date ON emails_cache(email_account, folder, date DESC);
 
+-- emails_cache 跨账户检索索引（按时间键集分页 / 发件人 / 验证码）
+CREATE INDEX IF NOT EXISTS idx_emails_cache_date_id ON emails_cache(date DESC, id DESC);
+-- 发件人前缀检索：from_address LIKE 'x%' 使用的 text_pattern_ops 索引在 init_database 加列后创建
+DROP INDEX IF EXISTS idx_emails_cache_from_email_date;
+DROP INDEX IF EXISTS idx_emails_cache_from_email_lower_date;
+CREATE INDEX IF NOT EXISTS idx_emails_cache_verification_code_date ON emails_cache(verification_code, date DESC);
+
 -- email_details_cache 复合索引
 CREATE INDEX IF NOT EXISTS idx_email_details_cache_account_message ON email_details_cache(email_account, message_id);
+CREATE INDEX IF NOT EXISTS idx_email_details_cache_verification_code ON email_details_cache(verification_code);
 
 -- ============================================================================
 -- 部分索引（减少索引大小）
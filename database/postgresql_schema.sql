@@ -24,6 +24,13 @@ CREATE TABLE IF NOT EXISTS accounts (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 创建 account_tags 表（accounts.tags 的规范化索引，用于标签筛选）
+CREATE TABLE IF NOT EXISTS account_tags (
+    account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    tag VARCHAR(255) NOT NULL,
+    PRIMARY KEY (tag, account_id)
+);
+
 -- 创建 users 表
 CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
@@ -55,6 +62,7 @@ CREATE TABLE IF NOT EXISTS emails_cache (
     folder VARCHAR(100) NOT NULL,
     subject TEXT,
     from_email VARCHAR(255),
+    from_address VARCHAR(255),
     date TIMESTAMP,
     is_read BOOLEAN DEFAULT FALSE,
     has_attachments BOOLEAN DEFAULT FALSE,
@@ -79,6 +87,8 @@ CREATE TABLE IF NOT EXISTS email_details_cache (
     date TIMESTAMP,
     body_plain TEXT,
     body_html TEXT,
+    body_plain_bin BYTEA,
+    body_html_bin BYTEA,
     verification_code TEXT,
     access_count INTEGER DEFAULT 0,
     last_accessed_at TIMESTAMP,
@@ -140,9 +150,9 @@ CREATE TABLE IF NOT EXISTS verification_rule_extractors (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- 创建 verification_detection_records 表
+-- 创建 verification_detection_records 表（按 detection_date 按天范围分区，分区由应用维护）
 CREATE TABLE IF NOT EXISTS verification_detection_records (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     email_account VARCHAR(255) NOT NULL,
     message_id VARCHAR(500) NOT NULL,
     detected_code VARCHAR(255) NOT NULL,
@@ -153,8 +163,11 @@ CREATE TABLE IF NOT EXISTS verification_detection_records (
     matched_sender TEXT,
     matched_subject TEXT,
     matched_body_excerpt TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    detection_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (id, detection_date),
+    UNIQUE (email_account, message_id, detected_code, detection_date)
+) PARTITION BY RANGE (detection_date);
 
 -- 创建 batch_import_tasks 表
 CREATE TABLE IF NOT EXISTS batch_import_tasks (
@@ -187,6 +200,28 @@ CREATE TABLE IF NOT EXISTS batch_import_task_items (
     processed_at TIMESTAMP
 );
 
+-- 创建 Graph 增量同步状态表（每个账户每个文件夹保存一个 delta/next 链接）
+CREATE TABLE IF NOT EXISTS graph_delta_state (
+    email_account VARCHAR(255) NOT NULL,
+    folder VARCHAR(100) NOT NULL,
+    delta_link TEXT NOT NULL,
+    is_complete BOOLEAN DEFAULT FALSE,
+    last_synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (email_account, folder)
+);
+
+-- 创建 Graph 变更通知订阅表（每个账户每个文件夹一个订阅）
+CREATE TABLE IF NOT EXISTS graph_subscriptions (
+    subscription_id VARCHAR(255) PRIMARY KEY,
+    email_account VARCHAR(255) NOT NULL,
+    folder VARCHAR(100) NOT NULL,
+    client_state VARCHAR(255) NOT NULL,
+    expiration_at VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_graph_subscriptions_account ON graph_subscriptions(email_account);
+
 -- 创建 SQL 查询历史记录表
 CREATE TABLE IF NOT EXISTS sql_query_history (
     id SERIAL PRIMARY KEY,
@@ -11,13 +11,14 @@ import re
 import ssl
 from datetime import datetime, timezone
 from itertools import groupby
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 import time
 import database as db
 from fastapi import HTTPException
 
 import database as db
 import cache_service
+from cache_write_behind import cache_write_behind
 from email_utils import (
     decode_header_value,
     extract_email_address,
@@ -29,10 +30,11 @@ from imap_pool import imap_pool
 from models import AccountCredentials, EmailDetailsResponse, EmailItem, EmailListResponse
 from oauth_service import get_cached_access_token, clear_cached_access_token
 from verification_rule_service import detect_verification_code_with_rules
-from logger_config import logger
+from logger_config import get_structured_logger, logger
 
 IMAP_RECENT_WINDOW_MIN = 120
 IMAP_RECENT_WINDOW_MULTIPLIER = 2
+IMAP_STREAM_BATCH_SIZE = 50  # 流式列表每批获取的邮件头数量（与列表接口的分批大小一致）
 IMAP_VERIFICATION_HINTS = (
     "verification",
     "verify",
@@ -85,42 +87,33 @@ def _is_recoverable_imap_exception(exc: Exception) -> bool:
     return False
 
 
-def _format_token_info(token: str, expires_at: Optional[str] = None) -> str:
+# 热路径日志（按级别和请求采样输出，字段惰性求值并脱敏）
+hot_log = get_structured_logger("email")
+
+
+def _describe_token_expiry(expires_at: Optional[str]) -> Optional[str]:
     """
-    格式化 token 信息用于日志（只显示前8位和后8位，中间用...代替）
+    描述 token 剩余有效期用于日志（令牌本身由结构化日志脱敏）
     
     Args:
-        token: access token
         expires_at: token 过期时间（可选）
         
     Returns:
-        格式化的 token 信息字符串
+        剩余有效期描述；没有过期时间时返回 None
     """
-    if not token:
-        return "None"
-    
-    if len(token) <= 16:
-        masked_token = token[:4] + "..." + token[-4:]
-    else:
-        masked_token = token[:8] + "..." + token[-8:]
-    
-    info = f"Token: {masked_token}"
-    if expires_at:
-        try:
-            expires_dt = datetime.fromisoformat(expires_at)
-            # 如果没有时区信息，假设为UTC（向后兼容）
-            if expires_dt.tzinfo is None:
-                expires_dt = expires_dt.replace(tzinfo=timezone.utc)
-            now = datetime.now(timezone.utc)
-            time_until_expiry = (expires_dt - now).total_seconds()
-            if time_until_expiry > 0:
-                info += f", Expires in: {int(time_until_expiry/60)} minutes"
-            else:
-                info += f", Expired: {int(abs(time_until_expiry)/60)} minutes ago"
-        except:
-            info += f", Expires at: {expires_at}"
-    
-    return info
+    if not expires_at:
+        return None
+    try:
+        expires_dt = datetime.fromisoformat(expires_at)
+        # 如果没有时区信息，假设为UTC（向后兼容）
+        if expires_dt.tzinfo is None:
+            expires_dt = expires_dt.replace(tzinfo=timezone.utc)
+        time_until_expiry = (expires_dt - datetime.now(timezone.utc)).total_seconds()
+    except ValueError:
+        return expires_at
+    if time_until_expiry > 0:
+        return f"in {int(time_until_expiry / 60)} minutes"
+    return f"{int(abs(time_until_expiry) / 60)} minutes ago"
 
 
 def _should_use_imap_recent_window(
@@ -218,6 +211,132 @@ def _enrich_paginated_items_from_cached_details(
             email_item.body_preview = _build_body_preview_from_detail(cached_detail)
 
 
+def _parse_imap_header_batch(
+    credentials: AccountCredentials,
+    folder_name: str,
+    msg_data: list,
+) -> list[EmailItem]:
+    """解析一批 BODY.PEEK[HEADER.FIELDS (...)] 的返回数据为 EmailItem（含列表页验证码识别）"""
+    email_items = []
+    for j in range(0, len(msg_data), 2):
+        if not msg_data[j]: continue
+
+        # 检查是否是元组 (response, data)
+        if isinstance(msg_data[j], tuple):
+            header_data = msg_data[j][1]
+            response_part = msg_data[j][0]
+        else:
+            continue
+
+        # 从返回的原始数据中解析出msg_id
+        # e.g., b'1 (BODY[HEADER.FIELDS (SUBJECT DATE FROM)] {..}'
+        match = re.match(rb"(\d+)\s+\(", response_part)
+        if not match:
+            continue
+        fetched_msg_id = match.group(1)
+
+        msg = email.message_from_bytes(header_data)
+
+        subject = decode_header_value(
+            msg.get("Subject", "(No Subject)")
+        )
+        from_email = decode_header_value(
+            msg.get("From", "(Unknown Sender)")
+        )
+        date_str = msg.get("Date", "")
+
+        try:
+            date_obj = parse_email_datetime(date_str) if date_str else datetime.now()
+            # 转换为UTC时间并去除时区信息，确保统一格式
+            if date_obj.tzinfo is not None:
+                date_obj = date_obj.astimezone(datetime.now().astimezone().tzinfo).replace(tzinfo=None)
+            formatted_date = date_obj.isoformat()
+        except Exception:
+            date_obj = datetime.now().replace(tzinfo=None)
+            formatted_date = date_obj.isoformat()
+
+        message_id = f"{folder_name}-{fetched_msg_id.decode()}"
+
+        # 提取发件人首字母
+        sender_initial = "?"
+        normalized_from_email = extract_email_address(from_email)
+        if normalized_from_email:
+            # 尝试提取邮箱用户名的首字母
+            email_match = re.search(r"([a-zA-Z])", normalized_from_email)
+            if email_match:
+                sender_initial = email_match.group(1).upper()
+
+        verification_code = None
+        try:
+            detection = detect_verification_code_with_rules(
+                email_account=credentials.email,
+                message_id=message_id,
+                from_email=from_email,
+                subject=subject,
+                body_plain="",
+                body_html="",
+                body_preview="",
+                source="runtime",
+                page_source="list",
+                persist_record=True,
+            )
+            verification_code = detection.get("code")
+        except Exception as detection_error:
+            logger.warning(f"Failed to detect verification code in list item {message_id}: {detection_error}")
+
+        email_item = EmailItem(
+            message_id=message_id,
+            folder=folder_name,
+            subject=subject,
+            from_email=from_email,
+            date=formatted_date,
+            is_read=False,  # 简化处理，实际可通过IMAP flags判断
+            has_attachments=False,  # 简化处理，实际需要检查邮件结构
+            sender_initial=sender_initial,
+            verification_code=verification_code,
+            body_preview=None,
+        )
+        email_items.append(email_item)
+    return email_items
+
+
+def _email_item_matches_filters(
+    email_item: EmailItem,
+    sender_search: Optional[str] = None,
+    subject_search: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+) -> bool:
+    """检查 IMAP 列表项是否满足发件人/主题/时间范围过滤条件"""
+    # 检查发件人过滤
+    if sender_search:
+        if sender_search.lower() not in email_item.from_email.lower():
+            return False
+    
+    # 检查主题过滤
+    if subject_search:
+        if subject_search.lower() not in email_item.subject.lower():
+            return False
+    
+    # 检查时间范围过滤
+    try:
+        email_date = datetime.fromisoformat(email_item.date)
+        if start_time:
+            start_dt = datetime.fromisoformat(start_time)
+            if email_date < start_dt:
+                return False
+        if end_time:
+            end_dt = datetime.fromisoformat(end_time)
+            if email_date > end_dt:
+                return False
+    except Exception as e:
+        logger.warning(f"Failed to parse date for filtering: {e}")
+        # 如果日期解析失败，跳过时间过滤
+        pass
+    
+    return True
+
+
 async def _list_emails_direct(
     credentials: AccountCredentials,
     folder: str,
@@ -260,7 +379,9 @@ async def _list_emails_direct(
             from_cache = True
             fetch_time_ms = int((time.time() - start_time_ms) * 1000)
             email_count = len(cached_data.get('emails', []))
-            logger.info(f"[数据来源: 内存LRU缓存] 账户: {credentials.email}, 返回邮件数: {email_count}, 耗时: {fetch_time_ms}ms")
+            hot_log.info(
+                "list.served", email=credentials.email, source="memory", count=email_count, elapsed_ms=fetch_time_ms
+            )
             # 兼容旧缓存数据，如果缺少 total_pages 则计算
             if 'total_pages' not in cached_data:
                 total = cached_data.get('total_emails', 0)
@@ -288,7 +409,14 @@ async def _list_emails_direct(
             if cached_emails:
                 from_cache = True
                 fetch_time_ms = int((time.time() - start_time_ms) * 1000)
-                logger.info(f"[数据来源: 数据库] 账户: {credentials.email}, 返回邮件数: {len(cached_emails)}, 总数: {total}, 耗时: {fetch_time_ms}ms")
+                hot_log.info(
+                    "list.served",
+                    email=credentials.email,
+                    source="database",
+                    count=len(cached_emails),
+                    total=total,
+                    elapsed_ms=fetch_time_ms,
+                )
                 email_items = [
                     EmailItem(**email) for email in cached_emails
                 ]
@@ -333,11 +461,11 @@ async def _list_emails_direct(
     
     if credentials.api_method in ["graph", "graph_api"]:
         use_graph_api = True
-        logger.info(f"[API选择] 账户: {credentials.email}, 使用预设的 Graph API")
+        hot_log.debug("api.selected", email=credentials.email, api="graph_api", reason="preset")
     elif credentials.api_method == "imap":
         # api_method 明确设置为 imap，直接使用（不检测）
         use_graph_api = False
-        logger.info(f"[API选择] 账户: {credentials.email}, 使用预设的 IMAP")
+        hot_log.debug("api.selected", email=credentials.email, api="imap", reason="preset")
     else:
         # api_method 未设置或为空，动态检测 Graph API 是否可用（参考 mail-all.js 的 graph_api 函数）
         try:
@@ -362,23 +490,24 @@ async def _list_emails_direct(
             use_graph_api = False
     
     if use_graph_api:
-        logger.info(f"[邮件列表请求] 账户: {credentials.email}, 访问方式: GRAPH API, 文件夹: {folder}, 页码: {page}, 每页: {page_size}")
+        hot_log.debug("list.request", email=credentials.email, api="graph_api", folder=folder, page=page, page_size=page_size)
         return await list_emails_via_graph_api(
             credentials, folder, page, page_size, force_refresh,
             sender_search, subject_search, sort_by, sort_order, start_time_ms,
             start_time, end_time
         )
     
-    logger.info(f"[邮件列表请求] 账户: {credentials.email}, 访问方式: IMAP, 文件夹: {folder}, 页码: {page}, 每页: {page_size}")
+    hot_log.debug("list.request", email=credentials.email, api="imap", folder=folder, page=page, page_size=page_size)
 
     # 如果没有缓存或强制刷新，从 IMAP 获取
-    logger.info(f"[数据来源: 微软IMAP服务器] 账户: {credentials.email}, 开始获取邮件列表...")
     access_token = await get_cached_access_token(credentials)
-    
-    # 获取 token 信息用于日志
-    token_info = db.get_account_access_token(credentials.email)
-    token_expires_at = token_info.get('token_expires_at') if token_info else None
-    logger.info(f"[Token信息] 账户: {credentials.email}, {_format_token_info(access_token, token_expires_at)}")
+    # 令牌信息只在输出时读取内存中的令牌缓存
+    hot_log.debug(
+        "token.ready",
+        email=credentials.email,
+        access_token=access_token,
+        expires=lambda: _describe_token_expiry(cache_service.get_cached_access_token_expiry(credentials.email)),
+    )
     
     retry_count = 0
     max_retries = 1
@@ -483,85 +612,7 @@ async def _list_emails_direct(
                                 continue
 
                             # 解析批量获取的数据
-                            for j in range(0, len(msg_data), 2):
-                                if not msg_data[j]: continue
-                                
-                                # 检查是否是元组 (response, data)
-                                if isinstance(msg_data[j], tuple):
-                                    header_data = msg_data[j][1]
-                                    response_part = msg_data[j][0]
-                                else:
-                                    continue
-
-                                # 从返回的原始数据中解析出msg_id
-                                # e.g., b'1 (BODY[HEADER.FIELDS (SUBJECT DATE FROM)] {..}'
-                                match = re.match(rb"(\d+)\s+\(", response_part)
-                                if not match:
-                                    continue
-                                fetched_msg_id = match.group(1)
-
-                                msg = email.message_from_bytes(header_data)
-
-                                subject = decode_header_value(
-                                    msg.get("Subject", "(No Subject)")
-                                )
-                                from_email = decode_header_value(
-                                    msg.get("From", "(Unknown Sender)")
-                                )
-                                date_str = msg.get("Date", "")
-
-                                try:
-                                    date_obj = parse_email_datetime(date_str) if date_str else datetime.now()
-                                    # 转换为UTC时间并去除时区信息，确保统一格式
-                                    if date_obj.tzinfo is not None:
-                                        date_obj = date_obj.astimezone(datetime.now().astimezone().tzinfo).replace(tzinfo=None)
-                                    formatted_date = date_obj.isoformat()
-                                except Exception:
-                                    date_obj = datetime.now().replace(tzinfo=None)
-                                    formatted_date = date_obj.isoformat()
-
-                                message_id = f"{folder_name}-{fetched_msg_id.decode()}"
-
-                                # 提取发件人首字母
-                                sender_initial = "?"
-                                normalized_from_email = extract_email_address(from_email)
-                                if normalized_from_email:
-                                    # 尝试提取邮箱用户名的首字母
-                                    email_match = re.search(r"([a-zA-Z])", normalized_from_email)
-                                    if email_match:
-                                        sender_initial = email_match.group(1).upper()
-
-                                verification_code = None
-                                try:
-                                    detection = detect_verification_code_with_rules(
-                                        email_account=credentials.email,
-                                        message_id=message_id,
-                                        from_email=from_email,
-                                        subject=subject,
-                                        body_plain="",
-                                        body_html="",
-                                        body_preview="",
-                                        source="runtime",
-                                        page_source="list",
-                                        persist_record=True,
-                                    )
-                                    verification_code = detection.get("code")
-                                except Exception as detection_error:
-                                    logger.warning(f"Failed to detect verification code in list item {message_id}: {detection_error}")
-
-                                email_item = EmailItem(
-                                    message_id=message_id,
-                                    folder=folder_name,
-                                    subject=subject,
-                                    from_email=from_email,
-                                    date=formatted_date,
-                                    is_read=False,  # 简化处理，实际可通过IMAP flags判断
-                                    has_attachments=False,  # 简化处理，实际需要检查邮件结构
-                                    sender_initial=sender_initial,
-                                    verification_code=verification_code,
-                                    body_preview=None,
-                                )
-                                email_items.append(email_item)
+                            email_items.extend(_parse_imap_header_batch(credentials, folder_name, msg_data))
                         except Exception as batch_error:
                             logger.warning(f"Error fetching batch in {folder_name}: {batch_error}")
                             continue
@@ -573,35 +624,13 @@ async def _list_emails_direct(
                     continue
 
             # 应用过滤条件
-            filtered_email_items = []
-            for email_item in email_items:
-                # 检查发件人过滤
-                if sender_search:
-                    if sender_search.lower() not in email_item.from_email.lower():
-                        continue
-                
-                # 检查主题过滤
-                if subject_search:
-                    if subject_search.lower() not in email_item.subject.lower():
-                        continue
-                
-                # 检查时间范围过滤
-                try:
-                    email_date = datetime.fromisoformat(email_item.date)
-                    if start_time:
-                        start_dt = datetime.fromisoformat(start_time)
-                        if email_date < start_dt:
-                            continue
-                    if end_time:
-                        end_dt = datetime.fromisoformat(end_time)
-                        if email_date > end_dt:
-                            continue
-                except Exception as e:
-                    logger.warning(f"Failed to parse date for filtering: {e}")
-                    # 如果日期解析失败，跳过时间过滤
-                    pass
-                
-                filtered_email_items.append(email_item)
+            filtered_email_items = [
+                email_item
+                for email_item in email_items
+                if _email_item_matches_filters(
+                    email_item, sender_search, subject_search, start_time, end_time
+                )
+            ]
             
             # 按日期重新排序最终结果（使用datetime对象排序以确保准确性）
             def get_sort_key(email_item):
@@ -637,8 +666,8 @@ async def _list_emails_direct(
             # 缓存到 SQLite
             try:
                 emails_to_cache = [email.dict() for email in email_items]
-                db.cache_emails(credentials.email, emails_to_cache, provider="imap")
-                logger.info(f"Cached {len(emails_to_cache)} emails to database for {credentials.email}")
+                cache_write_behind.submit_emails(credentials.email, emails_to_cache, provider="imap")
+                hot_log.debug("list.cache_queued", email=credentials.email, count=len(emails_to_cache))
             except Exception as e:
                 logger.warning(f"Failed to cache emails to database: {e}")
 
@@ -677,7 +706,14 @@ async def _list_emails_direct(
             except Exception as e:
                 logger.warning(f"Failed to cache emails to LRU cache: {e}")
             
-            logger.info(f"[数据来源: 微软IMAP服务器] 账户: {credentials.email}, 返回邮件数: {len(email_items)}, 总数: {total_emails}, 耗时: {fetch_time_ms}ms")
+            hot_log.info(
+                "list.served",
+                email=credentials.email,
+                source="imap",
+                count=len(email_items),
+                total=total_emails,
+                elapsed_ms=fetch_time_ms,
+            )
 
             return result
 
@@ -776,6 +812,135 @@ async def _list_emails_direct(
         )
 
 
+def _email_item_stream_sort_key(sort_by: str):
+    """流式列表的批内排序键（与 Graph 的 $orderby 字段对应，未知字段按日期排序）"""
+    if sort_by == "subject":
+        return lambda item: item.subject or ""
+    if sort_by == "from_email":
+        return lambda item: item.from_email or ""
+    return lambda item: item.date
+
+
+async def stream_emails_imap(
+    credentials: AccountCredentials,
+    folder: str,
+    max_count: int,
+    sender_search: Optional[str] = None,
+    subject_search: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    sort_by: str = "date",
+    sort_order: str = "desc",
+) -> AsyncIterator[List[EmailItem]]:
+    """
+    流式获取 IMAP 邮件列表：每获取并解析完一批邮件头就产出一批 EmailItem
+    
+    各文件夹按 IMAP 序号依次读取（desc 从新到旧，asc 从旧到新），批内按 sort_by/sort_order 排序；
+    不做跨文件夹的全局排序和分页，取满 max_count 封（过滤后）即停止。产出的邮件同样写入邮件列表缓存。
+    
+    Args:
+        credentials: 账户凭证
+        folder: 文件夹 ('inbox', 'junk', 'all')
+        max_count: 最多产出的邮件数
+        sender_search: 发件人搜索
+        subject_search: 主题搜索
+        start_time: 开始时间 (ISO8601)
+        end_time: 结束时间 (ISO8601)
+        sort_by: 批内排序字段 ('date', 'subject', 'from_email')
+        sort_order: 排序方向 ('asc', 'desc')
+    """
+    if folder == "inbox":
+        folders_to_check = ["INBOX"]
+    elif folder == "junk":
+        folders_to_check = ["Junk"]
+    else:
+        folders_to_check = ["INBOX", "Junk"]
+
+    access_token = await get_cached_access_token(credentials)
+    try:
+        imap_client = await asyncio.to_thread(imap_pool.get_connection, credentials.email, access_token)
+    except Exception as e:
+        if not _is_recoverable_imap_exception(e):
+            raise
+        logger.warning(f"IMAP connection failed for {credentials.email} before streaming, refreshing token: {e}")
+        await clear_cached_access_token(credentials.email)
+        access_token = await get_cached_access_token(credentials)
+        imap_client = await asyncio.to_thread(imap_pool.get_connection, credentials.email, access_token)
+
+    def _search_folder(folder_name: str) -> list[bytes]:
+        imap_client.select(f'"{folder_name}"', readonly=True)
+        status, messages = imap_client.search(None, "ALL")
+        if status != "OK" or not messages or not messages[0]:
+            return []
+        message_ids = messages[0].split()
+        if sort_order != "asc":
+            message_ids.reverse()  # 通常ID越大越新
+        return message_ids
+
+    def _fetch_batch(folder_name: str, batch_ids: list[bytes]) -> list[EmailItem]:
+        status, msg_data = imap_client.fetch(
+            b",".join(batch_ids),
+            "(BODY.PEEK[HEADER.FIELDS (SUBJECT DATE FROM MESSAGE-ID)])",
+        )
+        if status != "OK":
+            logger.warning(f"Failed to fetch batch from {folder_name}: {status}")
+            return []
+        return _parse_imap_header_batch(credentials, folder_name, msg_data)
+
+    # 客户端断开时生成器会在等待取件线程时被取消，线程仍在使用这条连接；
+    # 此时（以及连接出错时）不能归还到池中，否则 return_connection 会在另一个线程里并发使用它
+    connection_busy = False
+
+    async def _run_on_connection(func, *args):
+        nonlocal connection_busy
+        connection_busy = True
+        result = await asyncio.to_thread(func, *args)
+        connection_busy = False
+        return result
+
+    remaining = max_count
+    try:
+        for folder_name in folders_to_check:
+            try:
+                message_ids = await _run_on_connection(_search_folder, folder_name)
+            except Exception as e:
+                if _is_recoverable_imap_exception(e):
+                    raise
+                logger.warning(f"Failed to access folder {folder_name}: {e}")
+                continue
+
+            for i in range(0, len(message_ids), IMAP_STREAM_BATCH_SIZE):
+                if remaining <= 0:
+                    return
+                batch_items = await _run_on_connection(
+                    _fetch_batch, folder_name, message_ids[i:i + IMAP_STREAM_BATCH_SIZE]
+                )
+                batch_items = [
+                    email_item
+                    for email_item in batch_items
+                    if _email_item_matches_filters(
+                        email_item, sender_search, subject_search, start_time, end_time
+                    )
+                ]
+                if not batch_items:
+                    continue
+                batch_items.sort(key=_email_item_stream_sort_key(sort_by), reverse=(sort_order != "asc"))
+                batch_items = batch_items[:remaining]
+                remaining -= len(batch_items)
+                try:
+                    cache_write_behind.submit_emails(
+                        credentials.email, [item.dict() for item in batch_items], provider="imap"
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to cache streamed emails to database: {e}")
+                yield batch_items
+    finally:
+        if connection_busy:
+            imap_pool.discard_connection(credentials.email, imap_client)
+        else:
+            await asyncio.to_thread(imap_pool.return_connection, credentials.email, imap_client)
+
+
 async def _get_email_details_direct(
     credentials: AccountCredentials, message_id: str, skip_cache: bool = False
 ) -> EmailDetailsResponse:
@@ -784,7 +949,7 @@ async def _get_email_details_direct(
     
     # 检查是否使用 Graph API
     if credentials.api_method in ["graph", "graph_api"]:
-        logger.info(f"Using Graph API for email details: {credentials.email}")
+        hot_log.debug("detail.request", email=credentials.email, api="graph_api")
         from graph_api_service import get_email_details_graph
         return await get_email_details_graph(
             credentials,
@@ -800,7 +965,7 @@ async def _get_email_details_direct(
             provider=cache_provider,
         )
         if cached_detail:
-            logger.info(f"Returning cached email detail from LRU cache for {message_id}")
+            hot_log.debug("detail.cache_hit", message_id=message_id, source="memory")
             return EmailDetailsResponse(**cached_detail)
     
     # 从 SQLite 缓存获取
@@ -812,7 +977,7 @@ async def _get_email_details_direct(
                 provider=cache_provider,
             )
             if cached_detail:
-                logger.info(f"Returning cached email detail from database for {message_id}")
+                hot_log.debug("detail.cache_hit", message_id=message_id, source="database")
                 # 缓存到内存LRU缓存
                 cache_service.set_cached_email_detail(
                     credentials.email,
@@ -889,7 +1054,7 @@ async def _get_email_details_direct(
                 )
                 if detection.get("code"):
                     verification_code = detection["code"]
-                    logger.info(f"Detected verification code in email {message_id}: {verification_code}")
+                    hot_log.info("detail.verification_code_detected", message_id=message_id, code=verification_code)
             except Exception as e:
                 logger.warning(f"Failed to detect verification code in email details: {e}")
 
@@ -909,12 +1074,12 @@ async def _get_email_details_direct(
             
             # 缓存到 SQLite
             try:
-                db.cache_email_detail(
+                cache_write_behind.submit_email_detail(
                     credentials.email,
                     email_detail_response.dict(),
                     provider="imap",
                 )
-                logger.info(f"Cached email detail to database for {message_id}")
+                hot_log.debug("detail.cache_queued", message_id=message_id)
             except Exception as e:
                 logger.warning(f"Failed to cache email detail to database: {e}")
             
@@ -1055,7 +1220,14 @@ async def list_emails_via_graph_api(
         if cached_data:
             fetch_time_ms = int((time.time() - start_time_ms) * 1000)
             email_count = len(cached_data.get('emails', []))
-            logger.info(f"[数据来源: 内存LRU缓存] 账户: {credentials.email}, 访问方式: GRAPH API, 返回邮件数: {email_count}, 耗时: {fetch_time_ms}ms")
+            hot_log.info(
+                "list.served",
+                email=credentials.email,
+                api="graph_api",
+                source="memory",
+                count=email_count,
+                elapsed_ms=fetch_time_ms,
+            )
             # 兼容旧缓存数据，如果缺少 total_pages 则计算
             if 'total_pages' not in cached_data:
                 total = cached_data.get('total_emails', 0)
@@ -1082,7 +1254,15 @@ async def list_emails_via_graph_api(
             
             if cached_emails:
                 fetch_time_ms = int((time.time() - start_time_ms) * 1000)
-                logger.info(f"[数据来源: 数据库] 账户: {credentials.email}, 访问方式: GRAPH API, 返回邮件数: {len(cached_emails)}, 总数: {total}, 耗时: {fetch_time_ms}ms")
+                hot_log.info(
+                    "list.served",
+                    email=credentials.email,
+                    api="graph_api",
+                    source="database",
+                    count=len(cached_emails),
+                    total=total,
+                    elapsed_ms=fetch_time_ms,
+                )
                 email_items = [EmailItem(**email) for email in cached_emails]
                 total_pages = (total + page_size - 1) // page_size if total > 0 else 0
                 response = EmailListResponse(
@@ -1115,18 +1295,7 @@ async def list_emails_via_graph_api(
         except Exception as e:
             logger.warning(f"Failed to load from cache, fetching from Graph API: {e}")
     
-    # 从 Graph API 获取
-    logger.info(f"[数据来源: 微软Graph API服务器] 账户: {credentials.email}, 开始获取邮件列表...")
-    
-    # 获取 token 信息用于日志（不重新获取 token，只查询数据库中的信息）
-    token_info = db.get_account_access_token(credentials.email)
-    if token_info:
-        access_token = token_info.get('access_token', '')
-        token_expires_at = token_info.get('token_expires_at')
-        logger.info(f"[Token信息] 账户: {credentials.email}, {_format_token_info(access_token, token_expires_at)}")
-    else:
-        logger.info(f"[Token信息] 账户: {credentials.email}, Token信息未找到，将在获取邮件时自动获取")
-    
+    # 从 Graph API 获取（令牌由 Graph 服务获取并记录日志）
     # 使用新的 list_emails_graph2 方法，支持 $count=true 获取准确的总数
     from graph_api_service import list_emails_graph2
     email_items, total = await list_emails_graph2(
@@ -1138,8 +1307,8 @@ async def list_emails_via_graph_api(
     # 缓存到数据库
     try:
         emails_to_cache = [email.dict() for email in email_items]
-        db.cache_emails(credentials.email, emails_to_cache, provider="graph_api")
-        logger.info(f"Cached {len(emails_to_cache)} emails to database for {credentials.email}")
+        cache_write_behind.submit_emails(credentials.email, emails_to_cache, provider="graph_api")
+        hot_log.debug("list.cache_queued", email=credentials.email, count=len(emails_to_cache))
     except Exception as e:
         logger.warning(f"Failed to cache emails to database: {e}")
     
@@ -1162,13 +1331,21 @@ async def list_emails_via_graph_api(
                 fetch_time_ms=int((time.time() - start_time_ms) * 1000)
             ).dict()
         )
-        logger.debug(f"Cached {len(email_items)} emails to memory LRU cache for {credentials.email}")
+        hot_log.debug("list.memory_cached", email=credentials.email, count=len(email_items))
     except Exception as e:
         logger.warning(f"Failed to cache emails to memory: {e}")
     
     fetch_time_ms = int((time.time() - start_time_ms) * 1000)
     
-    logger.info(f"[数据来源: 微软Graph API服务器] 账户: {credentials.email}, 返回邮件数: {len(email_items)}, 总数: {total}, 耗时: {fetch_time_ms}ms")
+    hot_log.info(
+        "list.served",
+        email=credentials.email,
+        api="graph_api",
+        source="graph",
+        count=len(email_items),
+        total=total,
+        elapsed_ms=fetch_time_ms,
+    )
     
     total_pages = (total + page_size - 1) // page_size if total > 0 else 0
 
@@ -1402,9 +1579,13 @@ def _imap_delete_messages(
                         typ, _ = imap_client.store(batch_ids, '+FLAGS', '\\Deleted')
                         if typ == "OK":
                             success_count += len(batch)
-                            logger.debug(
-                                f"Marked {len(batch)} emails as deleted in {folder_name} "
-                                f"(progress: {min(i + batch_size, len(email_ids))}/{len(email_ids)})"
+                            hot_log.debug(
+                                "delete.batch_marked",
+                                email=email,
+                                folder=folder_name,
+                                count=len(batch),
+                                progress=min(i + batch_size, len(email_ids)),
+                                total=len(email_ids),
                             )
                         else:
                             fail_count += len(batch)
@@ -9,7 +9,7 @@ import base64
 import json
 import re
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple, Union
 
 import httpx
 from fastapi import HTTPException
@@ -19,8 +19,12 @@ from models import AccountCredentials, EmailItem, EmailDetailsResponse
 from verification_rule_service import detect_verification_code_with_rules
 import database as db
 import cache_service
-from logger_config import logger
+from cache_write_behind import cache_write_behind
+from logger_config import get_structured_logger, logger
 from microsoft_access import TokenBroker
+from http_client_pool import GRAPH_CLIENT, http_clients
+from graph_batch import graph_batch
+from graph_throttle import graph_throttle
 
 RECOVERABLE_GRAPH_PROBE_HTTP_STATUS_CODES = {408, 429, 502, 503, 504}
 RECOVERABLE_GRAPH_PROBE_HTTP_500_DETAILS = {"Network error during token acquisition"}
@@ -31,6 +35,21 @@ RECOVERABLE_GRAPH_PROBE_EXCEPTION_TYPES = (
     httpx.TimeoutException,
 )
 
+# 热路径日志（按级别和请求采样输出，字段惰性求值并脱敏）
+hot_log = get_structured_logger("graph")
+
+
+def _graph_token_expires_in(email: str) -> Optional[int]:
+    """读取内存令牌缓存中的剩余有效秒数（仅用于日志，不查询数据库）"""
+    expires_at_str = cache_service.get_cached_access_token_expiry(email)
+    if not expires_at_str:
+        return None
+    expires_at = datetime.fromisoformat(expires_at_str)
+    # 如果没有时区信息，假设为UTC（向后兼容）
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return int((expires_at - datetime.now(timezone.utc)).total_seconds())
+
 
 async def get_graph_access_token(credentials: AccountCredentials) -> str:
     """
@@ -50,37 +69,12 @@ async def get_graph_access_token(credentials: AccountCredentials) -> str:
     try:
         # 使用统一的缓存机制获取 access token
         access_token = await get_cached_access_token(credentials)
-        
-        # 格式化 token 信息用于日志
-        if len(access_token) <= 16:
-            masked_token = access_token[:4] + "..." + access_token[-4:]
-        else:
-            masked_token = access_token[:8] + "..." + access_token[-8:]
-        
-        # 获取过期时间信息用于日志
-        import database as db
-        token_info = db.get_account_access_token(credentials.email)
-        if token_info:
-            expires_at_str = token_info.get('token_expires_at')
-            if expires_at_str:
-                if isinstance(expires_at_str, datetime):
-                    expires_at = expires_at_str
-                    # 如果没有时区信息，假设为UTC
-                    if expires_at.tzinfo is None:
-                        expires_at = expires_at.replace(tzinfo=timezone.utc)
-                else:
-                    expires_at = datetime.fromisoformat(expires_at_str)
-                    # 如果没有时区信息，假设为UTC（向后兼容）
-                    if expires_at.tzinfo is None:
-                        expires_at = expires_at.replace(tzinfo=timezone.utc)
-                now = datetime.now(timezone.utc)
-                expires_in = int((expires_at - now).total_seconds())
-                logger.info(f"[Token信息] 账户: {credentials.email}, Graph API Token: {masked_token}, Expires in: {expires_in} seconds ({int(expires_in/60)} minutes)")
-            else:
-                logger.info(f"[Token信息] 账户: {credentials.email}, Graph API Token: {masked_token}")
-        else:
-            logger.info(f"[Token信息] 账户: {credentials.email}, Graph API Token: {masked_token}")
-        
+        hot_log.debug(
+            "token.ready",
+            email=credentials.email,
+            access_token=access_token,
+            expires_in=lambda: _graph_token_expires_in(credentials.email),
+        )
         return access_token
             
     except Exception as e:
@@ -352,6 +346,412 @@ def _derive_availability_status(
     return "insufficient_evidence"
 
 
+# 列表查询只取列表展示字段，正文在查看详情时按需获取
+GRAPH_LIST_SELECT_FIELDS = "id,subject,from,toRecipients,receivedDateTime,isRead,hasAttachments,bodyPreview"
+# 详情查询字段（包含正文）
+GRAPH_DETAIL_SELECT_FIELDS = "id,subject,from,toRecipients,receivedDateTime,body,bodyPreview"
+# 正文格式：html 为 Graph 默认返回格式（用于渲染）；text 通过 Prefer 头让 Graph 直接返回纯文本，
+# 只用于验证码识别和预览，省去 HTML 的传输和本地去标签
+GRAPH_BODY_FORMAT_HTML = "html"
+GRAPH_BODY_FORMAT_TEXT = "text"
+# Graph 邮件列表单次请求最多返回的条数
+GRAPH_MAX_PAGE_SIZE = 1000
+# 带过滤条件按主题/发件人排序时，本地排序最多覆盖的匹配邮件数（每个文件夹）
+GRAPH_LOCAL_SORT_MAX_ITEMS = 1000
+# 流式列表每页条数（页越小首批数据越快返回）
+GRAPH_STREAM_PAGE_SIZE = 100
+
+_GRAPH_LIST_FOLDER_MAP = {
+    "inbox": "inbox",
+    "junk": "junkemail",
+}
+# folder 为 'all' 时合并查询的文件夹（与 IMAP 的 'all' 一致：收件箱和垃圾邮件）
+GRAPH_ALL_FOLDERS = ("inbox", "junkemail")
+
+_GRAPH_ORDERBY_FIELDS = {
+    "date": "receivedDateTime",
+    "subject": "subject",
+    "from_email": "from/emailAddress/address",
+}
+
+
+# 发件人为完整邮箱地址时可以用 $filter 精确匹配，否则只能用 $search 关键词匹配
+_EMAIL_ADDRESS_PATTERN = re.compile(r"^[^@\s\"]+@[^@\s\"]+\.[^@\s\"]+$")
+# KQL 关键词中允许的字符（其余字符无法在 $search 中安全转义，此时改为本地过滤）
+_KQL_TERM_PATTERN = re.compile(r"^[\w.@+\-]+$", re.UNICODE)
+# $filter 带条件时 $orderby 字段必须先出现在 $filter 中，用于补齐 receivedDateTime 条件
+_GRAPH_MIN_RECEIVED_DATETIME = "1900-01-01T00:00:00Z"
+
+
+def _escape_odata_string(value: str) -> str:
+    """转义 OData 字符串字面量（单引号写两次）"""
+    return value.replace("'", "''")
+
+
+def _parse_graph_datetime(value: Optional[str]) -> Optional[datetime]:
+    """
+    解析 ISO8601 时间并转换为 UTC（无时区的时间按本地时间处理，与分享页的时间比较一致）
+    
+    Returns:
+        带 UTC 时区的 datetime，无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    return dt.astimezone(timezone.utc)
+
+
+def _format_graph_datetime(dt: datetime) -> str:
+    """格式化为 $filter 使用的 UTC 时间字面量"""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _build_graph_ordered_query(
+    time_filters: List[str],
+    other_filters: List[str],
+    sort_by: str = "date",
+    sort_order: str = "desc"
+) -> Tuple[Dict[str, str], bool]:
+    """
+    组合 $filter 与 $orderby（列表查询与分享页查询共用）
+    
+    Graph 要求 $orderby 的字段同时出现在 $filter 中且排在最前，否则返回 400 (InefficientFilter)：
+    - 有过滤条件时 $orderby 固定为 receivedDateTime，receivedDateTime 条件放在最前（没有时间条件时补一个恒真的下限）；
+      此时按主题/发件人排序只能由调用方在本地完成
+    - 没有过滤条件时 $orderby 直接使用 sort_by 对应的字段
+    
+    Args:
+        time_filters: receivedDateTime 条件
+        other_filters: 其余条件
+        sort_by: 排序字段
+        sort_order: 排序方向
+        
+    Returns:
+        (查询参数, 是否需要在本地按 sort_by 排序)
+    """
+    if not time_filters and not other_filters:
+        return {"$orderby": _build_graph_list_orderby(sort_by, sort_order)}, False
+    
+    filters = list(time_filters) or [f"receivedDateTime ge {_GRAPH_MIN_RECEIVED_DATETIME}"]
+    filters.extend(other_filters)
+    params = {
+        "$orderby": _build_graph_list_orderby("date", sort_order),
+        "$filter": " and ".join(filters),
+    }
+    local_sort = _GRAPH_ORDERBY_FIELDS.get(sort_by, "receivedDateTime") != "receivedDateTime"
+    return params, local_sort
+
+
+def _build_graph_time_filters(start_dt: Optional[datetime], end_dt: Optional[datetime]) -> List[str]:
+    """构建 receivedDateTime 范围条件"""
+    filters = []
+    if start_dt:
+        filters.append(f"receivedDateTime ge {_format_graph_datetime(start_dt)}")
+    if end_dt:
+        filters.append(f"receivedDateTime le {_format_graph_datetime(end_dt)}")
+    return filters
+
+
+def _build_graph_list_query(
+    sender_search: Optional[str],
+    subject_search: Optional[str],
+    start_time: Optional[str],
+    end_time: Optional[str],
+    sort_by: str = "date",
+    sort_order: str = "desc"
+) -> Tuple[Dict[str, str], bool]:
+    """
+    构建邮件列表（服务端分页）的 $filter/$orderby
+    
+    列表需要 $skip/$count 做服务端分页，因此发件人/主题使用 $filter contains 子串匹配而不是 $search。
+    
+    Args:
+        sender_search: 发件人搜索
+        subject_search: 主题搜索
+        start_time: 开始时间 (ISO8601)
+        end_time: 结束时间 (ISO8601)
+        sort_by: 排序字段
+        sort_order: 排序方向
+        
+    Returns:
+        (查询参数, 是否需要在本地按 sort_by 排序)
+    """
+    other_filters = []
+    if sender_search:
+        other_filters.append(f"contains(from/emailAddress/address, '{_escape_odata_string(sender_search)}')")
+    if subject_search:
+        other_filters.append(f"contains(subject, '{_escape_odata_string(subject_search)}')")
+    time_filters = _build_graph_time_filters(_parse_graph_datetime(start_time), _parse_graph_datetime(end_time))
+    return _build_graph_ordered_query(time_filters, other_filters, sort_by, sort_order)
+
+
+def build_graph_message_query(
+    sender_search: Optional[str],
+    subject_search: Optional[str],
+    start_time: Optional[str],
+    end_time: Optional[str],
+    sort_order: str = "desc"
+) -> Tuple[Dict[str, str], bool]:
+    """
+    把发件人/主题/时间条件尽量下推到 Graph 查询参数
+    
+    - 时间范围下推为 $filter receivedDateTime（放在最前，满足 $orderby 对 $filter 字段顺序的要求）
+    - 完整邮箱地址的发件人下推为 $filter from/emailAddress/address eq
+    - 部分发件人或主题关键词下推为 $search（from:/subject:）；Graph 不支持 $search 与 $filter/$orderby
+      同时使用，此时时间范围和排序在本地完成
+    - 含空格或特殊字符、无法安全下推的关键词，以及无法解析的时间，保留给本地过滤
+    
+    Args:
+        sender_search: 发件人关键词
+        subject_search: 主题关键词
+        start_time: 开始时间 (ISO8601)
+        end_time: 结束时间 (ISO8601)
+        sort_order: 接收时间排序方向
+        
+    Returns:
+        (查询参数, 是否所有条件都已由服务端精确完成)
+    """
+    exact = True
+    start_dt = _parse_graph_datetime(start_time)
+    end_dt = _parse_graph_datetime(end_time)
+    if (start_time and start_dt is None) or (end_time and end_dt is None):
+        exact = False
+    
+    sender_exact = bool(sender_search and _EMAIL_ADDRESS_PATTERN.match(sender_search))
+    search_terms = []
+    if subject_search:
+        # $search 按词匹配，与本地的子串匹配语义不同，结果仍需本地过滤
+        exact = False
+        if _KQL_TERM_PATTERN.match(subject_search):
+            search_terms.append(f"subject:{subject_search}")
+    if sender_search and not sender_exact:
+        exact = False
+        if _KQL_TERM_PATTERN.match(sender_search):
+            search_terms.append(f"from:{sender_search}")
+    
+    if search_terms:
+        if sender_exact:
+            search_terms.append(f"from:{sender_search}")
+        return {"$search": '"' + " ".join(search_terms) + '"'}, False
+    
+    sender_filters = []
+    if sender_exact:
+        sender_filters.append(f"from/emailAddress/address eq '{_escape_odata_string(sender_search)}'")
+    params, _ = _build_graph_ordered_query(
+        _build_graph_time_filters(start_dt, end_dt), sender_filters, "date", sort_order
+    )
+    return params, exact
+
+
+def _build_graph_list_orderby(sort_by: str, sort_order: str) -> str:
+    """构建邮件列表的 $orderby 表达式（未知排序字段按接收时间排序）"""
+    field = _GRAPH_ORDERBY_FIELDS.get(sort_by, "receivedDateTime")
+    direction = "asc" if sort_order == "asc" else "desc"
+    return f"{field} {direction}"
+
+
+def _email_item_sort_key(sort_by: str):
+    """返回与 $orderby 一致的 EmailItem 排序键（用于合并多个文件夹的结果）"""
+    if sort_by == "subject":
+        return lambda item: item.subject or ""
+    if sort_by == "from_email":
+        return lambda item: item.from_email or ""
+
+    def get_date_key(email_item):
+        try:
+            return datetime.fromisoformat(email_item.date.replace('Z', '+00:00'))
+        except Exception:
+            return datetime.min.replace(tzinfo=timezone.utc)
+    return get_date_key
+
+
+async def _get_graph_list_page(
+    client: httpx.AsyncClient,
+    credentials: AccountCredentials,
+    headers: Dict[str, str],
+    url: str,
+    params: Optional[Dict[str, Any]],
+    timeout: Union[float, httpx.Timeout],
+) -> Dict[str, Any]:
+    """
+    请求一页 Graph 邮件列表（网络错误重试，401 时刷新一次 token 并更新 headers）
+    
+    Args:
+        client: 共享 HTTP 客户端
+        credentials: 账户凭证
+        headers: 请求头（token 刷新后原地更新，后续分页请求继续使用）
+        url: 请求地址（可以是 @odata.nextLink）
+        params: 查询参数（请求 nextLink 时为 None）
+        timeout: 本次请求的超时配置
+        
+    Returns:
+        响应 JSON
+    """
+    max_retries = 2
+    token_refreshed = False
+    response = None
+    for attempt in range(max_retries + 1):
+        try:
+            hot_log.debug("list.request", email=credentials.email, url=url, params=params, attempt=attempt)
+            response = await graph_throttle.request(
+                client, "GET", url, mailbox=credentials.email, headers=headers, params=params, timeout=timeout
+            )
+            # 处理 401 未授权错误（token 过期或无效）
+            if response.status_code == 401:
+                if not token_refreshed:
+                    logger.warning(
+                        f"Received 401 Unauthorized for {credentials.email}, "
+                        f"clearing cache and refreshing token..."
+                    )
+                    from oauth_service import clear_cached_access_token
+                    await clear_cached_access_token(credentials.email)
+                    access_token = await get_graph_access_token(credentials)
+                    headers["Authorization"] = f"Bearer {access_token}"
+                    token_refreshed = True
+                    # 重试请求（不增加 attempt 计数，继续循环）
+                    continue
+                hot_log.error(
+                    "list.unauthorized_after_refresh",
+                    email=credentials.email,
+                    response_preview=lambda: response.text[:200],
+                )
+            response.raise_for_status()
+            break
+        except (httpx.ConnectError, httpx.TimeoutException) as e:
+            if attempt < max_retries:
+                wait_time = (attempt + 1) * 2  # 递增等待时间：2秒、4秒
+                logger.warning(
+                    f"Network error fetching emails for {credentials.email} "
+                    f"(attempt {attempt + 1}/{max_retries + 1}): {e}. Retrying in {wait_time}s..."
+                )
+                await asyncio.sleep(wait_time)
+            else:
+                raise  # 最后一次尝试失败，抛出异常
+    
+    if response is None:
+        raise httpx.RequestError("Failed to get response after retries")
+    return response.json()
+
+
+def _graph_message_to_email_item(
+    credentials: AccountCredentials,
+    email: Dict[str, Any],
+    folder_name: Optional[str]
+) -> EmailItem:
+    """
+    将 Graph 列表返回的邮件转换为 EmailItem（列表不含正文，验证码识别基于主题和预览）
+    
+    Args:
+        credentials: 账户凭证
+        email: Graph 邮件对象
+        folder_name: 文件夹名称（None 表示来自 /me/messages）
+    """
+    from_data = email.get("from", {}).get("emailAddress", {})
+    from_email = from_data.get("address", "(Unknown Sender)")
+    
+    # 提取发件人首字母
+    sender_initial = "?"
+    email_match = re.search(r"([a-zA-Z])", from_email)
+    if email_match:
+        sender_initial = email_match.group(1).upper()
+    
+    subject = email.get("subject", "(No Subject)")
+    body_preview = email.get("bodyPreview", "")
+    
+    # 提取收件人
+    to_recipients = email.get("toRecipients", [])
+    to_email = ", ".join([r.get("emailAddress", {}).get("address", "") for r in to_recipients])
+    
+    verification_code = None
+    try:
+        detection = detect_verification_code_with_rules(
+            email_account=credentials.email,
+            message_id=email.get("id"),
+            from_email=from_email,
+            subject=subject,
+            body_plain=body_preview or "",
+            body_html="",
+            body_preview=body_preview or "",
+            source="runtime",
+            page_source="list",
+            persist_record=True,
+        )
+        if detection.get("code"):
+            verification_code = detection["code"]
+    except Exception as e:
+        logger.warning(f"Failed to detect verification code: {e}")
+    
+    # 格式化日期
+    date_str = email.get("receivedDateTime", "")
+    try:
+        date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        formatted_date = date_obj.isoformat()
+    except Exception:
+        formatted_date = datetime.now().isoformat()
+    
+    # 获取邮件所在的文件夹
+    email_folder = folder_name
+    if folder_name is None:
+        # 从 /me/messages 获取的邮件，尝试从 parentFolderId 推断文件夹名称，默认为 "inbox"
+        parent_folder_id = email.get("parentFolderId", "")
+        if "junk" in parent_folder_id.lower() or "spam" in parent_folder_id.lower():
+            email_folder = "junkemail"
+        else:
+            email_folder = "inbox"
+    
+    return EmailItem(
+        message_id=email.get("id"),
+        folder=email_folder or "inbox",
+        subject=subject,
+        from_email=from_email,
+        date=formatted_date,
+        is_read=email.get("isRead", False),
+        has_attachments=email.get("hasAttachments", False),
+        sender_initial=sender_initial,
+        verification_code=verification_code,
+        body_preview=body_preview,
+        to_email=to_email if to_email else None,
+    )
+
+
+def _raise_graph_list_error(credentials: AccountCredentials, e: Exception) -> None:
+    """将 Graph 邮件列表请求的异常转换为 HTTPException"""
+    if isinstance(e, httpx.ConnectError):
+        error_msg = f"Network connection error: Unable to connect to Microsoft Graph API. Please check your network connection."
+        logger.error(f"Connection error fetching emails via Graph API for {credentials.email}: {e}")
+        raise HTTPException(status_code=503, detail=error_msg)
+    if isinstance(e, httpx.TimeoutException):
+        error_msg = f"Request timeout: The request to Microsoft Graph API took too long. Please try again later."
+        logger.error(f"Timeout error fetching emails via Graph API for {credentials.email}: {e}")
+        raise HTTPException(status_code=504, detail=error_msg)
+    if isinstance(e, httpx.HTTPStatusError):
+        # 401 错误应该已经在请求循环中处理过了，如果还是失败，说明凭证有问题
+        if e.response.status_code == 401:
+            hot_log.error(
+                "unauthorized_after_refresh",
+                email=credentials.email,
+                response_preview=lambda: e.response.text[:200],
+            )
+            raise HTTPException(
+                status_code=401, 
+                detail="Authentication failed. Please check your account credentials."
+            )
+        hot_log.error(
+            "list.http_error",
+            email=credentials.email,
+            status=e.response.status_code,
+            response_preview=lambda: e.response.text[:200],
+        )
+        raise HTTPException(status_code=500, detail=f"Failed to fetch emails via Graph API: HTTP {e.response.status_code}")
+    logger.exception(f"Error fetching emails via Graph API for {credentials.email}: {e}")
+    raise HTTPException(status_code=500, detail=f"Failed to fetch emails via Graph API: {str(e)}")
+
+
 async def list_emails_graph(
     credentials: AccountCredentials,
     folder: str,
@@ -365,7 +765,12 @@ async def list_emails_graph(
     end_time: Optional[str] = None
 ) -> tuple[List[EmailItem], int]:
     """
-    使用 Graph API 获取邮件列表
+    使用 Graph API 获取邮件列表（按文件夹分别查询，folder 为 'all' 时合并收件箱和垃圾邮件）
+    
+    单个文件夹直接使用 $top/$skip 服务端分页；多个文件夹时每个文件夹只取前 page*page_size 封
+    （超过单页上限时沿 @odata.nextLink 继续），合并排序后截取当前页。总数来自 $count。
+    带过滤条件时服务端只能按接收时间排序，按主题/发件人排序时每个文件夹取前
+    GRAPH_LOCAL_SORT_MAX_ITEMS 封匹配邮件（翻页更深时取前 page*page_size 封）整体排序后截取当前页。
     
     Args:
         credentials: 账户凭证
@@ -384,495 +789,268 @@ async def list_emails_graph(
     """
     access_token = await get_graph_access_token(credentials)
     
-    # 映射文件夹名称
-    folder_map = {
-        "inbox": "inbox",
-        "junk": "junkemail",
-        "all": None  # 需要分别获取
-    }
-    
     headers = {
         "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
+        "Content-Type": "application/json",
+        "ConsistencyLevel": "eventual"  # 使用 $count=true 时需要此 header
     }
     
-    all_emails = []
-    
     # 确定要查询的文件夹
-    folders_to_query = []
     if folder == "all":
-        folders_to_query = ["inbox", "junkemail"]
+        folders_to_query = list(GRAPH_ALL_FOLDERS)
+    else:
+        folders_to_query = [_GRAPH_LIST_FOLDER_MAP.get(folder, "inbox")]
+    
+    query_params, local_sort = _build_graph_list_query(
+        sender_search, subject_search, start_time, end_time, sort_by, sort_order
+    )
+    # 多个文件夹或服务端无法按 sort_by 排序时，取前 page*page_size 封在本地排序后截取
+    merge_locally = len(folders_to_query) > 1 or local_sort
+    
+    page = max(1, page)
+    if not merge_locally:
+        server_skip = (page - 1) * page_size
+        needed = page_size
+        local_offset = 0
     else:
-        folders_to_query = [folder_map.get(folder, "inbox")]
+        server_skip = 0
+        needed = page * page_size
+        local_offset = (page - 1) * page_size
+        if local_sort:
+            # 只取前 page*page_size 封时排序结果随页码变化，需要覆盖全部匹配邮件（有上限）
+            needed = max(needed, GRAPH_LOCAL_SORT_MAX_ITEMS)
+    
+    base_params: Dict[str, Any] = {
+        "$top": min(needed, GRAPH_MAX_PAGE_SIZE),
+        "$skip": server_skip,
+        "$count": "true",
+        "$select": GRAPH_LIST_SELECT_FIELDS,
+        **query_params,
+    }
     
     try:
-        # 增加超时时间，并添加重试机制
         timeout = httpx.Timeout(10.0, connect=5.0)  # 总超时10秒，连接超时5秒
-        async with httpx.AsyncClient(timeout=timeout) as client:
+        all_emails: List[EmailItem] = []
+        total = 0
+        async with http_clients.client(GRAPH_CLIENT) as client:
             for folder_name in folders_to_query:
-                # 构建查询参数（参考 mail-all.js 的实现，使用 $top=10000）
-                params = {
-                    "$top": 1000,  # 一次性获取大量邮件（参考 mail-all.js）
-                    "$orderby": "receivedDateTime desc",  # 按接收时间降序排序
-                    "$select": "id,subject,from,toRecipients,receivedDateTime,isRead,hasAttachments,bodyPreview,body"
-                }
-                
-                # 添加过滤条件
-                filters = []
-                if sender_search:
-                    filters.append(f"contains(from/emailAddress/address, '{sender_search}')")
-                if subject_search:
-                    filters.append(f"contains(subject, '{subject_search}')")
-                if start_time:
-                    filters.append(f"receivedDateTime ge {start_time}")
-                if end_time:
-                    filters.append(f"receivedDateTime le {end_time}")
-                
-                if filters:
-                    params["$filter"] = " and ".join(filters)
-                
                 url = f"{GRAPH_API_BASE_URL}/me/mailFolders/{folder_name}/messages"
+                params: Optional[Dict[str, Any]] = dict(base_params)
+                messages: List[Dict[str, Any]] = []
+                folder_total = None
+                while url and len(messages) < needed:
+                    data = await _get_graph_list_page(client, credentials, headers, url, params, timeout)
+                    if folder_total is None:
+                        folder_total = data.get("@odata.count")
+                    messages.extend(data.get("value", []))
+                    # nextLink 已包含全部查询参数
+                    url = data.get("@odata.nextLink")
+                    params = None
                 
-                # 添加重试机制（包括 401 错误处理）
-                max_retries = 2
-                last_error = None
-                token_refreshed = False
-                response = None
-                for attempt in range(max_retries + 1):
-                    try:
-                        logger.info(f"Requesting URL: {url}, Headers: {headers}, Params: {params}")
-                        response = await client.get(url, headers=headers, params=params)
-                        logger.info(f"Response: {response.text[:200]}...")
-                        # 处理 401 未授权错误（token 过期或无效）
-                        if response.status_code == 401:
-                            if not token_refreshed:
-                                logger.warning(
-                                    f"Received 401 Unauthorized for {credentials.email}, "
-                                    f"clearing cache and refreshing token..."
-                                )
-                                # 清除缓存的 token
-                                from oauth_service import clear_cached_access_token
-                                await clear_cached_access_token(credentials.email)
-                                
-                                # 重新获取 token
-                                access_token = await get_graph_access_token(credentials)
-                                headers["Authorization"] = f"Bearer {access_token}"
-                                token_refreshed = True
-                                
-                                # 重试请求（不增加 attempt 计数，继续循环）
-                                continue
-                            else:
-                                # 已经刷新过 token，还是 401，说明凭证有问题
-                                logger.error(
-                                    f"401 Unauthorized persists after token refresh for {credentials.email}. "
-                                    f"Response: {response.text[:200]}"
-                                )
-                                response.raise_for_status()  # 抛出异常
-                        
-                        response.raise_for_status()
-                        break  # 成功，退出重试循环
-                    except (httpx.ConnectError, httpx.TimeoutException) as e:
-                        last_error = e
-                        if attempt < max_retries:
-                            wait_time = (attempt + 1) * 2  # 递增等待时间：2秒、4秒
-                            logger.warning(
-                                f"Network error fetching emails from {folder_name} for {credentials.email} "
-                                f"(attempt {attempt + 1}/{max_retries + 1}): {e}. Retrying in {wait_time}s..."
-                            )
-                            await asyncio.sleep(wait_time)
-                        else:
-                            raise  # 最后一次尝试失败，抛出异常
-                
-                if response is None:
-                    raise httpx.RequestError("Failed to get response after retries")
-                
-                data = response.json()
-                emails = data.get("value", [])
-                
-                # 转换为 EmailItem 格式
-                for email in emails:
-                    from_data = email.get("from", {}).get("emailAddress", {})
-                    from_email = from_data.get("address", "(Unknown Sender)")
-                    
-                    # 提取发件人首字母
-                    sender_initial = "?"
-                    email_match = re.search(r"([a-zA-Z])", from_email)
-                    if email_match:
-                        sender_initial = email_match.group(1).upper()
-                    
-                    subject = email.get("subject", "(No Subject)")
-                    body_preview = email.get("bodyPreview", "")
-                    
-                    # 提取收件人
-                    to_recipients = email.get("toRecipients", [])
-                    to_email = ", ".join([r.get("emailAddress", {}).get("address", "") for r in to_recipients])
-                    
-                    # 获取邮件正文
-                    body_data = email.get("body", {})
-                    body_content = body_data.get("content", "")
-                    body_type = body_data.get("contentType", "text")
-                    
-                    body_plain = None
-                    body_html = None
-                    
-                    if body_content:
-                        if body_type.lower() == "html":
-                            body_html = body_content
-                            body_plain = body_preview  # 使用预览作为纯文本
-                        else:
-                            body_plain = body_content
-                    
-                    verification_code = None
-                    try:
-                        detection = detect_verification_code_with_rules(
-                            email_account=credentials.email,
-                            message_id=email.get("id"),
-                            from_email=from_email,
-                            subject=subject,
-                            body_plain=body_plain or "",
-                            body_html=body_html or "",
-                            body_preview=body_preview or "",
-                            source="runtime",
-                            page_source="list",
-                            persist_record=True,
-                        )
-                        if detection.get("code"):
-                            verification_code = detection["code"]
-                    except Exception as e:
-                        logger.warning(f"Failed to detect verification code: {e}")
-                    
-                    # 格式化日期
-                    date_str = email.get("receivedDateTime", "")
-                    try:
-                        date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                        formatted_date = date_obj.isoformat()
-                    except Exception:
-                        formatted_date = datetime.now().isoformat()
-                    
-                    email_item = EmailItem(
-                        message_id=email.get("id"),
-                        folder=folder_name,
-                        subject=subject,
-                        from_email=from_email,
-                        date=formatted_date,
-                        is_read=email.get("isRead", False),
-                        has_attachments=email.get("hasAttachments", False),
-                        sender_initial=sender_initial,
-                        verification_code=verification_code,
-                        body_preview=body_preview,
-                        to_email=to_email if to_email else None,
-                        body_plain=body_plain if body_plain else None,
-                        body_html=body_html if body_html else None
-                    )
-                    all_emails.append(email_item)
-        
-        # 排序
-        reverse = (sort_order == "desc")
-        if sort_by == "date":
-            # 使用datetime对象进行日期排序，确保准确性
-            def get_date_key(email_item):
-                try:
-                    return datetime.fromisoformat(email_item.date.replace('Z', '+00:00'))
-                except:
-                    return datetime.min
-            all_emails.sort(key=get_date_key, reverse=reverse)
-        elif sort_by == "subject":
-            all_emails.sort(key=lambda x: x.subject, reverse=reverse)
-        elif sort_by == "from_email":
-            all_emails.sort(key=lambda x: x.from_email, reverse=reverse)
+                total += folder_total if folder_total is not None else server_skip + len(messages)
+                all_emails.extend(
+                    _graph_message_to_email_item(credentials, message, folder_name)
+                    for message in messages[:needed]
+                )
         
-        # 分页
-        total = len(all_emails)
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        paginated_emails = all_emails[start_idx:end_idx]
+        if merge_locally:
+            all_emails.sort(key=_email_item_sort_key(sort_by), reverse=(sort_order != "asc"))
+        paginated_emails = all_emails[local_offset:local_offset + page_size]
         
-        logger.debug(f"Fetched {len(paginated_emails)} emails via Graph API for {credentials.email}")
+        hot_log.debug("list.fetched", email=credentials.email, count=len(paginated_emails), total=total)
         return paginated_emails, total
         
-    except httpx.ConnectError as e:
-        error_msg = f"Network connection error: Unable to connect to Microsoft Graph API. Please check your network connection."
-        logger.error(f"Connection error fetching emails via Graph API for {credentials.email}: {e}")
-        raise HTTPException(status_code=503, detail=error_msg)
-    except httpx.TimeoutException as e:
-        error_msg = f"Request timeout: The request to Microsoft Graph API took too long. Please try again later."
-        logger.error(f"Timeout error fetching emails via Graph API for {credentials.email}: {e}")
-        raise HTTPException(status_code=504, detail=error_msg)
-    except httpx.HTTPStatusError as e:
-        # 401 错误应该已经在循环中处理过了，如果还是失败，记录错误
-        if e.response.status_code == 401:
-            logger.error(
-                f"401 Unauthorized error for {credentials.email} after token refresh attempt. "
-                f"Response: {e.response.text[:200]}"
-            )
-            raise HTTPException(
-                status_code=401, 
-                detail="Authentication failed. Please check your account credentials."
-            )
-        
-        logger.error(f"HTTP error fetching emails via Graph API for {credentials.email}: Status {e.response.status_code}, Response: {e.response.text[:200]}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch emails via Graph API: HTTP {e.response.status_code}")
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.exception(f"Error fetching emails via Graph API for {credentials.email}: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch emails via Graph API: {str(e)}")
+        _raise_graph_list_error(credentials, e)
 
 
-async def list_emails_graph2(
+async def stream_emails_graph(
     credentials: AccountCredentials,
     folder: str,
-    page: int,
-    page_size: int,
+    max_count: int,
     sender_search: Optional[str] = None,
     subject_search: Optional[str] = None,
     sort_by: str = "date",
     sort_order: str = "desc",
     start_time: Optional[str] = None,
     end_time: Optional[str] = None
-) -> tuple[List[EmailItem], int]:
+) -> AsyncIterator[List[EmailItem]]:
     """
-    使用 Graph API 获取邮件列表（新版本，使用 $count=true 获取总数）
-    参考 list_emails_with_body_graph 的实现
+    流式获取 Graph 邮件列表：每收到一页就产出该页的 EmailItem
+    
+    各文件夹依次沿 @odata.nextLink 分页读取（文件夹内按 $orderby 服务端排序，不做跨文件夹合并排序），
+    取满 max_count 封即停止。产出的邮件同样写入邮件列表缓存。带过滤条件时服务端只能按接收时间排序，
+    按主题/发件人排序只在每页内进行。
     
     Args:
         credentials: 账户凭证
         folder: 文件夹名称 ('inbox', 'junk', 'all')
-        page: 页码
-        page_size: 每页大小
+        max_count: 最多产出的邮件数
         sender_search: 发件人搜索
         subject_search: 主题搜索
         sort_by: 排序字段
         sort_order: 排序方向
         start_time: 开始时间 (ISO8601)
         end_time: 结束时间 (ISO8601)
-        
-    Returns:
-        tuple: (邮件列表, 总数)
     """
     access_token = await get_graph_access_token(credentials)
-    
-    # 映射文件夹名称
-    folder_map = {
-        "inbox": "inbox",
-        "junk": "junkemail",
-        "all": None
-    }
-    
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json",
-        "ConsistencyLevel": "eventual"  # 使用 $count=true 时需要此 header
+        "ConsistencyLevel": "eventual"
     }
-    
-    # 确定要查询的URL和文件夹
-    # 如果不指定folder（即folder == "all"），使用 /me/messages 而不是分别请求inbox和junkemail
     if folder == "all":
-        url = f"{GRAPH_API_BASE_URL}/me/messages"
-        folder_name = None  # 用于后续处理，表示所有文件夹
+        folders_to_query = ["inbox", "junkemail"]
     else:
-        folder_name = folder_map.get(folder, "inbox")
-        url = f"{GRAPH_API_BASE_URL}/me/mailFolders/{folder_name}/messages"
+        folders_to_query = [_GRAPH_LIST_FOLDER_MAP.get(folder, "inbox")]
+    
+    query_params, local_sort = _build_graph_list_query(
+        sender_search, subject_search, start_time, end_time, sort_by, sort_order
+    )
+    base_params: Dict[str, Any] = {
+        "$top": min(max_count, GRAPH_STREAM_PAGE_SIZE),
+        "$select": GRAPH_LIST_SELECT_FIELDS,
+        **query_params,
+    }
     
+    remaining = max_count
     try:
-        timeout = httpx.Timeout(60.0, connect=30.0)  # 总超时60秒，连接超时30秒
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            # 构建查询参数
-            # 计算分页参数
-            skip = (page - 1) * page_size
-            top = page_size
-            
-            params = {
-                "$top": top,
-                "$skip": skip,
-                "$count": "true",  # 添加 $count=true 获取总数
-                "$orderby": "receivedDateTime desc",  # 按接收时间降序排序
-                "$select": "id,subject,from,toRecipients,receivedDateTime,isRead,hasAttachments,bodyPreview,body"
-            }
-            
-            # 添加过滤条件
-            filters = []
-            if sender_search:
-                filters.append(f"contains(from/emailAddress/address, '{sender_search}')")
-            if subject_search:
-                filters.append(f"contains(subject, '{subject_search}')")
-            if start_time:
-                filters.append(f"receivedDateTime ge {start_time}")
-            if end_time:
-                filters.append(f"receivedDateTime le {end_time}")
-            
-            if filters:
-                params["$filter"] = " and ".join(filters)
-            
-            # 添加重试机制
-            max_retries = 2
-            token_refreshed = False
-            response = None
-            for attempt in range(max_retries + 1):
-                try:
-                    response = await client.get(url, headers=headers, params=params)
-                    # 处理 401 未授权错误
-                    if response.status_code == 401:
-                        if not token_refreshed:
-                            logger.warning(
-                                f"Received 401 Unauthorized for {credentials.email}, "
-                                f"clearing cache and refreshing token..."
-                            )
-                            from oauth_service import clear_cached_access_token
-                            await clear_cached_access_token(credentials.email)
-                            access_token = await get_graph_access_token(credentials)
-                            headers["Authorization"] = f"Bearer {access_token}"
-                            token_refreshed = True
-                            continue
-                    response.raise_for_status()
-                    break
-                except (httpx.ConnectError, httpx.TimeoutException) as e:
-                    if attempt < max_retries:
-                        wait_time = (attempt + 1) * 2
-                        logger.warning(
-                            f"Network error fetching emails for {credentials.email} "
-                            f"(attempt {attempt + 1}/{max_retries + 1}): {e}. Retrying in {wait_time}s..."
+        timeout = httpx.Timeout(10.0, connect=5.0)
+        async with http_clients.client(GRAPH_CLIENT) as client:
+            for folder_name in folders_to_query:
+                url = f"{GRAPH_API_BASE_URL}/me/mailFolders/{folder_name}/messages"
+                params: Optional[Dict[str, Any]] = dict(base_params)
+                while url and remaining > 0:
+                    data = await _get_graph_list_page(client, credentials, headers, url, params, timeout)
+                    url = data.get("@odata.nextLink")
+                    params = None
+                    page_items = [
+                        _graph_message_to_email_item(credentials, message, folder_name)
+                        for message in data.get("value", [])[:remaining]
+                    ]
+                    if not page_items:
+                        continue
+                    if local_sort:
+                        page_items.sort(key=_email_item_sort_key(sort_by), reverse=(sort_order != "asc"))
+                    remaining -= len(page_items)
+                    try:
+                        cache_write_behind.submit_emails(
+                            credentials.email, [item.dict() for item in page_items], provider="graph_api"
                         )
-                        await asyncio.sleep(wait_time)
-                    else:
-                        raise
-            
-            if response is None:
-                raise httpx.RequestError("Failed to get response after retries")
-            
-            data = response.json()
-            emails = data.get("value", [])
-            
-            # 从响应中获取总数（使用 $count=true 时返回 @odata.count）
-            total_count = data.get("@odata.count")
-            if total_count is None:
-                # 如果没有 @odata.count，尝试从其他字段获取，或者使用当前返回的数量
-                # 注意：如果没有 $count=true 或服务器不支持，可能需要回退到其他方法
-                logger.warning(f"@odata.count not found in response for {credentials.email}, using fallback")
-                total_count = len(emails)  # 回退方案：使用当前页的数量
-            
-            # 转换为 EmailItem 格式
-            email_items = []
-            for email in emails:
-                from_data = email.get("from", {}).get("emailAddress", {})
-                from_email = from_data.get("address", "(Unknown Sender)")
-                
-                # 提取发件人首字母
-                sender_initial = "?"
-                email_match = re.search(r"([a-zA-Z])", from_email)
-                if email_match:
-                    sender_initial = email_match.group(1).upper()
-                
-                subject = email.get("subject", "(No Subject)")
-                body_preview = email.get("bodyPreview", "")
-                
-                # 提取收件人
-                to_recipients = email.get("toRecipients", [])
-                to_email = ", ".join([r.get("emailAddress", {}).get("address", "") for r in to_recipients])
-                
-                # 获取邮件正文
-                body_data = email.get("body", {})
-                body_content = body_data.get("content", "")
-                body_type = body_data.get("contentType", "text")
-                
-                body_plain = None
-                body_html = None
-                
-                if body_content:
-                    if body_type.lower() == "html":
-                        body_html = body_content
-                        body_plain = body_preview  # 使用预览作为纯文本
-                    else:
-                        body_plain = body_content
-                
-                verification_code = None
-                try:
-                    detection = detect_verification_code_with_rules(
-                        email_account=credentials.email,
-                        message_id=email.get("id"),
-                        from_email=from_email,
-                        subject=subject,
-                        body_plain=body_plain or "",
-                        body_html=body_html or "",
-                        body_preview=body_preview or "",
-                        source="runtime",
-                        page_source="list",
-                        persist_record=True,
-                    )
-                    if detection.get("code"):
-                        verification_code = detection["code"]
-                except Exception as e:
-                    logger.warning(f"Failed to detect verification code: {e}")
-                
-                # 格式化日期
-                date_str = email.get("receivedDateTime", "")
-                try:
-                    date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                    formatted_date = date_obj.isoformat()
-                except Exception:
-                    formatted_date = datetime.now().isoformat()
-                
-                # 获取邮件所在的文件夹
-                email_folder = folder_name
-                if folder_name is None:
-                    # 从 /me/messages 获取的邮件，尝试从 parentFolderId 或其他字段获取文件夹信息
-                    # 如果没有，默认为 "inbox"
-                    parent_folder_id = email.get("parentFolderId", "")
-                    # 尝试从 parentFolderId 推断文件夹名称
-                    if "inbox" in parent_folder_id.lower():
-                        email_folder = "inbox"
-                    elif "junk" in parent_folder_id.lower() or "spam" in parent_folder_id.lower():
-                        email_folder = "junkemail"
-                    else:
-                        email_folder = "inbox"  # 默认
-                
-                email_item = EmailItem(
-                    message_id=email.get("id"),
-                    folder=email_folder or "inbox",  # 如果无法确定，默认为 inbox
-                    subject=subject,
-                    from_email=from_email,
-                    date=formatted_date,
-                    is_read=email.get("isRead", False),
-                    has_attachments=email.get("hasAttachments", False),
-                    sender_initial=sender_initial,
-                    verification_code=verification_code,
-                    body_preview=body_preview,
-                    to_email=to_email if to_email else None,
-                    body_plain=body_plain if body_plain else None,
-                    body_html=body_html if body_html else None
-                )
-                email_items.append(email_item)
-            
-            # 如果需要客户端排序（当使用 $filter 时，服务器端排序可能不准确）
-            # 这里我们依赖服务器端排序，因为使用了 $orderby
-            
-            logger.info(
-                f"Fetched {len(email_items)} emails via Graph API for {credentials.email}, "
-                f"total count: {total_count}"
-            )
-            return email_items, total_count
-            
-    except httpx.ConnectError as e:
-        error_msg = f"Network connection error: Unable to connect to Microsoft Graph API. Please check your network connection."
-        logger.error(f"Connection error fetching emails via Graph API for {credentials.email}: {e}")
-        raise HTTPException(status_code=503, detail=error_msg)
-    except httpx.TimeoutException as e:
-        error_msg = f"Request timeout: The request to Microsoft Graph API took too long. Please try again later."
-        logger.error(f"Timeout error fetching emails via Graph API for {credentials.email}: {e}")
-        raise HTTPException(status_code=504, detail=error_msg)
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 401:
-            logger.error(
-                f"401 Unauthorized error for {credentials.email} after token refresh attempt. "
-                f"Response: {e.response.text[:200]}"
-            )
-            raise HTTPException(
-                status_code=401, 
-                detail="Authentication failed. Please check your account credentials."
-            )
-        logger.error(f"HTTP error fetching emails via Graph API for {credentials.email}: Status {e.response.status_code}, Response: {e.response.text[:200]}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch emails via Graph API: HTTP {e.response.status_code}")
+                    except Exception as e:
+                        logger.warning(f"Failed to cache streamed emails to database: {e}")
+                    yield page_items
+    except HTTPException:
+        raise
+    except Exception as e:
+        _raise_graph_list_error(credentials, e)
+
+
+async def list_emails_graph2(
+    credentials: AccountCredentials,
+    folder: str,
+    page: int,
+    page_size: int,
+    sender_search: Optional[str] = None,
+    subject_search: Optional[str] = None,
+    sort_by: str = "date",
+    sort_order: str = "desc",
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+) -> tuple[List[EmailItem], int]:
+    """
+    使用 Graph API 获取邮件列表（新版本，服务端分页并使用 $count=true 获取总数）
+    
+    只请求列表字段，不包含正文；正文在查看详情时按需获取。带过滤条件时服务端只能按接收时间排序，
+    按主题/发件人排序时取前 GRAPH_LOCAL_SORT_MAX_ITEMS 封匹配邮件（翻页更深时取前 page*page_size 封，
+    沿 @odata.nextLink 继续）在本地整体排序后截取当前页
+    
+    Args:
+        credentials: 账户凭证
+        folder: 文件夹名称 ('inbox', 'junk', 'all')
+        page: 页码
+        page_size: 每页大小
+        sender_search: 发件人搜索
+        subject_search: 主题搜索
+        sort_by: 排序字段
+        sort_order: 排序方向
+        start_time: 开始时间 (ISO8601)
+        end_time: 结束时间 (ISO8601)
+        
+    Returns:
+        tuple: (邮件列表, 总数)
+    """
+    access_token = await get_graph_access_token(credentials)
+    
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+        "ConsistencyLevel": "eventual"  # 使用 $count=true 时需要此 header
+    }
+    
+    # 确定要查询的URL和文件夹
+    # 如果不指定folder（即folder == "all"），使用 /me/messages 而不是分别请求inbox和junkemail
+    if folder == "all":
+        url = f"{GRAPH_API_BASE_URL}/me/messages"
+        folder_name = None  # 用于后续处理，表示所有文件夹
+    else:
+        folder_name = _GRAPH_LIST_FOLDER_MAP.get(folder, "inbox")
+        url = f"{GRAPH_API_BASE_URL}/me/mailFolders/{folder_name}/messages"
+    
+    query_params, local_sort = _build_graph_list_query(
+        sender_search, subject_search, start_time, end_time, sort_by, sort_order
+    )
+    page = max(1, page)
+    if local_sort:
+        # 服务端无法按 sort_by 排序：从头取匹配邮件，本地排序后截取当前页
+        server_skip = 0
+        needed = max(page * page_size, GRAPH_LOCAL_SORT_MAX_ITEMS)
+    else:
+        server_skip = (page - 1) * page_size
+        needed = page_size
+    params: Dict[str, Any] = {
+        "$top": min(needed, GRAPH_MAX_PAGE_SIZE),
+        "$skip": server_skip,
+        "$count": "true",  # 添加 $count=true 获取总数
+        "$select": GRAPH_LIST_SELECT_FIELDS,
+        **query_params,
+    }
+    
+    try:
+        timeout = httpx.Timeout(60.0, connect=30.0)  # 总超时60秒，连接超时30秒
+        async with http_clients.client(GRAPH_CLIENT) as client:
+            data = await _get_graph_list_page(client, credentials, headers, url, params, timeout)
+            total_count = data.get("@odata.count")
+            emails = list(data.get("value", []))
+            next_link = data.get("@odata.nextLink")
+            while local_sort and next_link and len(emails) < needed:
+                # nextLink 已包含全部查询参数
+                data = await _get_graph_list_page(client, credentials, headers, next_link, None, timeout)
+                emails.extend(data.get("value", []))
+                next_link = data.get("@odata.nextLink")
+        
+        # 从响应中获取总数（使用 $count=true 时返回 @odata.count）
+        if total_count is None:
+            logger.warning(f"@odata.count not found in response for {credentials.email}, using fallback")
+            total_count = server_skip + len(emails)
+        
+        email_items = [
+            _graph_message_to_email_item(credentials, email, folder_name)
+            for email in emails[:needed]
+        ]
+        if local_sort:
+            email_items.sort(key=_email_item_sort_key(sort_by), reverse=(sort_order != "asc"))
+            email_items = email_items[(page - 1) * page_size:page * page_size]
+        
+        hot_log.info("list.fetched", email=credentials.email, count=len(email_items), total=total_count)
+        return email_items, total_count
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.exception(f"Error fetching emails via Graph API for {credentials.email}: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch emails via Graph API: {str(e)}")
+        _raise_graph_list_error(credentials, e)
 
 
 async def list_emails_with_body_graph(
@@ -889,6 +1067,8 @@ async def list_emails_with_body_graph(
     """
     使用 Graph API 直接获取包含body的邮件详情列表（用于分享页）
     
+    folder 为 'all' 时分别查询收件箱和垃圾邮件，按接收时间合并
+    
     Args:
         credentials: 账户凭证
         folder: 文件夹名称 ('inbox', 'junk', 'all')
@@ -905,13 +1085,6 @@ async def list_emails_with_body_graph(
     """
     access_token = await get_graph_access_token(credentials)
     
-    # 映射文件夹名称
-    folder_map = {
-        "inbox": "inbox",
-        "junk": "junkemail",
-        "all": None
-    }
-    
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
@@ -919,69 +1092,92 @@ async def list_emails_with_body_graph(
     
     all_emails = []
     
-    # 确定要查询的URL和文件夹
-    # 如果不指定folder（即folder == "all"），使用 /me/messages 而不是分别请求inbox和junkemail
+    # 确定要查询的文件夹：folder == "all" 时分别请求收件箱和垃圾邮件后合并，
+    # 读取范围与变更通知订阅的文件夹一致，分享页缓存才能由推送失效
     if folder == "all":
-        url = f"{GRAPH_API_BASE_URL}/me/messages"
-        folder_name = None  # 用于后续处理，表示所有文件夹
+        folders_to_query = list(GRAPH_ALL_FOLDERS)
     else:
-        folder_name = folder_map.get(folder, "inbox")
-        url = f"{GRAPH_API_BASE_URL}/me/mailFolders/{folder_name}/messages"
+        folders_to_query = [_GRAPH_LIST_FOLDER_MAP.get(folder, "inbox")]
     
     try:
         timeout = httpx.Timeout(60.0, connect=30.0)  # 总超时60秒，连接超时30秒
-        async with httpx.AsyncClient(timeout=timeout) as client:
+        async with http_clients.client(GRAPH_CLIENT) as client:
             # 构建查询参数，包含body字段
-            # 取件数设置为入参的两倍，以便过滤后仍有足够的数据
+            # 过滤条件尽量下推到 $filter/$search；全部由服务端精确完成时只取 max_count 封，
+            # 否则取两倍数量，本地过滤后再截取
+            query_params, exact = build_graph_message_query(
+                sender_search, subject_search, start_time, end_time
+            )
             params = {
-                "$top": max_count * 2,  # 取两倍数量，过滤后再截取
+                "$top": max_count if exact else max_count * 2,
+                "$select": GRAPH_LIST_SELECT_FIELDS,
+                **query_params,
+            }
+            # 服务端不支持的条件组合（400）时退回不带条件的查询，完全由本地过滤
+            fallback_params = {
+                "$top": max_count * 2,
                 "$orderby": "receivedDateTime desc",
-                "$select": "id,subject,from,toRecipients,receivedDateTime,isRead,hasAttachments,body,bodyPreview"
+                "$select": GRAPH_LIST_SELECT_FIELDS,
             }
-            
-            # 不再使用 $filter，改为代码过滤
                 
-            # 添加重试机制
-            max_retries = 2
-            last_error = None
-            token_refreshed = False
-            response = None
-            for attempt in range(max_retries + 1):
-                try:
-                    response = await client.get(url, headers=headers, params=params)
-                    # 处理 401 未授权错误
-                    if response.status_code == 401:
-                        if not token_refreshed:
-                            logger.warning(
-                                f"Received 401 Unauthorized for {credentials.email}, "
-                                f"clearing cache and refreshing token..."
-                            )
-                            from oauth_service import clear_cached_access_token
-                            clear_cached_access_token(credentials.email)
-                            access_token = await get_graph_access_token(credentials)
-                            headers["Authorization"] = f"Bearer {access_token}"
-                            token_refreshed = True
-                            continue
-                    response.raise_for_status()
-                    break
-                except (httpx.ConnectError, httpx.TimeoutException) as e:
-                    last_error = e
-                    if attempt < max_retries:
-                        wait_time = (attempt + 1) * 2
+            # 添加重试机制：网络错误最多重试 max_retries 次；401 刷新 token 与 400 退回本地过滤
+            # 各自最多发生一次，不占用网络重试次数
+            emails: List[Dict[str, Any]] = []
+            email_folders: Dict[str, str] = {}
+            for folder_name in folders_to_query:
+                url = f"{GRAPH_API_BASE_URL}/me/mailFolders/{folder_name}/messages"
+                folder_params = params
+                max_retries = 2
+                network_attempt = 0
+                token_refreshed = False
+                while True:
+                    try:
+                        response = await graph_throttle.request(
+                            client, "GET", url, mailbox=credentials.email, headers=headers, params=folder_params,
+                            timeout=timeout,
+                        )
+                    except (httpx.ConnectError, httpx.TimeoutException) as e:
+                        if network_attempt >= max_retries:
+                            raise
+                        network_attempt += 1
+                        wait_time = network_attempt * 2
                         logger.warning(
                             f"Network error fetching emails with body for {credentials.email} "
-                            f"(attempt {attempt + 1}/{max_retries + 1}): {e}. Retrying in {wait_time}s..."
+                            f"(attempt {network_attempt}/{max_retries + 1}): {e}. Retrying in {wait_time}s..."
                         )
                         await asyncio.sleep(wait_time)
-                    else:
-                        raise
-            
-            if response is None:
-                logger.warning(f"No response received for {credentials.email}")
-                return []
-            
-            data = response.json()
-            emails = data.get("value", [])
+                        continue
+                    # 处理 401 未授权错误
+                    if response.status_code == 401 and not token_refreshed:
+                        logger.warning(
+                            f"Received 401 Unauthorized for {credentials.email}, "
+                            f"clearing cache and refreshing token..."
+                        )
+                        from oauth_service import clear_cached_access_token
+                        await clear_cached_access_token(credentials.email)
+                        access_token = await get_graph_access_token(credentials)
+                        headers["Authorization"] = f"Bearer {access_token}"
+                        token_refreshed = True
+                        continue
+                    if response.status_code == 400 and folder_params is not fallback_params:
+                        hot_log.warning(
+                            "list.query_rejected",
+                            email=credentials.email,
+                            fallback="local_filtering",
+                            response_preview=lambda: response.text[:200],
+                        )
+                        folder_params = fallback_params
+                        continue
+                    # 其余错误（包括退回后的查询仍然失败）直接抛出，不当作空结果返回
+                    response.raise_for_status()
+                    break
+                
+                for email in response.json().get("value", []):
+                    email_folders[email.get("id")] = folder_name
+                    emails.append(email)
+            # 多个文件夹时按接收时间合并，截取时保留最新的邮件
+            if len(folders_to_query) > 1:
+                emails.sort(key=lambda email: email.get("receivedDateTime") or "", reverse=True)
             
             # 代码过滤：在取件后进行过滤
             filtered_emails = []
@@ -1002,24 +1198,29 @@ async def list_emails_with_body_graph(
                     if subject_search.lower() not in subject.lower():
                         continue
                 
-                # 时间过滤
+                # 时间过滤（$search 查询无法同时带时间条件，服务端结果也在这里补充过滤）
                 if start_time or end_time:
-                    try:
-                        email_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                        if start_time:
-                            start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                            if email_date < start_dt:
-                                continue
-                        if end_time:
-                            end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-                            if email_date > end_dt:
-                                continue
-                    except Exception as e:
-                        logger.warning(f"Error parsing date for filtering: {e}")
+                    email_date = _parse_graph_datetime(date_str)
+                    if email_date is None:
                         # 如果日期解析失败，跳过时间过滤
+                        logger.warning(f"Error parsing date for filtering: {date_str}")
+                    else:
+                        start_dt = _parse_graph_datetime(start_time)
+                        if start_dt and email_date < start_dt:
+                            continue
+                        end_dt = _parse_graph_datetime(end_time)
+                        if end_dt and email_date > end_dt:
+                            continue
                 
                 filtered_emails.append(email)
             
+            # 正文只为过滤后保留的邮件获取：命中详情缓存的直接复用，其余通过 $batch 每 20 封一次请求
+            filtered_emails = filtered_emails[:max_count]
+            details = await get_email_details_batch_graph(
+                credentials,
+                [email.get("id") for email in filtered_emails if email.get("id")],
+            )
+            
             # 处理每封过滤后的邮件
             for email in filtered_emails:
                 # 提取基本信息（过滤时已提取，这里重新提取以确保完整性）
@@ -1031,19 +1232,14 @@ async def list_emails_with_body_graph(
                 
                 subject = email.get("subject", "(No Subject)")
                 
-                # 获取邮件正文
-                body_data = email.get("body", {})
-                body_content = body_data.get("content", "")
-                body_type = body_data.get("contentType", "text")
-                
-                body_plain = None
-                body_html = None
-                
-                if body_type.lower() == "html":
-                    body_html = body_content
-                    body_plain = email.get("bodyPreview", "")
+                # 获取邮件正文（详情获取失败时退回预览）
+                detail = details.get(email.get("id"))
+                if detail is not None:
+                    body_plain = detail.body_plain
+                    body_html = detail.body_html
                 else:
-                    body_plain = body_content
+                    body_plain = email.get("bodyPreview", "")
+                    body_html = None
                 
                 # 格式化日期
                 date_str = email.get("receivedDateTime", "")
@@ -1053,24 +1249,27 @@ async def list_emails_with_body_graph(
                 except Exception:
                     formatted_date = datetime.now().isoformat()
                 
-                verification_code = None
-                try:
-                    detection = detect_verification_code_with_rules(
-                        email_account=credentials.email,
-                        message_id=email.get("id"),
-                        from_email=from_email,
-                        subject=subject,
-                        body_plain=body_plain or "",
-                        body_html=body_html or "",
-                        body_preview=email.get("bodyPreview", "") or "",
-                        source="runtime",
-                        page_source="list",
-                        persist_record=True,
-                    )
-                    if detection.get("code"):
-                        verification_code = detection["code"]
-                except Exception as e:
-                    logger.warning(f"Failed to detect verification code: {e}")
+                if detail is not None:
+                    verification_code = detail.verification_code
+                else:
+                    verification_code = None
+                    try:
+                        detection = detect_verification_code_with_rules(
+                            email_account=credentials.email,
+                            message_id=email.get("id"),
+                            from_email=from_email,
+                            subject=subject,
+                            body_plain=body_plain or "",
+                            body_html="",
+                            body_preview=email.get("bodyPreview", "") or "",
+                            source="runtime",
+                            page_source="list",
+                            persist_record=True,
+                        )
+                        if detection.get("code"):
+                            verification_code = detection["code"]
+                    except Exception as e:
+                        logger.warning(f"Failed to detect verification code: {e}")
                 
                 # 提取发件人首字母
                 sender_initial = "?"
@@ -1079,16 +1278,9 @@ async def list_emails_with_body_graph(
                     if match:
                         sender_initial = match.group(1).upper()
                     
-                # 获取邮件所在的文件夹（如果是从 /me/messages 获取的）
-                email_folder = folder_name
-                if folder_name is None:
-                    # 从 /me/messages 获取的邮件，尝试从 parentFolderId 或其他字段获取文件夹信息
-                    # 如果没有，默认为 "all" 表示所有文件夹
-                    email_folder = email.get("parentFolderId") or "all"
-                
                 email_dict = {
                     'message_id': email.get("id"),
-                    'folder': email_folder,
+                    'folder': email_folders.get(email.get("id"), folders_to_query[0]),
                     'subject': subject,
                     'from_email': from_email,
                     'to_email': to_email,
@@ -1124,7 +1316,7 @@ async def list_emails_with_body_graph(
         # 限制返回数量
         all_emails = all_emails[:max_count]
         
-        logger.info(f"Fetched {len(all_emails)} emails with body via Graph API for {credentials.email}")
+        hot_log.info("list_with_body.fetched", email=credentials.email, count=len(all_emails))
         return all_emails
         
     except httpx.ConnectError as e:
@@ -1137,67 +1329,297 @@ async def list_emails_with_body_graph(
         raise HTTPException(status_code=504, detail=error_msg)
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
-            logger.error(
-                f"401 Unauthorized error for {credentials.email} after token refresh attempt. "
-                f"Response: {e.response.text[:200]}"
+            hot_log.error(
+                "unauthorized_after_refresh",
+                email=credentials.email,
+                response_preview=lambda: e.response.text[:200],
             )
             raise HTTPException(
                 status_code=401, 
                 detail="Authentication failed. Please check your account credentials."
             )
-        logger.error(f"HTTP error fetching emails with body via Graph API for {credentials.email}: Status {e.response.status_code}, Response: {e.response.text[:200]}")
+        hot_log.error(
+            "list_with_body.http_error",
+            email=credentials.email,
+            status=e.response.status_code,
+            response_preview=lambda: e.response.text[:200],
+        )
         raise HTTPException(status_code=500, detail=f"Failed to fetch emails with body via Graph API: HTTP {e.response.status_code}")
     except Exception as e:
         logger.exception(f"Error fetching emails with body via Graph API for {credentials.email}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch emails with body via Graph API: {str(e)}")
 
 
-async def get_email_details_graph(
+def _graph_message_to_email_detail(
     credentials: AccountCredentials,
-    message_id: str,
-    skip_cache: bool = False,
+    email: Dict[str, Any],
+    message_id: str
 ) -> EmailDetailsResponse:
     """
-    使用 Graph API 获取邮件详情
+    将 Graph 返回的完整邮件（含正文）转换为 EmailDetailsResponse
     
     Args:
         credentials: 账户凭证
+        email: Graph 邮件对象
         message_id: 邮件ID
-        
-    Returns:
-        EmailDetailsResponse: 邮件详情
     """
+    # 提取信息
+    from_data = email.get("from", {}).get("emailAddress", {})
+    from_email = from_data.get("address", "(Unknown Sender)")
+    
+    to_recipients = email.get("toRecipients", [])
+    to_email = ", ".join([r.get("emailAddress", {}).get("address", "") for r in to_recipients])
+    
+    subject = email.get("subject", "(No Subject)")
+    
+    # 获取邮件正文（按 uniqueBody 查询时只有 uniqueBody 字段）
+    body_data = email.get("uniqueBody") or email.get("body") or {}
+    body_content = body_data.get("content", "")
+    body_type = body_data.get("contentType", "text")
+    
+    body_plain = None
+    body_html = None
+    
+    if body_type.lower() == "html":
+        body_html = body_content
+        body_plain = email.get("bodyPreview", "")
+    else:
+        body_plain = body_content
+    
+    # 格式化日期
+    date_str = email.get("receivedDateTime", "")
+    try:
+        date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        formatted_date = date_obj.isoformat()
+    except Exception:
+        formatted_date = datetime.now().isoformat()
+    
+    verification_code = None
+    try:
+        detection = detect_verification_code_with_rules(
+            email_account=credentials.email,
+            message_id=message_id,
+            from_email=from_email,
+            subject=subject,
+            body_plain=body_plain or "",
+            body_html=body_html or "",
+            body_preview=email.get("bodyPreview", "") or "",
+            source="runtime",
+            page_source="detail",
+            persist_record=True,
+        )
+        if detection.get("code"):
+            verification_code = detection["code"]
+            hot_log.info("detail.verification_code_detected", message_id=message_id, code=verification_code)
+    except Exception as e:
+        logger.warning(f"Failed to detect verification code: {e}")
+    
+    return EmailDetailsResponse(
+        message_id=message_id,
+        subject=subject,
+        from_email=from_email,
+        to_email=to_email,
+        date=formatted_date,
+        body_plain=body_plain,
+        body_html=body_html,
+        verification_code=verification_code
+    )
+
+
+def _graph_detail_request_options(body_format: str, unique_body: bool) -> Tuple[str, Dict[str, str]]:
+    """
+    按正文格式返回详情查询的 $select 字段和请求头
+    
+    Args:
+        body_format: GRAPH_BODY_FORMAT_HTML / GRAPH_BODY_FORMAT_TEXT
+        unique_body: 是否只取本封邮件新增的内容（uniqueBody，不含引用的历史邮件）
+    """
+    select_fields = GRAPH_DETAIL_SELECT_FIELDS
+    if unique_body:
+        select_fields = select_fields.replace(",body,", ",uniqueBody,")
+    headers = {}
+    if body_format == GRAPH_BODY_FORMAT_TEXT:
+        headers["Prefer"] = 'outlook.body-content-type="text"'
+    return select_fields, headers
+
+
+def _graph_compact_detail_cache_provider(body_format: str, unique_body: bool) -> Optional[str]:
+    """
+    非默认正文格式的详情只缓存在内存中，并使用单独的缓存命名空间，
+    避免纯文本详情被当作可渲染的详情返回；默认格式返回 None
+    """
+    if body_format == GRAPH_BODY_FORMAT_HTML and not unique_body:
+        return None
+    return f"graph_api:{body_format}{':unique' if unique_body else ''}"
+
+
+def _get_cached_graph_email_detail(
+    credentials: AccountCredentials,
+    message_id: str
+) -> Optional[EmailDetailsResponse]:
+    """依次从内存LRU缓存和数据库缓存读取邮件详情"""
     # 优先从内存LRU缓存获取
-    if not skip_cache:
-        cached_detail = cache_service.get_cached_email_detail(
+    cached_detail = cache_service.get_cached_email_detail(
+        credentials.email,
+        message_id,
+        provider="graph_api",
+    )
+    if cached_detail:
+        hot_log.debug("detail.cache_hit", message_id=message_id, source="memory")
+        return EmailDetailsResponse(**cached_detail)
+    
+    # 从 SQLite 缓存获取
+    try:
+        cached_detail = db.get_cached_email_detail(
             credentials.email,
             message_id,
             provider="graph_api",
         )
         if cached_detail:
-            logger.info(f"Returning cached email detail from LRU cache for {message_id}")
-            return EmailDetailsResponse(**cached_detail)
-    
-    # 从 SQLite 缓存获取
-    if not skip_cache:
-        try:
-            cached_detail = db.get_cached_email_detail(
+            hot_log.debug("detail.cache_hit", message_id=message_id, source="database")
+            # 缓存到内存LRU缓存
+            cache_service.set_cached_email_detail(
                 credentials.email,
                 message_id,
+                cached_detail,
                 provider="graph_api",
             )
-            if cached_detail:
-                logger.info(f"Returning cached email detail from database for {message_id}")
-                # 缓存到内存LRU缓存
-                cache_service.set_cached_email_detail(
-                    credentials.email,
-                    message_id,
-                    cached_detail,
-                    provider="graph_api",
+            return EmailDetailsResponse(**cached_detail)
+    except Exception as e:
+        logger.warning(f"Failed to load email detail from cache: {e}")
+    return None
+
+
+def _cache_graph_email_detail(
+    credentials: AccountCredentials,
+    email_detail_response: EmailDetailsResponse
+) -> None:
+    """把邮件详情写入数据库缓存（写回队列）和内存LRU缓存"""
+    message_id = email_detail_response.message_id
+    # 缓存到 SQLite
+    try:
+        cache_write_behind.submit_email_detail(
+            credentials.email,
+            email_detail_response.dict(),
+            provider="graph_api",
+        )
+        hot_log.debug("detail.cache_queued", message_id=message_id)
+    except Exception as e:
+        logger.warning(f"Failed to cache email detail to database: {e}")
+    
+    # 缓存到内存LRU缓存
+    try:
+        cache_service.set_cached_email_detail(
+            credentials.email, 
+            message_id, 
+            email_detail_response.dict(),
+            provider="graph_api",
+        )
+    except Exception as e:
+        logger.warning(f"Failed to cache email detail to LRU cache: {e}")
+
+
+async def get_email_details_batch_graph(
+    credentials: AccountCredentials,
+    message_ids: List[str],
+    skip_cache: bool = False,
+    body_format: str = GRAPH_BODY_FORMAT_HTML,
+    unique_body: bool = False,
+) -> Dict[str, EmailDetailsResponse]:
+    """
+    使用 Graph $batch 批量获取邮件详情（每 20 封邮件一次 HTTP 请求）
+    
+    Args:
+        credentials: 账户凭证
+        message_ids: 邮件ID列表
+        skip_cache: 是否跳过缓存
+        body_format: 正文格式，需要渲染时用 html，只做验证码识别/预览时用 text
+        unique_body: 是否只取 uniqueBody（不含引用的历史邮件）
+        
+    Returns:
+        {message_id: EmailDetailsResponse}，获取失败的邮件不包含在结果中
+    """
+    compact_provider = _graph_compact_detail_cache_provider(body_format, unique_body)
+    details: Dict[str, EmailDetailsResponse] = {}
+    missing: List[str] = []
+    for message_id in dict.fromkeys(message_ids):
+        cached = None
+        if not skip_cache:
+            if compact_provider:
+                cached_detail = cache_service.get_cached_email_detail(
+                    credentials.email, message_id, provider=compact_provider
                 )
-                return EmailDetailsResponse(**cached_detail)
-        except Exception as e:
-            logger.warning(f"Failed to load email detail from cache: {e}")
+                cached = EmailDetailsResponse(**cached_detail) if cached_detail else None
+            # 已缓存的完整详情同样可以满足精简格式的请求
+            if cached is None:
+                cached = _get_cached_graph_email_detail(credentials, message_id)
+        if cached is not None:
+            details[message_id] = cached
+        else:
+            missing.append(message_id)
+    
+    if not missing:
+        return details
+    
+    select_fields, request_headers = _graph_detail_request_options(body_format, unique_body)
+    sub_requests = []
+    for message_id in missing:
+        sub_request = {"method": "GET", "url": f"/me/messages/{message_id}?$select={select_fields}"}
+        if request_headers:
+            sub_request["headers"] = request_headers
+        sub_requests.append(sub_request)
+    sub_responses = await graph_batch.execute(
+        credentials,
+        sub_requests,
+        timeout=httpx.Timeout(60.0, connect=30.0),
+    )
+    for message_id, sub_response in zip(missing, sub_responses):
+        if sub_response.get("status") != 200:
+            logger.warning(
+                f"Failed to fetch email detail {message_id} via Graph batch for {credentials.email}: "
+                f"status {sub_response.get('status')}"
+            )
+            continue
+        detail = _graph_message_to_email_detail(credentials, sub_response.get("body") or {}, message_id)
+        if compact_provider:
+            cache_service.set_cached_email_detail(
+                credentials.email, message_id, detail.dict(), provider=compact_provider
+            )
+        else:
+            _cache_graph_email_detail(credentials, detail)
+        details[message_id] = detail
+    
+    hot_log.info(
+        "detail.batch_fetched",
+        email=credentials.email,
+        fetched=len(details),
+        requested=len(message_ids),
+        via_batch=len(missing),
+        body_format=body_format,
+        unique_body=unique_body,
+    )
+    return details
+
+
+async def get_email_details_graph(
+    credentials: AccountCredentials,
+    message_id: str,
+    skip_cache: bool = False,
+) -> EmailDetailsResponse:
+    """
+    使用 Graph API 获取邮件详情
+    
+    Args:
+        credentials: 账户凭证
+        message_id: 邮件ID
+        
+    Returns:
+        EmailDetailsResponse: 邮件详情
+    """
+    if not skip_cache:
+        cached_detail = _get_cached_graph_email_detail(credentials, message_id)
+        if cached_detail is not None:
+            return cached_detail
     
     access_token = await get_graph_access_token(credentials)
     
@@ -1209,18 +1631,19 @@ async def get_email_details_graph(
     try:
         # 增加超时时间，并添加重试机制
         timeout = httpx.Timeout(60.0, connect=30.0)  # 总超时60秒，连接超时30秒
-        async with httpx.AsyncClient(timeout=timeout) as client:
+        async with http_clients.client(GRAPH_CLIENT) as client:
             url = f"{GRAPH_API_BASE_URL}/me/messages/{message_id}"
-            params = {
-                "$select": "id,subject,from,toRecipients,receivedDateTime,body,bodyPreview"
-            }
+            params = {"$select": GRAPH_DETAIL_SELECT_FIELDS}
             
             # 添加重试机制
             max_retries = 2
             last_error = None
             for attempt in range(max_retries + 1):
                 try:
-                    response = await client.get(url, headers=headers, params=params)
+                    response = await graph_throttle.request(
+                        client, "GET", url, mailbox=credentials.email, headers=headers, params=params,
+                        timeout=timeout,
+                    )
                     response.raise_for_status()
                     break  # 成功，退出重试循环
                 except (httpx.ConnectError, httpx.TimeoutException) as e:
@@ -1234,92 +1657,8 @@ async def get_email_details_graph(
                     else:
                         raise  # 最后一次尝试失败，抛出异常
             
-            email = response.json()
-            
-            # 提取信息
-            from_data = email.get("from", {}).get("emailAddress", {})
-            from_email = from_data.get("address", "(Unknown Sender)")
-            
-            to_recipients = email.get("toRecipients", [])
-            to_email = ", ".join([r.get("emailAddress", {}).get("address", "") for r in to_recipients])
-            
-            subject = email.get("subject", "(No Subject)")
-            
-            # 获取邮件正文
-            body_data = email.get("body", {})
-            body_content = body_data.get("content", "")
-            body_type = body_data.get("contentType", "text")
-            
-            body_plain = None
-            body_html = None
-            
-            if body_type.lower() == "html":
-                body_html = body_content
-                body_plain = email.get("bodyPreview", "")
-            else:
-                body_plain = body_content
-            
-            # 格式化日期
-            date_str = email.get("receivedDateTime", "")
-            try:
-                date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                formatted_date = date_obj.isoformat()
-            except Exception:
-                formatted_date = datetime.now().isoformat()
-            
-            verification_code = None
-            try:
-                detection = detect_verification_code_with_rules(
-                    email_account=credentials.email,
-                    message_id=message_id,
-                    from_email=from_email,
-                    subject=subject,
-                    body_plain=body_plain or "",
-                    body_html=body_html or "",
-                    body_preview=email.get("bodyPreview", "") or "",
-                    source="runtime",
-                    page_source="detail",
-                    persist_record=True,
-                )
-                if detection.get("code"):
-                    verification_code = detection["code"]
-                    logger.info(f"Detected verification code in email {message_id}: {verification_code}")
-            except Exception as e:
-                logger.warning(f"Failed to detect verification code: {e}")
-            
-            email_detail_response = EmailDetailsResponse(
-                message_id=message_id,
-                subject=subject,
-                from_email=from_email,
-                to_email=to_email,
-                date=formatted_date,
-                body_plain=body_plain,
-                body_html=body_html,
-                verification_code=verification_code
-            )
-            
-            # 缓存到 SQLite
-            try:
-                db.cache_email_detail(
-                    credentials.email,
-                    email_detail_response.dict(),
-                    provider="graph_api",
-                )
-                logger.info(f"Cached email detail to database for {message_id}")
-            except Exception as e:
-                logger.warning(f"Failed to cache email detail to database: {e}")
-            
-            # 缓存到内存LRU缓存
-            try:
-                cache_service.set_cached_email_detail(
-                    credentials.email, 
-                    message_id, 
-                    email_detail_response.dict(),
-                    provider="graph_api",
-                )
-            except Exception as e:
-                logger.warning(f"Failed to cache email detail to LRU cache: {e}")
-            
+            email_detail_response = _graph_message_to_email_detail(credentials, response.json(), message_id)
+            _cache_graph_email_detail(credentials, email_detail_response)
             return email_detail_response
             
     except httpx.ConnectError as e:
@@ -1333,7 +1672,12 @@ async def get_email_details_graph(
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
             raise HTTPException(status_code=404, detail="Email not found")
-        logger.error(f"HTTP error fetching email details via Graph API for {credentials.email}: Status {e.response.status_code}, Response: {e.response.text[:200]}")
+        hot_log.error(
+            "detail.http_error",
+            email=credentials.email,
+            status=e.response.status_code,
+            response_preview=lambda: e.response.text[:200],
+        )
         raise HTTPException(status_code=500, detail=f"Failed to fetch email details via Graph API: HTTP {e.response.status_code}")
     except Exception as e:
         logger.exception(f"Error fetching email details via Graph API for {credentials.email}: {e}")
@@ -1362,9 +1706,11 @@ async def delete_email_graph(
     }
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_clients.client(GRAPH_CLIENT) as client:
             url = f"{GRAPH_API_BASE_URL}/me/messages/{message_id}"
-            response = await client.delete(url, headers=headers)
+            response = await graph_throttle.request(
+                client, "DELETE", url, mailbox=credentials.email, headers=headers, timeout=30.0
+            )
             response.raise_for_status()
             
             logger.info(f"Successfully deleted email {message_id} via Graph API for {credentials.email}")
@@ -1433,7 +1779,7 @@ async def delete_emails_batch_graph(
         list_url = f"{GRAPH_API_BASE_URL}/me/mailFolders/{folder_name}/messages"
     
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with http_clients.client(GRAPH_CLIENT) as client:
             # 1. 获取邮件列表（仅获取ID）
             all_message_ids = []
             url = list_url
@@ -1445,7 +1791,9 @@ async def delete_emails_batch_graph(
                     "$top": 100  # 每次最多获取100封
                 }
                 
-                response = await client.get(url, headers=headers, params=params)
+                response = await graph_throttle.request(
+                    client, "GET", url, mailbox=credentials.email, headers=headers, params=params, timeout=60.0
+                )
                 response.raise_for_status()
                 
                 data = response.json()
@@ -1472,46 +1820,22 @@ async def delete_emails_batch_graph(
             
             logger.info(f"Found {len(all_message_ids)} emails to delete in folder {folder} for {credentials.email}")
             
-            # 2. 分批删除（Graph API 限制每次 batch 最多 20 个请求）
-            batch_size = 20
+            # 2. 批量删除（每个 $batch 最多 20 个子请求，多批并发发送，被限流的子请求单独重试）
+            sub_responses = await graph_batch.execute(
+                credentials,
+                [
+                    {"method": "DELETE", "url": f"/me/messages/{message_id}"}
+                    for message_id in all_message_ids
+                ],
+            )
             success_count = 0
             fail_count = 0
-            
-            for i in range(0, len(all_message_ids), batch_size):
-                batch_chunk = all_message_ids[i:i + batch_size]
-                
-                batch_payload = {
-                    "requests": []
-                }
-                
-                # 构建 batch 请求体
-                for index, message_id in enumerate(batch_chunk):
-                    batch_payload["requests"].append({
-                        "id": str(index),  # 请求的序号，不是邮件 ID
-                        "method": "DELETE",
-                        "url": f"/me/messages/{message_id}"
-                    })
-                
-                # 发送批量删除请求
-                batch_url = f"{GRAPH_API_BASE_URL}/$batch"
-                del_resp = await client.post(batch_url, headers=headers, json=batch_payload)
-                
-                if del_resp.status_code == 200:
-                    batch_result = del_resp.json()
-                    responses = batch_result.get('responses', [])
-                    
-                    for resp in responses:
-                        if resp.get('status') == 204:  # 204 No Content 表示删除成功
-                            success_count += 1
-                        else:
-                            fail_count += 1
-                            logger.warning(f"Failed to delete email: {resp}")
-                    
-                    logger.info(f"Processed batch {i // batch_size + 1}: {len(batch_chunk)} emails")
+            for resp in sub_responses:
+                if resp.get('status') == 204:  # 204 No Content 表示删除成功
+                    success_count += 1
                 else:
-                    # 整个批次失败
-                    fail_count += len(batch_chunk)
-                    logger.error(f"Batch delete failed: {del_resp.status_code}, {del_resp.text[:200]}")
+                    fail_count += 1
+                    logger.warning(f"Failed to delete email: {resp}")
             
             # 清除缓存
             try:
@@ -1592,9 +1916,11 @@ async def send_email_graph(
     }
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_clients.client(GRAPH_CLIENT) as client:
             url = f"{GRAPH_API_BASE_URL}/me/sendMail"
-            response = await client.post(url, headers=headers, json=message)
+            response = await graph_throttle.request(
+                client, "POST", url, mailbox=credentials.email, headers=headers, json=message, timeout=30.0
+            )
             response.raise_for_status()
             
             logger.info(f"Successfully sent email via Graph API from {credentials.email} to {to}")
@@ -0,0 +1,202 @@
+"""
+Graph JSON 批量请求模块
+
+把多个 Graph 子请求打包为 /$batch 请求（每批最多 20 个），在并发上限内同时发送多批，
+被限流（429/503）的子请求按 Retry-After 单独重试（期间同一邮箱的其他 Graph 请求一起退避），
+其余子请求的结果直接返回
+"""
+
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from config import (
+    GRAPH_API_BASE_URL,
+    GRAPH_BATCH_CONCURRENCY,
+    GRAPH_BATCH_MAX_REQUESTS,
+    GRAPH_BATCH_MAX_RETRIES,
+    GRAPH_BATCH_MAX_RETRY_AFTER,
+)
+from graph_throttle import THROTTLED_STATUS_CODES, graph_throttle, parse_retry_after
+from http_client_pool import GRAPH_CLIENT, http_clients
+from logger_config import logger
+from models import AccountCredentials
+
+
+class GraphBatchExecutor:
+    """Graph $batch 执行器"""
+
+    def __init__(
+        self,
+        max_requests: int = GRAPH_BATCH_MAX_REQUESTS,
+        concurrency: int = GRAPH_BATCH_CONCURRENCY,
+        max_retries: int = GRAPH_BATCH_MAX_RETRIES,
+        max_retry_after: float = GRAPH_BATCH_MAX_RETRY_AFTER,
+    ):
+        """
+        初始化批量执行器
+
+        Args:
+            max_requests: 每个 $batch 请求包含的最大子请求数（Graph 上限为 20）
+            concurrency: 同时发送的 $batch 请求数
+            max_retries: 被限流子请求的最大重试次数
+            max_retry_after: 单次重试的最长等待时间（秒）
+        """
+        self.max_requests = max_requests
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "sub_requests": 0, "throttled_retries": 0}
+
+    def _bump(self, **counts: int) -> None:
+        with self._lock:
+            for key, value in counts.items():
+                self._stats[key] += value
+
+    async def execute(
+        self,
+        credentials: AccountCredentials,
+        requests: List[Dict[str, Any]],
+        timeout: Any = 60.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        执行一组 Graph 子请求
+
+        Args:
+            credentials: 账户凭证
+            requests: 子请求列表，每项包含 method、url（相对路径，如 /me/messages/{id}），可选 headers、body
+            timeout: HTTP 超时配置
+
+        Returns:
+            与 requests 顺序一致的子响应列表，每项包含 status、headers、body
+        """
+        if not requests:
+            return []
+
+        from graph_api_service import get_graph_access_token
+
+        access_token = await get_graph_access_token(credentials)
+        auth = {"headers": {"Authorization": f"Bearer {access_token}"}, "refreshed": False}
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with http_clients.client(GRAPH_CLIENT) as client:
+
+            async def run_chunk(indexes: List[int]) -> None:
+                async with semaphore:
+                    await self._run_chunk(client, credentials, auth, requests, indexes, results, timeout)
+
+            await asyncio.gather(*(
+                run_chunk(list(range(start, min(start + self.max_requests, len(requests)))))
+                for start in range(0, len(requests), self.max_requests)
+            ))
+
+        return results
+
+    async def _run_chunk(
+        self,
+        client: httpx.AsyncClient,
+        credentials: AccountCredentials,
+        auth: Dict[str, Any],
+        requests: List[Dict[str, Any]],
+        indexes: List[int],
+        results: List[Optional[Dict[str, Any]]],
+        timeout: Any,
+    ) -> None:
+        pending = indexes
+        attempt = 0
+        while pending:
+            sub_responses = await self._post_batch(client, credentials, auth, requests, pending, timeout)
+            throttled: List[int] = []
+            wait_seconds = 0.0
+            for index in pending:
+                sub_response = sub_responses.get(index) or {"status": 500, "headers": {}, "body": None}
+                results[index] = sub_response
+                if sub_response.get("status") in THROTTLED_STATUS_CODES and attempt < self.max_retries:
+                    throttled.append(index)
+                    wait_seconds = max(
+                        wait_seconds,
+                        graph_throttle.compute_backoff(attempt, parse_retry_after(sub_response.get("headers"))),
+                    )
+            if not throttled:
+                return
+            attempt += 1
+            self._bump(throttled_retries=len(throttled))
+            wait_seconds = min(wait_seconds, self.max_retry_after)
+            logger.warning(
+                f"Graph batch throttled {len(throttled)} sub-requests for {credentials.email}, "
+                f"retrying in {wait_seconds:.1f}s (attempt {attempt}/{self.max_retries})"
+            )
+            # 由限流层让该邮箱的后续请求（包括本次重试）一起等待
+            graph_throttle.note_throttled(credentials.email, wait_seconds)
+            pending = throttled
+
+    async def _post_batch(
+        self,
+        client: httpx.AsyncClient,
+        credentials: AccountCredentials,
+        auth: Dict[str, Any],
+        requests: List[Dict[str, Any]],
+        indexes: List[int],
+        timeout: Any,
+    ) -> Dict[int, Dict[str, Any]]:
+        """发送一个 $batch 请求，返回 {子请求序号: 子响应}"""
+        payload = {
+            "requests": [
+                {"id": str(index), **requests[index]}
+                for index in indexes
+            ]
+        }
+        url = f"{GRAPH_API_BASE_URL}/$batch"
+        while True:
+            response = await graph_throttle.request(
+                client, "POST", url, mailbox=credentials.email, headers=auth["headers"], json=payload,
+                timeout=timeout,
+            )
+            if response.status_code == 401 and not auth["refreshed"]:
+                logger.warning(
+                    f"Received 401 Unauthorized for {credentials.email} on $batch, "
+                    f"clearing cache and refreshing token..."
+                )
+                from graph_api_service import get_graph_access_token
+                from oauth_service import clear_cached_access_token
+
+                auth["refreshed"] = True
+                await clear_cached_access_token(credentials.email)
+                access_token = await get_graph_access_token(credentials)
+                auth["headers"] = {"Authorization": f"Bearer {access_token}"}
+                continue
+            break
+
+        self._bump(batches=1, sub_requests=len(indexes))
+        if response.status_code != 200:
+            # 整个批次失败：所有子请求继承外层状态码（429/503 时按子请求重试）
+            logger.error(f"Graph batch failed for {credentials.email}: {response.status_code}, {response.text[:200]}")
+            headers = dict(response.headers)
+            return {
+                index: {"status": response.status_code, "headers": headers, "body": None}
+                for index in indexes
+            }
+
+        sub_responses: Dict[int, Dict[str, Any]] = {}
+        for sub_response in response.json().get("responses", []):
+            try:
+                sub_responses[int(sub_response.get("id"))] = sub_response
+            except (TypeError, ValueError):
+                continue
+        return sub_responses
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_requests": self.max_requests,
+                "concurrency": self.concurrency,
+                **self._stats,
+            }
+
+
+# 全局实例
+graph_batch = GraphBatchExecutor()
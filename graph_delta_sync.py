@@ -0,0 +1,254 @@
+"""
+Graph 增量同步模块
+
+基于 /me/mailFolders/{folder}/messages/delta 为使用 Graph API 的账户镜像邮件列表：
+
+- 每个账户每个文件夹保存一个链接（首轮同步未完成时为 @odata.nextLink，完成后为 @odata.deltaLink），
+  中断后从保存的链接继续
+- 新增/变更的邮件写入 emails_cache 并删除旧的详情缓存，被删除或移出文件夹的邮件从两张缓存表中删除，
+  同时清除该账户的内存列表/详情缓存
+- delta 链接失效（410 Gone）时清除状态，下一页从全量同步重新开始
+
+镜像完成后列表接口直接命中本地缓存，两次变更之间上游请求只剩一次空的 delta 查询。
+"""
+
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+import cache_service
+import database as db
+from config import (
+    GRAPH_API_BASE_URL,
+    GRAPH_DELTA_SYNC_CONCURRENCY,
+    GRAPH_DELTA_SYNC_FOLDERS,
+    GRAPH_DELTA_SYNC_INTERVAL,
+    GRAPH_DELTA_SYNC_MAX_PAGES_PER_RUN,
+    GRAPH_DELTA_SYNC_PAGE_SIZE,
+)
+from http_client_pool import GRAPH_CLIENT, http_clients
+from logger_config import logger
+from models import AccountCredentials
+
+GRAPH_PROVIDER = "graph_api"
+
+
+class GraphDeltaSyncEngine:
+    """Graph delta 增量同步引擎"""
+
+    def __init__(
+        self,
+        folders=GRAPH_DELTA_SYNC_FOLDERS,
+        page_size: int = GRAPH_DELTA_SYNC_PAGE_SIZE,
+        max_pages_per_run: int = GRAPH_DELTA_SYNC_MAX_PAGES_PER_RUN,
+    ):
+        self.folders = tuple(folders)
+        self.page_size = page_size
+        self.max_pages_per_run = max_pages_per_run
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "runs": 0,
+            "folders_synced": 0,
+            "pages": 0,
+            "upserted": 0,
+            "removed": 0,
+            "resets": 0,
+            "errors": 0,
+            "last_run_at": None,
+        }
+
+    def _bump(self, **counts: int) -> None:
+        with self._lock:
+            for key, value in counts.items():
+                self._stats[key] += value
+
+    def _initial_url(self, folder: str) -> str:
+        from graph_api_service import GRAPH_LIST_SELECT_FIELDS
+
+        return (
+            f"{GRAPH_API_BASE_URL}/me/mailFolders/{folder}/messages/delta"
+            f"?$select={GRAPH_LIST_SELECT_FIELDS}"
+        )
+
+    def _apply_page(
+        self,
+        credentials: AccountCredentials,
+        folder: str,
+        messages: List[Dict[str, Any]],
+    ) -> Dict[str, int]:
+        """在线程池中把一页变更写入数据库缓存"""
+        from graph_api_service import _graph_message_to_email_item
+
+        changed: List[Dict[str, Any]] = []
+        removed: List[str] = []
+        for message in messages:
+            message_id = message.get("id")
+            if not message_id:
+                continue
+            if "@removed" in message:
+                removed.append(message_id)
+            else:
+                changed.append(_graph_message_to_email_item(credentials, message, folder).dict())
+        return db.apply_email_cache_delta(credentials.email, changed, removed, provider=GRAPH_PROVIDER)
+
+    async def sync_folder(self, credentials: AccountCredentials, folder: str) -> Dict[str, Any]:
+        """
+        同步一个文件夹（从保存的链接继续，最多处理 max_pages_per_run 页）
+
+        Args:
+            credentials: 账户凭证
+            folder: 文件夹名称
+
+        Returns:
+            {'pages', 'upserted', 'removed', 'complete'}
+        """
+        from graph_api_service import _get_graph_list_page, get_graph_access_token
+
+        state = await asyncio.to_thread(db.get_graph_delta_state, credentials.email, folder)
+        url = state["delta_link"] if state else self._initial_url(folder)
+        is_complete = bool(state and state["is_complete"])
+
+        access_token = await get_graph_access_token(credentials)
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Prefer": f"odata.maxpagesize={self.page_size}",
+        }
+        result = {"pages": 0, "upserted": 0, "removed": 0, "complete": is_complete}
+        reset = False
+
+        timeout = httpx.Timeout(60.0, connect=30.0)
+        async with http_clients.client(GRAPH_CLIENT) as client:
+            while result["pages"] < self.max_pages_per_run:
+                try:
+                    data = await _get_graph_list_page(client, credentials, headers, url, None, timeout)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 410 or reset:
+                        raise
+                    # delta 链接过期或同步状态丢失，从全量同步重新开始
+                    logger.warning(f"Delta link expired for {credentials.email}/{folder}, restarting full sync")
+                    await asyncio.to_thread(db.delete_graph_delta_state, credentials.email, folder)
+                    url = self._initial_url(folder)
+                    is_complete = False
+                    reset = True
+                    self._bump(resets=1)
+                    continue
+
+                applied = await asyncio.to_thread(
+                    self._apply_page, credentials, folder, data.get("value", [])
+                )
+                result["pages"] += 1
+                result["upserted"] += applied["upserted"]
+                result["removed"] += applied["removed"]
+
+                next_link: Optional[str] = data.get("@odata.nextLink")
+                delta_link: Optional[str] = data.get("@odata.deltaLink")
+                if next_link:
+                    url = next_link
+                    await asyncio.to_thread(
+                        db.save_graph_delta_state, credentials.email, folder, next_link, is_complete
+                    )
+                    continue
+                if delta_link:
+                    is_complete = True
+                    await asyncio.to_thread(
+                        db.save_graph_delta_state, credentials.email, folder, delta_link, True
+                    )
+                break
+
+        if result["upserted"] or result["removed"]:
+            cache_service.clear_email_cache(credentials.email)
+        result["complete"] = is_complete
+        self._bump(
+            folders_synced=1,
+            pages=result["pages"],
+            upserted=result["upserted"],
+            removed=result["removed"],
+        )
+        logger.info(
+            f"Delta sync {credentials.email}/{folder}: {result['pages']} pages, "
+            f"{result['upserted']} upserted, {result['removed']} removed, complete={is_complete}"
+        )
+        return result
+
+    async def sync_account(self, credentials: AccountCredentials) -> Dict[str, Dict[str, Any]]:
+        """同步账户的所有配置文件夹"""
+        results = {}
+        for folder in self.folders:
+            results[folder] = await self.sync_folder(credentials, folder)
+        return results
+
+    async def run_once(self, concurrency: int = GRAPH_DELTA_SYNC_CONCURRENCY) -> Dict[str, int]:
+        """对所有使用 Graph API 的账户执行一轮增量同步"""
+        from account_service import get_account_credentials
+
+        accounts = await asyncio.to_thread(_load_graph_account_emails)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def sync_one(email: str) -> bool:
+            async with semaphore:
+                try:
+                    credentials = await get_account_credentials(email)
+                    await self.sync_account(credentials)
+                    return True
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[{email}] Delta sync failed: {e}")
+                    self._bump(errors=1)
+                    return False
+
+        results = await asyncio.gather(*(sync_one(email) for email in accounts))
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["last_run_at"] = asyncio.get_running_loop().time()
+        synced = sum(1 for ok in results if ok)
+        return {"accounts": len(accounts), "synced": synced, "failed": len(accounts) - synced}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"folders": list(self.folders), **self._stats}
+
+
+def _load_graph_account_emails(page_size: int = 1000) -> List[str]:
+    """分页加载使用 Graph API 的账户邮箱"""
+    emails: List[str] = []
+    page = 1
+    while True:
+        accounts, total = db.get_all_accounts_db(page, page_size)
+        if not accounts:
+            break
+        emails.extend(
+            account["email"] for account in accounts
+            if account.get("api_method") in ("graph", "graph_api")
+        )
+        if page * page_size >= total:
+            break
+        page += 1
+    return emails
+
+
+# 全局实例
+graph_delta_sync = GraphDeltaSyncEngine()
+
+
+async def graph_delta_sync_background_task():
+    """后台 Graph 增量同步任务：按固定间隔对所有 Graph 账户执行一轮增量同步"""
+    logger.info(f"Graph delta sync background task started (interval: {GRAPH_DELTA_SYNC_INTERVAL}s)")
+    try:
+        while True:
+            try:
+                summary = await graph_delta_sync.run_once()
+                logger.info(
+                    f"Graph delta sync completed: {summary['synced']}/{summary['accounts']} accounts, "
+                    f"{summary['failed']} failed"
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error in Graph delta sync background task")
+            await asyncio.sleep(GRAPH_DELTA_SYNC_INTERVAL)
+    except asyncio.CancelledError:
+        logger.info("Graph delta sync background task stopped")
+        raise
@@ -0,0 +1,567 @@
+"""
+Graph 变更通知模块
+
+为使用 Graph API 的账户订阅邮件文件夹的变更通知（/subscriptions），收到通知后按账户精确失效缓存：
+
+- 每个账户每个文件夹一个订阅，后台任务定期创建缺失的订阅、续期即将过期的订阅
+- /graph/notifications 收到通知后校验 clientState，立即返回 202，在后台处理：
+  删除的邮件从缓存中移除；新增/变更的邮件通过 $batch 预取列表字段写入缓存（或直接清除该账户的 Graph 列表缓存），
+  同时清除该账户的内存列表/详情缓存和分享页缓存
+- 生命周期通知：reauthorizationRequired 时续期，subscriptionRemoved 时删除记录等待下一轮重建，
+  missed 时清除该账户的 Graph 列表缓存
+
+有完整订阅的账户由推送失效缓存，读取范围在订阅文件夹内的分享页列表缓存时间从 10 秒延长到数分钟
+（读取整个邮箱的结果收不到其他文件夹的推送，仍使用短缓存）。
+LocalGraphNotifier 按 Graph 的通知格式为已保存的订阅生成通知，供测试和本地开发替代真实推送。
+"""
+
+import asyncio
+import secrets
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+import cache_service
+import database as db
+from config import (
+    GRAPH_API_BASE_URL,
+    GRAPH_NOTIFICATION_PREFETCH,
+    GRAPH_NOTIFICATION_URL,
+    GRAPH_SUBSCRIPTION_CHECK_INTERVAL,
+    GRAPH_SUBSCRIPTION_CONCURRENCY,
+    GRAPH_SUBSCRIPTION_FOLDERS,
+    GRAPH_SUBSCRIPTION_LIFETIME_MINUTES,
+    GRAPH_SUBSCRIPTION_RENEW_BEFORE,
+)
+from graph_batch import graph_batch
+from graph_throttle import graph_throttle
+from http_client_pool import GRAPH_CLIENT, http_clients
+from logger_config import logger
+from models import AccountCredentials
+
+GRAPH_PROVIDER = "graph_api"
+# 订阅的变更类型
+SUBSCRIPTION_CHANGE_TYPES = "created,updated,deleted"
+
+
+def _format_expiration(dt: datetime) -> str:
+    """格式化为 UTC ISO 时间（订阅记录中统一使用该格式，可直接按字符串比较）"""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_expiration(value: Any) -> Optional[datetime]:
+    """解析 Graph 返回或数据库中保存的过期时间"""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if not value:
+        return None
+    text = str(value).replace("Z", "+00:00")
+    # Graph 返回 7 位小数秒，fromisoformat 只接受 6 位
+    if "." in text:
+        head, _, tail = text.partition(".")
+        digits = "".join(ch for ch in tail if ch.isdigit())
+        text = f"{head}.{digits[:6]}{tail[len(digits):]}"
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _folder_resource(folder: str) -> str:
+    return f"me/mailFolders('{folder}')/messages"
+
+
+class GraphSubscriptionManager:
+    """Graph 变更通知订阅管理与通知处理"""
+
+    def __init__(
+        self,
+        notification_url: str = GRAPH_NOTIFICATION_URL,
+        folders: Iterable[str] = GRAPH_SUBSCRIPTION_FOLDERS,
+        lifetime_minutes: int = GRAPH_SUBSCRIPTION_LIFETIME_MINUTES,
+        renew_before: float = GRAPH_SUBSCRIPTION_RENEW_BEFORE,
+        prefetch: bool = GRAPH_NOTIFICATION_PREFETCH,
+    ):
+        """
+        初始化订阅管理器
+
+        Args:
+            notification_url: Graph 推送通知的回调地址（同时用作生命周期通知地址）
+            folders: 订阅的文件夹
+            lifetime_minutes: 订阅有效期（分钟）
+            renew_before: 距离过期不足该时间（秒）时续期
+            prefetch: 收到通知后是否预取变更的邮件
+        """
+        self.notification_url = notification_url
+        self.folders = tuple(folders)
+        self.lifetime_minutes = lifetime_minutes
+        self.renew_before = renew_before
+        self.prefetch = prefetch
+        self._lock = threading.Lock()
+        self._pending_tasks: Set[asyncio.Task] = set()
+        self._stats: Dict[str, Any] = {
+            "created": 0,
+            "renewed": 0,
+            "subscription_errors": 0,
+            "notifications": 0,
+            "rejected": 0,
+            "lifecycle_events": 0,
+            "prefetched": 0,
+            "removed": 0,
+            "invalidations": 0,
+        }
+
+    def _bump(self, **counts: int) -> None:
+        with self._lock:
+            for key, value in counts.items():
+                self._stats[key] += value
+
+    # ------------------------------------------------------------------
+    # 订阅创建与续期
+    # ------------------------------------------------------------------
+
+    def _new_expiration(self) -> str:
+        return _format_expiration(datetime.now(timezone.utc) + timedelta(minutes=self.lifetime_minutes))
+
+    async def _send(
+        self,
+        credentials: AccountCredentials,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> httpx.Response:
+        """发送一个 /subscriptions 请求（经过限流层，401 时刷新一次 token）"""
+        from graph_api_service import get_graph_access_token
+
+        url = f"{GRAPH_API_BASE_URL}{path}"
+        kwargs: Dict[str, Any] = {"timeout": httpx.Timeout(30.0, connect=10.0)}
+        if payload is not None:
+            kwargs["json"] = payload
+        async with http_clients.client(GRAPH_CLIENT) as client:
+            for attempt in range(2):
+                access_token = await get_graph_access_token(credentials)
+                response = await graph_throttle.request(
+                    client,
+                    method,
+                    url,
+                    mailbox=credentials.email,
+                    headers={"Authorization": f"Bearer {access_token}"},
+                    **kwargs,
+                )
+                if response.status_code != 401 or attempt:
+                    return response
+                from oauth_service import clear_cached_access_token
+
+                await clear_cached_access_token(credentials.email)
+        return response
+
+    async def create_subscription(self, credentials: AccountCredentials, folder: str) -> Dict[str, Any]:
+        """
+        为账户的一个文件夹创建订阅并保存
+
+        Returns:
+            保存的订阅记录
+        """
+        client_state = secrets.token_urlsafe(32)
+        response = await self._send(credentials, "POST", "/subscriptions", {
+            "changeType": SUBSCRIPTION_CHANGE_TYPES,
+            "notificationUrl": self.notification_url,
+            "lifecycleNotificationUrl": self.notification_url,
+            "resource": _folder_resource(folder),
+            "expirationDateTime": self._new_expiration(),
+            "clientState": client_state,
+            "latestSupportedTlsVersion": "v1_2",
+        })
+        response.raise_for_status()
+        data = response.json()
+        expiration = _parse_expiration(data.get("expirationDateTime"))
+        record = {
+            "subscription_id": data["id"],
+            "email_account": credentials.email,
+            "folder": folder,
+            "client_state": client_state,
+            "expiration_at": _format_expiration(expiration) if expiration else self._new_expiration(),
+        }
+        await asyncio.to_thread(
+            db.save_graph_subscription,
+            record["subscription_id"],
+            record["email_account"],
+            record["folder"],
+            record["client_state"],
+            record["expiration_at"],
+        )
+        self._bump(created=1)
+        logger.info(f"Created Graph subscription {record['subscription_id']} for {credentials.email}/{folder}")
+        return record
+
+    async def renew_subscription(self, credentials: AccountCredentials, subscription: Dict[str, Any]) -> bool:
+        """
+        续期订阅
+
+        Returns:
+            是否续期成功；订阅在 Graph 端已不存在时删除本地记录并返回 False
+        """
+        expiration_at = self._new_expiration()
+        response = await self._send(
+            credentials,
+            "PATCH",
+            f"/subscriptions/{subscription['subscription_id']}",
+            {"expirationDateTime": expiration_at},
+        )
+        if response.status_code == 404:
+            logger.warning(
+                f"Graph subscription {subscription['subscription_id']} for {credentials.email} no longer exists"
+            )
+            await asyncio.to_thread(db.delete_graph_subscription, subscription["subscription_id"])
+            return False
+        response.raise_for_status()
+        expiration = _parse_expiration(response.json().get("expirationDateTime"))
+        await asyncio.to_thread(
+            db.update_graph_subscription_expiration,
+            subscription["subscription_id"],
+            _format_expiration(expiration) if expiration else expiration_at,
+        )
+        self._bump(renewed=1)
+        return True
+
+    async def ensure_account(self, credentials: AccountCredentials) -> Dict[str, str]:
+        """
+        确保账户的每个文件夹都有有效订阅（缺失时创建，即将过期时续期）
+
+        Returns:
+            {文件夹: 'created' / 'renewed' / 'ok'}
+        """
+        existing = {
+            record["folder"]: record
+            for record in await asyncio.to_thread(db.list_graph_subscriptions, credentials.email)
+        }
+        renew_deadline = datetime.now(timezone.utc) + timedelta(seconds=self.renew_before)
+        results: Dict[str, str] = {}
+        for folder in self.folders:
+            record = existing.get(folder)
+            if record is not None:
+                expiration = _parse_expiration(record.get("expiration_at"))
+                if expiration is not None and expiration > renew_deadline:
+                    results[folder] = "ok"
+                    continue
+                if expiration is not None and expiration > datetime.now(timezone.utc):
+                    if await self.renew_subscription(credentials, record):
+                        results[folder] = "renewed"
+                        continue
+                else:
+                    await asyncio.to_thread(db.delete_graph_subscription, record["subscription_id"])
+            await self.create_subscription(credentials, folder)
+            results[folder] = "created"
+        return results
+
+    async def delete_account_subscriptions(self, credentials: AccountCredentials) -> int:
+        """删除账户在 Graph 端的所有订阅和本地记录"""
+        records = await asyncio.to_thread(db.list_graph_subscriptions, credentials.email)
+        for record in records:
+            try:
+                await self._send(credentials, "DELETE", f"/subscriptions/{record['subscription_id']}")
+            except Exception as e:
+                logger.warning(f"Failed to delete Graph subscription {record['subscription_id']}: {e}")
+        await asyncio.to_thread(db.delete_graph_subscriptions_for_account, credentials.email)
+        await asyncio.to_thread(self.refresh_push_accounts)
+        return len(records)
+
+    def refresh_push_accounts(self) -> Set[str]:
+        """重新计算所有文件夹都有未过期订阅的账户，并通知缓存层"""
+        folder_counts = db.list_graph_subscription_folder_counts(_format_expiration(datetime.now(timezone.utc)))
+        accounts = {email for email, count in folder_counts.items() if count >= len(self.folders)}
+        cache_service.set_push_invalidated_accounts(accounts)
+        return accounts
+
+    async def run_once(self, concurrency: int = GRAPH_SUBSCRIPTION_CONCURRENCY) -> Dict[str, int]:
+        """为所有使用 Graph API 的账户创建/续期订阅"""
+        from account_service import get_account_credentials
+        from graph_delta_sync import _load_graph_account_emails
+
+        accounts = await asyncio.to_thread(_load_graph_account_emails)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def ensure_one(email: str) -> bool:
+            async with semaphore:
+                try:
+                    credentials = await get_account_credentials(email)
+                    await self.ensure_account(credentials)
+                    return True
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[{email}] Graph subscription maintenance failed: {e}")
+                    self._bump(subscription_errors=1)
+                    return False
+
+        results = await asyncio.gather(*(ensure_one(email) for email in accounts))
+        push_accounts = await asyncio.to_thread(self.refresh_push_accounts)
+        ok = sum(1 for result in results if result)
+        return {"accounts": len(accounts), "ok": ok, "failed": len(accounts) - ok, "push_accounts": len(push_accounts)}
+
+    # ------------------------------------------------------------------
+    # 通知处理
+    # ------------------------------------------------------------------
+
+    def validate_notifications(
+        self, payload: Dict[str, Any]
+    ) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any]]], int]:
+        """
+        校验通知：订阅必须存在且 clientState 一致
+
+        Returns:
+            ([(通知, 订阅记录)], 被拒绝的通知数)
+        """
+        accepted: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        rejected = 0
+        subscriptions: Dict[str, Optional[Dict[str, Any]]] = {}
+        for notification in payload.get("value") or []:
+            subscription_id = notification.get("subscriptionId")
+            if subscription_id not in subscriptions:
+                subscriptions[subscription_id] = db.get_graph_subscription(subscription_id) if subscription_id else None
+            subscription = subscriptions[subscription_id]
+            if subscription is None or not secrets.compare_digest(
+                str(notification.get("clientState") or ""), subscription["client_state"]
+            ):
+                rejected += 1
+                continue
+            accepted.append((notification, subscription))
+        self._bump(notifications=len(accepted), rejected=rejected)
+        if rejected:
+            logger.warning(f"Rejected {rejected} Graph notifications with unknown subscription or clientState")
+        return accepted, rejected
+
+    async def receive(self, payload: Dict[str, Any]) -> Dict[str, int]:
+        """
+        接收一批通知：同步校验后在后台处理（Graph 要求 3 秒内响应）
+
+        Returns:
+            {'accepted', 'rejected'}
+        """
+        accepted, rejected = await asyncio.to_thread(self.validate_notifications, payload)
+        if accepted:
+            task = asyncio.create_task(self.process_notifications(accepted))
+            self._pending_tasks.add(task)
+            task.add_done_callback(self._pending_tasks.discard)
+        return {"accepted": len(accepted), "rejected": rejected}
+
+    async def wait_idle(self) -> None:
+        """等待已接收的通知处理完成"""
+        while self._pending_tasks:
+            await asyncio.gather(*list(self._pending_tasks), return_exceptions=True)
+
+    async def process_notifications(self, accepted: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Dict[str, int]:
+        """按账户和文件夹汇总通知，失效或预取受影响的缓存"""
+        from account_service import get_account_credentials
+
+        changes: Dict[Tuple[str, str], Dict[str, Set[str]]] = defaultdict(lambda: {"changed": set(), "removed": set()})
+        lifecycle: List[Tuple[str, Dict[str, Any]]] = []
+        for notification, subscription in accepted:
+            key = (subscription["email_account"], subscription["folder"])
+            event = notification.get("lifecycleEvent")
+            if event:
+                lifecycle.append((event, subscription))
+                continue
+            message_id = (notification.get("resourceData") or {}).get("id")
+            if not message_id:
+                continue
+            bucket = "removed" if notification.get("changeType") == "deleted" else "changed"
+            changes[key][bucket].add(message_id)
+        # 同一封邮件先变更后删除时只按删除处理
+        for change in changes.values():
+            change["changed"] -= change["removed"]
+
+        summary = {"accounts": 0, "prefetched": 0, "removed": 0}
+        affected_accounts: Set[str] = set()
+        for (email, folder), change in changes.items():
+            try:
+                credentials = await get_account_credentials(email)
+                applied = await self._apply_changes(credentials, folder, change["changed"], change["removed"])
+                summary["prefetched"] += applied["upserted"]
+                summary["removed"] += applied["removed"]
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{email}] Failed to apply Graph notifications for {folder}: {e}")
+                await asyncio.to_thread(db.clear_email_cache_db, email, GRAPH_PROVIDER)
+            affected_accounts.add(email)
+
+        for event, subscription in lifecycle:
+            self._bump(lifecycle_events=1)
+            await self._handle_lifecycle_event(event, subscription)
+            affected_accounts.add(subscription["email_account"])
+
+        for email in affected_accounts:
+            cache_service.clear_email_cache(email)
+            cache_service.clear_share_email_cache_for_account(email)
+        summary["accounts"] = len(affected_accounts)
+        self._bump(prefetched=summary["prefetched"], removed=summary["removed"], invalidations=len(affected_accounts))
+        return summary
+
+    async def _apply_changes(
+        self,
+        credentials: AccountCredentials,
+        folder: str,
+        changed_ids: Set[str],
+        removed_ids: Set[str],
+    ) -> Dict[str, int]:
+        """预取变更的邮件写入缓存，删除已删除的邮件；不预取时清除该账户的 Graph 列表缓存"""
+        if not self.prefetch and changed_ids:
+            await asyncio.to_thread(db.clear_email_cache_db, credentials.email, GRAPH_PROVIDER)
+            return {"upserted": 0, "removed": len(removed_ids)}
+
+        from graph_api_service import GRAPH_LIST_SELECT_FIELDS, _graph_message_to_email_item
+
+        changed_items: List[Dict[str, Any]] = []
+        removed = set(removed_ids)
+        if changed_ids:
+            ordered_ids = sorted(changed_ids)
+            sub_responses = await graph_batch.execute(
+                credentials,
+                [
+                    {"method": "GET", "url": f"/me/messages/{message_id}?$select={GRAPH_LIST_SELECT_FIELDS}"}
+                    for message_id in ordered_ids
+                ],
+            )
+            for message_id, sub_response in zip(ordered_ids, sub_responses):
+                status = sub_response.get("status")
+                if status == 200:
+                    changed_items.append(
+                        _graph_message_to_email_item(credentials, sub_response.get("body") or {}, folder).dict()
+                    )
+                elif status == 404:
+                    # 邮件已被删除或移出文件夹
+                    removed.add(message_id)
+                else:
+                    raise RuntimeError(f"prefetch of {message_id} failed with status {status}")
+        return await asyncio.to_thread(
+            db.apply_email_cache_delta, credentials.email, changed_items, sorted(removed), GRAPH_PROVIDER
+        )
+
+    async def _handle_lifecycle_event(self, event: str, subscription: Dict[str, Any]) -> None:
+        """处理订阅生命周期通知"""
+        email = subscription["email_account"]
+        logger.info(f"Graph subscription lifecycle event '{event}' for {email}/{subscription['folder']}")
+        try:
+            if event == "reauthorizationRequired":
+                from account_service import get_account_credentials
+
+                credentials = await get_account_credentials(email)
+                await self.renew_subscription(credentials, subscription)
+            elif event == "subscriptionRemoved":
+                # 下一轮订阅维护时重新创建
+                await asyncio.to_thread(db.delete_graph_subscription, subscription["subscription_id"])
+                await asyncio.to_thread(self.refresh_push_accounts)
+            elif event == "missed":
+                # 有通知未送达，缓存可能已过期
+                await asyncio.to_thread(db.clear_email_cache_db, email, GRAPH_PROVIDER)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[{email}] Failed to handle Graph lifecycle event '{event}': {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "folders": list(self.folders),
+                "notification_url": self.notification_url,
+                "prefetch": self.prefetch,
+                "pending": len(self._pending_tasks),
+                **self._stats,
+            }
+
+
+class LocalGraphNotifier:
+    """
+    本地通知模拟器
+
+    按 Graph 的通知格式为已保存的订阅生成通知并投递（默认直接交给订阅管理器，
+    也可以传入把请求发到 /graph/notifications 的函数），用于测试和没有公网回调地址的本地开发。
+    """
+
+    def __init__(
+        self,
+        manager: Optional[GraphSubscriptionManager] = None,
+        deliver: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None,
+    ):
+        self.manager = manager or graph_subscriptions
+        self.deliver = deliver or self.manager.receive
+
+    @staticmethod
+    def build_payload(
+        subscription: Dict[str, Any],
+        change_type: str = "created",
+        message_ids: Iterable[str] = (),
+        lifecycle_event: Optional[str] = None,
+        client_state: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """生成一批 Graph 格式的通知"""
+        client_state = subscription["client_state"] if client_state is None else client_state
+        base = {
+            "subscriptionId": subscription["subscription_id"],
+            "subscriptionExpirationDateTime": subscription.get("expiration_at"),
+            "clientState": client_state,
+            "tenantId": "",
+        }
+        if lifecycle_event:
+            return {"value": [{**base, "lifecycleEvent": lifecycle_event}]}
+        return {
+            "value": [
+                {
+                    **base,
+                    "changeType": change_type,
+                    "resource": f"Users/me/Messages/{message_id}",
+                    "resourceData": {
+                        "@odata.type": "#Microsoft.Graph.Message",
+                        "@odata.id": f"Users/me/Messages/{message_id}",
+                        "id": message_id,
+                    },
+                }
+                for message_id in message_ids
+            ]
+        }
+
+    async def notify(
+        self,
+        email: str,
+        folder: str = "inbox",
+        change_type: str = "created",
+        message_ids: Iterable[str] = (),
+        lifecycle_event: Optional[str] = None,
+    ) -> Any:
+        """为账户文件夹的订阅投递一批通知"""
+        subscriptions = await asyncio.to_thread(db.list_graph_subscriptions, email)
+        subscription = next((record for record in subscriptions if record["folder"] == folder), None)
+        if subscription is None:
+            raise LookupError(f"No Graph subscription for {email}/{folder}")
+        payload = self.build_payload(subscription, change_type, message_ids, lifecycle_event)
+        return await self.deliver(payload)
+
+
+# 全局实例
+graph_subscriptions = GraphSubscriptionManager()
+
+
+async def graph_subscription_background_task():
+    """后台订阅维护任务：按固定间隔为所有 Graph 账户创建/续期变更通知订阅"""
+    logger.info(f"Graph subscription background task started (interval: {GRAPH_SUBSCRIPTION_CHECK_INTERVAL}s)")
+    try:
+        while True:
+            try:
+                summary = await graph_subscriptions.run_once()
+                logger.info(
+                    f"Graph subscriptions checked: {summary['ok']}/{summary['accounts']} accounts, "
+                    f"{summary['failed']} failed, {summary['push_accounts']} push-invalidated"
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error in Graph subscription background task")
+            await asyncio.sleep(GRAPH_SUBSCRIPTION_CHECK_INTERVAL)
+    except asyncio.CancelledError:
+        logger.info("Graph subscription background task stopped")
+        raise
@@ -0,0 +1,266 @@
+"""
+Graph 自适应限流模块
+
+所有 Graph 请求经过同一个限流层：
+- 全局令牌桶限制整体请求速率，批量任务不会瞬间打满上游
+- 每个邮箱一个并发信号量（Graph 对单个邮箱的并发请求数有限制）
+- 收到 429/503 时按 Retry-After（缺失时指数退避）加随机抖动等待后重试，
+  同时让该邮箱的其他请求一起等待，避免并发请求放大限流
+- 记录限流次数和退避时间等指标
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from config import (
+    GRAPH_THROTTLE_BASE_DELAY,
+    GRAPH_THROTTLE_BURST,
+    GRAPH_THROTTLE_MAILBOX_CONCURRENCY,
+    GRAPH_THROTTLE_MAX_DELAY,
+    GRAPH_THROTTLE_MAX_RETRIES,
+    GRAPH_THROTTLE_RATE,
+)
+from logger_config import logger
+
+# 需要退避重试的状态码
+THROTTLED_STATUS_CODES = {429, 503}
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """解析 Retry-After（秒数形式），无法解析时返回 None"""
+    if not headers:
+        return None
+    for key, value in headers.items():
+        if key.lower() == "retry-after":
+            try:
+                return max(0.0, float(value))
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class TokenBucket:
+    """令牌桶（只在锁内做计算，等待在锁外进行，可跨事件循环共享）"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """取一个令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self) -> float:
+        """获取一个令牌，返回实际等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        wait_seconds = self._reserve()
+        if wait_seconds > 0:
+            await asyncio.sleep(wait_seconds)
+        return wait_seconds
+
+
+class _MailboxState:
+    """单个邮箱在某个事件循环上的限流状态"""
+
+    __slots__ = ("semaphore", "active", "blocked_until")
+
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.blocked_until = 0.0
+
+
+class GraphThrottle:
+    """Graph 请求限流器"""
+
+    def __init__(
+        self,
+        mailbox_concurrency: int = GRAPH_THROTTLE_MAILBOX_CONCURRENCY,
+        rate: float = GRAPH_THROTTLE_RATE,
+        burst: float = GRAPH_THROTTLE_BURST,
+        max_retries: int = GRAPH_THROTTLE_MAX_RETRIES,
+        base_delay: float = GRAPH_THROTTLE_BASE_DELAY,
+        max_delay: float = GRAPH_THROTTLE_MAX_DELAY,
+    ):
+        """
+        初始化限流器
+
+        Args:
+            mailbox_concurrency: 单个邮箱的最大并发请求数
+            rate: 全局令牌桶速率（请求/秒，<=0 表示不限速）
+            burst: 全局令牌桶容量（允许的突发请求数）
+            max_retries: 429/503 的最大重试次数
+            base_delay: 没有 Retry-After 时的指数退避基数（秒）
+            max_delay: 单次退避的最长等待时间（秒）
+        """
+        self.mailbox_concurrency = mailbox_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+        # asyncio.Semaphore 绑定事件循环，邮箱状态按事件循环分别保存
+        self._mailboxes: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _MailboxState]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._stats: Dict[str, Any] = {
+            "requests": 0,
+            "throttled": 0,
+            "retries": 0,
+            "gave_up": 0,
+            "backoff_seconds": 0.0,
+            "rate_limited_seconds": 0.0,
+        }
+        self._throttled_by_mailbox: Dict[str, int] = {}
+
+    def compute_backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        计算退避时间：优先使用 Retry-After，否则指数退避；再加最多 25% 的随机抖动
+
+        Args:
+            attempt: 第几次重试（从 0 开始）
+            retry_after: 服务端返回的 Retry-After（秒）
+        """
+        delay = retry_after if retry_after is not None else self.base_delay * (2 ** attempt)
+        delay += random.uniform(0, delay * 0.25)
+        return min(delay, self.max_delay)
+
+    def note_throttled(self, mailbox: str, delay: float) -> None:
+        """记录一次限流，并让该邮箱的后续请求在 delay 秒内等待"""
+        with self._lock:
+            self._stats["throttled"] += 1
+            self._throttled_by_mailbox[mailbox] = self._throttled_by_mailbox.get(mailbox, 0) + 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        with self._lock:
+            mailboxes = self._mailboxes.setdefault(loop, {})
+            state = mailboxes.get(mailbox)
+            if state is None:
+                state = mailboxes[mailbox] = _MailboxState(self.mailbox_concurrency)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+
+    @asynccontextmanager
+    async def slot(self, mailbox: str) -> AsyncIterator[None]:
+        """
+        占用一个请求名额：全局令牌桶 + 邮箱并发信号量 + 邮箱退避窗口
+
+        Args:
+            mailbox: 邮箱地址
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            mailboxes = self._mailboxes.setdefault(loop, {})
+            state = mailboxes.get(mailbox)
+            if state is None:
+                state = mailboxes[mailbox] = _MailboxState(self.mailbox_concurrency)
+            state.active += 1
+            self._stats["requests"] += 1
+        try:
+            async with state.semaphore:
+                # 该邮箱正在退避时一起等待
+                wait_seconds = state.blocked_until - time.monotonic()
+                if wait_seconds > 0:
+                    await asyncio.sleep(wait_seconds)
+                waited = await self.bucket.acquire()
+                if waited:
+                    with self._lock:
+                        self._stats["rate_limited_seconds"] += waited
+                yield
+        finally:
+            with self._lock:
+                state.active -= 1
+                # 空闲且不在退避窗口内的邮箱状态及时释放
+                if state.active == 0 and state.blocked_until <= time.monotonic():
+                    mailboxes.pop(mailbox, None)
+
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        method: str,
+        url: str,
+        *,
+        mailbox: str,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        发送一个受限流保护的 Graph 请求（429/503 自动退避重试）
+
+        Args:
+            client: HTTP 客户端
+            method: HTTP 方法
+            url: 请求地址
+            mailbox: 请求所针对的邮箱
+            **kwargs: 请求参数（headers、params、json 等）
+
+        Returns:
+            最后一次响应（重试耗尽时返回最后一次 429/503 响应，由调用方处理）
+        """
+        attempt = 0
+        while True:
+            async with self.slot(mailbox):
+                # 通过 get/post/delete 等便捷方法发送，与各调用点原有的请求方式一致
+                response = await getattr(client, method.lower())(url, **kwargs)
+            if response.status_code not in THROTTLED_STATUS_CODES:
+                return response
+
+            if attempt >= self.max_retries:
+                with self._lock:
+                    self._stats["throttled"] += 1
+                    self._stats["gave_up"] += 1
+                    self._throttled_by_mailbox[mailbox] = self._throttled_by_mailbox.get(mailbox, 0) + 1
+                logger.error(
+                    f"Graph request still throttled for {mailbox} after {self.max_retries} retries: "
+                    f"{method} {url} -> {response.status_code}"
+                )
+                return response
+
+            delay = self.compute_backoff(attempt, parse_retry_after(response.headers))
+            self.note_throttled(mailbox, delay)
+            with self._lock:
+                self._stats["retries"] += 1
+                self._stats["backoff_seconds"] += delay
+            logger.warning(
+                f"Graph throttled {mailbox} ({response.status_code}) on {method} {url}, "
+                f"backing off {delay:.1f}s (retry {attempt + 1}/{self.max_retries})"
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """获取限流指标（含限流次数最多的邮箱）"""
+        with self._lock:
+            top_mailboxes = sorted(
+                self._throttled_by_mailbox.items(), key=lambda item: item[1], reverse=True
+            )[:top]
+            return {
+                "mailbox_concurrency": self.mailbox_concurrency,
+                "rate": self.bucket.rate,
+                "burst": self.bucket.capacity,
+                **self._stats,
+                "active_mailboxes": sum(len(mailboxes) for mailboxes in self._mailboxes.values()),
+                "top_throttled_mailboxes": dict(top_mailboxes),
+            }
+
+
+# 全局实例
+graph_throttle = GraphThrottle()
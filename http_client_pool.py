@@ -0,0 +1,130 @@
+"""
+HTTP客户端池管理模块
+
+为 Microsoft Graph 与 OAuth2 令牌端点提供进程级共享的 httpx.AsyncClient，
+复用 DNS 解析、TCP 与 TLS 连接，支持 HTTP/2 多路复用、长连接与按主机的连接数限制
+"""
+
+import asyncio
+import importlib.util
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Union
+
+import httpx
+
+from config import (
+    HTTP_CLIENT_HTTP2,
+    HTTP_CLIENT_KEEPALIVE_EXPIRY,
+    HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST,
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+)
+from logger_config import logger
+
+# 客户端名称（每个名称对应一个目标主机，拥有独立的连接数限制）
+GRAPH_CLIENT = "graph"
+TOKEN_CLIENT = "token"
+
+
+class HttpClientRegistry:
+    """
+    共享 HTTP 客户端注册表
+
+    httpx.AsyncClient 绑定创建时的事件循环，因此客户端按 (事件循环, 名称) 缓存，同一主机只有一个连接池；
+    各调用方的超时通过请求参数传入（client.get(..., timeout=...)），不会因超时配置不同而拆分连接池。
+    事件循环被回收后对应的客户端记录随之释放。应用关闭时调用 aclose() 关闭当前事件循环上的客户端。
+    """
+
+    def __init__(
+        self,
+        http2: bool = HTTP_CLIENT_HTTP2,
+        max_connections: int = HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections: int = HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_CLIENT_KEEPALIVE_EXPIRY,
+        default_timeout: Union[float, httpx.Timeout] = 30.0,
+    ):
+        """
+        初始化客户端注册表
+
+        Args:
+            http2: 是否启用 HTTP/2（需要安装 h2，未安装时回退到 HTTP/1.1）
+            max_connections: 每个主机的最大连接数
+            max_keepalive_connections: 每个主机保持的最大空闲连接数
+            keepalive_expiry: 空闲连接保持时间（秒）
+            default_timeout: 请求未显式传入 timeout 时使用的默认超时
+        """
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the h2 package is not installed; falling back to HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.default_timeout = httpx.Timeout(default_timeout)
+        self._lock = threading.Lock()
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._stats = {"created": 0, "reused": 0}
+
+    def get_client(self, name: str) -> httpx.AsyncClient:
+        """
+        获取当前事件循环上的共享客户端（不存在时创建）
+
+        Args:
+            name: 客户端名称（GRAPH_CLIENT / TOKEN_CLIENT）
+
+        Returns:
+            共享的 httpx.AsyncClient，调用方不应关闭它；需要特定超时时在每次请求中传入 timeout
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            client = clients.get(name)
+            if client is not None and not getattr(client, "is_closed", False):
+                self._stats["reused"] += 1
+                return client
+
+            client = httpx.AsyncClient(timeout=self.default_timeout, http2=self.http2, limits=self.limits)
+            clients[name] = client
+            self._stats["created"] += 1
+        logger.debug(f"Created shared HTTP client {name} (http2={self.http2})")
+        return client
+
+    @asynccontextmanager
+    async def client(self, name: str) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        以 async with 形式使用共享客户端（退出时不关闭连接，便于替换原有的临时客户端）
+
+        Args:
+            name: 客户端名称
+        """
+        yield self.get_client(name)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的所有共享客户端（应用关闭时调用）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.pop(loop, {})
+        for client in clients.values():
+            close = getattr(client, "aclose", None)
+            if close is not None:
+                await close()
+        if clients:
+            logger.info(f"Closed {len(clients)} shared HTTP clients")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "http2": self.http2,
+                "max_connections_per_host": self.limits.max_connections,
+                "clients": sum(len(clients) for clients in self._clients.values()),
+                **self._stats,
+            }
+
+
+# 全局实例
+http_clients = HttpClientRegistry()
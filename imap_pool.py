@@ -180,6 +180,28 @@ class IMAPConnectionPool:
                     )
             logger.debug(f"Discarded invalid connection for {email}: {e}")
 
+    def discard_connection(self, email: str, connection: imaplib.IMAP4_SSL) -> None:
+        """
+        丢弃连接（不归还到池中）
+
+        用于连接状态未知的场景（例如取件线程仍在使用该连接时调用方已被取消）：
+        不发送任何 IMAP 命令，直接关闭 socket，使仍在进行的读取尽快以错误结束
+
+        Args:
+            email: 邮箱地址
+            connection: 要丢弃的IMAP连接
+        """
+        with self.lock:
+            if email in self.connection_count:
+                self.connection_count[email] = max(
+                    0, self.connection_count[email] - 1
+                )
+        try:
+            connection.shutdown()
+        except Exception as e:
+            logger.debug(f"Error shutting down discarded connection for {email}: {e}")
+        logger.debug(f"Discarded IMAP connection for {email}")
+
     def close_all_connections(self, email: str = None) -> None:
         """
         关闭所有连接（带超时保护，防止卡住）
@@ -8,12 +8,23 @@
 import sys
 import os
 import json
+import random
+import re
+import uuid
+from contextvars import ContextVar, Token
 from pathlib import Path
 from typing import Any, Dict, Optional
 
 from loguru import logger
 
-from config import LOG_DIR, LOG_FILE, LOG_RETENTION_DAYS, LOG_MAX_SIZE
+from config import (
+    LOG_DIR,
+    LOG_FILE,
+    LOG_HOT_PATH_LEVEL,
+    LOG_HOT_PATH_SAMPLE_RATE,
+    LOG_MAX_SIZE,
+    LOG_RETENTION_DAYS,
+)
 
 
 # ============================================================================
@@ -179,3 +190,187 @@ def setup_logger():
 
 # 初始化logger（供其他模块直接导入使用）
 logger = setup_logger()
+
+
+# ============================================================================
+# 结构化日志门面（热路径使用）
+# ============================================================================
+
+_LEVEL_NUMBERS = {
+    "TRACE": 5,
+    "DEBUG": 10,
+    "INFO": 20,
+    "SUCCESS": 25,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+}
+# 达到该级别的事件不受请求采样影响，始终输出
+_UNSAMPLED_LEVEL_NO = _LEVEL_NUMBERS["WARNING"]
+
+# 需要脱敏的字段名（小写比较），同时用于字典（如请求头）中的键
+SENSITIVE_LOG_KEYS = frozenset({
+    "authorization",
+    "access_token",
+    "refresh_token",
+    "id_token",
+    "token",
+    "password",
+    "client_secret",
+    "client_state",
+    "clientstate",
+    "cookie",
+    "set-cookie",
+    "x-api-key",
+    "api_key",
+})
+_BEARER_PATTERN = re.compile(r"(Bearer\s+)\S+", re.IGNORECASE)
+_SENSITIVE_QUERY_PATTERN = re.compile(
+    r"((?:access_token|refresh_token|id_token|token|password|client_secret|code)=)[^&\s]+",
+    re.IGNORECASE,
+)
+
+# 当前请求的日志上下文：{"request_id": str, "sampled": bool}；请求之外为 None（始终采样）
+_request_log_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_log_context", default=None)
+
+
+def mask_secret(value: str) -> str:
+    """
+    遮盖敏感值，只保留首尾少量字符便于排查
+
+    Args:
+        value: 原始值
+
+    Returns:
+        遮盖后的字符串；过短的值整体替换为 ***
+    """
+    if not value:
+        return "None"
+    if len(value) <= 16:
+        return "***"
+    return value[:8] + "..." + value[-8:]
+
+
+def redact_log_value(value: Any, key: Optional[str] = None) -> Any:
+    """
+    对日志字段脱敏
+
+    敏感字段名的值整体遮盖；字典和列表递归处理；字符串中的 Bearer 令牌和
+    URL 查询参数中的令牌/密码被遮盖。
+
+    Args:
+        value: 字段值
+        key: 字段名（可选）
+
+    Returns:
+        脱敏后的值
+    """
+    if key is not None and key.lower() in SENSITIVE_LOG_KEYS:
+        return mask_secret(str(value)) if value else value
+    if isinstance(value, dict):
+        return {item_key: redact_log_value(item, str(item_key)) for item_key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [redact_log_value(item) for item in value]
+    if isinstance(value, str):
+        if "Bearer" in value or "bearer" in value:
+            value = _BEARER_PATTERN.sub(r"\1***", value)
+        if "=" in value:
+            value = _SENSITIVE_QUERY_PATTERN.sub(r"\1***", value)
+    return value
+
+
+def begin_request_log_context(request_id: Optional[str] = None, sample_rate: Optional[float] = None) -> Token:
+    """
+    开始一个请求的日志上下文，决定该请求的热路径日志是否被采样
+
+    Args:
+        request_id: 请求ID（为空时自动生成）
+        sample_rate: 采样比例（为空时使用 LOG_HOT_PATH_SAMPLE_RATE）
+
+    Returns:
+        用于 end_request_log_context 的 ContextVar token
+    """
+    rate = LOG_HOT_PATH_SAMPLE_RATE if sample_rate is None else sample_rate
+    return _request_log_context.set({
+        "request_id": request_id[:64] if request_id else uuid.uuid4().hex[:12],
+        "sampled": rate >= 1.0 or random.random() < rate,
+    })
+
+
+def end_request_log_context(token: Token) -> None:
+    """结束请求的日志上下文"""
+    _request_log_context.reset(token)
+
+
+def get_request_log_context() -> Optional[Dict[str, Any]]:
+    """获取当前请求的日志上下文（请求之外返回 None）"""
+    return _request_log_context.get()
+
+
+class StructuredLogger:
+    """
+    热路径结构化日志记录器
+
+    以 "[组件] 事件 key=value ..." 的形式输出。事件未达到级别或当前请求未被
+    采样时直接返回，不做任何格式化；字段值可以是无参可调用对象，只在确实
+    输出时求值（如 response_preview=lambda: response.text[:200]）；输出前
+    对敏感字段脱敏。
+    """
+
+    def __init__(self, component: str, min_level: str = LOG_HOT_PATH_LEVEL):
+        self.component = component
+        self.min_level_no = _LEVEL_NUMBERS.get(min_level.upper(), _LEVEL_NUMBERS["INFO"])
+
+    def is_enabled(self, level: str) -> bool:
+        """判断该级别的事件在当前请求中是否会输出"""
+        level_no = _LEVEL_NUMBERS[level]
+        if level_no < self.min_level_no:
+            return False
+        if level_no >= _UNSAMPLED_LEVEL_NO:
+            return True
+        context = _request_log_context.get()
+        return context is None or context["sampled"]
+
+    def debug(self, event: str, **fields: Any) -> None:
+        if self.is_enabled("DEBUG"):
+            self._emit("DEBUG", event, fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        if self.is_enabled("INFO"):
+            self._emit("INFO", event, fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        if self.is_enabled("WARNING"):
+            self._emit("WARNING", event, fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        if self.is_enabled("ERROR"):
+            self._emit("ERROR", event, fields)
+
+    def exception(self, event: str, **fields: Any) -> None:
+        """记录 ERROR 级别事件并附带当前异常堆栈"""
+        if self.is_enabled("ERROR"):
+            self._emit("ERROR", event, fields, exception=True)
+
+    def _emit(self, level: str, event: str, fields: Dict[str, Any], exception: bool = False) -> None:
+        parts = [f"[{self.component}] {event}"]
+        context = _request_log_context.get()
+        if context is not None:
+            parts.append(f"request_id={context['request_id']}")
+        for key, value in fields.items():
+            if callable(value):
+                value = value()
+            parts.append(f"{key}={redact_log_value(value, key)}")
+        # depth=2：日志位置指向调用 debug()/info() 的业务代码
+        logger.opt(depth=2, exception=exception).log(level, " ".join(parts))
+
+
+_structured_loggers: Dict[str, StructuredLogger] = {}
+
+
+def get_structured_logger(component: str) -> StructuredLogger:
+    """获取（或创建）指定组件的结构化日志记录器"""
+    structured_logger = _structured_loggers.get(component)
+    if structured_logger is None:
+        structured_logger = _structured_loggers.setdefault(component, StructuredLogger(component))
+    return structured_logger
@@ -29,21 +29,38 @@ from config import (
     APP_TITLE,
     APP_VERSION,
     AUTO_SYNC_EMAILS_ENABLED,
+    CACHE_MAINTENANCE_ENABLED,
+    CACHE_WRITE_BEHIND_ENABLED,
     EMAIL_SYNC_INTERVAL,
     EMAIL_SYNC_PAGE_SIZE,
+    GRAPH_DELTA_SYNC_ENABLED,
+    GRAPH_NOTIFICATION_URL,
+    GRAPH_NOTIFICATIONS_ENABLED,
     HOST,
     PORT,
     REFRESH_TOKEN_INTERVAL,
 )
-from logger_config import logger, format_request_log, format_response_log, truncate_text
+from logger_config import (
+    begin_request_log_context,
+    end_request_log_context,
+    format_request_log,
+    format_response_log,
+    logger,
+    truncate_text,
+)
 
 # 导入自定义模块
 import admin_api
 import auth
 import database as db
 from account_service import get_account_credentials
+from cache_maintenance import cache_maintenance_background_task
+from cache_write_behind import cache_write_behind
 from email_service import list_emails
+from graph_delta_sync import graph_delta_sync_background_task
+from graph_notifications import graph_subscription_background_task
 from imap_pool import imap_pool
+from http_client_pool import http_clients
 from models import AccountCredentials
 from oauth_service import refresh_account_token
 from routes import main_router
@@ -476,6 +493,14 @@ async def warmup_cache():
         CACHE_WARMUP_EMAILS_PER_ACCOUNT
     )
     
+    # 预加载账户记录缓存（账户凭证读取不再每次请求都查询数据库）
+    # 使用事件循环默认线程池，不依赖随生命周期关闭的后台任务线程池
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, db.preload_account_cache)
+    except Exception as e:
+        logger.warning(f"Account record cache preload failed: {e}")
+    
     if not CACHE_WARMUP_ENABLED:
         logger.info("Cache warmup is disabled")
         return
@@ -574,6 +599,40 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     else:
         logger.info("Email auto sync is disabled")
     
+    # 启动后台缓存维护任务（LRU淘汰在后台线程池中分批执行）
+    cache_maintenance_task = None
+    if CACHE_MAINTENANCE_ENABLED:
+        cache_maintenance_task = asyncio.create_task(
+            cache_maintenance_background_task(background_tasks_executor)
+        )
+        logger.info("Cache maintenance background task scheduled")
+    else:
+        logger.info("Cache maintenance is disabled")
+    
+    # 启动 Graph 增量同步任务（delta 查询镜像 Graph 账户的邮件列表）
+    graph_delta_sync_task = None
+    if GRAPH_DELTA_SYNC_ENABLED:
+        graph_delta_sync_task = asyncio.create_task(graph_delta_sync_background_task())
+        logger.info("Graph delta sync background task scheduled")
+    else:
+        logger.info("Graph delta sync is disabled")
+    
+    # 启动 Graph 变更通知订阅维护任务（创建/续期订阅，收到通知后主动失效缓存）
+    graph_subscription_task = None
+    if GRAPH_NOTIFICATIONS_ENABLED and GRAPH_NOTIFICATION_URL:
+        graph_subscription_task = asyncio.create_task(graph_subscription_background_task())
+        logger.info("Graph subscription background task scheduled")
+    elif GRAPH_NOTIFICATIONS_ENABLED:
+        logger.warning("Graph notifications are enabled but GRAPH_NOTIFICATION_URL is not set")
+    else:
+        logger.info("Graph notifications are disabled")
+    
+    # 启动缓存写回线程（列表/详情缓存写入不再阻塞请求）
+    if CACHE_WRITE_BEHIND_ENABLED:
+        cache_write_behind.start()
+    else:
+        logger.info("Cache write-behind is disabled, cache writes are synchronous")
+    
     # 启动缓存预热（已优化：使用线程池执行同步数据库操作）
     asyncio.create_task(warmup_cache())
 
@@ -588,6 +647,12 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
         tasks_to_cancel.append(refresh_task)
     if email_sync_task:
         tasks_to_cancel.append(email_sync_task)
+    if cache_maintenance_task:
+        tasks_to_cancel.append(cache_maintenance_task)
+    if graph_delta_sync_task:
+        tasks_to_cancel.append(graph_delta_sync_task)
+    if graph_subscription_task:
+        tasks_to_cancel.append(graph_subscription_task)
     
     # 取消所有任务
     for task in tasks_to_cancel:
@@ -617,6 +682,12 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
             logger.error(f"Error cancelling background tasks: {e}")
             # 即使出错也继续关闭流程
 
+    # 停止缓存写回线程（写入剩余待写记录，需在关闭数据库资源之前）
+    try:
+        await asyncio.to_thread(cache_write_behind.stop)
+    except Exception as e:
+        logger.error(f"Error stopping cache write-behind writer: {e}")
+
     # 关闭线程池
     logger.info("Shutting down thread pools...")
     try:
@@ -633,6 +704,12 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     except Exception as e:
         logger.error(f"Error closing database resources: {e}")
 
+    # 关闭共享HTTP客户端（Graph API 与令牌端点长连接）
+    try:
+        await http_clients.aclose()
+    except Exception as e:
+        logger.error(f"Error closing shared HTTP clients: {e}")
+
     # 关闭IMAP连接池（使用线程，防止阻塞）
     logger.info("Closing IMAP connection pool...")
     try:
@@ -673,6 +750,8 @@ async def log_requests(request: Request, call_next):
     """记录HTTP请求与耗时（轻量模式，避免读取完整请求/响应体）"""
     request_start_time = time.perf_counter()
     client_host = request.client.host if request.client else 'unknown'
+    # 请求级日志上下文：热路径结构化日志按请求采样并带上请求ID
+    log_context_token = begin_request_log_context(request.headers.get("x-request-id"))
 
     # 构建请求日志
     log_parts = [
@@ -723,6 +802,8 @@ async def log_requests(request: Request, call_next):
             exc_info=True
         )
         raise
+    finally:
+        end_request_log_context(log_context_token)
 
 # 添加CORS中间件
 app.add_middleware(
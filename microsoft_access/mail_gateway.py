@@ -3,7 +3,7 @@ from __future__ import annotations
 import asyncio
 import json
 import re
-from typing import Any, Callable
+from typing import Any, AsyncIterator, Callable
 
 import database as db
 import httpx
@@ -13,6 +13,7 @@ from logger_config import logger
 from models import (
     AccountCredentials,
     EmailDetailsResponse,
+    EmailItem,
     EmailListResponse,
     normalize_strategy_mode,
 )
@@ -60,6 +61,7 @@ class MailGateway:
         strategy_mode: str | None = None,
         override_provider: str | None = None,
         hydrate_details: bool = False,
+        body_format: str = "html",
         skip_cache: bool = False,
         sender_search: str | None = None,
         subject_search: str | None = None,
@@ -97,6 +99,7 @@ class MailGateway:
                         credentials,
                         response,
                         skip_cache=skip_cache,
+                        body_format=body_format,
                     )
                 self._record_successful_provider(credentials, provider_name)
                 return response
@@ -220,6 +223,101 @@ class MailGateway:
             raise last_error
         raise RuntimeError("MailGateway failed to resolve provider for list_messages_with_body")
 
+    async def stream_messages(
+        self,
+        credentials: AccountCredentials,
+        *,
+        folder: str,
+        max_count: int,
+        strategy_mode: str | None = None,
+        override_provider: str | None = None,
+        sender_search: str | None = None,
+        subject_search: str | None = None,
+        sort_by: str = "date",
+        sort_order: str = "desc",
+        start_time: str | None = None,
+        end_time: str | None = None,
+    ) -> AsyncIterator[tuple[str, list[EmailItem]]]:
+        """按 provider 分批产出 (provider_name, 邮件批次)；只有在尚未产出任何数据时才会回退到下一个 provider。"""
+        last_error: Exception | None = None
+        provider_order = await self.resolve_provider_order(
+            credentials,
+            strategy_mode=strategy_mode,
+            override_provider=override_provider,
+        )
+
+        for provider_name in provider_order:
+            provider = self._provider_for(provider_name)
+            emitted = False
+            try:
+                async for batch in self._stream_messages_via_provider(
+                    provider,
+                    credentials,
+                    folder=folder,
+                    max_count=max_count,
+                    sender_search=sender_search,
+                    subject_search=subject_search,
+                    sort_by=sort_by,
+                    sort_order=sort_order,
+                    start_time=start_time,
+                    end_time=end_time,
+                ):
+                    emitted = True
+                    yield provider_name, batch
+                self._record_successful_provider(credentials, provider_name)
+                return
+            except HTTPException as exc:
+                if emitted or not self._is_recoverable_http_exception(exc):
+                    raise
+                last_error = exc
+                logger.warning(
+                    "MailGateway stream_messages recoverable failure via {} for {}: {}",
+                    provider_name,
+                    credentials.email,
+                    exc,
+                )
+                if provider_name == provider_order[-1]:
+                    raise
+            except RECOVERABLE_PROVIDER_EXCEPTION_TYPES as exc:
+                if emitted:
+                    raise
+                last_error = exc
+                logger.warning(
+                    "MailGateway stream_messages recoverable failure via {} for {}: {}",
+                    provider_name,
+                    credentials.email,
+                    exc,
+                )
+                if provider_name == provider_order[-1]:
+                    raise
+
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("MailGateway failed to resolve provider for stream_messages")
+
+    async def _stream_messages_via_provider(
+        self,
+        provider: Any,
+        credentials: AccountCredentials,
+        **kwargs: Any,
+    ) -> AsyncIterator[list[EmailItem]]:
+        """provider 支持流式读取时逐批产出，否则退化为一次 list_messages 调用。"""
+        provider_stream_method = getattr(provider, "stream_messages", None)
+        if callable(provider_stream_method):
+            async for batch in provider_stream_method(credentials, **kwargs):
+                yield batch
+            return
+
+        max_count = kwargs.pop("max_count")
+        response = await provider.list_messages(
+            credentials,
+            page=1,
+            page_size=max_count,
+            **kwargs,
+        )
+        if response.emails:
+            yield list(response.emails)
+
     async def delete_message(
         self,
         credentials: AccountCredentials,
@@ -447,34 +545,18 @@ class MailGateway:
         list_response: EmailListResponse,
         *,
         skip_cache: bool,
+        body_format: str = "html",
     ) -> EmailListResponse:
         if not list_response.emails:
             return list_response
 
-        semaphore = asyncio.Semaphore(DETAIL_FETCH_CONCURRENCY_LIMIT)
         target_items = list_response.emails[:DETAIL_HYDRATION_MAX_ITEMS]
-
-        async def fetch_detail(item: Any) -> tuple[str, EmailDetailsResponse | None]:
-            try:
-                async with semaphore:
-                    detail = await provider.get_message_detail(
-                        credentials,
-                        item.message_id,
-                        skip_cache=skip_cache,
-                    )
-                return item.message_id, detail
-            except Exception as exc:  # noqa: BLE001 - 列表增强失败不应打断主列表
-                logger.warning(
-                    "MailGateway hydrate_details skipped {} for {} via {}: {}",
-                    item.message_id,
-                    credentials.email,
-                    getattr(provider, "name", provider.__class__.__name__),
-                    exc,
-                )
-                return item.message_id, None
-
-        detail_results = await asyncio.gather(
-            *(fetch_detail(item) for item in target_items)
+        detail_results = await self._fetch_details_for_items(
+            provider,
+            credentials,
+            target_items,
+            skip_cache=skip_cache,
+            body_format=body_format,
         )
         items_by_id = {item.message_id: item for item in list_response.emails}
 
@@ -499,6 +581,63 @@ class MailGateway:
 
         return list_response
 
+    async def _fetch_details_for_items(
+        self,
+        provider: Any,
+        credentials: AccountCredentials,
+        items: list[Any],
+        *,
+        skip_cache: bool,
+        body_format: str = "html",
+    ) -> list[tuple[str, EmailDetailsResponse | None]]:
+        """获取一组邮件的详情；provider 支持批量获取时一次取回（Graph 为 $batch），否则逐封并发获取。"""
+        provider_name = getattr(provider, "name", provider.__class__.__name__)
+        provider_bulk_method = getattr(provider, "get_message_details_many", None)
+        if callable(provider_bulk_method):
+            try:
+                details = await provider_bulk_method(
+                    credentials,
+                    [item.message_id for item in items],
+                    skip_cache=skip_cache,
+                    body_format=body_format,
+                    # text 只用于验证码识别和预览：只取纯文本的 uniqueBody，HTML 留给详情页渲染时再取
+                    unique_body=body_format == "text",
+                )
+            except Exception as exc:  # noqa: BLE001 - 列表增强失败不应打断主列表
+                logger.warning(
+                    "MailGateway hydrate_details bulk fetch skipped for {} via {}: {}",
+                    credentials.email,
+                    provider_name,
+                    exc,
+                )
+                return [(item.message_id, None) for item in items]
+            return [(item.message_id, details.get(item.message_id)) for item in items]
+
+        semaphore = asyncio.Semaphore(DETAIL_FETCH_CONCURRENCY_LIMIT)
+
+        async def fetch_detail(item: Any) -> tuple[str, EmailDetailsResponse | None]:
+            try:
+                async with semaphore:
+                    detail = await provider.get_message_detail(
+                        credentials,
+                        item.message_id,
+                        skip_cache=skip_cache,
+                    )
+                return item.message_id, detail
+            except Exception as exc:  # noqa: BLE001 - 列表增强失败不应打断主列表
+                logger.warning(
+                    "MailGateway hydrate_details skipped {} for {} via {}: {}",
+                    item.message_id,
+                    credentials.email,
+                    provider_name,
+                    exc,
+                )
+                return item.message_id, None
+
+        # 合并本页详情的缓存写入：整页只提交一次事务
+        async with db.batched_email_detail_cache():
+            return await asyncio.gather(*(fetch_detail(item) for item in items))
+
     async def _list_messages_with_body_via_provider(
         self,
         provider: Any,
@@ -558,7 +697,8 @@ class MailGateway:
             merged.update(self._model_to_dict(detail))
             return merged
 
-        return await asyncio.gather(*(fetch_detail(item) for item in list_response.emails))
+        async with db.batched_email_detail_cache():
+            return await asyncio.gather(*(fetch_detail(item) for item in list_response.emails))
 
 
 default_mail_gateway = MailGateway()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from models import AccountCredentials, EmailDetailsResponse, EmailListResponse
+from typing import AsyncIterator
+
+from models import AccountCredentials, EmailDetailsResponse, EmailItem, EmailListResponse
 
 
 def _graph_credentials(credentials: AccountCredentials) -> AccountCredentials:
@@ -38,6 +40,34 @@ async def list_messages(
     )
 
 
+async def stream_messages(
+    credentials: AccountCredentials,
+    *,
+    folder: str,
+    max_count: int,
+    sender_search: str | None = None,
+    subject_search: str | None = None,
+    sort_by: str = "date",
+    sort_order: str = "desc",
+    start_time: str | None = None,
+    end_time: str | None = None,
+) -> AsyncIterator[list[EmailItem]]:
+    from graph_api_service import stream_emails_graph
+
+    async for batch in stream_emails_graph(
+        _graph_credentials(credentials),
+        folder=folder,
+        max_count=max_count,
+        sender_search=sender_search,
+        subject_search=subject_search,
+        sort_by=sort_by,
+        sort_order=sort_order,
+        start_time=start_time,
+        end_time=end_time,
+    ):
+        yield batch
+
+
 async def get_message_detail(
     credentials: AccountCredentials,
     message_id: str,
@@ -53,6 +83,25 @@ async def get_message_detail(
     )
 
 
+async def get_message_details_many(
+    credentials: AccountCredentials,
+    message_ids: list[str],
+    *,
+    skip_cache: bool = False,
+    body_format: str = "html",
+    unique_body: bool = False,
+) -> dict[str, EmailDetailsResponse]:
+    from graph_api_service import get_email_details_batch_graph
+
+    return await get_email_details_batch_graph(
+        _graph_credentials(credentials),
+        message_ids,
+        skip_cache=skip_cache,
+        body_format=body_format,
+        unique_body=unique_body,
+    )
+
+
 async def list_messages_with_body(
     credentials: AccountCredentials,
     *,
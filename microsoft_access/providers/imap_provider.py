@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+from typing import AsyncIterator
+
 from fastapi import HTTPException
 
-from models import AccountCredentials, EmailDetailsResponse, EmailListResponse
+from models import AccountCredentials, EmailDetailsResponse, EmailItem, EmailListResponse
 
 
 def _imap_credentials(credentials: AccountCredentials) -> AccountCredentials:
@@ -40,6 +42,34 @@ async def list_messages(
     )
 
 
+async def stream_messages(
+    credentials: AccountCredentials,
+    *,
+    folder: str,
+    max_count: int,
+    sender_search: str | None = None,
+    subject_search: str | None = None,
+    sort_by: str = "date",
+    sort_order: str = "desc",
+    start_time: str | None = None,
+    end_time: str | None = None,
+) -> AsyncIterator[list[EmailItem]]:
+    from email_service import stream_emails_imap
+
+    async for batch in stream_emails_imap(
+        _imap_credentials(credentials),
+        folder=folder,
+        max_count=max_count,
+        sender_search=sender_search,
+        subject_search=subject_search,
+        start_time=start_time,
+        end_time=end_time,
+        sort_by=sort_by,
+        sort_order=sort_order,
+    ):
+        yield batch
+
+
 async def get_message_detail(
     credentials: AccountCredentials,
     message_id: str,
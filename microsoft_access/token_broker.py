@@ -10,6 +10,7 @@ from fastapi import HTTPException
 import cache_service
 import database as db
 from config import GRAPH_API_SCOPE, OAUTH_SCOPE, TOKEN_URL
+from http_client_pool import TOKEN_CLIENT, http_clients
 from logger_config import logger
 from models import AccountCredentials, normalize_strategy_mode
 
@@ -46,9 +47,8 @@ class TokenBroker:
     ) -> None:
         self.db = db_module
         self.cache = cache_module
-        self.http_client_factory = http_client_factory or (
-            lambda timeout=30.0: httpx.AsyncClient(timeout=timeout)
-        )
+        # 默认使用进程级共享的令牌端点客户端，复用 TLS 长连接
+        self.http_client_factory = http_client_factory or (lambda: http_clients.client(TOKEN_CLIENT))
         self.now_fn = now_fn or (lambda: datetime.now(timezone.utc))
         self.token_url = token_url
 
@@ -291,8 +291,8 @@ class TokenBroker:
             "refresh_token": credentials.refresh_token,
             "scope": scope,
         }
-        async with self.http_client_factory(timeout=30.0) as client:
-            return await client.post(self.token_url, data=token_request_data)
+        async with self.http_client_factory() as client:
+            return await client.post(self.token_url, data=token_request_data, timeout=30.0)
 
     def _should_try_fallback(self, response: Any, plan: ScopePlan) -> bool:
         return bool(
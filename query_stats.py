@@ -0,0 +1,354 @@
+"""
+SQL 语句统计模块
+
+在数据库连接层为每条语句计时：
+- 将 SQL 归一化为指纹（字面量、占位符、IN 列表折叠），按指纹聚合延迟直方图
+- 超过慢查询阈值的语句写入慢查询日志，并按指纹限频采集执行计划
+  （PostgreSQL: EXPLAIN，SQLite: EXPLAIN QUERY PLAN）
+
+SQLite 通过自定义 Connection/Cursor 工厂接入，PostgreSQL 通过 cursor_factory 接入，
+DAO 代码无需改动。
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from config import (
+    QUERY_PLAN_CAPTURE_INTERVAL,
+    QUERY_STATS_ENABLED,
+    QUERY_STATS_MAX_FINGERPRINTS,
+    SLOW_QUERY_LOG_SIZE,
+    SLOW_QUERY_THRESHOLD_MS,
+)
+from logger_config import logger
+
+# 延迟直方图桶上界（毫秒），最后一个桶为 +Inf
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# 指纹数量超过上限后，新指纹归入该条目
+OTHER_FINGERPRINT = "<other>"
+# 可以采集执行计划的语句
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|EXECUTE)\b", re.IGNORECASE)
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?|%\(\w+\)s")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint_sql(sql: str) -> str:
+    """
+    将 SQL 归一化为指纹：去掉注释，字面量和占位符替换为 ?，
+    IN 列表与多行 VALUES 折叠，空白合并
+    """
+    normalized = _COMMENT_RE.sub(" ", sql)
+    normalized = _STRING_RE.sub("?", normalized)
+    normalized = _PLACEHOLDER_RE.sub("?", normalized)
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _IN_LIST_RE.sub("IN (?...)", normalized)
+    normalized = _VALUES_LIST_RE.sub("(?...)", normalized)
+    normalized = _WHITESPACE_RE.sub(" ", normalized).strip()
+    return normalized[:1000]
+
+
+class _FingerprintStats:
+    __slots__ = (
+        "count", "errors", "total_ms", "max_ms", "buckets", "slow_count",
+        "last_seen", "plan", "plan_captured_at", "plan_captured_monotonic",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.slow_count = 0
+        self.last_seen: Optional[str] = None
+        self.plan: Optional[List[str]] = None
+        self.plan_captured_at: Optional[str] = None
+        self.plan_captured_monotonic: Optional[float] = None
+
+    def percentile(self, ratio: float) -> Optional[float]:
+        """按直方图估算分位数（返回所在桶的上界）"""
+        if self.count == 0:
+            return None
+        target = self.count * ratio
+        cumulative = 0
+        for index, bucket_count in enumerate(self.buckets):
+            cumulative += bucket_count
+            if cumulative >= target:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return float(LATENCY_BUCKETS_MS[index])
+                return round(self.max_ms, 2)
+        return round(self.max_ms, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        histogram = {f"le_{bound}ms": self.buckets[index] for index, bound in enumerate(LATENCY_BUCKETS_MS)}
+        histogram["le_inf"] = self.buckets[-1]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "slow_count": self.slow_count,
+            "last_seen": self.last_seen,
+            "histogram": histogram,
+            "plan": self.plan,
+            "plan_captured_at": self.plan_captured_at,
+        }
+
+
+class QueryStatsCollector:
+    """按 SQL 指纹聚合语句耗时，记录慢查询并采集执行计划（线程安全）"""
+
+    def __init__(
+        self,
+        slow_threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+        max_fingerprints: int = QUERY_STATS_MAX_FINGERPRINTS,
+        slow_log_size: int = SLOW_QUERY_LOG_SIZE,
+        plan_capture_interval: float = QUERY_PLAN_CAPTURE_INTERVAL,
+    ):
+        self.enabled = QUERY_STATS_ENABLED
+        self.slow_threshold_ms = slow_threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self.plan_capture_interval = plan_capture_interval
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _FingerprintStats] = {}
+        self._slow_log: deque = deque(maxlen=slow_log_size)
+        self._started_at = datetime.now().isoformat()
+
+    def record(self, sql: str, duration_ms: float, error: bool = False) -> bool:
+        """
+        记录一次语句执行
+
+        Returns:
+            是否需要为该语句采集执行计划
+        """
+        fingerprint = fingerprint_sql(sql)
+        slow = duration_ms >= self.slow_threshold_ms
+        now = datetime.now().isoformat()
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    fingerprint = OTHER_FINGERPRINT
+                    stats = self._stats.get(fingerprint)
+                if stats is None:
+                    stats = self._stats[fingerprint] = _FingerprintStats()
+
+            stats.count += 1
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.last_seen = now
+            if error:
+                stats.errors += 1
+            bucket_index = len(LATENCY_BUCKETS_MS)
+            for index, bound in enumerate(LATENCY_BUCKETS_MS):
+                if duration_ms <= bound:
+                    bucket_index = index
+                    break
+            stats.buckets[bucket_index] += 1
+
+            if not slow:
+                return False
+            stats.slow_count += 1
+            self._slow_log.append({
+                "fingerprint": fingerprint,
+                "sql": sql[:2000],
+                "duration_ms": round(duration_ms, 2),
+                "error": error,
+                "at": now,
+            })
+            if error or fingerprint == OTHER_FINGERPRINT or not _EXPLAINABLE_RE.match(sql):
+                return False
+            captured = stats.plan_captured_monotonic
+            return captured is None or time.monotonic() - captured >= self.plan_capture_interval
+
+    def record_plan(self, sql: str, plan: List[str]) -> None:
+        fingerprint = fingerprint_sql(sql)
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                return
+            stats.plan = plan
+            stats.plan_captured_at = datetime.now().isoformat()
+            stats.plan_captured_monotonic = time.monotonic()
+            for entry in reversed(self._slow_log):
+                if entry["fingerprint"] == fingerprint:
+                    entry["plan"] = plan
+                    break
+        logger.warning(f"Slow SQL plan captured for: {fingerprint[:200]}")
+
+    def snapshot(self, sort_by: str = "total_ms", limit: int = 50) -> Dict[str, Any]:
+        with self._lock:
+            fingerprints = [
+                {"fingerprint": fingerprint, **stats.to_dict()}
+                for fingerprint, stats in self._stats.items()
+            ]
+            slow_queries = list(self._slow_log)
+        if sort_by not in ("total_ms", "count", "max_ms", "avg_ms", "slow_count"):
+            sort_by = "total_ms"
+        fingerprints.sort(key=lambda item: item[sort_by], reverse=True)
+        return {
+            "enabled": self.enabled,
+            "since": self._started_at,
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "fingerprint_count": len(fingerprints),
+            "histogram_buckets_ms": list(LATENCY_BUCKETS_MS),
+            "fingerprints": fingerprints[:limit],
+            "slow_queries": list(reversed(slow_queries))[:limit],
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._slow_log.clear()
+            self._started_at = datetime.now().isoformat()
+
+
+# 全局实例
+query_stats = QueryStatsCollector()
+
+
+def _normalize_plan_rows(rows: List[Any]) -> List[str]:
+    plan = []
+    for row in rows:
+        if isinstance(row, dict):
+            values = list(row.values())
+        else:
+            values = list(row)
+        # SQLite EXPLAIN QUERY PLAN: (id, parent, notused, detail)；PostgreSQL EXPLAIN: (QUERY PLAN,)
+        plan.append(str(values[-1]) if values else "")
+    return plan
+
+
+def _capture_sqlite_plan(connection: sqlite3.Connection, sql: str, parameters: Any) -> None:
+    try:
+        cursor = sqlite3.Cursor(connection)
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+        query_stats.record_plan(sql, _normalize_plan_rows(cursor.fetchall()))
+    except Exception as e:
+        logger.debug(f"Failed to capture SQLite query plan: {e}")
+
+
+class InstrumentedSqliteCursor(sqlite3.Cursor):
+    """为每条语句计时的 SQLite 游标"""
+
+    def execute(self, sql, parameters=()):
+        if not query_stats.enabled:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            result = super().execute(sql, parameters)
+        except Exception:
+            query_stats.record(sql, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        if query_stats.record(sql, (time.perf_counter() - start) * 1000):
+            _capture_sqlite_plan(self.connection, sql, parameters)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        if not query_stats.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+        except Exception:
+            query_stats.record(sql, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        # 批量语句只计时，不采集执行计划
+        query_stats.record(sql, (time.perf_counter() - start) * 1000)
+        return result
+
+
+class InstrumentedSqliteConnection(sqlite3.Connection):
+    """默认使用 InstrumentedSqliteCursor 的 SQLite 连接"""
+
+    def cursor(self, factory=InstrumentedSqliteCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+_postgresql_cursor_class = None
+
+
+def get_instrumented_postgresql_cursor_class():
+    """返回为每条语句计时的 psycopg2 RealDictCursor 子类（延迟创建，避免未安装 psycopg2 时报错）"""
+    global _postgresql_cursor_class
+    if _postgresql_cursor_class is not None:
+        return _postgresql_cursor_class
+
+    from psycopg2.extras import RealDictCursor
+
+    def _capture_postgresql_plan(cursor, sql, parameters):
+        connection = cursor.connection
+        savepoint_cursor = connection.cursor(cursor_factory=RealDictCursor)
+        try:
+            # 使用保存点，EXPLAIN 失败时不影响调用方事务
+            savepoint_cursor.execute("SAVEPOINT query_stats_explain")
+            try:
+                savepoint_cursor.execute(f"EXPLAIN {sql}", parameters)
+                plan = _normalize_plan_rows(savepoint_cursor.fetchall())
+                savepoint_cursor.execute("RELEASE SAVEPOINT query_stats_explain")
+            except Exception:
+                savepoint_cursor.execute("ROLLBACK TO SAVEPOINT query_stats_explain")
+                raise
+            query_stats.record_plan(sql, plan)
+        except Exception as e:
+            logger.debug(f"Failed to capture PostgreSQL query plan: {e}")
+        finally:
+            savepoint_cursor.close()
+
+    class InstrumentedRealDictCursor(RealDictCursor):
+        """为每条语句计时的 psycopg2 游标"""
+
+        def execute(self, query, vars=None):
+            if not query_stats.enabled:
+                return super().execute(query, vars)
+            sql = query if isinstance(query, str) else str(query)
+            start = time.perf_counter()
+            try:
+                result = super().execute(query, vars)
+            except Exception:
+                query_stats.record(sql, (time.perf_counter() - start) * 1000, error=True)
+                raise
+            need_plan = query_stats.record(sql, (time.perf_counter() - start) * 1000)
+            # 命名游标（服务端游标）执行的是 DECLARE，不采集执行计划
+            if need_plan and not self.name and isinstance(query, str):
+                _capture_postgresql_plan(self, query, vars)
+            return result
+
+        def executemany(self, query, vars_list):
+            if not query_stats.enabled:
+                return super().executemany(query, vars_list)
+            sql = query if isinstance(query, str) else str(query)
+            start = time.perf_counter()
+            try:
+                result = super().executemany(query, vars_list)
+            except Exception:
+                query_stats.record(sql, (time.perf_counter() - start) * 1000, error=True)
+                raise
+            query_stats.record(sql, (time.perf_counter() - start) * 1000)
+            return result
+
+    _postgresql_cursor_class = InstrumentedRealDictCursor
+    return _postgresql_cursor_class
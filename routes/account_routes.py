@@ -37,6 +37,7 @@ from models import (
     BatchImportTaskResponse,
     BatchImportTaskProgress,
 )
+from graph_notifications import graph_subscriptions
 from microsoft_access.account_lifecycle_service import AccountLifecycleService
 from oauth_service import get_access_token, refresh_account_token
 from logger_config import logger
@@ -326,17 +327,35 @@ async def add_account_tag(
         raise HTTPException(status_code=500, detail="Failed to add tag to account")
 
 
+async def _cleanup_deleted_account(email: str, credentials: Optional[AccountCredentials]) -> None:
+    """
+    账户删除后清理 Graph 变更通知订阅（失败只记录日志，不影响删除结果）
+
+    没有凭证时无法取消 Graph 端的订阅，只删除本地记录（Graph 端订阅到期后自动失效）
+    """
+    try:
+        if credentials is not None:
+            await graph_subscriptions.delete_account_subscriptions(credentials)
+        else:
+            await asyncio.to_thread(db.delete_graph_subscriptions_for_account, email)
+            await asyncio.to_thread(graph_subscriptions.refresh_push_accounts)
+    except Exception as e:
+        logger.warning(f"Failed to delete Graph subscriptions for {email}: {e}")
+
+
 @router.delete("/{email_id}", response_model=AccountResponse)
 async def delete_account(email_id: str, admin: dict = Depends(auth.get_current_admin)):
     """删除邮箱账户"""
     try:
-        # 检查账户是否存在
-        await get_account_credentials(email_id)
+        # 检查账户是否存在（删除订阅需要账户凭证）
+        credentials = await get_account_credentials(email_id)
 
         # 从数据库删除账户
         success = db.delete_account(email_id)
 
         if success:
+            await asyncio.to_thread(db.delete_graph_delta_state, email_id)
+            await _cleanup_deleted_account(email_id, credentials)
             return AccountResponse(
                 email_id=email_id, message="Account deleted successfully."
             )
@@ -371,37 +390,62 @@ async def batch_delete_accounts(
         failed_count = 0
         details = []
         
-        for email_id in request.email_ids:
+        # 有变更通知订阅的账户删除前先取凭证，删除后用于取消 Graph 端的订阅
+        subscribed_credentials: dict[str, Optional[AccountCredentials]] = {}
+        for email_id in dict.fromkeys(request.email_ids):
+            if not await asyncio.to_thread(db.list_graph_subscriptions, email_id):
+                continue
             try:
-                # 从数据库删除账户
-                success = db.delete_account(email_id)
-                
-                if success:
-                    success_count += 1
-                    details.append({
-                        "email": email_id,
-                        "status": "success",
-                        "message": "Account deleted successfully"
-                    })
-                    logger.info(f"Successfully deleted account {email_id} in batch")
-                else:
-                    failed_count += 1
-                    details.append({
-                        "email": email_id,
-                        "status": "failed",
-                        "message": "Account not found"
-                    })
-                    logger.warning(f"Account {email_id} not found during batch delete")
-                    
+                subscribed_credentials[email_id] = await get_account_credentials(email_id)
             except Exception as e:
-                error_msg = str(e)
-                logger.error(f"Error deleting account {email_id} in batch: {e}")
+                logger.warning(f"Failed to load credentials of {email_id} before batch delete: {e}")
+                subscribed_credentials[email_id] = None
+        
+        # 从数据库批量删除账户（分块查询ID后按ID删除）；批量删除失败时逐个删除，逐个报告错误
+        delete_errors: dict[str, str] = {}
+        try:
+            deleted_emails = set(db.delete_accounts(request.email_ids))
+        except Exception as e:
+            logger.warning(f"Bulk delete failed, falling back to per-account deletes: {e}")
+            deleted_emails = set()
+            for email_id in request.email_ids:
+                try:
+                    if db.delete_account(email_id):
+                        deleted_emails.add(email_id)
+                except Exception as exc:
+                    logger.error(f"Error deleting account {email_id} in batch: {exc}")
+                    delete_errors[email_id] = str(exc)
+        for email_id in deleted_emails:
+            await asyncio.to_thread(db.delete_graph_delta_state, email_id)
+        for email_id, credentials in subscribed_credentials.items():
+            if email_id in deleted_emails:
+                await _cleanup_deleted_account(email_id, credentials)
+        
+        for email_id in request.email_ids:
+            if email_id in deleted_emails:
+                # 重复出现的邮箱只计一次成功
+                deleted_emails.discard(email_id)
+                success_count += 1
+                details.append({
+                    "email": email_id,
+                    "status": "success",
+                    "message": "Account deleted successfully"
+                })
+            elif email_id in delete_errors:
+                failed_count += 1
+                details.append({
+                    "email": email_id,
+                    "status": "failed",
+                    "message": delete_errors[email_id]
+                })
+            else:
                 failed_count += 1
                 details.append({
                     "email": email_id,
                     "status": "failed",
-                    "message": error_msg
+                    "message": "Account not found"
                 })
+                logger.warning(f"Account {email_id} not found during batch delete")
         
         logger.info(f"Batch delete completed by {admin['username']}: "
                    f"{success_count} succeeded, {failed_count} failed out of {len(request.email_ids)}")
@@ -466,11 +510,13 @@ async def batch_refresh_tokens(
         # 如果提供了email_ids，直接使用这些账户
         if request and request.email_ids and len(request.email_ids) > 0:
             logger.info(f"Admin {admin['username']} initiated batch token refresh for {len(request.email_ids)} selected accounts")
-            accounts_data = []
-            for email_id in request.email_ids:
-                account_data = db.get_account_by_email(email_id)
-                if account_data:
-                    accounts_data.append(account_data)
+            # 批量查询（分块 IN / = ANY），保持请求中的顺序
+            accounts_by_email = db.get_accounts_by_emails(request.email_ids)
+            accounts_data = [
+                accounts_by_email[email_id]
+                for email_id in dict.fromkeys(request.email_ids)
+                if email_id in accounts_by_email
+            ]
             total_accounts = len(accounts_data)
         else:
             # 否则使用筛选条件
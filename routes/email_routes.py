@@ -4,18 +4,21 @@
 处理邮件查询相关的API端点
 """
 
-from typing import Optional
+from typing import Literal, Optional
 
 from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
 import auth
 from account_service import (
+    MESSAGE_STREAM_MEDIA_TYPES,
     delete_message_via_gateway,
     delete_messages_batch_via_gateway,
     get_account_credentials,
     get_mail_gateway_for_request,
     get_message_detail_via_gateway,
     list_messages_via_gateway,
+    open_message_stream_via_gateway,
     send_message_via_gateway,
 )
 from email_service import list_emails  # 兼容测试哨兵：确保 v1 adapter 不再走旧读路径
@@ -131,6 +134,48 @@ async def get_dual_view_emails(
     )
 
 
+@router.get("/{email_id}/stream")
+async def stream_emails(
+    email_id: str,
+    folder: str = Query("all", pattern="^(inbox|junk|all)$"),
+    max_count: int = Query(100, ge=1, le=1000, description="最多返回的邮件数"),
+    stream_format: Literal["ndjson", "sse"] = Query("ndjson", alias="format", description="输出格式（ndjson/sse）"),
+    sender_search: Optional[str] = Query(None, description="发件人模糊搜索"),
+    subject_search: Optional[str] = Query(None, description="主题模糊搜索"),
+    sort_by: str = Query("date", pattern="^(date|subject|from_email)$", description="批内排序字段（date/subject/from_email）"),
+    sort_order: str = Query("desc", pattern="^(asc|desc)$", description="排序方向"),
+    request: Request = None,
+    user: dict = Depends(auth.get_current_user),
+):
+    """
+    流式获取邮件列表（NDJSON / SSE，根据用户权限控制）
+
+    邮件按批次（IMAP 每批邮件头、Graph 每页）到达即输出，批内按 sort_by/sort_order 排序，
+    不做跨文件夹的全局排序和分页，最后输出一帧汇总信息。
+    """
+    if not auth.check_account_access(user, email_id):
+        raise HTTPException(status_code=403, detail=f"无权访问账户 {email_id}")
+    
+    auth.require_permission(user, Permission.VIEW_EMAILS)
+    
+    credentials = await get_account_credentials(email_id)
+    mail_gateway = get_mail_gateway_for_request(request)
+    frames = await open_message_stream_via_gateway(
+        mail_gateway,
+        credentials,
+        stream_format=stream_format,
+        folder=folder,
+        max_count=max_count,
+        sender_search=sender_search,
+        subject_search=subject_search,
+        sort_by=sort_by,
+        sort_order=sort_order,
+    )
+    stream_response = StreamingResponse(frames, media_type=MESSAGE_STREAM_MEDIA_TYPES[stream_format])
+    _apply_v1_deprecation_headers(stream_response)
+    return stream_response
+
+
 @router.get("/{email_id}/{message_id}", response_model=EmailDetailsResponse)
 async def get_email_detail(
     email_id: str,
@@ -0,0 +1,42 @@
+"""
+Graph 变更通知路由模块
+
+接收 Microsoft Graph 推送的变更通知和生命周期通知（公开接口，由 clientState 校验来源）
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from graph_notifications import graph_subscriptions
+from logger_config import logger
+
+# 创建路由器
+router = APIRouter(prefix="/graph", tags=["Graph 变更通知"])
+
+
+@router.post("/notifications")
+async def receive_graph_notifications(
+    request: Request,
+    validation_token: Optional[str] = Query(None, alias="validationToken"),
+):
+    """
+    接收 Graph 变更通知
+
+    创建订阅时 Graph 会带 validationToken 调用一次，需要原样以纯文本返回；
+    普通通知校验 clientState 后立即返回 202，缓存失效和预取在后台进行。
+    """
+    if validation_token is not None:
+        return PlainTextResponse(validation_token)
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid notification payload")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid notification payload")
+
+    result = await graph_subscriptions.receive(payload)
+    logger.debug(f"Graph notifications received: {result}")
+    return JSONResponse(result, status_code=202)
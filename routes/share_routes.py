@@ -37,6 +37,7 @@ from account_service import (
     get_message_detail_via_gateway,
     list_messages_with_body_via_gateway,
 )
+from graph_api_service import GRAPH_ALL_FOLDERS
 from rate_limiter import check_share_token_rate_limit
 from logger_config import logger
 
@@ -195,12 +196,14 @@ async def create_tokens_batch(
     elif request.valid_days:
         expiry_time = (datetime.now() + timedelta(days=request.valid_days)).isoformat()
     
+    # 批量查询账号是否存在（分块 IN / = ANY）
+    existing_accounts = db.get_accounts_by_emails(unique_accounts)
+    
     # 遍历每个账号
     for email_account_id in unique_accounts:
         try:
             # 检查账号是否存在
-            account = db.get_account_by_email(email_account_id)
-            if not account:
+            if email_account_id not in existing_accounts:
                 ignored_count += 1
                 results.append(BatchShareResultItem(
                     email_account_id=email_account_id,
@@ -725,7 +728,7 @@ async def public_list_emails(
             from_cache=False,
             fetch_time_ms=int((time.time() - start_time) * 1000)
         )
-        # 将空结果也缓存，避免频繁查询
+        # 将空结果也缓存（只用短 TTL，获取失败时也是空结果），避免频繁查询
         cache_service.set_cached_share_email_list(
             token,
             page,
@@ -794,13 +797,15 @@ async def public_list_emails(
         fetch_time_ms=fetch_time_ms
     )
     
-    # 存入内存缓存（10秒TTL）
+    # 存入内存缓存（10秒TTL）；分享页按 folder=all 读取收件箱和垃圾邮件，
+    # 账户的这些文件夹都有变更通知订阅时使用推送失效的长 TTL 缓存
     try:
         cache_service.set_cached_share_email_list(
             token,
             page,
             page_size,
             response.model_dump() if hasattr(response, "model_dump") else response.dict(),
+            folders=GRAPH_ALL_FOLDERS,
         )
         logger.info(f"[分享页缓存已设置] Token: {token}, Page: {page}, 邮件数: {len(paginated_emails)}, 耗时: {fetch_time_ms}ms")
     except Exception as e:
@@ -3,9 +3,14 @@ from __future__ import annotations
 from typing import Callable, Literal, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
 import auth
-from account_service import get_account_credentials
+from account_service import (
+    MESSAGE_STREAM_MEDIA_TYPES,
+    get_account_credentials,
+    open_message_stream_via_gateway,
+)
 from microsoft_access.mail_gateway import default_mail_gateway
 from models import (
     AccountCredentials,
@@ -44,6 +49,9 @@ async def list_messages(
     override_provider: Optional[Literal["auto", "graph", "imap"]] = Query(None),
     strategy_mode: Optional[StrategyMode] = Query(None),
     hydrate_details: bool = Query(False),
+    body_format: Literal["html", "text"] = Query(
+        "html", description="hydrate_details 时详情正文的格式；text 只取纯文本新增内容，适合验证码识别/预览"
+    ),
     skip_cache: bool = Query(False),
     sender_search: Optional[str] = Query(None),
     subject_search: Optional[str] = Query(None),
@@ -68,6 +76,7 @@ async def list_messages(
         strategy_mode=strategy_mode or credentials.strategy_mode,
         override_provider=override_provider,
         hydrate_details=hydrate_details,
+        body_format=body_format,
         skip_cache=skip_cache,
         sender_search=sender_search,
         subject_search=subject_search,
@@ -78,6 +87,47 @@ async def list_messages(
     )
 
 
+@router.get("/{email}/messages/stream")
+async def stream_messages(
+    email: str,
+    folder: str = Query("all", pattern="^(inbox|junk|all)$"),
+    max_count: int = Query(100, ge=1, le=1000),
+    stream_format: Literal["ndjson", "sse"] = Query("ndjson", alias="format"),
+    override_provider: Optional[Literal["auto", "graph", "imap"]] = Query(None),
+    strategy_mode: Optional[StrategyMode] = Query(None),
+    sender_search: Optional[str] = Query(None),
+    subject_search: Optional[str] = Query(None),
+    sort_by: str = Query("date", pattern="^(date|subject|from_email)$"),
+    sort_order: str = Query("desc", pattern="^(asc|desc)$"),
+    start_time: Optional[str] = Query(None),
+    end_time: Optional[str] = Query(None),
+    user: dict = Depends(auth.get_current_user),
+    account_loader=Depends(get_account_loader),
+    mail_gateway=Depends(get_mail_gateway),
+):
+    if not auth.check_account_access(user, email):
+        raise HTTPException(status_code=403, detail=f"无权访问账户 {email}")
+    auth.require_permission(user, Permission.VIEW_EMAILS)
+
+    credentials = await account_loader(email)
+    frames = await open_message_stream_via_gateway(
+        mail_gateway,
+        credentials,
+        stream_format=stream_format,
+        folder=folder,
+        max_count=max_count,
+        strategy_mode=strategy_mode or credentials.strategy_mode,
+        override_provider=override_provider,
+        sender_search=sender_search,
+        subject_search=subject_search,
+        sort_by=sort_by,
+        sort_order=sort_order,
+        start_time=start_time,
+        end_time=end_time,
+    )
+    return StreamingResponse(frames, media_type=MESSAGE_STREAM_MEDIA_TYPES[stream_format])
+
+
 @router.get("/{email}/messages/{message_id}", response_model=EmailDetailsResponse)
 async def get_message_detail(
     email: str,
@@ -0,0 +1,352 @@
+"""
+管理后台 SQL 控制台执行模块
+
+SQL 在独立工作线程中执行，不占用事件循环：
+- SQLite：游标按批 fetchmany 增量读取，通过 progress handler 实现超时与取消
+- PostgreSQL：查询语句使用命名游标（服务端游标）分批读取，
+  通过 SET LOCAL statement_timeout 限制单条语句执行时间，取消时调用 connection.cancel()
+
+执行结果以事件流的形式返回（columns / rows / end / error），
+既可以流式输出为 NDJSON，也可以收集为一次性响应。
+"""
+
+import asyncio
+import queue
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import database as db
+from config import (
+    DB_TYPE,
+    SQL_CONSOLE_FETCH_BATCH_SIZE,
+    SQL_CONSOLE_MAX_TIMEOUT,
+    SQL_CONSOLE_STATEMENT_TIMEOUT,
+)
+from logger_config import logger
+
+# 可以放入 PostgreSQL DECLARE CURSOR 的语句
+_SERVER_CURSOR_STATEMENT_RE = re.compile(r"^\s*(SELECT|WITH|VALUES|TABLE)\b", re.IGNORECASE)
+# SQLite progress handler 的调用间隔（虚拟机指令数）
+_SQLITE_PROGRESS_INTERVAL = 1000
+# 客户端指定的 query_id 格式（同时用作 PostgreSQL 命名游标名的一部分）
+QUERY_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# 工作线程与消费方之间的事件队列长度（按批计），用于背压
+_EVENT_QUEUE_SIZE = 4
+_QUEUE_POLL_INTERVAL = 0.5
+
+
+class SqlQueryCancelled(Exception):
+    """SQL 查询被取消或超时"""
+
+
+class SqlConsoleQuery:
+    """一次 SQL 控制台执行的句柄，可从其他线程取消"""
+
+    def __init__(
+        self,
+        sql: str,
+        *,
+        query_id: Optional[str] = None,
+        created_by: Optional[str] = None,
+        timeout_seconds: Optional[float] = None,
+    ):
+        self.query_id = query_id or uuid.uuid4().hex
+        self.sql = sql
+        self.created_by = created_by
+        self.timeout_seconds = min(
+            timeout_seconds or SQL_CONSOLE_STATEMENT_TIMEOUT,
+            SQL_CONSOLE_MAX_TIMEOUT,
+        )
+        self.started_at = datetime.now().isoformat()
+        self._started_monotonic = time.monotonic()
+        self._cancel_event = threading.Event()
+        self._cancel_reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def deadline(self) -> float:
+        return self._started_monotonic + self.timeout_seconds
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    @property
+    def cancel_reason(self) -> Optional[str]:
+        return self._cancel_reason
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """请求取消执行（线程安全）"""
+        with self._lock:
+            if self._cancel_event.is_set():
+                return
+            self._cancel_reason = reason
+            self._cancel_event.set()
+            conn = self._conn
+        # PostgreSQL 连接支持跨线程发送取消请求；SQLite 由 progress handler 检查取消标记
+        if conn is not None and DB_TYPE == "postgresql":
+            try:
+                conn.cancel()
+            except Exception as e:
+                logger.warning(f"Failed to cancel SQL query {self.query_id}: {e}")
+
+    def should_abort(self) -> bool:
+        if self._cancel_event.is_set():
+            return True
+        if time.monotonic() >= self.deadline:
+            self.cancel("timeout")
+            return True
+        return False
+
+    def attach(self, conn) -> None:
+        with self._lock:
+            self._conn = conn
+
+    def detach(self) -> None:
+        with self._lock:
+            self._conn = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "query_id": self.query_id,
+            "sql": self.sql,
+            "created_by": self.created_by,
+            "started_at": self.started_at,
+            "elapsed_ms": int((time.monotonic() - self._started_monotonic) * 1000),
+            "timeout_seconds": self.timeout_seconds,
+            "cancelled": self.cancelled,
+        }
+
+
+class SqlConsoleRegistry:
+    """正在执行的 SQL 查询登记表（按 query_id 取消）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries: Dict[str, SqlConsoleQuery] = {}
+
+    def register(self, query: SqlConsoleQuery) -> None:
+        with self._lock:
+            if query.query_id in self._queries:
+                raise ValueError(f"Query id already running: {query.query_id}")
+            self._queries[query.query_id] = query
+
+    def unregister(self, query: SqlConsoleQuery) -> None:
+        with self._lock:
+            if self._queries.get(query.query_id) is query:
+                del self._queries[query.query_id]
+
+    def cancel(self, query_id: str) -> bool:
+        with self._lock:
+            query = self._queries.get(query_id)
+        if query is None:
+            return False
+        query.cancel()
+        return True
+
+    def list_running(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            queries = list(self._queries.values())
+        return [query.to_dict() for query in queries]
+
+
+# 全局实例
+sql_console_registry = SqlConsoleRegistry()
+
+
+def _row_to_dict(row: Any, columns: List[str]) -> Dict[str, Any]:
+    if isinstance(row, dict):
+        record = dict(row)
+    else:
+        record = dict(zip(columns, row))
+    return db._serialize_binary_values(record)
+
+
+def _is_cancellation_error(error: Exception, query: SqlConsoleQuery) -> bool:
+    if query.cancelled:
+        return True
+    # psycopg2 的 QueryCanceledError（statement_timeout 触发）
+    return type(error).__name__ == "QueryCanceledError"
+
+
+def _statement_needs_commit(conn, sql: str) -> bool:
+    """
+    返回结果集的语句是否需要提交（INSERT/UPDATE/DELETE ... RETURNING 同样有 description）
+
+    SQLite 只在写语句前隐式开启事务，以 in_transaction 判断；PostgreSQL 中除只读查询外都提交。
+    """
+    if DB_TYPE == "postgresql":
+        return not _SERVER_CURSOR_STATEMENT_RE.match(sql)
+    return conn.in_transaction
+
+
+def _execute_in_worker(
+    query: SqlConsoleQuery,
+    max_rows: int,
+    batch_size: int,
+    emit,
+) -> None:
+    """在工作线程中执行 SQL，按批通过 emit 输出事件"""
+    start_time = time.time()
+    with db.get_db_connection() as conn:
+        query.attach(conn)
+        try:
+            if DB_TYPE == "postgresql":
+                setup_cursor = conn.cursor()
+                setup_cursor.execute(
+                    "SET LOCAL statement_timeout = %s",
+                    (int(query.timeout_seconds * 1000),),
+                )
+                setup_cursor.close()
+                if _SERVER_CURSOR_STATEMENT_RE.match(query.sql):
+                    cursor = conn.cursor(name=f"sql_console_{query.query_id.replace('-', '_')}")
+                    cursor.itersize = batch_size
+                else:
+                    cursor = conn.cursor()
+            else:
+                conn.set_progress_handler(
+                    lambda: 1 if query.should_abort() else 0,
+                    _SQLITE_PROGRESS_INTERVAL,
+                )
+                cursor = conn.cursor()
+
+            cursor.execute(query.sql)
+
+            # 命名游标在第一次 fetch 后才有 description，需先取第一批
+            rows = cursor.fetchmany(batch_size) if getattr(cursor, "name", None) else None
+            if cursor.description is None:
+                # 不返回结果集的 DML 语句（INSERT/UPDATE/DELETE），返回影响行数
+                conn.commit()
+                affected_rows = cursor.rowcount
+                emit("end", {
+                    "row_count": affected_rows,
+                    "affected_rows": affected_rows,
+                    "truncated": False,
+                    "execution_time_ms": int((time.time() - start_time) * 1000),
+                })
+                return
+
+            columns = [desc[0] for desc in cursor.description]
+            emit("columns", columns)
+            if rows is None:
+                rows = cursor.fetchmany(batch_size)
+
+            row_count = 0
+            truncated = False
+            while rows:
+                if query.should_abort():
+                    raise SqlQueryCancelled(query.cancel_reason)
+                remaining = max_rows - row_count
+                if len(rows) > remaining:
+                    rows = rows[:remaining]
+                    truncated = True
+                emit("rows", [_row_to_dict(row, columns) for row in rows])
+                row_count += len(rows)
+                if row_count >= max_rows:
+                    # 只探测是否还有更多行，不读取剩余结果
+                    truncated = truncated or bool(cursor.fetchmany(1))
+                    break
+                rows = cursor.fetchmany(batch_size)
+
+            cursor.close()
+            if _statement_needs_commit(conn, query.sql):
+                conn.commit()
+            emit("end", {
+                "row_count": row_count,
+                "truncated": truncated,
+                "execution_time_ms": int((time.time() - start_time) * 1000),
+            })
+        finally:
+            query.detach()
+            if DB_TYPE != "postgresql":
+                conn.set_progress_handler(None, 0)
+
+
+async def iter_query_events(
+    query: SqlConsoleQuery,
+    *,
+    max_rows: int,
+    batch_size: int = SQL_CONSOLE_FETCH_BATCH_SIZE,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    执行 SQL 并异步产出事件
+
+    事件类型：
+    - ("columns", [列名])
+    - ("rows", [行字典])
+    - ("end", {"row_count", "truncated", "execution_time_ms", ...})
+    - ("error", {"message", "cancelled", "execution_time_ms"})
+
+    消费方提前退出（例如客户端断开）时会取消正在执行的查询。
+    """
+    events: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=_EVENT_QUEUE_SIZE)
+    start_time = time.time()
+
+    def emit(kind: str, payload: Any) -> None:
+        # 消费方已停止时不再阻塞工作线程
+        while True:
+            if query.cancelled and kind == "rows":
+                raise SqlQueryCancelled(query.cancel_reason)
+            try:
+                events.put((kind, payload), timeout=_QUEUE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def worker() -> None:
+        try:
+            _execute_in_worker(query, max_rows, batch_size, emit)
+        except Exception as e:
+            cancelled = isinstance(e, SqlQueryCancelled) or _is_cancellation_error(e, query)
+            if cancelled:
+                reason = query.cancel_reason or "timeout"
+                message = (
+                    f"Query exceeded statement timeout ({query.timeout_seconds}s)"
+                    if reason == "timeout" else "Query cancelled"
+                )
+            else:
+                message = str(e)
+            try:
+                emit("error", {
+                    "message": message,
+                    "cancelled": cancelled,
+                    "execution_time_ms": int((time.time() - start_time) * 1000),
+                })
+            except SqlQueryCancelled:
+                pass
+
+    sql_console_registry.register(query)
+    thread = threading.Thread(target=worker, name=f"sql-console-{query.query_id}", daemon=True)
+    thread.start()
+    finished = False
+    try:
+        while True:
+            # 每次只等待一个轮询间隔：客户端断开取消 await 后，执行 events.get 的
+            # 线程最多再阻塞一个间隔就返回，不会长期占用默认线程池
+            try:
+                kind, payload = await asyncio.to_thread(events.get, True, _QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                if query.cancelled and not thread.is_alive() and events.empty():
+                    # 已取消且工作线程已退出，不会再有结束事件
+                    break
+                continue
+            if kind in ("end", "error"):
+                finished = True
+            yield kind, payload
+            if finished:
+                break
+    finally:
+        if not finished:
+            query.cancel()
+            # 排空队列，让工作线程尽快结束
+            while thread.is_alive():
+                try:
+                    events.get_nowait()
+                except queue.Empty:
+                    await asyncio.sleep(0.05)
+        sql_console_registry.unregister(query)
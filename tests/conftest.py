@@ -23,6 +23,7 @@ LIVE_TEST_FILES = {
 
 BENCHMARK_TEST_FILES = {
     "test_cache_performance.py",
+    "test_prepared_statement_performance.py",
 }
 
 
@@ -0,0 +1,34 @@
+import pytest
+
+from models import BatchDeleteRequest
+from routes import account_routes
+
+ADMIN = {"username": "admin", "role": "admin"}
+
+
+@pytest.mark.asyncio
+async def test_batch_delete_falls_back_to_per_account_deletes_when_bulk_delete_fails(monkeypatch):
+    def failing_bulk_delete(_emails):
+        raise RuntimeError("database is locked")
+
+    def delete_account(email: str) -> bool:
+        if email == "broken@example.com":
+            raise RuntimeError("constraint failed")
+        return email == "ok@example.com"
+
+    monkeypatch.setattr(account_routes.db, "delete_accounts", failing_bulk_delete)
+    monkeypatch.setattr(account_routes.db, "delete_account", delete_account)
+    monkeypatch.setattr(account_routes.db, "list_graph_subscriptions", lambda _email: [])
+    monkeypatch.setattr(account_routes.db, "delete_graph_delta_state", lambda _email: 0)
+
+    result = await account_routes.batch_delete_accounts(
+        BatchDeleteRequest(email_ids=["ok@example.com", "broken@example.com", "missing@example.com"]),
+        admin=ADMIN,
+    )
+
+    assert (result.total_processed, result.success_count, result.failed_count) == (3, 1, 2)
+    assert [(item["email"], item["status"], item["message"]) for item in result.details] == [
+        ("ok@example.com", "success", "Account deleted successfully"),
+        ("broken@example.com", "failed", "constraint failed"),
+        ("missing@example.com", "failed", "Account not found"),
+    ]
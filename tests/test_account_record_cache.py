@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+
+import cache_service
+import database as db
+import dao.account_dao as account_dao_module
+from dao.account_dao import AccountDAO
+
+EMAIL = "account-cache@example.com"
+
+
+def _reset(dao: AccountDAO) -> None:
+    dao.delete_account(EMAIL)
+    cache_service.invalidate_account_record(EMAIL)
+
+
+def _trace_account_queries(monkeypatch):
+    statements = []
+    original_get_db_connection = db.get_db_connection
+
+    @contextmanager
+    def tracing_connection():
+        with original_get_db_connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+
+    monkeypatch.setattr(account_dao_module, "get_db_connection", tracing_connection)
+    return statements
+
+
+def test_get_by_email_is_read_through_and_returns_copies(monkeypatch):
+    dao = AccountDAO()
+    _reset(dao)
+    dao.create(email=EMAIL, refresh_token="rt", client_id="cid", tags=["a"])
+
+    first = dao.get_by_email(EMAIL)
+    first["tags"].append("mutated")
+
+    statements = _trace_account_queries(monkeypatch)
+    second = dao.get_by_email(EMAIL)
+    token_info = dao.get_access_token(EMAIL)
+
+    assert second["tags"] == ["a"]
+    assert token_info is None
+    assert statements == []
+    _reset(dao)
+
+
+def test_writes_invalidate_cached_account_record():
+    dao = AccountDAO()
+    _reset(dao)
+    dao.create(email=EMAIL, refresh_token="rt", client_id="cid")
+    assert dao.get_by_email(EMAIL)["refresh_token"] == "rt"
+
+    dao.update_account(EMAIL, refresh_token="rt-2")
+    assert dao.get_by_email(EMAIL)["refresh_token"] == "rt-2"
+
+    dao.update_access_token(EMAIL, "at", "2099-01-01T00:00:00")
+    assert dao.get_access_token(EMAIL) == {
+        "access_token": "at",
+        "token_expires_at": "2099-01-01T00:00:00",
+    }
+
+    dao.delete_account(EMAIL)
+    assert dao.get_by_email(EMAIL) is None
+
+
+def test_stale_read_is_not_cached_after_concurrent_invalidation():
+    generation = cache_service.get_account_record_cache_generation()
+    cache_service.invalidate_account_record(EMAIL)
+
+    cache_service.set_cached_account_record(EMAIL, {"email": EMAIL}, generation)
+
+    assert cache_service.get_cached_account_record(EMAIL) is None
+
+
+def test_preload_cache_fills_records_in_bulk(monkeypatch):
+    dao = AccountDAO()
+    _reset(dao)
+    dao.create(email=EMAIL, refresh_token="rt", client_id="cid")
+    cache_service.invalidate_account_record(EMAIL)
+
+    assert dao.preload_cache([EMAIL, EMAIL, "missing@example.com"]) == 1
+
+    statements = _trace_account_queries(monkeypatch)
+    assert dao.get_by_email(EMAIL)["client_id"] == "cid"
+    assert statements == []
+    _reset(dao)
+
+
+def test_get_many_by_emails_queries_misses_in_chunks(monkeypatch):
+    dao = AccountDAO()
+    emails = [f"bulk-{index}@example.com" for index in range(5)]
+    dao.delete_many_by_emails(emails)
+    for email in emails:
+        dao.create(email=email, refresh_token="rt", client_id="cid")
+        cache_service.invalidate_account_record(email)
+    dao.get_by_email(emails[0])
+
+    statements = _trace_account_queries(monkeypatch)
+    accounts = dao.get_many_by_emails(emails + [emails[1], "missing@example.com"], chunk_size=2)
+
+    assert set(accounts) == set(emails)
+    # emails[0] 命中缓存，其余 4 个邮箱 + 1 个不存在的邮箱分 3 块查询
+    assert len([sql for sql in statements if "FROM accounts WHERE email IN" in sql]) == 3
+
+    statements.clear()
+    assert set(dao.get_many_by_emails(emails)) == set(emails)
+    assert statements == []
+
+    assert sorted(dao.delete_many_by_emails(emails + ["missing@example.com"])) == sorted(emails)
+    assert dao.get_many_by_emails(emails) == {}
+
+
+def test_get_many_by_emails_uses_any_array_on_postgres(monkeypatch):
+    executed = []
+
+    class FakeCursor:
+        def execute(self, sql, params=None):
+            executed.append((sql, params))
+
+        def fetchall(self):
+            return []
+
+    monkeypatch.setattr(account_dao_module, "DB_TYPE", "postgresql")
+
+    AccountDAO()._fetch_by_emails(FakeCursor(), ["a@example.com", "b@example.com", "a@example.com"])
+
+    assert executed == [
+        ("SELECT * FROM accounts WHERE email = ANY(%s)", (["a@example.com", "b@example.com"],))
+    ]
@@ -0,0 +1,169 @@
+from contextlib import contextmanager
+
+import database as db
+import dao.account_dao as account_dao_module
+from account_sampler import AccountSampler, account_sampler
+from dao.account_dao import AccountDAO
+
+
+class _FakeAccountDAO:
+    def __init__(self, accounts):
+        # {id: [tags]}
+        self.accounts = dict(accounts)
+        self.index_loads = []
+        self.fetches = []
+
+    def load_sampling_index(self, after_id=0):
+        self.index_loads.append(after_id)
+        ids = [account_id for account_id in self.accounts if account_id > after_id]
+        pairs = [(account_id, tag) for account_id in ids for tag in self.accounts[account_id]]
+        return ids, pairs
+
+    def get_by_ids(self, ids):
+        self.fetches.append(list(ids))
+        return [{"id": account_id} for account_id in ids if account_id in self.accounts]
+
+
+def _sampled_ids(records):
+    return {record["id"] for record in records}
+
+
+def test_sampler_honors_tags_and_reports_exact_total():
+    dao = _FakeAccountDAO({1: ["vip"], 2: ["vip", "disabled"], 3: [], 4: ["vip"]})
+    sampler = AccountSampler()
+
+    records, total = sampler.sample(dao, include_tags=["vip"], exclude_tags=["disabled"], page_size=10)
+    assert total == 2
+    assert _sampled_ids(records) == {1, 4}
+
+    records, total = sampler.sample(dao, exclude_tags=["vip"], page_size=10)
+    assert total == 1
+    assert _sampled_ids(records) == {3}
+
+    records, total = sampler.sample(dao, page=3, page_size=2)
+    assert (records, total) == ([], 4)
+    # 索引只全量加载一次
+    assert dao.index_loads == [0]
+
+
+def test_sampler_returns_random_subsets():
+    dao = _FakeAccountDAO({account_id: [] for account_id in range(1, 101)})
+    sampler = AccountSampler()
+
+    seen = set()
+    for _ in range(20):
+        records, total = sampler.sample(dao, page_size=5)
+        assert total == 100
+        assert len(records) == 5
+        seen.update(_sampled_ids(records))
+    assert len(seen) > 20
+
+
+def test_sampler_refreshes_incrementally_and_after_invalidation():
+    dao = _FakeAccountDAO({1: ["a"], 2: ["a"]})
+    sampler = AccountSampler()
+    sampler.sample(dao, include_tags=["a"])
+
+    dao.accounts[3] = ["a"]
+    sampler.invalidate(full=False)
+    _, total = sampler.sample(dao, include_tags=["a"])
+    assert total == 3
+    assert dao.index_loads == [0, 2]
+
+    dao.accounts[1] = []
+    sampler.invalidate()
+    _, total = sampler.sample(dao, include_tags=["a"])
+    assert total == 2
+    assert dao.index_loads == [0, 2, 0]
+
+
+def test_sampler_rebuilds_when_accounts_were_deleted_elsewhere():
+    dao = _FakeAccountDAO({1: [], 2: []})
+    sampler = AccountSampler()
+    sampler.sample(dao)
+
+    del dao.accounts[2]
+    records, total = sampler.sample(dao, page_size=2)
+
+    assert total == 1
+    assert _sampled_ids(records) == {1}
+    assert sampler.get_stats()["retries"] == 1
+
+
+def test_get_random_uses_sampler_without_order_by_random(monkeypatch):
+    statements = []
+    original_get_db_connection = db.get_db_connection
+
+    dao = AccountDAO()
+    for index in range(3):
+        email = f"sampler-{index}@example.com"
+        dao.delete_account(email)
+        dao.create(email=email, refresh_token="rt", client_id="cid", tags=["sampler-test"])
+    account_sampler.invalidate()
+
+    @contextmanager
+    def tracing_connection():
+        with original_get_db_connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+
+    monkeypatch.setattr(account_dao_module, "get_db_connection", tracing_connection)
+    records, total = dao.get_random(include_tags=["sampler-test"], page_size=2)
+
+    assert total == 3
+    assert len(records) == 2
+    assert all("sampler-test" in record["tags"] for record in records)
+    assert not any("RANDOM()" in sql.upper() or "COUNT(" in sql.upper() for sql in statements)
+
+    for index in range(3):
+        dao.delete_account(f"sampler-{index}@example.com")
+
+
+def test_tag_updates_and_deletes_apply_to_index_without_reloading():
+    dao = _FakeAccountDAO({1: ["fresh"], 2: ["fresh"], 3: ["fresh", "vip"]})
+    sampler = AccountSampler()
+    _, total = sampler.sample(dao, include_tags=["fresh"])
+    assert total == 3
+    sampler.sample(dao, include_tags=["vip"])
+
+    # 抽样后把账户标记为已使用
+    dao.accounts[1] = ["used"]
+    sampler.update_account_tags(1, ["used"])
+    records, total = sampler.sample(dao, include_tags=["fresh"], page_size=10)
+    assert total == 2
+    assert _sampled_ids(records) == {2, 3}
+    _, total = sampler.sample(dao, include_tags=["used"])
+    assert total == 1
+
+    del dao.accounts[3]
+    sampler.remove_account(3)
+    _, total = sampler.sample(dao, include_tags=["vip"])
+    assert total == 0
+    _, total = sampler.sample(dao)
+    assert total == 2
+
+    assert dao.index_loads == [0]
+    assert sampler.get_stats()["incremental_updates"] == 2
+
+
+def test_tag_update_during_reload_schedules_full_rebuild():
+    dao = _FakeAccountDAO({1: ["fresh"]})
+    sampler = AccountSampler()
+
+    def load_with_concurrent_update(after_id=0):
+        result = _FakeAccountDAO.load_sampling_index(dao, after_id)
+        # 加载快照之后、写入索引之前，另一个请求修改了标签
+        dao.accounts[1] = ["used"]
+        sampler.update_account_tags(1, ["used"])
+        return result
+
+    dao.load_sampling_index = load_with_concurrent_update
+    sampler.sample(dao)
+    dao.load_sampling_index = lambda after_id=0: _FakeAccountDAO.load_sampling_index(dao, after_id)
+
+    _, total = sampler.sample(dao, include_tags=["used"])
+    assert total == 1
+    assert dao.index_loads == [0, 0]
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import json
+
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 import auth
@@ -11,6 +14,8 @@ class FakeMailGateway:
     def __init__(self) -> None:
         self.list_calls: list[dict] = []
         self.detail_calls: list[dict] = []
+        self.stream_calls: list[dict] = []
+        self.stream_error: HTTPException | None = None
 
     async def list_messages(self, credentials, **kwargs):
         self.list_calls.append({"email": credentials.email, **kwargs})
@@ -33,6 +38,21 @@ class FakeMailGateway:
             ],
         )
 
+    async def stream_messages(self, credentials, **kwargs):
+        self.stream_calls.append({"email": credentials.email, **kwargs})
+        if self.stream_error is not None:
+            raise self.stream_error
+        for index in range(2):
+            yield "graph_api", [
+                EmailItem(
+                    message_id=f"msg-{index}",
+                    folder="inbox",
+                    subject=f"Code {index}",
+                    from_email="noreply@example.com",
+                    date="2026-04-30T00:00:00",
+                )
+            ]
+
     async def get_message_detail(self, credentials, message_id: str, **kwargs):
         self.detail_calls.append(
             {
@@ -102,6 +122,7 @@ def test_v2_list_messages_supports_provider_override():
                 "strategy_mode": StrategyMode.AUTO,
                 "override_provider": "graph",
                 "hydrate_details": True,
+                "body_format": "html",
                 "skip_cache": True,
             "sender_search": None,
             "subject_search": "code",
@@ -267,3 +288,65 @@ def test_v2_get_message_detail_rejects_invalid_provider_override():
 
     assert response.status_code == 422
     assert gateway.detail_calls == []
+
+
+def _stream(gateway: FakeMailGateway, params: dict):
+    app.dependency_overrides[auth.get_current_user] = _admin_override
+    app.state.v2_account_loader = _load_credentials
+    app.state.v2_mail_gateway = gateway
+    try:
+        with TestClient(app) as client:
+            return client.get("/api/v2/accounts/mailbox@example.com/messages/stream", params=params)
+    finally:
+        app.dependency_overrides.clear()
+        del app.state.v2_account_loader
+        del app.state.v2_mail_gateway
+
+
+def test_v2_stream_messages_emits_ndjson_items_then_summary():
+    gateway = FakeMailGateway()
+
+    response = _stream(gateway, {"folder": "inbox", "max_count": 2, "subject_search": "code"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line.get("message_id") for line in lines[:2]] == ["msg-0", "msg-1"]
+    assert lines[2]["summary"]["provider"] == "graph_api"
+    assert lines[2]["summary"]["total_emails"] == 2
+    assert lines[2]["summary"]["truncated"] is True
+    assert gateway.stream_calls[0]["max_count"] == 2
+    assert gateway.stream_calls[0]["subject_search"] == "code"
+    assert gateway.stream_calls[0]["strategy_mode"] == StrategyMode.AUTO
+
+
+def test_v2_stream_messages_supports_sse():
+    response = _stream(FakeMailGateway(), {"format": "sse"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [event[0] for event in events] == ["event: email", "event: email", "event: summary"]
+    assert json.loads(events[0][1][len("data: "):])["message_id"] == "msg-0"
+
+
+def test_v2_stream_messages_reports_errors_before_first_batch_as_http_status():
+    gateway = FakeMailGateway()
+    gateway.stream_error = HTTPException(status_code=503, detail="mailbox unavailable")
+
+    response = _stream(gateway, {})
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == "mailbox unavailable"
+
+
+def test_v2_stream_messages_passes_sort_and_rejects_unknown_sort_fields():
+    gateway = FakeMailGateway()
+
+    response = _stream(gateway, {"sort_by": "subject", "sort_order": "asc"})
+    assert response.status_code == 200
+    assert gateway.stream_calls[0]["sort_by"] == "subject"
+    assert gateway.stream_calls[0]["sort_order"] == "asc"
+
+    response = _stream(gateway, {"sort_by": "size"})
+    assert response.status_code == 422
+    assert len(gateway.stream_calls) == 1
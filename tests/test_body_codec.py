@@ -0,0 +1,111 @@
+import body_codec
+import database as db
+from dao.email_detail_cache_dao import EmailDetailCacheDAO
+
+
+def _clear_details() -> None:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM email_details_cache")
+        conn.commit()
+
+
+def setup_function():
+    _clear_details()
+
+
+def teardown_function():
+    _clear_details()
+
+
+def _html_body() -> str:
+    rows = "".join(
+        f'<tr><td align="center" valign="top" style="padding:8px;">Line {i}</td></tr>'
+        for i in range(40)
+    )
+    return (
+        '<html><body><table role="presentation" width="100%" cellspacing="0" '
+        f'cellpadding="0" border="0" align="center">{rows}</table></body></html>'
+    )
+
+
+def test_codec_marks_and_round_trips_bodies():
+    short = body_codec.encode_body("hello")
+    assert short[0] == body_codec.BODY_CODEC_RAW
+    assert body_codec.decode_body(short) == "hello"
+
+    plain = "A" * 5000
+    encoded_plain = body_codec.encode_body(plain)
+    assert encoded_plain[0] == body_codec.BODY_CODEC_ZLIB
+    assert body_codec.decode_body(memoryview(encoded_plain)) == plain
+
+    html = _html_body()
+    encoded_html = body_codec.encode_body(html, is_html=True)
+    assert encoded_html[0] == body_codec.BODY_CODEC_ZLIB_HTML_DICT_V1
+    assert body_codec.decode_body(encoded_html) == html
+    assert len(encoded_html) < len(db.compress_text(html))
+
+    assert body_codec.encode_body(None) is None
+    assert body_codec.decode_body(None) is None
+
+
+def test_detail_cache_stores_binary_bodies():
+    html = _html_body()
+    db.cache_email_detail(
+        "codec@example.com",
+        {"message_id": "m1", "subject": "s", "body_plain": "x" * 3000, "body_html": html},
+    )
+
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT body_plain, body_html, body_plain_bin, body_html_bin FROM email_details_cache"
+        )
+        row = cursor.fetchone()
+    assert row["body_plain"] is None and row["body_html"] is None
+    assert isinstance(row["body_html_bin"], bytes)
+
+    cached = db.get_cached_email_detail("codec@example.com", "m1")
+    assert cached["body_plain"] == "x" * 3000
+    assert cached["body_html"] == html
+
+
+def _insert_legacy_row(message_id: str, body_plain: str, body_html: str) -> None:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO email_details_cache (email_account, message_id, body_plain, body_html)
+            VALUES (?, ?, ?, ?)
+            """,
+            ("legacy@example.com", message_id, db.compress_text(body_plain), db.compress_text(body_html)),
+        )
+        conn.commit()
+
+
+def _legacy_count() -> int:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM email_details_cache WHERE body_plain_bin IS NULL AND body_html_bin IS NULL"
+        )
+        return cursor.fetchone()[0]
+
+
+def test_legacy_rows_migrate_on_read_and_in_batches():
+    _insert_legacy_row("old-1", "P" * 2000, "short html")
+    _insert_legacy_row("old-2", "plain", "<p>" + "H" * 2000 + "</p>")
+    _insert_legacy_row("old-3", "plain 3", "html 3")
+
+    cached = db.get_cached_email_detail("legacy@example.com", "old-1")
+    assert cached["body_plain"] == "P" * 2000
+    assert cached["body_html"] == "short html"
+    assert _legacy_count() == 2
+
+    dao = EmailDetailCacheDAO()
+    assert dao.migrate_legacy_bodies(batch_size=1) == 1
+    assert dao.migrate_legacy_bodies(batch_size=10) == 1
+    assert dao.migrate_legacy_bodies(batch_size=10) == 0
+
+    cached = db.get_cached_email_detail("legacy@example.com", "old-2")
+    assert cached["body_html"] == "<p>" + "H" * 2000 + "</p>"
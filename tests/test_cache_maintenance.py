@@ -0,0 +1,104 @@
+import pytest
+
+import cache_maintenance
+import database as db
+from dao.email_detail_cache_dao import EmailDetailCacheDAO
+
+
+def _clear_cache_tables() -> None:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM emails_cache")
+        cursor.execute("DELETE FROM email_details_cache")
+        conn.commit()
+
+
+def setup_function():
+    _clear_cache_tables()
+
+
+def teardown_function():
+    _clear_cache_tables()
+
+
+def _emails(count: int):
+    return [
+        {
+            "message_id": f"m{i}",
+            "folder": "INBOX",
+            "subject": f"Subject {i}",
+            "from_email": "sender@example.com",
+            "date": f"2026-03-01T00:00:{i:02d}",
+            "is_read": False,
+            "has_attachments": False,
+            "sender_initial": "S",
+            "verification_code": None,
+        }
+        for i in range(count)
+    ]
+
+
+def test_tracker_counts_writes_and_deletes():
+    tracker = cache_maintenance.CacheOccupancyTracker()
+    assert tracker.needs_resync() is True
+
+    tracker.resync({"emails_cache": {"count": 10, "size_bytes": 100}})
+    assert tracker.needs_resync() is False
+
+    tracker.record_write("emails_cache", 5, 50)
+    tracker.record_delete("emails_cache", 20, 500)
+    snapshot = tracker.snapshot()["tables"]["emails_cache"]
+    assert snapshot["count"] == 0
+    assert snapshot["size_bytes"] == 0
+
+    tracker.invalidate()
+    assert tracker.needs_resync() is True
+
+
+def test_cache_emails_no_longer_runs_inline_size_check(monkeypatch: pytest.MonkeyPatch):
+    def fail_check(*_args, **_kwargs):
+        raise AssertionError("check_cache_size should not run on the write path")
+
+    monkeypatch.setattr(EmailDetailCacheDAO, "check_cache_size", fail_check)
+    before = cache_maintenance.cache_occupancy.count("emails_cache")
+
+    assert db.cache_emails("writer@example.com", _emails(3)) is True
+    assert cache_maintenance.cache_occupancy.count("emails_cache") == before + 3
+
+
+def test_scheduler_evicts_in_bounded_chunks(monkeypatch: pytest.MonkeyPatch):
+    db.cache_emails("bulk@example.com", _emails(30))
+
+    monkeypatch.setattr(
+        cache_maintenance,
+        "CACHE_TABLE_LIMITS",
+        {"emails_cache": 20, "email_details_cache": 20},
+    )
+    monkeypatch.setattr(cache_maintenance, "LRU_CLEANUP_CHUNK_SIZE", 5)
+    monkeypatch.setattr(cache_maintenance, "LRU_CLEANUP_CHUNK_PAUSE", 0)
+    monkeypatch.setattr(cache_maintenance, "LRU_CLEANUP_MAX_CHUNKS_PER_RUN", 2)
+
+    delete_calls = []
+    original_delete = EmailDetailCacheDAO.delete_cache_rows
+
+    def tracking_delete(self, table_name, record_ids):
+        delete_calls.append(len(record_ids))
+        return original_delete(self, table_name, record_ids)
+
+    monkeypatch.setattr(EmailDetailCacheDAO, "delete_cache_rows", tracking_delete)
+
+    scheduler = cache_maintenance.CacheMaintenanceScheduler(
+        cache_maintenance.CacheOccupancyTracker()
+    )
+    first = scheduler.run_once()
+    assert first["deleted_emails"] == 10
+    assert delete_calls == [5, 5]
+
+    second = scheduler.run_once()
+    assert second["deleted_emails"] == 6
+    assert scheduler.tracker.count("emails_cache") == 14
+    assert EmailDetailCacheDAO().get_occupancy()["emails_cache"]["count"] == 14
+
+    third = scheduler.run_once()
+    assert third == {"deleted_emails": 0, "deleted_details": 0}
+    assert scheduler.get_stats()["total_deleted_emails"] == 16
@@ -0,0 +1,161 @@
+import asyncio
+
+import admin_api
+import database as db
+
+
+def _clear_cache_tables() -> None:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM emails_cache")
+        cursor.execute("DELETE FROM email_details_cache")
+        conn.commit()
+
+
+def setup_function():
+    _clear_cache_tables()
+
+
+def teardown_function():
+    _clear_cache_tables()
+
+
+def _admin():
+    return {"role": "admin", "username": "tester", "is_active": True}
+
+
+def _email(message_id: str, sender: str, subject: str, date: str, code=None):
+    return {
+        "message_id": message_id,
+        "folder": "INBOX",
+        "subject": subject,
+        "from_email": sender,
+        "date": date,
+        "is_read": False,
+        "has_attachments": False,
+        "sender_initial": sender[:1].upper(),
+        "verification_code": code,
+    }
+
+
+def _search(**kwargs):
+    params = {
+        "sender": None,
+        "subject": None,
+        "start_time": None,
+        "end_time": None,
+        "verification_code": None,
+        "has_verification_code": None,
+        "email_account": None,
+        "page_size": 100,
+        "cursor": None,
+        "admin": _admin(),
+    }
+    params.update(kwargs)
+    return asyncio.run(admin_api.search_cache(**params))
+
+
+def test_cache_search_spans_accounts_and_namespaces():
+    db.cache_emails(
+        "a@example.com",
+        [_email("m1", "noreply@github.com", "GitHub code", "2026-01-01T10:00:00", "111111")],
+        provider="graph_api",
+    )
+    db.cache_emails(
+        "b@example.com",
+        [
+            # IMAP 缓存保存原始 From 头
+            _email("m2", '"GitHub" <noreply@github.com>', "GitHub login", "2026-01-01T11:00:00"),
+            _email("m3", "news@example.com", "Weekly", "2026-01-01T12:00:00"),
+        ],
+        provider="imap",
+    )
+    db.cache_email_detail(
+        "b@example.com",
+        {
+            "message_id": "m2",
+            "subject": "GitHub login",
+            "from_email": "noreply@github.com",
+            "to_email": "b@example.com",
+            "date": "2026-01-01T11:00:00",
+            "body_plain": "code 222222",
+            "body_html": "",
+            "verification_code": "222222",
+        },
+        provider="imap",
+    )
+
+    result = _search(sender="NoReply@GitHub")
+
+    assert [item.message_id for item in result.items] == ["m2", "m1"]
+    assert result.items[0].email_account == "b@example.com"
+    assert result.items[0].provider == "imap"
+    assert result.items[0].verification_code == "222222"
+    assert result.items[0].has_detail is True
+    assert result.items[1].provider == "graph_api"
+
+    # 发件人按前缀匹配，中间片段不匹配
+    assert _search(sender="github").items == []
+    assert [item.message_id for item in _search(sender="news@").items] == ["m3"]
+
+    by_code = _search(verification_code="222222")
+    assert [item.message_id for item in by_code.items] == ["m2"]
+    by_list_code = _search(verification_code="111111")
+    assert [item.message_id for item in by_list_code.items] == ["m1"]
+
+    windowed = _search(start_time="2026-01-01T10:30:00", has_verification_code=False)
+    assert [item.message_id for item in windowed.items] == ["m3"]
+
+    scoped = _search(email_account="a@example.com")
+    assert [item.message_id for item in scoped.items] == ["m1"]
+
+
+def test_cache_search_pages_with_keyset_cursor():
+    db.cache_emails(
+        "c@example.com",
+        [
+            _email(f"m{i}", "alerts@example.com", f"Alert {i}", f"2026-02-01T00:00:{i:02d}")
+            for i in range(5)
+        ],
+    )
+
+    seen = []
+    cursor = None
+    while True:
+        page = _search(page_size=2, cursor=cursor)
+        seen.extend(item.message_id for item in page.items)
+        cursor = page.next_cursor
+        if not cursor:
+            break
+
+    assert seen == ["m4", "m3", "m2", "m1", "m0"]
+
+
+def test_cache_search_sender_prefix_uses_index():
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM emails_cache WHERE from_address LIKE ? ESCAPE '\\'",
+            ("noreply%",),
+        )
+        sender_plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+
+    assert "idx_emails_cache_from_address_date" in sender_plan
+
+
+def test_from_address_backfill_normalizes_raw_from_headers():
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO emails_cache (email_account, message_id, folder, from_email, date)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            ("legacy@example.com", "old-1", "INBOX", "GitHub <NoReply@GitHub.com>", "2026-03-01T00:00:00"),
+        )
+        db._backfill_email_from_address(cursor)
+        conn.commit()
+        cursor.execute("SELECT from_address FROM emails_cache WHERE message_id = ?", ("old-1",))
+        assert cursor.fetchone()[0] == "noreply@github.com"
+
+    assert [item.message_id for item in _search(sender="noreply@github").items] == ["old-1"]
@@ -0,0 +1,124 @@
+import database as db
+from cache_write_behind import CacheWriteBehindQueue
+
+
+ACCOUNT = "write-behind@example.com"
+
+
+def _clear_cache_tables() -> None:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM emails_cache")
+        cursor.execute("DELETE FROM email_details_cache")
+        conn.commit()
+
+
+def setup_function():
+    _clear_cache_tables()
+
+
+def teardown_function():
+    _clear_cache_tables()
+
+
+def _email(message_id: str, subject: str) -> dict:
+    return {
+        "message_id": message_id,
+        "folder": "INBOX",
+        "subject": subject,
+        "from_email": "sender@example.com",
+        "date": "2026-03-01T00:00:00",
+        "is_read": False,
+        "has_attachments": False,
+        "sender_initial": "S",
+        "verification_code": None,
+    }
+
+
+def _force_running(queue: CacheWriteBehindQueue, monkeypatch) -> None:
+    # 不启动写线程，直接让 submit 走入队分支，由测试手动 flush
+    monkeypatch.setattr(CacheWriteBehindQueue, "running", property(lambda self: True))
+
+
+def test_submit_writes_synchronously_when_writer_not_running():
+    queue = CacheWriteBehindQueue()
+
+    assert queue.submit_emails(ACCOUNT, [_email("m1", "Hello")], provider="imap") is True
+
+    cached, total = db.get_cached_emails(ACCOUNT, provider="imap")
+    assert total == 1
+    assert queue.get_stats()["enqueued"] == 0
+
+
+def test_queue_coalesces_per_account_and_flushes_in_one_batch(monkeypatch):
+    queue = CacheWriteBehindQueue(max_pending=100)
+    _force_running(queue, monkeypatch)
+
+    queue.submit_emails(ACCOUNT, [_email("m1", "Old"), _email("m2", "Two")], provider="imap")
+    queue.submit_emails(ACCOUNT, [_email("m1", "New")], provider="imap")
+    queue.submit_email_detail(
+        ACCOUNT,
+        {"message_id": "m1", "subject": "New", "body_plain": "hello"},
+        provider="imap",
+    )
+
+    stats = queue.get_stats()
+    assert stats["queue_depth"] == 3
+    assert stats["coalesced"] == 1
+    assert stats["pending_accounts"] == 1
+    assert db.get_cached_emails(ACCOUNT, provider="imap")[1] == 0
+
+    assert queue.flush() == 3
+    cached, total = db.get_cached_emails(ACCOUNT, provider="imap")
+    assert total == 2
+    assert {item["message_id"]: item["subject"] for item in cached}["m1"] == "New"
+    assert db.get_cached_email_detail(ACCOUNT, "m1", provider="imap")["body_plain"] == "hello"
+    assert queue.get_stats()["queue_depth"] == 0
+
+
+def test_queue_drops_writes_when_full_and_discards_cleared_accounts(monkeypatch):
+    queue = CacheWriteBehindQueue(max_pending=2)
+    _force_running(queue, monkeypatch)
+
+    assert queue.submit_emails(ACCOUNT, [_email("m1", "a"), _email("m2", "b")]) is True
+    assert queue.submit_emails(ACCOUNT, [_email("m3", "c")]) is False
+    # 覆盖已在队列中的记录不占用新的容量
+    assert queue.submit_emails(ACCOUNT, [_email("m2", "b2")]) is True
+
+    stats = queue.get_stats()
+    assert stats["dropped"] == 1
+    assert stats["queue_depth"] == 2
+
+    assert queue.discard(ACCOUNT) == 2
+    assert queue.flush() == 0
+    assert db.get_cached_emails(ACCOUNT)[1] == 0
+
+
+def test_writer_thread_flushes_pending_writes_on_stop():
+    queue = CacheWriteBehindQueue(max_pending=100, flush_interval=60)
+    queue.start()
+    try:
+        assert queue.submit_emails(ACCOUNT, [_email("m1", "Hello")], provider="graph_api") is True
+    finally:
+        queue.stop()
+
+    assert queue.running is False
+    assert db.get_cached_emails(ACCOUNT, provider="graph_api")[1] == 1
+    assert queue.get_stats()["flushed_rows"] == 1
+
+
+def test_discard_skips_batch_already_taken_by_writer(monkeypatch):
+    queue = CacheWriteBehindQueue(max_pending=100)
+    _force_running(queue, monkeypatch)
+    queue.submit_emails(ACCOUNT, [_email("m1", "a"), _email("m2", "b")], provider="imap")
+
+    # 写线程已取出这批记录，尚未写入时账户缓存被清空
+    batch, epochs = queue._take_batch()
+    assert queue.discard(ACCOUNT) == 0
+    assert queue._write_batch(batch, epochs) == 0
+    assert db.get_cached_emails(ACCOUNT, provider="imap")[1] == 0
+    assert queue.get_stats()["stale_skipped"] == 2
+
+    # 清空之后的新写入不受影响
+    queue.submit_emails(ACCOUNT, [_email("m3", "c")], provider="imap")
+    assert queue.flush() == 1
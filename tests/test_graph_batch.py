@@ -0,0 +1,169 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import graph_api_service
+import graph_batch as batch_module
+from graph_batch import GraphBatchExecutor
+from models import AccountCredentials
+
+
+class FakeResponse:
+    status_code = 200
+    text = "ok"
+    headers: dict = {}
+
+    def __init__(self, payload: dict) -> None:
+        self._payload = payload
+
+    def json(self) -> dict:
+        return self._payload
+
+
+@pytest.fixture
+def credentials() -> AccountCredentials:
+    return AccountCredentials(
+        email="batch@example.com",
+        refresh_token="refresh-token",
+        client_id="client-id",
+        api_method="graph_api",
+    )
+
+
+@pytest.fixture
+def fake_batch_endpoint(monkeypatch):
+    posts: list[list[dict]] = []
+    throttled_once: set[str] = set()
+    sleeps: list[float] = []
+    state = {"in_flight": 0, "max_in_flight": 0, "throttle": set(), "timeouts": []}
+    real_sleep = asyncio.sleep
+
+    class FakeAsyncClient:
+        async def post(self, url: str, *, headers: dict, json: dict, timeout=None):
+            assert url.endswith("/$batch")
+            posts.append(json["requests"])
+            state["timeouts"].append(timeout)
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            await real_sleep(0)
+            state["in_flight"] -= 1
+            responses = []
+            for sub_request in json["requests"]:
+                message_id = sub_request["url"].split("/")[-1].split("?")[0]
+                if message_id in state["throttle"] and message_id not in throttled_once:
+                    throttled_once.add(message_id)
+                    responses.append({"id": sub_request["id"], "status": 429, "headers": {"Retry-After": "7"}})
+                elif sub_request["method"] == "DELETE":
+                    responses.append({"id": sub_request["id"], "status": 204})
+                else:
+                    body_field = "uniqueBody" if "uniqueBody" in sub_request["url"] else "body"
+                    responses.append({
+                        "id": sub_request["id"],
+                        "status": 200,
+                        "body": {
+                            "id": message_id,
+                            "subject": f"subject {message_id}",
+                            "from": {"emailAddress": {"address": "sender@example.com"}},
+                            "receivedDateTime": "2024-01-01T00:00:00Z",
+                            body_field: {"contentType": "text", "content": f"body {message_id}"},
+                        },
+                    })
+            return FakeResponse({"responses": list(reversed(responses))})
+
+    class FakeRegistry:
+        @asynccontextmanager
+        async def client(self, name):
+            yield FakeAsyncClient()
+
+    async def fake_get_graph_access_token(_credentials: AccountCredentials) -> str:
+        return "graph-token"
+
+    async def fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(batch_module, "http_clients", FakeRegistry())
+    monkeypatch.setattr(batch_module.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr("graph_api_service.get_graph_access_token", fake_get_graph_access_token)
+    monkeypatch.setattr(
+        "graph_api_service.detect_verification_code_with_rules",
+        lambda **_kwargs: {},
+    )
+    monkeypatch.setattr(graph_api_service.cache_write_behind, "submit_email_detail", lambda *a, **k: True)
+    return posts, sleeps, state
+
+
+@pytest.mark.asyncio
+async def test_executor_packs_requests_and_retries_throttled_sub_requests(credentials, fake_batch_endpoint):
+    posts, sleeps, state = fake_batch_endpoint
+    state["throttle"] = {"m3", "m41"}
+    requests = [{"method": "DELETE", "url": f"/me/messages/m{index}"} for index in range(45)]
+
+    results = await GraphBatchExecutor(concurrency=3, max_retry_after=5).execute(credentials, requests)
+
+    assert [result["status"] for result in results] == [204] * 45
+    assert sorted(len(batch) for batch in posts) == [1, 1, 5, 20, 20]
+    retried = [batch for batch in posts if len(batch) == 1]
+    assert sorted(batch[0]["url"] for batch in retried) == ["/me/messages/m3", "/me/messages/m41"]
+    assert state["max_in_flight"] == 3
+    # Retry-After 超过上限时按上限等待，由限流层让该邮箱的重试请求退避
+    assert len(sleeps) == 2 and all(4.5 < seconds <= 5 for seconds in sleeps)
+    # 共享客户端不绑定超时，每个请求都带上执行器的超时配置
+    assert state["timeouts"] == [60.0] * len(posts)
+
+
+@pytest.mark.asyncio
+async def test_executor_gives_up_after_max_retries(credentials, fake_batch_endpoint):
+    posts, sleeps, state = fake_batch_endpoint
+    state["throttle"] = {"m0"}
+
+    results = await GraphBatchExecutor(max_retries=0).execute(
+        credentials, [{"method": "DELETE", "url": "/me/messages/m0"}]
+    )
+
+    assert results[0]["status"] == 429
+    assert len(posts) == 1 and sleeps == []
+
+
+@pytest.mark.asyncio
+async def test_fetching_twenty_message_bodies_costs_one_request(credentials, fake_batch_endpoint):
+    posts, _sleeps, _state = fake_batch_endpoint
+    message_ids = [f"batch-detail-{index}" for index in range(20)]
+
+    details = await graph_api_service.get_email_details_batch_graph(credentials, message_ids, skip_cache=True)
+
+    assert len(posts) == 1
+    assert list(details) == message_ids
+    assert details["batch-detail-7"].body_plain == "body batch-detail-7"
+    assert posts[0][0]["url"].endswith(f"?$select={graph_api_service.GRAPH_DETAIL_SELECT_FIELDS}")
+
+    # 已获取的详情写入内存缓存，再次获取不再请求 Graph
+    again = await graph_api_service.get_email_details_batch_graph(credentials, message_ids[:3])
+    assert len(posts) == 1
+    assert again["batch-detail-1"].subject == "subject batch-detail-1"
+
+
+@pytest.mark.asyncio
+async def test_text_unique_body_fetch_uses_prefer_header_and_keeps_html_cache(credentials, fake_batch_endpoint):
+    posts, _sleeps, _state = fake_batch_endpoint
+    message_ids = ["text-detail-1", "text-detail-2"]
+
+    details = await graph_api_service.get_email_details_batch_graph(
+        credentials,
+        message_ids,
+        skip_cache=True,
+        body_format=graph_api_service.GRAPH_BODY_FORMAT_TEXT,
+        unique_body=True,
+    )
+
+    sub_request = posts[0][0]
+    assert sub_request["headers"] == {"Prefer": 'outlook.body-content-type="text"'}
+    assert ",uniqueBody," in sub_request["url"] and ",body," not in sub_request["url"]
+    assert details["text-detail-1"].body_plain == "body text-detail-1"
+    assert details["text-detail-1"].body_html is None
+    # 纯文本详情不写入可渲染的详情缓存，只在单独的命名空间中复用
+    assert graph_api_service._get_cached_graph_email_detail(credentials, "text-detail-1") is None
+    await graph_api_service.get_email_details_batch_graph(
+        credentials, message_ids, body_format=graph_api_service.GRAPH_BODY_FORMAT_TEXT, unique_body=True
+    )
+    assert len(posts) == 1
@@ -0,0 +1,179 @@
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+import cache_service
+import database as db
+import graph_delta_sync as delta_module
+from graph_delta_sync import GraphDeltaSyncEngine
+from models import AccountCredentials
+
+EMAIL = "delta@example.com"
+DELTA_URL = f"{delta_module.GRAPH_API_BASE_URL}/me/mailFolders/inbox/messages/delta"
+
+
+class FakeResponse:
+    def __init__(self, url: str, payload: dict, status_code: int = 200) -> None:
+        self.url = url
+        self._payload = payload
+        self.status_code = status_code
+        self.text = "ok"
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            request = httpx.Request("GET", self.url)
+            raise httpx.HTTPStatusError(
+                "error", request=request, response=httpx.Response(self.status_code, request=request)
+            )
+
+    def json(self) -> dict:
+        return self._payload
+
+
+def _message(message_id: str, subject: str) -> dict:
+    return {
+        "id": message_id,
+        "subject": subject,
+        "from": {"emailAddress": {"address": "sender@example.com"}},
+        "receivedDateTime": "2024-01-01T00:00:00Z",
+        "bodyPreview": "preview",
+    }
+
+
+@pytest.fixture
+def credentials() -> AccountCredentials:
+    return AccountCredentials(
+        email=EMAIL,
+        refresh_token="refresh-token",
+        client_id="client-id",
+        api_method="graph_api",
+    )
+
+
+@pytest.fixture
+def isolated_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_TYPE", "sqlite")
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "graph_delta.db"))
+    monkeypatch.setattr(db, "_sqlite_last_integrity_check_ts", 0.0)
+    db.init_database()
+
+
+@pytest.fixture
+def fake_graph(monkeypatch):
+    requests: list[tuple[str, dict]] = []
+    responses: list[tuple[int, dict]] = []
+
+    class FakeAsyncClient:
+        async def get(self, url: str, *, headers: dict, params=None, timeout=None):
+            requests.append((url, dict(headers)))
+            status_code, payload = responses.pop(0)
+            return FakeResponse(url, payload, status_code)
+
+    class FakeRegistry:
+        @asynccontextmanager
+        async def client(self, name):
+            yield FakeAsyncClient()
+
+    async def fake_get_graph_access_token(_credentials: AccountCredentials) -> str:
+        return "graph-token"
+
+    monkeypatch.setattr(delta_module, "http_clients", FakeRegistry())
+    monkeypatch.setattr("graph_api_service.get_graph_access_token", fake_get_graph_access_token)
+    monkeypatch.setattr(
+        "graph_api_service.detect_verification_code_with_rules",
+        lambda **_kwargs: {},
+    )
+    return requests, responses
+
+
+def _cached_ids() -> list[str]:
+    emails, _ = db.get_cached_emails(EMAIL, page_size=100, provider="graph_api")
+    return sorted(email["message_id"] for email in emails)
+
+
+@pytest.mark.asyncio
+async def test_initial_sync_mirrors_pages_and_stores_delta_link(isolated_db, credentials, fake_graph):
+    requests, responses = fake_graph
+    next_link = f"{DELTA_URL}?$skiptoken=page2"
+    delta_link = f"{DELTA_URL}?$deltatoken=t1"
+    responses.extend([
+        (200, {"@odata.nextLink": next_link, "value": [_message("m1", "one")]}),
+        (200, {"@odata.deltaLink": delta_link, "value": [_message("m2", "two")]}),
+    ])
+    engine = GraphDeltaSyncEngine(folders=("inbox",), page_size=50)
+
+    result = await engine.sync_folder(credentials, "inbox")
+
+    assert result == {"pages": 2, "upserted": 2, "removed": 0, "complete": True}
+    assert _cached_ids() == ["m1", "m2"]
+    assert db.get_graph_delta_state(EMAIL, "inbox")["delta_link"] == delta_link
+    assert requests[0][0].startswith(f"{DELTA_URL}?$select=")
+    assert requests[0][1]["Prefer"] == "odata.maxpagesize=50"
+    assert requests[1][0] == next_link
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_applies_updates_and_removals(isolated_db, credentials, fake_graph):
+    requests, responses = fake_graph
+    db.cache_emails(EMAIL, [
+        {"message_id": "m1", "folder": "inbox", "subject": "old", "date": "2024-01-01T00:00:00Z"},
+        {"message_id": "m2", "folder": "inbox", "subject": "two", "date": "2024-01-01T00:00:00Z"},
+    ], provider="graph_api")
+    db.cache_email_detail(EMAIL, {"message_id": "m1", "subject": "old", "body_plain": "body"}, provider="graph_api")
+    db.cache_email_detail(EMAIL, {"message_id": "m2", "subject": "two", "body_plain": "body"}, provider="graph_api")
+    old_link = f"{DELTA_URL}?$deltatoken=t1"
+    new_link = f"{DELTA_URL}?$deltatoken=t2"
+    db.save_graph_delta_state(EMAIL, "inbox", old_link, True)
+    responses.append((200, {
+        "@odata.deltaLink": new_link,
+        "value": [_message("m1", "new"), {"id": "m2", "@removed": {"reason": "deleted"}}],
+    }))
+
+    result = await GraphDeltaSyncEngine(folders=("inbox",)).sync_folder(credentials, "inbox")
+
+    assert requests[0][0] == old_link
+    assert result["upserted"] == 1 and result["removed"] == 1
+    emails, _ = db.get_cached_emails(EMAIL, provider="graph_api")
+    assert [(email["message_id"], email["subject"]) for email in emails] == [("m1", "new")]
+    assert db.get_cached_email_detail(EMAIL, "m1", provider="graph_api") is None
+    assert db.get_cached_email_detail(EMAIL, "m2", provider="graph_api") is None
+    assert db.get_graph_delta_state(EMAIL, "inbox")["delta_link"] == new_link
+
+
+@pytest.mark.asyncio
+async def test_expired_delta_link_restarts_full_sync(isolated_db, credentials, fake_graph):
+    requests, responses = fake_graph
+    db.save_graph_delta_state(EMAIL, "inbox", f"{DELTA_URL}?$deltatoken=stale", True)
+    responses.extend([
+        (410, {}),
+        (200, {"@odata.deltaLink": f"{DELTA_URL}?$deltatoken=fresh", "value": [_message("m1", "one")]}),
+    ])
+
+    result = await GraphDeltaSyncEngine(folders=("inbox",)).sync_folder(credentials, "inbox")
+
+    assert result["complete"] is True
+    assert requests[1][0].startswith(f"{DELTA_URL}?$select=")
+    assert _cached_ids() == ["m1"]
+    assert db.get_graph_delta_state(EMAIL, "inbox")["delta_link"].endswith("fresh")
+
+
+def test_clearing_email_cache_resets_delta_state(isolated_db):
+    db.save_graph_delta_state(EMAIL, "inbox", f"{DELTA_URL}?$deltatoken=t1", True)
+    db.save_graph_delta_state(EMAIL, "junkemail", f"{DELTA_URL}?$deltatoken=t2", False)
+
+    db.clear_email_cache_db(EMAIL)
+
+    assert db.get_graph_delta_state(EMAIL, "inbox") is None
+    assert db.get_graph_delta_state(EMAIL, "junkemail") is None
+
+
+def test_clear_email_cache_drops_in_memory_entries_for_account():
+    cache_service.set_cached_email_detail(EMAIL, "m1", {"message_id": "m1"}, provider="graph_api")
+    cache_service.set_cached_email_detail("other@example.com", "m1", {"message_id": "m1"}, provider="graph_api")
+
+    cache_service.clear_email_cache(EMAIL)
+
+    assert cache_service.get_cached_email_detail(EMAIL, "m1", provider="graph_api") is None
+    assert cache_service.get_cached_email_detail("other@example.com", "m1", provider="graph_api") is not None
+    cache_service.clear_email_cache("other@example.com")
@@ -0,0 +1,241 @@
+import pytest
+
+import graph_api_service
+from models import AccountCredentials
+
+
+class FakeResponse:
+    status_code = 200
+    text = "ok"
+
+    def __init__(self, payload: dict) -> None:
+        self._payload = payload
+
+    def raise_for_status(self) -> None:
+        return None
+
+    def json(self) -> dict:
+        return self._payload
+
+
+def _message(message_id: str, received: str) -> dict:
+    return {
+        "id": message_id,
+        "subject": f"subject {message_id}",
+        "from": {"emailAddress": {"address": "sender@example.com"}},
+        "receivedDateTime": received,
+        "bodyPreview": "preview",
+    }
+
+
+@pytest.fixture
+def credentials() -> AccountCredentials:
+    return AccountCredentials(
+        email="paging@example.com",
+        refresh_token="refresh-token",
+        client_id="client-id",
+        api_method="graph_api",
+    )
+
+
+@pytest.fixture
+def fake_graph(monkeypatch):
+    requests: list[tuple[str, dict | None]] = []
+    responses: dict[str, list[dict]] = {}
+
+    class FakeAsyncClient:
+        def __init__(self, *args, **kwargs) -> None:
+            pass
+
+        async def get(self, url: str, *, headers: dict, params: dict | None, timeout=None):
+            requests.append((url, params))
+            return FakeResponse(responses[url].pop(0))
+
+    async def fake_get_graph_access_token(_credentials: AccountCredentials) -> str:
+        return "graph-token"
+
+    monkeypatch.setattr("graph_api_service.get_graph_access_token", fake_get_graph_access_token)
+    monkeypatch.setattr("graph_api_service.httpx.AsyncClient", FakeAsyncClient)
+    monkeypatch.setattr(
+        "graph_api_service.detect_verification_code_with_rules",
+        lambda **_kwargs: {},
+    )
+    return requests, responses
+
+
+@pytest.mark.asyncio
+async def test_list_emails_graph2_pages_on_server_without_bodies(credentials, fake_graph):
+    requests, responses = fake_graph
+    url = f"{graph_api_service.GRAPH_API_BASE_URL}/me/mailFolders/inbox/messages"
+    responses[url] = [
+        {"@odata.count": 42, "value": [_message("m3", "2024-01-03T00:00:00Z")]},
+    ]
+
+    items, total = await graph_api_service.list_emails_graph2(
+        credentials, "inbox", page=3, page_size=20, sort_by="subject", sort_order="asc"
+    )
+
+    assert total == 42
+    assert [item.message_id for item in items] == ["m3"]
+    assert items[0].body_plain is None and items[0].body_html is None
+    assert requests == [
+        (
+            url,
+            {
+                "$top": 20,
+                "$skip": 40,
+                "$count": "true",
+                "$orderby": "subject asc",
+                "$select": graph_api_service.GRAPH_LIST_SELECT_FIELDS,
+            },
+        )
+    ]
+    assert "body" not in graph_api_service.GRAPH_LIST_SELECT_FIELDS.split(",")
+
+
+@pytest.mark.asyncio
+async def test_list_emails_graph_merges_folders_with_next_link_cursor(credentials, fake_graph):
+    requests, responses = fake_graph
+    inbox_url = f"{graph_api_service.GRAPH_API_BASE_URL}/me/mailFolders/inbox/messages"
+    junk_url = f"{graph_api_service.GRAPH_API_BASE_URL}/me/mailFolders/junkemail/messages"
+    next_link = f"{inbox_url}?$skip=2"
+    responses[inbox_url] = [
+        {
+            "@odata.count": 10,
+            "@odata.nextLink": next_link,
+            "value": [_message("i1", "2024-01-09T00:00:00Z"), _message("i2", "2024-01-07T00:00:00Z")],
+        },
+    ]
+    responses[next_link] = [
+        {"value": [_message("i3", "2024-01-05T00:00:00Z"), _message("i4", "2024-01-03T00:00:00Z")]},
+    ]
+    responses[junk_url] = [
+        {
+            "@odata.count": 5,
+            "value": [
+                _message("j1", "2024-01-08T00:00:00Z"),
+                _message("j2", "2024-01-06T00:00:00Z"),
+                _message("j3", "2024-01-04T00:00:00Z"),
+                _message("j4", "2024-01-02T00:00:00Z"),
+            ],
+        },
+    ]
+
+    items, total = await graph_api_service.list_emails_graph(credentials, "all", page=2, page_size=2)
+
+    assert total == 15
+    assert [item.message_id for item in items] == ["i2", "j2"]
+    assert [(url, params and params["$top"]) for url, params in requests] == [
+        (inbox_url, 4),
+        (next_link, None),
+        (junk_url, 4),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_emails_graph_yields_each_page_and_stops_at_max_count(credentials, fake_graph, monkeypatch):
+    requests, responses = fake_graph
+    queued: list[int] = []
+    monkeypatch.setattr(
+        graph_api_service.cache_write_behind,
+        "submit_emails",
+        lambda _email, emails, provider=None: queued.append(len(emails)) or True,
+    )
+    inbox_url = f"{graph_api_service.GRAPH_API_BASE_URL}/me/mailFolders/inbox/messages"
+    junk_url = f"{graph_api_service.GRAPH_API_BASE_URL}/me/mailFolders/junkemail/messages"
+    next_link = f"{inbox_url}?$skiptoken=2"
+    responses[inbox_url] = [{
+        "@odata.nextLink": next_link,
+        "value": [_message("i1", "2024-01-03T00:00:00Z"), _message("i2", "2024-01-02T00:00:00Z")],
+    }]
+    responses[next_link] = [{"value": [_message("i3", "2024-01-01T00:00:00Z")]}]
+    responses[junk_url] = [{"value": [_message("j1", "2024-01-05T00:00:00Z"), _message("j2", "2024-01-04T00:00:00Z")]}]
+
+    batches = [
+        [item.message_id for item in batch]
+        async for batch in graph_api_service.stream_emails_graph(credentials, "all", max_count=4)
+    ]
+
+    assert batches == [["i1", "i2"], ["i3"], ["j1"]]
+    assert [url for url, _params in requests] == [inbox_url, next_link, junk_url]
+    assert requests[0][1]["$top"] == 4 and "$count" not in requests[0][1]
+    assert queued == [2, 1, 1]
+
+
+def test_list_query_keeps_received_date_first_when_filtering():
+    params, local_sort = graph_api_service._build_graph_list_query(
+        "sender", None, None, None, sort_by="subject", sort_order="asc"
+    )
+
+    # $orderby 字段必须出现在 $filter 最前，否则 Graph 返回 400 (InefficientFilter)
+    assert params == {
+        "$orderby": "receivedDateTime asc",
+        "$filter": "receivedDateTime ge 1900-01-01T00:00:00Z and contains(from/emailAddress/address, 'sender')",
+    }
+    assert local_sort
+
+    params, local_sort = graph_api_service._build_graph_list_query(
+        None, None, None, None, sort_by="from_email", sort_order="desc"
+    )
+    assert params == {"$orderby": "from/emailAddress/address desc"}
+    assert not local_sort
+
+
+@pytest.mark.asyncio
+async def test_list_emails_graph_sorts_filtered_results_locally(credentials, fake_graph):
+    requests, responses = fake_graph
+    url = f"{graph_api_service.GRAPH_API_BASE_URL}/me/mailFolders/inbox/messages"
+    responses[url] = [
+        {
+            "@odata.count": 3,
+            "value": [
+                _message("m2", "2024-01-03T00:00:00Z"),
+                _message("m3", "2024-01-02T00:00:00Z"),
+                _message("m1", "2024-01-01T00:00:00Z"),
+            ],
+        },
+    ]
+
+    items, total = await graph_api_service.list_emails_graph(
+        credentials, "inbox", page=2, page_size=2, subject_search="subject",
+        start_time="2024-01-01T00:00:00Z", sort_by="subject", sort_order="asc",
+    )
+
+    assert total == 3
+    assert [item.message_id for item in items] == ["m3"]
+    params = requests[0][1]
+    assert params["$orderby"] == "receivedDateTime asc"
+    assert params["$filter"].startswith("receivedDateTime ge 2024-01-01T00:00:00Z and ")
+    # 本地排序需要覆盖全部匹配邮件（上限 GRAPH_LOCAL_SORT_MAX_ITEMS），不能只取前 page*page_size 封
+    assert params["$skip"] == 0 and params["$top"] == graph_api_service.GRAPH_LOCAL_SORT_MAX_ITEMS
+
+
+@pytest.mark.asyncio
+async def test_list_emails_graph2_sorts_all_filtered_matches_before_paging(credentials, fake_graph):
+    requests, responses = fake_graph
+    url = f"{graph_api_service.GRAPH_API_BASE_URL}/me/mailFolders/inbox/messages"
+    next_link = f"{url}?$skip=2"
+    responses[url] = [
+        {
+            "@odata.count": 4,
+            "@odata.nextLink": next_link,
+            "value": [_message("m4", "2024-01-04T00:00:00Z"), _message("m1", "2024-01-03T00:00:00Z")],
+        },
+    ]
+    responses[next_link] = [
+        {"value": [_message("m3", "2024-01-02T00:00:00Z"), _message("m2", "2024-01-01T00:00:00Z")]},
+    ]
+
+    items, total = await graph_api_service.list_emails_graph2(
+        credentials, "inbox", page=2, page_size=2, sender_search="sender",
+        sort_by="subject", sort_order="asc",
+    )
+
+    assert total == 4
+    # 第 2 页是全部匹配邮件按主题排序后的第 3、4 封，而不是服务端第 2 页内的排序
+    assert [item.message_id for item in items] == ["m3", "m4"]
+    assert [(request_url, params and params["$skip"]) for request_url, params in requests] == [
+        (url, 0),
+        (next_link, None),
+    ]
+    assert requests[0][1]["$top"] == graph_api_service.GRAPH_LOCAL_SORT_MAX_ITEMS
@@ -0,0 +1,303 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import cache_service
+import database as db
+import graph_notifications as notifications_module
+from graph_notifications import GraphSubscriptionManager, LocalGraphNotifier
+from models import AccountCredentials
+
+EMAIL = "push@example.com"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, payload: dict | None = None) -> None:
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.text = "ok"
+        self.headers = {}
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self) -> dict:
+        return self._payload
+
+
+@pytest.fixture
+def credentials() -> AccountCredentials:
+    return AccountCredentials(
+        email=EMAIL,
+        refresh_token="refresh-token",
+        client_id="client-id",
+        api_method="graph_api",
+    )
+
+
+@pytest.fixture
+def isolated_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_TYPE", "sqlite")
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "graph_notifications.db"))
+    monkeypatch.setattr(db, "_sqlite_last_integrity_check_ts", 0.0)
+    db.init_database()
+
+
+@pytest.fixture
+def fake_graph(monkeypatch, credentials):
+    calls: list[tuple[str, str, dict | None]] = []
+    patch_status = {"code": 200}
+
+    class FakeAsyncClient:
+        async def post(self, url: str, *, headers: dict, json: dict, timeout=None):
+            calls.append(("POST", url, json))
+            folder = json["resource"].split("'")[1]
+            return FakeResponse(201, {
+                "id": f"sub-{folder}-{len(calls)}",
+                "expirationDateTime": "2099-01-01T00:00:00.1234567Z",
+            })
+
+        async def patch(self, url: str, *, headers: dict, json: dict, timeout=None):
+            calls.append(("PATCH", url, json))
+            return FakeResponse(patch_status["code"], {"expirationDateTime": json["expirationDateTime"]})
+
+        async def delete(self, url: str, *, headers: dict, timeout=None):
+            calls.append(("DELETE", url, None))
+            return FakeResponse(204)
+
+    class FakeRegistry:
+        @asynccontextmanager
+        async def client(self, name):
+            yield FakeAsyncClient()
+
+    async def fake_get_graph_access_token(_credentials: AccountCredentials) -> str:
+        return "graph-token"
+
+    async def fake_get_account_credentials(_email: str) -> AccountCredentials:
+        return credentials
+
+    monkeypatch.setattr(notifications_module, "http_clients", FakeRegistry())
+    monkeypatch.setattr("graph_api_service.get_graph_access_token", fake_get_graph_access_token)
+    monkeypatch.setattr("account_service.get_account_credentials", fake_get_account_credentials)
+    monkeypatch.setattr("graph_api_service.detect_verification_code_with_rules", lambda **_kwargs: {})
+    return calls, patch_status
+
+
+@pytest.mark.asyncio
+async def test_ensure_account_creates_then_renews_or_recreates_subscriptions(isolated_db, credentials, fake_graph):
+    calls, patch_status = fake_graph
+    manager = GraphSubscriptionManager(notification_url="https://hooks.example.com/graph/notifications")
+
+    assert await manager.ensure_account(credentials) == {"inbox": "created", "junkemail": "created"}
+    created = calls[0][2]
+    assert created["resource"] == "me/mailFolders('inbox')/messages"
+    assert created["notificationUrl"] == created["lifecycleNotificationUrl"]
+    records = db.list_graph_subscriptions(EMAIL)
+    assert {record["folder"] for record in records} == {"inbox", "junkemail"}
+    assert records[0]["expiration_at"] == "2099-01-01T00:00:00Z"
+    assert records[0]["client_state"] == created["clientState"]
+
+    # 还有很久才过期：不请求 Graph
+    assert await manager.ensure_account(credentials) == {"inbox": "ok", "junkemail": "ok"}
+    assert len(calls) == 2
+
+    soon = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    for record in records:
+        db.update_graph_subscription_expiration(record["subscription_id"], soon)
+    patch_status["code"] = 404
+    assert await manager.ensure_account(credentials) == {"inbox": "created", "junkemail": "created"}
+    assert [call[0] for call in calls[2:]] == ["PATCH", "POST", "PATCH", "POST"]
+    assert len(db.list_graph_subscriptions(EMAIL)) == 2
+
+    assert manager.refresh_push_accounts() == {EMAIL}
+    assert cache_service.is_push_invalidated(EMAIL)
+    cache_service.set_push_invalidated_accounts(())
+
+
+@pytest.mark.asyncio
+async def test_notifications_prefetch_changes_and_invalidate_account_caches(
+    isolated_db, credentials, fake_graph, monkeypatch
+):
+    manager = GraphSubscriptionManager(notification_url="https://hooks.example.com/graph/notifications")
+    await manager.ensure_account(credentials)
+    db.cache_emails(EMAIL, [
+        {"message_id": "old", "folder": "inbox", "subject": "old", "date": "2024-01-01T00:00:00Z"},
+    ], provider="graph_api")
+    batch_requests: list[list[dict]] = []
+
+    async def fake_execute(_credentials, requests, timeout=60.0):
+        batch_requests.append(requests)
+        messages = {"new": {
+            "id": "new",
+            "subject": "Your code 654321",
+            "from": {"emailAddress": {"address": "noreply@example.com"}},
+            "receivedDateTime": "2024-01-02T00:00:00Z",
+        }}
+        results = []
+        for request in requests:
+            message_id = request["url"].split("/")[-1].split("?")[0]
+            if message_id in messages:
+                results.append({"status": 200, "body": messages[message_id]})
+            else:
+                results.append({"status": 404, "body": None})
+        return results
+
+    monkeypatch.setattr(notifications_module.graph_batch, "execute", fake_execute)
+    cache_service.set_cached_email_detail(EMAIL, "old", {"message_id": "old"}, provider="graph_api")
+    cache_service.set_cached_share_email_list("share-token", 1, 20, {"email_id": EMAIL, "emails": []})
+    cache_service.set_cached_share_email_list("other-token", 1, 20, {"email_id": "other@example.com", "emails": []})
+
+    notifier = LocalGraphNotifier(manager)
+    result = await notifier.notify(EMAIL, "inbox", "created", ["new", "gone"])
+    await manager.wait_idle()
+
+    assert result == {"accepted": 2, "rejected": 0}
+    assert [request["url"].split("?")[0] for request in batch_requests[0]] == ["/me/messages/gone", "/me/messages/new"]
+    emails, _ = db.get_cached_emails(EMAIL, page_size=10, provider="graph_api")
+    assert sorted(email["message_id"] for email in emails) == ["new", "old"]
+    assert cache_service.get_cached_email_detail(EMAIL, "old", provider="graph_api") is None
+    assert cache_service.get_cached_share_email_list("share-token", 1, 20) is None
+    assert cache_service.get_cached_share_email_list("other-token", 1, 20) is not None
+    cache_service.clear_share_email_cache()
+
+    await notifier.notify(EMAIL, "inbox", "deleted", ["old"])
+    await manager.wait_idle()
+    emails, _ = db.get_cached_emails(EMAIL, page_size=10, provider="graph_api")
+    assert [email["message_id"] for email in emails] == ["new"]
+    assert manager.get_stats()["prefetched"] == 1
+
+
+@pytest.mark.asyncio
+async def test_notifications_with_wrong_client_state_are_rejected(isolated_db, credentials, fake_graph):
+    manager = GraphSubscriptionManager(notification_url="https://hooks.example.com/graph/notifications")
+    await manager.ensure_account(credentials)
+    subscription = db.list_graph_subscriptions(EMAIL)[0]
+
+    payload = LocalGraphNotifier.build_payload(subscription, "created", ["m1"], client_state="forged")
+    payload["value"].append({**payload["value"][0], "subscriptionId": "unknown"})
+
+    assert await manager.receive(payload) == {"accepted": 0, "rejected": 2}
+    assert manager.get_stats()["pending"] == 0
+
+
+def test_notification_endpoint_echoes_validation_token_and_accepts_notifications(monkeypatch):
+    from main import app
+
+    received: list[dict] = []
+
+    async def fake_receive(payload: dict) -> dict:
+        received.append(payload)
+        return {"accepted": 1, "rejected": 0}
+
+    monkeypatch.setattr(notifications_module.graph_subscriptions, "receive", fake_receive)
+    client = TestClient(app)
+
+    validation = client.post("/graph/notifications", params={"validationToken": "token <with> spaces"})
+    assert validation.status_code == 200
+    assert validation.headers["content-type"].startswith("text/plain")
+    assert validation.text == "token <with> spaces"
+
+    response = client.post("/graph/notifications", json={"value": [{"subscriptionId": "sub-1"}]})
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 1, "rejected": 0}
+    assert received == [{"value": [{"subscriptionId": "sub-1"}]}]
+
+
+def test_push_invalidated_accounts_use_longer_share_cache():
+    cache_service.set_push_invalidated_accounts({EMAIL})
+    try:
+        emails = [{"message_id": "m1"}]
+        subscribed = ("inbox", "junkemail")
+        cache_service.set_cached_share_email_list(
+            "push-token", 1, 20, {"email_id": EMAIL, "emails": emails}, folders=subscribed
+        )
+        cache_service.set_cached_share_email_list(
+            "poll-token", 1, 20, {"email_id": "poll@example.com", "emails": emails}, folders=subscribed
+        )
+        # 空结果可能来自获取超时/失败，不能进入长 TTL 缓存
+        cache_service.set_cached_share_email_list(
+            "empty-token", 1, 20, {"email_id": EMAIL, "emails": []}, folders=subscribed
+        )
+        # 读取整个邮箱（/me/messages）时其他文件夹的变化收不到推送
+        cache_service.set_cached_share_email_list("mailbox-token", 1, 20, {"email_id": EMAIL, "emails": emails})
+
+        push_key = cache_service.get_share_email_list_cache_key("push-token", 1, 20)
+        poll_key = cache_service.get_share_email_list_cache_key("poll-token", 1, 20)
+        empty_key = cache_service.get_share_email_list_cache_key("empty-token", 1, 20)
+        mailbox_key = cache_service.get_share_email_list_cache_key("mailbox-token", 1, 20)
+        assert set(cache_service.share_email_list_push_cache) == {push_key}
+        assert {poll_key, empty_key, mailbox_key} <= set(cache_service.share_email_list_cache)
+        assert cache_service.get_cached_share_email_list("push-token", 1, 20) == {"email_id": EMAIL, "emails": emails}
+    finally:
+        cache_service.set_push_invalidated_accounts(())
+        cache_service.clear_share_email_cache()
+
+
+@pytest.mark.asyncio
+async def test_share_route_uses_push_cache_for_subscribed_accounts(monkeypatch):
+    from routes import share_routes
+
+    fetches: list[str] = []
+
+    async def fake_fetch(**kwargs):
+        fetches.append(kwargs["email_account"])
+        return [{
+            "message_id": "m1",
+            "folder": "inbox",
+            "subject": "code",
+            "from_email": "noreply@example.com",
+            "date": "2026-05-02T01:30:00+00:00",
+        }]
+
+    monkeypatch.setattr(share_routes, "_fetch_emails_with_body_for_share", fake_fetch)
+    token_data = {"email_account_id": EMAIL, "start_time": "2026-05-01T00:00:00", "max_emails": 10}
+    cache_service.set_push_invalidated_accounts({EMAIL})
+    try:
+        first = await share_routes.public_list_emails(None, "route-token", page=1, page_size=20, token_data=token_data)
+        second = await share_routes.public_list_emails(None, "route-token", page=1, page_size=20, token_data=token_data)
+
+        push_key = cache_service.get_share_email_list_cache_key("route-token", 1, 20)
+        assert set(cache_service.share_email_list_push_cache) == {push_key}
+        assert fetches == [EMAIL]
+        assert [item.message_id for item in second.emails] == [item.message_id for item in first.emails] == ["m1"]
+    finally:
+        cache_service.set_push_invalidated_accounts(())
+        cache_service.clear_share_email_cache()
+
+
+@pytest.mark.asyncio
+async def test_account_delete_routes_remove_graph_subscriptions_and_delta_state(isolated_db, credentials, fake_graph, monkeypatch):
+    from routes import account_routes
+
+    calls, _patch_status = fake_graph
+
+    async def fake_get_account_credentials(email: str) -> AccountCredentials:
+        return credentials.model_copy(update={"email": email})
+
+    monkeypatch.setattr(account_routes, "get_account_credentials", fake_get_account_credentials)
+    admin = {"username": "admin", "role": "admin"}
+    other = "push-other@example.com"
+    for email in (EMAIL, other):
+        db.create_account(email, "refresh-token", "client-id", api_method="graph_api")
+        await notifications_module.graph_subscriptions.ensure_account(await fake_get_account_credentials(email))
+        db.save_graph_delta_state(email, "inbox", "https://graph.microsoft.com/delta?token=1", True)
+    assert notifications_module.graph_subscriptions.refresh_push_accounts() == {EMAIL, other}
+
+    try:
+        await account_routes.delete_account(EMAIL, admin=admin)
+        await account_routes.batch_delete_accounts(account_routes.BatchDeleteRequest(email_ids=[other]), admin=admin)
+
+        deleted = [call[1] for call in calls if call[0] == "DELETE"]
+        assert len(deleted) == 4
+        assert db.list_graph_subscriptions(EMAIL) == []
+        assert db.list_graph_subscriptions(other) == []
+        assert not cache_service.is_push_invalidated(EMAIL)
+        assert not cache_service.is_push_invalidated(other)
+        # 增量同步状态随账户一起删除
+        assert db.get_graph_delta_state(EMAIL, "inbox") is None
+        assert db.get_graph_delta_state(other, "inbox") is None
+    finally:
+        cache_service.set_push_invalidated_accounts(())
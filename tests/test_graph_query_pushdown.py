@@ -0,0 +1,217 @@
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import graph_api_service
+from graph_api_service import build_graph_message_query
+from models import AccountCredentials
+
+
+def test_time_range_and_exact_sender_are_pushed_into_filter():
+    params, exact = build_graph_message_query(
+        "o'neil@example.com", None, "2024-01-01T08:00:00+08:00", "2024-01-02T00:00:00Z"
+    )
+
+    assert exact is True
+    assert params == {
+        "$orderby": "receivedDateTime desc",
+        "$filter": (
+            "receivedDateTime ge 2024-01-01T00:00:00Z and receivedDateTime le 2024-01-02T00:00:00Z"
+            " and from/emailAddress/address eq 'o''neil@example.com'"
+        ),
+    }
+
+
+def test_sender_filter_without_time_range_keeps_orderby_field_first():
+    params, exact = build_graph_message_query("noreply@example.com", None, None, None)
+
+    assert exact is True
+    assert params["$filter"].startswith("receivedDateTime ge ")
+
+
+def test_keywords_use_search_without_filter_or_orderby():
+    params, exact = build_graph_message_query("github", "Code", "2024-01-01T00:00:00Z", None)
+
+    assert exact is False
+    assert params == {"$search": '"subject:Code from:github"'}
+
+
+def test_unsafe_keywords_and_bad_times_fall_back_to_local_filtering():
+    params, exact = build_graph_message_query(None, 'say "hi" now', "not-a-date", None)
+
+    assert exact is False
+    assert params == {"$orderby": "receivedDateTime desc"}
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, payload: dict) -> None:
+        self.status_code = status_code
+        self._payload = payload
+        self.text = "bad request" if status_code == 400 else "ok"
+        self.headers = {}
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            request = httpx.Request("GET", "https://graph.microsoft.com/v1.0/me/messages")
+            raise httpx.HTTPStatusError(
+                f"HTTP {self.status_code}", request=request, response=httpx.Response(self.status_code, request=request)
+            )
+
+    def json(self) -> dict:
+        return self._payload
+
+
+def _message(message_id: str, sender: str, received: str) -> dict:
+    return {
+        "id": message_id,
+        "subject": f"subject {message_id}",
+        "from": {"emailAddress": {"address": sender}},
+        "receivedDateTime": received,
+        "bodyPreview": "preview",
+    }
+
+
+@pytest.fixture
+def fake_graph(monkeypatch):
+    requests: list[dict] = []
+    responses: list[FakeResponse] = []
+
+    class FakeAsyncClient:
+        async def get(self, url: str, *, headers: dict, params: dict, timeout=None):
+            requests.append(dict(params))
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+    class FakeRegistry:
+        @asynccontextmanager
+        async def client(self, name):
+            yield FakeAsyncClient()
+
+    async def fake_get_graph_access_token(_credentials: AccountCredentials) -> str:
+        return "graph-token"
+
+    async def fake_details(_credentials, _message_ids, skip_cache=False):
+        return {}
+
+    monkeypatch.setattr(graph_api_service, "http_clients", FakeRegistry())
+    monkeypatch.setattr(graph_api_service, "get_graph_access_token", fake_get_graph_access_token)
+    monkeypatch.setattr(graph_api_service, "get_email_details_batch_graph", fake_details)
+    monkeypatch.setattr(graph_api_service, "detect_verification_code_with_rules", lambda **_kwargs: {})
+    return requests, responses
+
+
+@pytest.fixture
+def credentials() -> AccountCredentials:
+    return AccountCredentials(
+        email="pushdown@example.com",
+        refresh_token="refresh-token",
+        client_id="client-id",
+        api_method="graph_api",
+    )
+
+
+@pytest.mark.asyncio
+async def test_share_fetch_transfers_only_matching_messages(credentials, fake_graph):
+    requests, responses = fake_graph
+    responses.extend([
+        FakeResponse(200, {"value": [_message("m1", "noreply@example.com", "2024-01-03T00:00:00Z")]}),
+        FakeResponse(200, {"value": []}),
+    ])
+
+    emails = await graph_api_service.list_emails_with_body_graph(
+        credentials,
+        folder="all",
+        max_count=5,
+        sender_search="noreply@example.com",
+        start_time="2024-01-01T00:00:00Z",
+    )
+
+    assert [email["message_id"] for email in emails] == ["m1"]
+    # folder='all' 分别查询收件箱和垃圾邮件
+    assert len(requests) == 2
+    assert requests[0]["$top"] == 5
+    assert "from/emailAddress/address eq 'noreply@example.com'" in requests[0]["$filter"]
+
+
+@pytest.mark.asyncio
+async def test_share_fetch_falls_back_to_local_filtering_when_query_is_rejected(credentials, fake_graph):
+    requests, responses = fake_graph
+    responses.extend([
+        FakeResponse(400, {}),
+        FakeResponse(200, {"value": [
+            _message("m1", "other@example.com", "2024-01-03T00:00:00Z"),
+            _message("m2", "noreply@example.com", "2024-01-02T00:00:00Z"),
+            _message("m3", "noreply@example.com", "2023-12-01T00:00:00Z"),
+        ]}),
+    ])
+
+    emails = await graph_api_service.list_emails_with_body_graph(
+        credentials,
+        folder="inbox",
+        max_count=5,
+        sender_search="noreply@example.com",
+        start_time="2024-01-01T00:00:00Z",
+    )
+
+    assert [email["message_id"] for email in emails] == ["m2"]
+    assert "$filter" in requests[0]
+    assert "$filter" not in requests[1] and requests[1]["$top"] == 10
+
+
+@pytest.mark.asyncio
+async def test_share_fetch_fallback_does_not_use_up_network_retries(credentials, fake_graph, monkeypatch):
+    requests, responses = fake_graph
+    responses.extend([
+        httpx.ConnectTimeout("slow"),
+        FakeResponse(401, {}),
+        FakeResponse(400, {}),
+        FakeResponse(200, {"value": [_message("m1", "noreply@example.com", "2024-01-03T00:00:00Z")]}),
+    ])
+    cleared: list[str] = []
+
+    async def fake_clear(email: str) -> None:
+        cleared.append(email)
+
+    async def fake_sleep(_seconds: float) -> None:
+        return None
+
+    monkeypatch.setattr("oauth_service.clear_cached_access_token", fake_clear)
+    monkeypatch.setattr(graph_api_service.asyncio, "sleep", fake_sleep)
+
+    emails = await graph_api_service.list_emails_with_body_graph(
+        credentials, folder="inbox", max_count=5, sender_search="noreply@example.com",
+    )
+
+    assert [email["message_id"] for email in emails] == ["m1"]
+    assert cleared == [credentials.email]
+    assert len(requests) == 4 and "$filter" not in requests[3]
+
+
+@pytest.mark.asyncio
+async def test_share_fetch_raises_when_fallback_query_fails(credentials, fake_graph):
+    _requests, responses = fake_graph
+    responses.extend([FakeResponse(400, {}), FakeResponse(400, {})])
+
+    with pytest.raises(HTTPException) as exc_info:
+        await graph_api_service.list_emails_with_body_graph(
+            credentials, folder="inbox", max_count=5, sender_search="noreply@example.com",
+        )
+
+    assert exc_info.value.status_code == 500
+
+
+@pytest.mark.asyncio
+async def test_share_fetch_merges_inbox_and_junk_by_received_time(credentials, fake_graph):
+    _requests, responses = fake_graph
+    responses.extend([
+        FakeResponse(200, {"value": [_message("inbox-1", "a@example.com", "2024-01-01T00:00:00Z")]}),
+        FakeResponse(200, {"value": [_message("junk-1", "b@example.com", "2024-01-02T00:00:00Z")]}),
+    ])
+
+    emails = await graph_api_service.list_emails_with_body_graph(credentials, folder="all", max_count=1)
+
+    assert [(email["message_id"], email["folder"]) for email in emails] == [("junk-1", "junkemail")]
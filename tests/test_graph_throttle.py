@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from graph_throttle import GraphThrottle, TokenBucket, parse_retry_after
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: dict | None = None) -> None:
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeClient:
+    def __init__(self, statuses: list[int] | None = None, retry_after: str | None = None) -> None:
+        self.statuses = list(statuses or [])
+        self.retry_after = retry_after
+        self.calls: list[tuple[str, float]] = []
+        self.in_flight: dict[str, int] = {}
+        self.max_in_flight: dict[str, int] = {}
+
+    async def get(self, url: str, **kwargs):
+        self.calls.append((url, time.monotonic()))
+        self.in_flight[url] = self.in_flight.get(url, 0) + 1
+        self.max_in_flight[url] = max(self.max_in_flight.get(url, 0), self.in_flight[url])
+        await asyncio.sleep(0.01)
+        self.in_flight[url] -= 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        headers = {"Retry-After": self.retry_after} if status == 429 and self.retry_after else {}
+        return FakeResponse(status, headers)
+
+
+def test_parse_retry_after_is_case_insensitive():
+    assert parse_retry_after({"retry-after": "3"}) == 3.0
+    assert parse_retry_after({"Retry-After": "soon"}) is None
+    assert parse_retry_after({}) is None
+
+
+def test_backoff_prefers_retry_after_with_bounded_jitter():
+    throttle = GraphThrottle(base_delay=1.0, max_delay=10.0)
+
+    for _ in range(20):
+        assert 4.0 <= throttle.compute_backoff(0, retry_after=4.0) <= 5.0
+        assert 2.0 <= throttle.compute_backoff(1) <= 2.5
+        assert throttle.compute_backoff(8) == 10.0
+
+
+@pytest.mark.asyncio
+async def test_request_retries_throttled_responses_and_records_metrics():
+    throttle = GraphThrottle(rate=0, max_retries=3, max_delay=0.05)
+    client = FakeClient(statuses=[429, 503, 200], retry_after="0.02")
+
+    response = await throttle.request(client, "GET", "/me/messages", mailbox="a@example.com")
+
+    assert response.status_code == 200
+    assert len(client.calls) == 3
+    stats = throttle.get_stats()
+    assert stats["throttled"] == 2 and stats["retries"] == 2 and stats["gave_up"] == 0
+    assert stats["top_throttled_mailboxes"] == {"a@example.com": 2}
+
+
+@pytest.mark.asyncio
+async def test_request_gives_up_after_max_retries():
+    throttle = GraphThrottle(rate=0, max_retries=1, max_delay=0.01)
+    client = FakeClient(statuses=[429, 429, 200])
+
+    response = await throttle.request(client, "GET", "/me/messages", mailbox="a@example.com")
+
+    assert response.status_code == 429
+    assert len(client.calls) == 2
+    assert throttle.get_stats()["gave_up"] == 1
+
+
+@pytest.mark.asyncio
+async def test_mailbox_concurrency_is_limited_per_mailbox():
+    throttle = GraphThrottle(rate=0, mailbox_concurrency=2)
+    client = FakeClient()
+
+    await asyncio.gather(
+        *(throttle.request(client, "GET", "/a", mailbox="a@example.com") for _ in range(6)),
+        *(throttle.request(client, "GET", "/b", mailbox="b@example.com") for _ in range(2)),
+    )
+
+    assert client.max_in_flight == {"/a": 2, "/b": 2}
+    # 空闲邮箱的状态会被释放
+    assert throttle.get_stats()["active_mailboxes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_throttled_mailbox_holds_back_its_other_requests():
+    throttle = GraphThrottle(rate=0, max_delay=0.2)
+    throttle.note_throttled("a@example.com", 0.1)
+    client = FakeClient()
+
+    started = time.monotonic()
+    await asyncio.gather(
+        throttle.request(client, "GET", "/a", mailbox="a@example.com"),
+        throttle.request(client, "GET", "/b", mailbox="b@example.com"),
+    )
+
+    call_times = {url: at - started for url, at in client.calls}
+    assert call_times["/a"] >= 0.09
+    assert call_times["/b"] < 0.05
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_spaces_requests_after_burst():
+    bucket = TokenBucket(rate=20, capacity=2)
+
+    waits = [await bucket.acquire() for _ in range(3)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert 0.03 < waits[2] <= 0.05
@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+
+from http_client_pool import GRAPH_CLIENT, TOKEN_CLIENT, HttpClientRegistry
+from microsoft_access import TokenBroker
+
+
+def test_clients_are_shared_per_host_until_closed():
+    registry = HttpClientRegistry(max_connections=7, default_timeout=httpx.Timeout(30.0, connect=10.0))
+
+    async def scenario():
+        async with registry.client(GRAPH_CLIENT) as first:
+            pass
+        async with registry.client(GRAPH_CLIENT) as second:
+            pass
+        token_client = registry.get_client(TOKEN_CLIENT)
+
+        # 超时按请求传入，不再按超时配置拆分连接池
+        assert first is second
+        assert not first.is_closed
+        assert token_client is not first
+        assert first.timeout == httpx.Timeout(30.0, connect=10.0)
+        assert first._transport._pool._max_connections == 7
+
+        await registry.aclose()
+        assert first.is_closed and token_client.is_closed
+        return first
+
+    closed_client = asyncio.run(scenario())
+    assert registry.get_stats()["created"] == 2
+    assert registry.get_stats()["reused"] == 1
+
+    async def next_loop():
+        return registry.get_client(GRAPH_CLIENT)
+
+    # httpx 客户端绑定事件循环，新的事件循环上会创建新的客户端
+    assert asyncio.run(next_loop()) is not closed_client
+
+
+def test_token_broker_uses_shared_token_client_by_default():
+    broker = TokenBroker()
+
+    async def scenario():
+        async with broker.http_client_factory() as first:
+            pass
+        async with broker.http_client_factory() as second:
+            pass
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, httpx.AsyncClient)
+    assert first is second
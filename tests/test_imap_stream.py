@@ -0,0 +1,154 @@
+import asyncio
+import threading
+
+import pytest
+
+import email_service
+from microsoft_access.providers import imap_provider
+from models import AccountCredentials
+
+EMAIL = "imap-stream@example.com"
+
+
+def _header_response(message_id: bytes, subject: str, sender: str, date: str) -> list:
+    header_bytes = (
+        f"Subject: {subject}\r\nFrom: {sender}\r\nDate: {date}\r\n"
+        f"Message-ID: <{message_id.decode()}@example.com>\r\n\r\n"
+    ).encode()
+    return [
+        (message_id + b" (BODY[HEADER.FIELDS (SUBJECT DATE FROM MESSAGE-ID)] {128}", header_bytes),
+        b")",
+    ]
+
+
+@pytest.fixture
+def credentials() -> AccountCredentials:
+    return AccountCredentials(
+        email=EMAIL,
+        refresh_token="refresh-token",
+        client_id="client-id",
+        api_method="imap",
+    )
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    events: list[str] = []
+
+    class FakeImapPool:
+        def __init__(self) -> None:
+            self.client = None
+
+        def get_connection(self, _email: str, _access_token: str):
+            return self.client
+
+        def return_connection(self, _email: str, _imap_client) -> None:
+            events.append("returned")
+
+        def discard_connection(self, _email: str, _imap_client) -> None:
+            events.append("discarded")
+
+    async def fake_get_cached_access_token(_credentials: AccountCredentials) -> str:
+        return "token"
+
+    pool = FakeImapPool()
+    monkeypatch.setattr(email_service, "imap_pool", pool)
+    monkeypatch.setattr(email_service, "get_cached_access_token", fake_get_cached_access_token)
+    monkeypatch.setattr(email_service, "detect_verification_code_with_rules", lambda **_kwargs: {})
+    monkeypatch.setattr(email_service.cache_write_behind, "submit_emails", lambda *_args, **_kwargs: True)
+    return pool, events
+
+
+@pytest.mark.asyncio
+async def test_cancelled_stream_discards_connection_still_used_by_fetch_thread(credentials, fake_pool):
+    pool, events = fake_pool
+    fetch_started = threading.Event()
+    release_fetch = threading.Event()
+
+    class BlockingImapClient:
+        def select(self, *_args, **_kwargs):
+            return "OK", [b""]
+
+        def search(self, *_args, **_kwargs):
+            return "OK", [b"1 2"]
+
+        def fetch(self, _message_set, _query):
+            fetch_started.set()
+            release_fetch.wait(5)
+            return "OK", []
+
+    pool.client = BlockingImapClient()
+
+    async def consume():
+        async for _batch in email_service.stream_emails_imap(credentials, "inbox", max_count=10):
+            pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.to_thread(fetch_started.wait, 5)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    release_fetch.set()
+
+    # 取件线程仍在使用连接，不能通过 return_connection 在另一个线程里 noop()
+    assert events == ["discarded"]
+
+
+@pytest.mark.asyncio
+async def test_finished_stream_returns_connection(credentials, fake_pool):
+    pool, events = fake_pool
+
+    class ImapClient:
+        def select(self, *_args, **_kwargs):
+            return "OK", [b""]
+
+        def search(self, *_args, **_kwargs):
+            return "OK", [b"1"]
+
+        def fetch(self, _message_set, _query):
+            return "OK", _header_response(b"1", "hello", "a@example.com", "Thu, 30 Apr 2026 00:00:00 +0000")
+
+    pool.client = ImapClient()
+
+    batches = [batch async for batch in email_service.stream_emails_imap(credentials, "inbox", max_count=10)]
+
+    assert [[item.message_id for item in batch] for batch in batches] == [["INBOX-1"]]
+    assert events == ["returned"]
+
+
+@pytest.mark.asyncio
+async def test_stream_honours_sort_order_and_field_within_each_batch(credentials, fake_pool):
+    pool, _events = fake_pool
+    headers = {
+        b"1": ("charlie", "c@example.com", "Mon, 27 Apr 2026 00:00:00 +0000"),
+        b"2": ("alpha", "a@example.com", "Tue, 28 Apr 2026 00:00:00 +0000"),
+        b"3": ("bravo", "b@example.com", "Wed, 29 Apr 2026 00:00:00 +0000"),
+    }
+    fetched: list[bytes] = []
+
+    class ImapClient:
+        def select(self, *_args, **_kwargs):
+            return "OK", [b""]
+
+        def search(self, *_args, **_kwargs):
+            return "OK", [b"1 2 3"]
+
+        def fetch(self, message_set, _query):
+            fetched.append(message_set)
+            data = []
+            for message_id in message_set.split(b","):
+                data.extend(_header_response(message_id, *headers[message_id]))
+            return "OK", data
+
+    pool.client = ImapClient()
+
+    batches = [
+        batch
+        async for batch in imap_provider.stream_messages(
+            credentials, folder="inbox", max_count=10, sort_by="subject", sort_order="asc"
+        )
+    ]
+
+    # asc 从最旧的序号开始读取，批内按主题升序
+    assert fetched == [b"1,2,3"]
+    assert [item.subject for item in batches[0]] == ["alpha", "bravo", "charlie"]
@@ -318,6 +318,59 @@ async def test_mail_gateway_hydrate_details_enriches_list_response(
     assert [call[0] for call in imap_provider.calls] == ["list", "detail"]
 
 
+@pytest.mark.asyncio
+async def test_mail_gateway_hydrate_details_prefers_provider_bulk_detail_path(
+    credentials,
+    email_list_response,
+    email_detail_response,
+):
+    class BulkDetailProvider(FakeProvider):
+        async def get_message_details_many(
+            self,
+            credentials: AccountCredentials,
+            message_ids: list[str],
+            **kwargs,
+        ) -> dict[str, EmailDetailsResponse]:
+            self.calls.append(("details_many", {"message_ids": message_ids, **kwargs}))
+            return {"INBOX-1": email_detail_response}
+
+    bulk_provider = BulkDetailProvider(name="imap", list_response=email_list_response)
+    gateway = MailGateway(
+        graph_provider=FakeProvider(name="graph"),
+        imap_provider=bulk_provider,
+        persist_provider_hint=noop_persist_provider_hint,
+    )
+
+    response = await gateway.list_messages(
+        credentials,
+        folder="inbox",
+        page=1,
+        page_size=20,
+        hydrate_details=True,
+    )
+
+    assert response.emails[0].verification_code == "123456"
+    assert bulk_provider.calls[1] == (
+        "details_many",
+        {"message_ids": ["INBOX-1"], "skip_cache": False, "body_format": "html", "unique_body": False},
+    )
+    assert [call[0] for call in bulk_provider.calls] == ["list", "details_many"]
+
+    # 只做验证码识别/预览时可以选择纯文本的 uniqueBody
+    await gateway.list_messages(
+        credentials,
+        folder="inbox",
+        page=1,
+        page_size=20,
+        hydrate_details=True,
+        body_format="text",
+    )
+    assert bulk_provider.calls[3] == (
+        "details_many",
+        {"message_ids": ["INBOX-1"], "skip_cache": False, "body_format": "text", "unique_body": True},
+    )
+
+
 @pytest.mark.asyncio
 async def test_mail_gateway_list_with_body_falls_back_from_graph_bulk_503_to_imap(
     credentials,
@@ -777,7 +830,7 @@ async def test_graph_detail_skip_cache_bypasses_lru_and_db_cache(
         async def __aexit__(self, exc_type, exc, tb):
             return False
 
-        async def get(self, url: str, *, headers: dict, params: dict):
+        async def get(self, url: str, *, headers: dict, params: dict, timeout=None):
             self.calls.append((url, {"headers": headers, "params": params}))
             return FakeResponse()
 
@@ -1057,3 +1110,144 @@ async def test_mail_gateway_does_not_fallback_when_imap_detail_path_has_attribut
         )
 
     assert graph_fake_provider.calls == []
+
+
+@pytest.mark.asyncio
+async def test_mail_gateway_hydrate_details_batches_detail_cache_writes(
+    monkeypatch: pytest.MonkeyPatch,
+    credentials,
+):
+    from dao.email_detail_cache_dao import EmailDetailCacheDAO
+
+    message_ids = [f"INBOX-{index}" for index in range(1, 4)]
+    list_response = EmailListResponse(
+        email_id=credentials.email,
+        folder_view="inbox",
+        page=1,
+        page_size=20,
+        total_pages=1,
+        total_emails=len(message_ids),
+        emails=[
+            EmailItem(
+                message_id=message_id,
+                folder="INBOX",
+                subject=f"Subject {message_id}",
+                from_email="noreply@example.com",
+                date="2026-04-30T00:00:00",
+                sender_initial="N",
+            )
+            for message_id in message_ids
+        ],
+    )
+
+    class CachingFakeProvider(FakeProvider):
+        async def get_message_detail(self, credentials, message_id, **kwargs):
+            detail = EmailDetailsResponse(
+                message_id=message_id,
+                subject=f"Subject {message_id}",
+                from_email="noreply@example.com",
+                to_email=credentials.email,
+                date="2026-04-30T00:00:00",
+                body_plain=f"Body of {message_id}",
+            )
+            db.cache_email_detail(credentials.email, detail.model_dump(), provider="imap")
+            return detail
+
+    single_writes: list[str] = []
+    batch_writes: list[int] = []
+    original_many = EmailDetailCacheDAO.cache_details_many
+
+    def tracking_single(self, email_account, email_detail):
+        single_writes.append(email_detail["message_id"])
+        return True
+
+    def tracking_many(self, email_account, email_details):
+        batch_writes.append(len(email_details))
+        return original_many(self, email_account, email_details)
+
+    monkeypatch.setattr(EmailDetailCacheDAO, "cache_detail", tracking_single)
+    monkeypatch.setattr(EmailDetailCacheDAO, "cache_details_many", tracking_many)
+
+    gateway = MailGateway(
+        graph_provider=FakeProvider(name="graph"),
+        imap_provider=CachingFakeProvider(name="imap", list_response=list_response),
+        persist_provider_hint=noop_persist_provider_hint,
+    )
+
+    try:
+        await gateway.list_messages(
+            credentials,
+            folder="inbox",
+            page=1,
+            page_size=20,
+            strategy_mode="imap_only",
+            hydrate_details=True,
+        )
+
+        assert single_writes == []
+        assert batch_writes == [3]
+        for message_id in message_ids:
+            cached = db.get_cached_email_detail(credentials.email, message_id, provider="imap")
+            assert cached["body_plain"] == f"Body of {message_id}"
+    finally:
+        db.clear_email_cache_db(credentials.email)
+
+
+@pytest.mark.asyncio
+async def test_mail_gateway_stream_falls_back_before_first_batch_and_wraps_plain_providers(
+    credentials,
+    email_list_response,
+):
+    class FailingStreamProvider(FakeProvider):
+        async def stream_messages(self, credentials: AccountCredentials, **kwargs):
+            self.calls.append(("stream", {"email": credentials.email, **kwargs}))
+            raise HTTPException(status_code=503, detail="graph unavailable")
+            yield []
+
+    graph = FailingStreamProvider(name="graph")
+    imap = FakeProvider(name="imap", list_response=email_list_response)
+    gateway = MailGateway(
+        graph_provider=graph,
+        imap_provider=imap,
+        persist_provider_hint=noop_persist_provider_hint,
+    )
+
+    batches = [
+        batch
+        async for batch in gateway.stream_messages(
+            credentials,
+            folder="inbox",
+            max_count=30,
+            strategy_mode="graph_preferred",
+        )
+    ]
+
+    assert [call[0] for call in graph.calls] == ["stream"]
+    assert batches == [("imap", email_list_response.emails)]
+    # 没有流式接口的 provider 退化为一次 list_messages，取前 max_count 封
+    assert imap.calls[0][1]["page"] == 1 and imap.calls[0][1]["page_size"] == 30
+
+
+@pytest.mark.asyncio
+async def test_mail_gateway_stream_does_not_switch_provider_after_emitting(credentials, email_list_response):
+    class PartialStreamProvider(FakeProvider):
+        async def stream_messages(self, credentials: AccountCredentials, **kwargs):
+            yield email_list_response.emails
+            raise HTTPException(status_code=503, detail="graph went away")
+
+    imap = FakeProvider(name="imap", list_response=email_list_response)
+    gateway = MailGateway(
+        graph_provider=PartialStreamProvider(name="graph"),
+        imap_provider=imap,
+        persist_provider_hint=noop_persist_provider_hint,
+    )
+
+    received = []
+    with pytest.raises(HTTPException):
+        async for provider_name, batch in gateway.stream_messages(
+            credentials, folder="inbox", max_count=10, strategy_mode="graph_preferred"
+        ):
+            received.append((provider_name, batch))
+
+    assert received == [("graph_api", email_list_response.emails)]
+    assert imap.calls == []
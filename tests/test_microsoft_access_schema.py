@@ -6,6 +6,7 @@ from pathlib import Path
 
 import account_service
 import database as db
+from account_sampler import account_sampler
 from dao.account_dao import AccountDAO
 from models import AccountCredentials
 
@@ -249,3 +250,93 @@ def test_save_account_credentials_preserves_existing_optional_legacy_fields(
     assert updated["next_refresh_time"] == "2026-04-02T10:00:00"
     assert updated["refresh_status"] == "success"
     assert updated["refresh_error"] == "transient-error"
+
+
+def test_account_tags_table_stays_in_sync_and_drives_tag_filters(tmp_path, monkeypatch):
+    db_file = tmp_path / "account_tags.db"
+    monkeypatch.setattr(db, "DB_TYPE", "sqlite")
+    monkeypatch.setattr(db, "DB_FILE", str(db_file))
+    monkeypatch.setattr(db, "_sqlite_last_integrity_check_ts", 0.0)
+
+    db.init_database()
+    account_sampler.invalidate()
+    dao = AccountDAO()
+    dao.create(email="a@example.com", refresh_token="rt", client_id="cid", tags=["vip", "team"])
+    dao.create(email="b@example.com", refresh_token="rt", client_id="cid", tags=["team"])
+    dao.create(email="c@example.com", refresh_token="rt", client_id="cid")
+
+    assert dao.add_tag("c@example.com", "vip")
+    assert dao.update_account("b@example.com", tags=["disabled", "team"])
+
+    def emails(records):
+        return sorted(record["email"] for record in records)
+
+    records, total = dao.get_by_filters(include_tags=["vip"])
+    assert total == 2
+    assert emails(records) == ["a@example.com", "c@example.com"]
+
+    records, total = dao.get_by_filters(include_tags=["team"], exclude_tags=["disabled"])
+    assert emails(records) == ["a@example.com"]
+
+    records, total = dao.get_random(exclude_tags=["vip"])
+    assert emails(records) == ["b@example.com"]
+
+    records, total = dao.get_all(tag_search="disa")
+    assert emails(records) == ["b@example.com"]
+
+    assert dao.delete_account("a@example.com")
+    with sqlite3.connect(db_file) as conn:
+        rows = conn.execute("SELECT tag FROM account_tags ORDER BY tag").fetchall()
+    assert rows == [("disabled",), ("team",), ("vip",)]
+
+
+def test_init_database_backfills_account_tags_from_json_column(tmp_path, monkeypatch):
+    db_file = tmp_path / "account_tags_backfill.db"
+    monkeypatch.setattr(db, "DB_TYPE", "sqlite")
+    monkeypatch.setattr(db, "DB_FILE", str(db_file))
+    monkeypatch.setattr(db, "_sqlite_last_integrity_check_ts", 0.0)
+
+    db.init_database()
+    with sqlite3.connect(db_file) as conn:
+        conn.execute(
+            "INSERT INTO accounts (email, refresh_token, client_id, tags) VALUES (?, ?, ?, ?)",
+            ("legacy@example.com", "rt", "cid", '["old", "vip", "vip"]'),
+        )
+        conn.execute(
+            "INSERT INTO accounts (email, refresh_token, client_id, tags) VALUES (?, ?, ?, ?)",
+            ("broken@example.com", "rt", "cid", "not json"),
+        )
+        conn.execute("DELETE FROM account_tags")
+
+    db.init_database()
+
+    records, total = AccountDAO().get_by_filters(include_tags=["old", "vip"])
+    assert total == 1
+    assert records[0]["email"] == "legacy@example.com"
+
+
+def test_init_database_backfills_accounts_missing_from_partially_filled_tag_table(tmp_path, monkeypatch):
+    db_file = tmp_path / "account_tags_partial.db"
+    monkeypatch.setattr(db, "DB_TYPE", "sqlite")
+    monkeypatch.setattr(db, "DB_FILE", str(db_file))
+    monkeypatch.setattr(db, "_sqlite_last_integrity_check_ts", 0.0)
+
+    db.init_database()
+    with sqlite3.connect(db_file) as conn:
+        for email, tags in (("normalized@example.com", '["vip"]'), ("legacy@example.com", '["vip"]')):
+            conn.execute(
+                "INSERT INTO accounts (email, refresh_token, client_id, tags) VALUES (?, ?, ?, ?)",
+                (email, "rt", "cid", tags),
+            )
+        # 只有一个账户已规范化，另一个账户的标签只存在于旧的 tags 列（如旧版本进程写入）
+        conn.execute("DELETE FROM account_tags")
+        conn.execute(
+            "INSERT INTO account_tags (account_id, tag) "
+            "SELECT id, 'vip' FROM accounts WHERE email = 'normalized@example.com'"
+        )
+
+    db.init_database()
+
+    records, total = AccountDAO().get_by_filters(include_tags=["vip"])
+    assert total == 2
+    assert {record["email"] for record in records} == {"normalized@example.com", "legacy@example.com"}
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+预编译语句性能测试（仅 PostgreSQL）
+
+对比热点查询直接执行与 PREPARE/EXECUTE 的规划耗时和单条执行耗时。
+需要设置 PREPARED_STATEMENT_BENCHMARK_DSN 指向可写的 PostgreSQL 测试库。
+"""
+
+import os
+import statistics
+import time
+
+import pytest
+
+import dao.prepared_statements as prepared_module
+from dao.prepared_statements import PreparedStatementRegistry
+
+BENCHMARK_DSN = os.getenv("PREPARED_STATEMENT_BENCHMARK_DSN")
+ITERATIONS = 500
+HOT_QUERY = """
+    SELECT message_id, folder, subject, from_email, date
+    FROM prepared_bench_emails
+    WHERE email_account = %s AND folder = %s
+    ORDER BY date DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def _planning_time_ms(cursor, sql, params) -> float:
+    cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()[0]
+    return float(plan[0]["Planning Time"])
+
+
+@pytest.mark.skipif(not BENCHMARK_DSN, reason="PREPARED_STATEMENT_BENCHMARK_DSN not set")
+def test_prepared_statement_planning_overhead(monkeypatch):
+    psycopg2 = pytest.importorskip("psycopg2")
+    monkeypatch.setattr(prepared_module, "DB_TYPE", "postgresql")
+
+    conn = psycopg2.connect(BENCHMARK_DSN)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TEMP TABLE prepared_bench_emails (
+                email_account TEXT, message_id TEXT, folder TEXT,
+                subject TEXT, from_email TEXT, date TEXT
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO prepared_bench_emails
+            SELECT 'user' || (i % 50) || '@example.com', 'm' || i, 'INBOX',
+                   's' || i, 'f' || i || '@example.com', to_char(now() - i * interval '1 minute', 'YYYY-MM-DD"T"HH24:MI:SS')
+            FROM generate_series(1, 20000) AS i
+        """)
+        cursor.execute(
+            "CREATE INDEX ON prepared_bench_emails (email_account, folder, date DESC)"
+        )
+        cursor.execute("ANALYZE prepared_bench_emails")
+
+        params = ("user7@example.com", "INBOX", 50, 0)
+        registry = PreparedStatementRegistry(enabled=True)
+        registry.execute(cursor, "bench_hot_query", HOT_QUERY, params)
+        cursor.fetchall()
+
+        plain_planning = [_planning_time_ms(cursor, HOT_QUERY, params) for _ in range(50)]
+        prepared_planning = [
+            _planning_time_ms(cursor, "EXECUTE bench_hot_query (%s, %s, %s, %s)", params)
+            for _ in range(50)
+        ]
+
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            cursor.execute(HOT_QUERY, params)
+            cursor.fetchall()
+        plain_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            registry.execute(cursor, "bench_hot_query", HOT_QUERY, params)
+            cursor.fetchall()
+        prepared_elapsed = time.perf_counter() - start
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print("\n=== 预编译语句规划开销 ===")
+    print(f"直接执行 规划耗时中位数: {statistics.median(plain_planning):.3f}ms")
+    print(f"EXECUTE  规划耗时中位数: {statistics.median(prepared_planning):.3f}ms")
+    print(f"直接执行 {ITERATIONS} 次: {plain_elapsed * 1000:.1f}ms")
+    print(f"EXECUTE  {ITERATIONS} 次: {prepared_elapsed * 1000:.1f}ms")
+
+    assert statistics.median(prepared_planning) <= statistics.median(plain_planning)
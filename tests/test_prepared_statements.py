@@ -0,0 +1,97 @@
+import pytest
+
+import dao.prepared_statements as prepared_module
+from dao import AccountDAO, EmailCacheDAO
+from dao.prepared_statements import PreparedStatementRegistry, to_positional_parameters
+
+
+class _FakeConnection:
+    pass
+
+
+class _FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+
+def test_to_positional_parameters_numbers_placeholders():
+    assert to_positional_parameters(
+        "SELECT * FROM accounts WHERE email = %s AND status = %s LIMIT %s"
+    ) == "SELECT * FROM accounts WHERE email = $1 AND status = $2 LIMIT $3"
+
+
+def test_registry_prepares_once_per_connection(monkeypatch):
+    monkeypatch.setattr(prepared_module, "DB_TYPE", "postgresql")
+    registry = PreparedStatementRegistry(enabled=True)
+    sql = "SELECT * FROM users WHERE username = %s"
+
+    first_conn = _FakeConnection()
+    cursor = _FakeCursor(first_conn)
+    registry.execute(cursor, "users_get_by_username", sql, ("alice",))
+    registry.execute(cursor, "users_get_by_username", sql, ("bob",))
+
+    assert cursor.executed == [
+        ("PREPARE users_get_by_username AS SELECT * FROM users WHERE username = $1", None),
+        ("EXECUTE users_get_by_username (%s)", ("alice",)),
+        ("EXECUTE users_get_by_username (%s)", ("bob",)),
+    ]
+
+    # 新连接需要重新 PREPARE
+    other_cursor = _FakeCursor(_FakeConnection())
+    registry.execute(other_cursor, "users_get_by_username", sql, ("carol",))
+    assert other_cursor.executed[0][0].startswith("PREPARE users_get_by_username AS")
+
+    stats = registry.get_stats()
+    assert stats["prepares"] == 2
+    assert stats["executions"] == 3
+    assert stats["statements"] == ["users_get_by_username"]
+
+
+def test_registry_rejects_conflicting_sql_and_bad_names(monkeypatch):
+    monkeypatch.setattr(prepared_module, "DB_TYPE", "postgresql")
+    registry = PreparedStatementRegistry(enabled=True)
+    cursor = _FakeCursor(_FakeConnection())
+    registry.execute(cursor, "q", "SELECT 1", ())
+
+    with pytest.raises(ValueError):
+        registry.execute(cursor, "q", "SELECT 2", ())
+    with pytest.raises(ValueError):
+        registry.execute(cursor, "bad name; DROP", "SELECT 1", ())
+
+
+def test_registry_passes_through_on_sqlite_or_when_disabled(monkeypatch):
+    cursor = _FakeCursor(_FakeConnection())
+    PreparedStatementRegistry(enabled=True).execute(cursor, "q", "SELECT ?", (1,))
+
+    monkeypatch.setattr(prepared_module, "DB_TYPE", "postgresql")
+    PreparedStatementRegistry(enabled=False).execute(cursor, "q", "SELECT %s", (2,))
+
+    assert cursor.executed == [("SELECT ?", (1,)), ("SELECT %s", (2,))]
+
+
+def test_hot_dao_queries_still_work_on_sqlite():
+    account_dao = AccountDAO()
+    email = "prepared-statements@example.com"
+    account_dao.delete_account(email)
+    assert account_dao.create(email=email, refresh_token="rt", client_id="cid")
+    assert account_dao.get_by_email(email)["email"] == email
+    assert account_dao.update_access_token(email, "at", "2099-01-01T00:00:00")
+    assert account_dao.get_access_token(email) == {
+        "access_token": "at",
+        "token_expires_at": "2099-01-01T00:00:00",
+    }
+
+    cache_dao = EmailCacheDAO()
+    cache_dao.cache_emails(email, [
+        {"message_id": f"prepared-{i}", "folder": "INBOX", "subject": f"s{i}",
+         "from_email": "a@example.com", "date": f"2024-01-0{i + 1}T00:00:00"}
+        for i in range(3)
+    ])
+    emails, total = cache_dao.get_cached_emails(email, page=1, page_size=2, folder="INBOX")
+    assert total == 3
+    assert [item["message_id"] for item in emails] == ["prepared-2", "prepared-1"]
+    account_dao.delete_account(email)
@@ -0,0 +1,94 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.requests import Request
+
+import auth
+import cache_service
+import database as db
+import main
+
+
+def _request(headers=None):
+    raw_headers = [
+        (key.lower().encode(), value.encode())
+        for key, value in (headers or {}).items()
+    ]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw_headers})
+
+
+@pytest.fixture
+def isolated_auth_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_TYPE", "sqlite")
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "principal_cache.db"))
+    monkeypatch.setattr(db, "_sqlite_last_integrity_check_ts", 0.0)
+    db.init_database()
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(main, "api_requests_executor", executor)
+    cache_service.invalidate_principal_cache()
+    yield
+    cache_service.invalidate_principal_cache()
+    executor.shutdown(wait=True)
+
+
+def _count_calls(monkeypatch, name):
+    calls = []
+    original = getattr(db, name)
+
+    def counting(*args):
+        calls.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(db, name, counting)
+    return calls
+
+
+def test_jwt_principal_is_cached_until_user_update(isolated_auth_db, monkeypatch):
+    db.create_user("cached-user", auth.hash_password("secret"), role="user")
+    token = auth.create_access_token({"sub": "cached-user"})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    calls = _count_calls(monkeypatch, "get_user_by_username")
+
+    first = asyncio.run(auth.get_current_user(_request(), credentials))
+    first["permissions"].append("mutated")
+    second = asyncio.run(auth.get_current_user(_request(), credentials))
+
+    assert second["username"] == "cached-user"
+    assert "mutated" not in second["permissions"]
+    assert len(calls) == 1
+
+    db.update_user("cached-user", is_active=0)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(auth.get_current_user(_request(), credentials))
+    assert exc_info.value.status_code == 403
+    assert len(calls) == 2
+
+
+def test_api_key_principal_is_cached_by_fingerprint_and_invalidated_on_rotation(
+    isolated_auth_db, monkeypatch
+):
+    db.create_user("key-admin", auth.hash_password("secret"), role="admin")
+    db.set_api_key("old-api-key")
+    calls = _count_calls(monkeypatch, "get_users_by_role")
+
+    for _ in range(3):
+        user = asyncio.run(auth.get_current_user(_request({"X-API-Key": "old-api-key"}), None))
+        assert user["username"] == "key-admin"
+    assert len(calls) == 1
+    assert not any(
+        "old-api-key" in map(str, key) for key in cache_service.principal_cache.keys()
+    )
+
+    db.set_api_key("new-api-key")
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(auth.get_current_user(_request({"X-API-Key": "old-api-key"}), None))
+    assert exc_info.value.status_code == 401
+
+    user = asyncio.run(auth.get_current_user(_request({"X-API-Key": "new-api-key"}), None))
+    assert user["username"] == "key-admin"
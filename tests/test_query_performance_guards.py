@@ -29,7 +29,7 @@ def test_account_filters_use_index_friendly_order(monkeypatch: pytest.MonkeyPatc
     assert captured["order_by"] == "created_at DESC, id DESC"
 
 
-def test_account_tag_filters_use_jsonb_operator_on_postgres(monkeypatch: pytest.MonkeyPatch):
+def test_account_tag_filters_use_account_tags_table_on_postgres(monkeypatch: pytest.MonkeyPatch):
     dao = AccountDAO()
     captured = {}
 
@@ -39,11 +39,14 @@ def test_account_tag_filters_use_jsonb_operator_on_postgres(monkeypatch: pytest.
         return [], 0
 
     monkeypatch.setattr("dao.account_dao.DB_TYPE", "postgresql")
+    monkeypatch.setattr("dao.base_dao.DB_TYPE", "postgresql")
     monkeypatch.setattr(dao, "find_paginated", fake_find_paginated)
     dao.get_by_filters(include_tags=["vip"], exclude_tags=["disabled"])
 
-    assert "tags @>" in captured["where_clause"]
+    assert "id IN (SELECT account_id FROM account_tags WHERE tag = %s)" in captured["where_clause"]
+    assert "id NOT IN (SELECT account_id FROM account_tags WHERE tag IN (%s))" in captured["where_clause"]
     assert "LIKE" not in captured["where_clause"]
+    assert captured["params"] == ["vip", "disabled"]
 
 
 def test_share_tokens_use_stable_index_friendly_order(monkeypatch: pytest.MonkeyPatch):
@@ -0,0 +1,69 @@
+import admin_api
+import database as db
+import query_stats
+from query_stats import QueryStatsCollector, fingerprint_sql
+
+
+def _admin():
+    return {"role": "admin", "username": "tester", "is_active": True}
+
+
+def test_fingerprint_normalizes_literals_placeholders_and_in_lists():
+    assert fingerprint_sql(
+        "SELECT * FROM accounts  WHERE email = 'a@b.com' AND id IN (?, ?, ?) LIMIT 10"
+    ) == "SELECT * FROM accounts WHERE email = ? AND id IN (?...) LIMIT ?"
+    assert fingerprint_sql("SELECT * FROM accounts WHERE id IN (%s, %s)") == fingerprint_sql(
+        "SELECT * FROM accounts WHERE id IN (?)"
+    )
+    assert fingerprint_sql("SELECT 1 -- comment\nFROM t2") == "SELECT ? FROM t2"
+
+
+def test_collector_builds_histogram_and_slow_log():
+    collector = QueryStatsCollector(slow_threshold_ms=100, max_fingerprints=2)
+
+    assert collector.record("SELECT * FROM t WHERE id = 1", 3) is False
+    assert collector.record("SELECT * FROM t WHERE id = 2", 30) is False
+    assert collector.record("SELECT * FROM t WHERE id = 3", 300) is True
+    collector.record_plan("SELECT * FROM t WHERE id = 3", ["SCAN t"])
+    # 已采集过执行计划，间隔内不再重复采集
+    assert collector.record("SELECT * FROM t WHERE id = 4", 400) is False
+
+    collector.record("UPDATE u SET x = 1", 1)
+    collector.record("DELETE FROM v", 1)
+
+    snapshot = collector.snapshot()
+    by_fingerprint = {item["fingerprint"]: item for item in snapshot["fingerprints"]}
+    select_stats = by_fingerprint["SELECT * FROM t WHERE id = ?"]
+    assert select_stats["count"] == 4
+    assert select_stats["slow_count"] == 2
+    assert select_stats["histogram"]["le_5ms"] == 1
+    assert select_stats["histogram"]["le_50ms"] == 1
+    assert select_stats["p50_ms"] == 50.0
+    assert select_stats["plan"] == ["SCAN t"]
+    # 超过指纹上限后归入 <other>
+    assert by_fingerprint[query_stats.OTHER_FINGERPRINT]["count"] == 1
+    assert [entry["duration_ms"] for entry in snapshot["slow_queries"]] == [400, 300]
+    assert snapshot["slow_queries"][1]["plan"] == ["SCAN t"]
+
+
+async def test_connection_statements_are_timed_and_slow_plans_captured(monkeypatch):
+    collector = QueryStatsCollector(slow_threshold_ms=0)
+    monkeypatch.setattr(query_stats, "query_stats", collector)
+
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = ?", ("table",))
+        cursor.fetchall()
+        conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+
+    snapshot = collector.snapshot(limit=500)
+    by_fingerprint = {item["fingerprint"]: item for item in snapshot["fingerprints"]}
+    stats = by_fingerprint["SELECT name FROM sqlite_master WHERE type = ?"]
+    assert stats["count"] == 2
+    assert stats["plan"] and "sqlite_master" in stats["plan"][0]
+    assert any(entry["fingerprint"].startswith("PRAGMA") for entry in snapshot["fingerprints"])
+
+    monkeypatch.setattr(admin_api, "query_stats", collector)
+    response = await admin_api.get_query_stats(sort_by="count", limit=10, admin=_admin())
+    assert response["slow_threshold_ms"] == 0
+    assert len(response["fingerprints"]) <= 10
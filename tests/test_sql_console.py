@@ -0,0 +1,211 @@
+import asyncio
+import json
+
+import admin_api
+import database as db
+from sql_console import sql_console_registry
+
+
+# 递归 CTE 生成大量行，用于验证超时与取消
+SLOW_SQL = (
+    "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) "
+    "SELECT count(*) FROM n"
+)
+
+
+def _admin():
+    return {"role": "admin", "username": "tester", "is_active": True}
+
+
+def _clear_tables() -> None:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM emails_cache")
+        cursor.execute("DELETE FROM sql_query_history")
+        conn.commit()
+
+
+def setup_function():
+    _clear_tables()
+
+
+def teardown_function():
+    _clear_tables()
+
+
+def _seed_rows(count: int) -> None:
+    db.cache_emails(
+        "sql-console@example.com",
+        [
+            {
+                "message_id": f"m{i}",
+                "folder": "INBOX",
+                "subject": f"Subject {i}",
+                "from_email": "sender@example.com",
+                "date": f"2026-03-01T00:00:{i % 60:02d}",
+                "sender_initial": "S",
+            }
+            for i in range(count)
+        ],
+    )
+
+
+async def _read_stream(response) -> list:
+    lines = []
+    async for chunk in response.body_iterator:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        lines.extend(json.loads(line) for line in text.splitlines() if line)
+    return lines
+
+
+async def test_execute_sql_limits_rows_without_reading_everything():
+    _seed_rows(25)
+
+    response = await admin_api.execute_sql(
+        admin_api.SqlExecuteRequest(sql="SELECT message_id FROM emails_cache ORDER BY id", max_rows=10),
+        admin=_admin(),
+    )
+
+    assert response.success is True
+    assert response.row_count == 10
+    assert response.truncated is True
+    assert [row["message_id"] for row in response.data][:2] == ["m0", "m1"]
+    assert response.query_id
+    assert sql_console_registry.list_running() == []
+
+
+async def test_execute_sql_reports_affected_rows_for_dml():
+    _seed_rows(3)
+
+    response = await admin_api.execute_sql(
+        admin_api.SqlExecuteRequest(sql="DELETE FROM emails_cache WHERE message_id <> 'm0'"),
+        admin=_admin(),
+    )
+
+    assert response.success is True
+    assert response.data == [{"affected_rows": 2}]
+
+
+async def test_execute_sql_commits_dml_with_returning():
+    _seed_rows(2)
+
+    response = await admin_api.execute_sql(
+        admin_api.SqlExecuteRequest(
+            sql="UPDATE emails_cache SET subject = 'patched' WHERE message_id = 'm1' RETURNING message_id"
+        ),
+        admin=_admin(),
+    )
+
+    assert response.success is True
+    assert response.data == [{"message_id": "m1"}]
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT subject FROM emails_cache WHERE message_id = 'm1'")
+        assert cursor.fetchone()[0] == "patched"
+
+
+async def test_execute_sql_enforces_statement_timeout():
+    response = await admin_api.execute_sql(
+        admin_api.SqlExecuteRequest(sql=SLOW_SQL, timeout_seconds=0.2),
+        admin=_admin(),
+    )
+
+    assert response.success is False
+    assert response.cancelled is True
+    assert "timeout" in response.error_message
+
+
+async def test_execute_sql_can_be_cancelled_by_query_id():
+    task = asyncio.create_task(
+        admin_api.execute_sql(
+            admin_api.SqlExecuteRequest(sql=SLOW_SQL, query_id="slow-query", timeout_seconds=30),
+            admin=_admin(),
+        )
+    )
+    for _ in range(100):
+        if sql_console_registry.list_running():
+            break
+        await asyncio.sleep(0.01)
+
+    running = await admin_api.list_running_sql(admin=_admin())
+    assert [item["query_id"] for item in running["queries"]] == ["slow-query"]
+
+    await admin_api.cancel_sql("slow-query", admin=_admin())
+    response = await asyncio.wait_for(task, timeout=5)
+
+    assert response.success is False
+    assert response.cancelled is True
+    assert response.error_message == "Query cancelled"
+
+
+async def test_execute_sql_stream_outputs_ndjson_rows():
+    _seed_rows(5)
+
+    response = await admin_api.execute_sql_stream(
+        admin_api.SqlExecuteRequest(sql="SELECT message_id FROM emails_cache ORDER BY id", query_id="stream-1"),
+        admin=_admin(),
+    )
+    lines = await _read_stream(response)
+
+    assert response.media_type == "application/x-ndjson"
+    assert lines[0] == {"type": "start", "query_id": "stream-1"}
+    assert lines[1] == {"type": "columns", "columns": ["message_id"]}
+    assert [line["data"]["message_id"] for line in lines if line["type"] == "row"] == [
+        f"m{i}" for i in range(5)
+    ]
+    assert lines[-1]["type"] == "end"
+    assert lines[-1]["row_count"] == 5
+
+
+async def test_stream_consumer_cancellation_leaves_no_blocked_wait(monkeypatch):
+    import threading
+
+    import sql_console
+
+    waits = []
+    real_to_thread = asyncio.to_thread
+
+    async def spy_to_thread(func, *args, **kwargs):
+        waits.append(args)
+        return await real_to_thread(func, *args, **kwargs)
+
+    monkeypatch.setattr(sql_console.asyncio, "to_thread", spy_to_thread)
+    query = sql_console.SqlConsoleQuery(SLOW_SQL, query_id="disconnect-query", timeout_seconds=30)
+
+    async def consume():
+        async for _event in sql_console.iter_query_events(query, max_rows=10):
+            pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.2)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+    # 每次等待事件都带超时，断开后不会有线程永久阻塞在 events.get 上
+    assert waits and all(args == (True, sql_console._QUEUE_POLL_INTERVAL) for args in waits)
+    assert query.cancelled is True
+    for _ in range(100):
+        if not any(thread.name == "sql-console-disconnect-query" for thread in threading.enumerate()):
+            break
+        await asyncio.sleep(0.05)
+    else:
+        raise AssertionError("query worker thread is still running")
+
+
+async def test_execute_sql_invalidates_principal_cache_after_writes(monkeypatch):
+    _seed_rows(1)
+    calls = []
+    monkeypatch.setattr(admin_api.cache_service, "invalidate_principal_cache", lambda: calls.append(1))
+
+    await admin_api.execute_sql(
+        admin_api.SqlExecuteRequest(sql="SELECT message_id FROM emails_cache"), admin=_admin()
+    )
+    assert calls == []
+
+    await admin_api.execute_sql(
+        admin_api.SqlExecuteRequest(sql="UPDATE emails_cache SET subject = 'x'"), admin=_admin()
+    )
+    assert calls == [1]
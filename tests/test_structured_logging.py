@@ -0,0 +1,58 @@
+import pytest
+
+from logger_config import (
+    StructuredLogger,
+    begin_request_log_context,
+    end_request_log_context,
+    logger,
+    redact_log_value,
+)
+
+
+@pytest.fixture
+def captured():
+    messages: list[str] = []
+    handler_id = logger.add(lambda message: messages.append(message.record["message"]), level="DEBUG")
+    yield messages
+    logger.remove(handler_id)
+
+
+def test_redaction_masks_tokens_in_fields_headers_and_urls():
+    token = "eyJ0eXAiOiJKV1QiLCJhbGciOiJSUzI1NiJ9.payload.signature"
+
+    assert redact_log_value(token, "access_token") == "eyJ0eXAi...ignature"
+    assert redact_log_value("short", "password") == "***"
+    assert redact_log_value({"Authorization": f"Bearer {token}", "Accept": "application/json"}) == {
+        "Authorization": "Bearer e...ignature",
+        "Accept": "application/json",
+    }
+    assert redact_log_value("https://example.com/cb?code=abc123&state=ok") == "https://example.com/cb?code=***&state=ok"
+    assert redact_log_value(f"failed with Bearer {token} header") == "failed with Bearer *** header"
+
+
+def test_events_below_level_are_not_formatted(captured):
+    structured_logger = StructuredLogger("test", min_level="INFO")
+    evaluated: list[str] = []
+
+    structured_logger.debug("list.request", preview=lambda: evaluated.append("debug") or "body")
+    structured_logger.info("list.served", count=3, preview=lambda: evaluated.append("info") or "body")
+
+    assert evaluated == ["info"]
+    assert captured == ["[test] list.served count=3 preview=body"]
+
+
+def test_unsampled_requests_keep_only_warnings(captured):
+    structured_logger = StructuredLogger("test", min_level="DEBUG")
+
+    token = begin_request_log_context("req-1", sample_rate=0.0)
+    try:
+        structured_logger.info("list.served", count=1)
+        structured_logger.warning("list.query_rejected", access_token="x" * 40)
+    finally:
+        end_request_log_context(token)
+    structured_logger.debug("outside.request")
+
+    assert captured == [
+        "[test] list.query_rejected request_id=req-1 access_token=xxxxxxxx...xxxxxxxx",
+        "[test] outside.request",
+    ]
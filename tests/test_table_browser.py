@@ -0,0 +1,202 @@
+import pytest
+from fastapi import HTTPException
+
+import admin_api
+import database as db
+
+
+def _admin():
+    return {"role": "admin", "username": "tester", "is_active": True}
+
+
+def _clear_cache_tables() -> None:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM emails_cache")
+        conn.commit()
+
+
+def setup_function():
+    _clear_cache_tables()
+
+
+def teardown_function():
+    _clear_cache_tables()
+
+
+def _seed(account: str, count: int) -> None:
+    db.cache_emails(
+        account,
+        [
+            {
+                "message_id": f"{account}-{i}",
+                "folder": "INBOX",
+                "subject": f"Subject {i}",
+                "from_email": "sender@example.com",
+                "date": f"2026-03-01T00:00:{i:02d}",
+                "sender_initial": "S",
+                "body_preview": f"Preview {i}",
+            }
+            for i in range(count)
+        ],
+    )
+
+
+def test_browse_table_data_pages_by_primary_key_cursor():
+    _seed("alice@example.com", 5)
+
+    first = db.browse_table_data("emails_cache", page_size=2)
+    second = db.browse_table_data("emails_cache", page_size=2, after=first["next_cursor"])
+    third = db.browse_table_data("emails_cache", page_size=2, after=second["next_cursor"])
+
+    ids = [row["id"] for row in first["data"] + second["data"] + third["data"]]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 5
+    assert third["next_cursor"] is None
+    assert first["primary_key"] == "id"
+
+    descending = db.browse_table_data("emails_cache", page_size=10, sort_order="desc")
+    assert [row["id"] for row in descending["data"]] == sorted(ids, reverse=True)
+
+
+def test_browse_table_data_searches_only_indexed_columns():
+    _seed("alice@example.com", 3)
+    _seed("bob@example.com", 2)
+
+    result = db.browse_table_data("emails_cache", page_size=10, search="bob@")
+    assert "email_account" in result["searchable_columns"]
+    assert "body_preview" not in result["searchable_columns"]
+    assert {row["email_account"] for row in result["data"]} == {"bob@example.com"}
+
+    # body_preview 没有索引：全局搜索不会匹配它，字段搜索直接拒绝
+    assert db.browse_table_data("emails_cache", page_size=10, search="Preview")["data"] == []
+    with pytest.raises(ValueError):
+        db.browse_table_data("emails_cache", page_size=10, field_search={"body_preview": "Preview"})
+
+
+def test_estimate_table_row_count_uses_statistics():
+    _seed("alice@example.com", 4)
+    with db.get_db_connection() as conn:
+        conn.execute("ANALYZE emails_cache")
+        conn.commit()
+
+    assert db.estimate_table_row_count("emails_cache") == 4
+
+
+async def test_table_data_endpoint_browse_mode():
+    _seed("alice@example.com", 3)
+
+    response = await admin_api.get_table_data(
+        "emails_cache",
+        page=1,
+        page_size=2,
+        search=None,
+        sort_by=None,
+        sort_order="asc",
+        field_search=None,
+        mode="browse",
+        after=None,
+        admin=_admin(),
+    )
+    assert response["mode"] == "browse"
+    assert response["total_is_estimate"] is True
+    assert len(response["records"]) == 2
+    assert response["next_cursor"] is not None
+
+    with pytest.raises(HTTPException) as exc_info:
+        await admin_api.get_table_data(
+            "emails_cache",
+            page=1,
+            page_size=2,
+            search=None,
+            sort_by=None,
+            sort_order="asc",
+            field_search='{"body_preview": "x"}',
+            mode="browse",
+            after=None,
+            admin=_admin(),
+        )
+    assert exc_info.value.status_code == 400
+
+
+async def test_table_list_reports_exact_counts_unless_estimates_requested():
+    _seed("carol@example.com", 3)
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        # 删除行后 MAX(rowid) 不变，估算值会偏大
+        cursor.execute("DELETE FROM emails_cache WHERE message_id = 'carol@example.com-0'")
+        conn.commit()
+
+    exact = await admin_api.get_tables(estimate=False, admin=_admin())
+    emails_cache = next(table for table in exact.tables if table.name == "emails_cache")
+    assert emails_cache.record_count == 2
+    assert emails_cache.record_count_is_estimate is False
+
+    estimated = await admin_api.get_tables(estimate=True, admin=_admin())
+    emails_cache = next(table for table in estimated.tables if table.name == "emails_cache")
+    assert emails_cache.record_count_is_estimate is True
+
+
+async def test_table_editor_writes_to_principal_tables_invalidate_principal_cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(admin_api.cache_service, "invalidate_principal_cache", lambda: calls.append(1))
+
+    await admin_api.create_table_record(
+        "system_config",
+        admin_api.RecordCreateRequest(data={"key": "table_editor_probe", "value": "1"}),
+        admin=_admin(),
+    )
+    record_id = next(config["id"] for config in db.get_all_configs() if config["key"] == "table_editor_probe")
+    await admin_api.update_table_record(
+        "system_config", record_id, admin_api.RecordUpdateRequest(data={"value": "2"}), admin=_admin()
+    )
+    await admin_api.delete_table_record("system_config", record_id, admin=_admin())
+    assert len(calls) == 3
+
+    # 与认证无关的表不会清空认证主体缓存
+    _seed("dave@example.com", 1)
+    cache_id = db.browse_table_data("emails_cache", page_size=1)["data"][0]["id"]
+    await admin_api.delete_table_record("emails_cache", cache_id, admin=_admin())
+    assert len(calls) == 3
+
+
+def _account_tags(account_id: int) -> list:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT tag FROM account_tags WHERE account_id = ? ORDER BY tag", (account_id,))
+        return [row["tag"] for row in cursor.fetchall()]
+
+
+async def test_table_editor_keeps_account_tags_in_sync():
+    email = "table-editor-tags@example.com"
+    db.delete_account(email)
+    account_id = db.create_account(email, "refresh-token", "client-id", tags=["old"])["id"]
+    try:
+        await admin_api.update_table_record(
+            "accounts", account_id, admin_api.RecordUpdateRequest(data={"tags": '["new", "vip"]'}), admin=_admin()
+        )
+        assert _account_tags(account_id) == ["new", "vip"]
+        assert db.get_account_by_email(email)["tags"] == ["new", "vip"]
+
+        await admin_api.delete_table_record("accounts", account_id, admin=_admin())
+        assert _account_tags(account_id) == []
+        assert db.get_account_by_email(email) is None
+    finally:
+        db.delete_account(email)
+
+
+async def test_table_editor_email_change_invalidates_old_and_new_account_records():
+    old_email, new_email = "table-editor-old@example.com", "table-editor-new@example.com"
+    for email in (old_email, new_email):
+        db.delete_account(email)
+    account_id = db.create_account(old_email, "refresh-token", "client-id")["id"]
+    try:
+        assert db.get_account_by_email(old_email) is not None
+        await admin_api.update_table_record(
+            "accounts", account_id, admin_api.RecordUpdateRequest(data={"email": new_email}), admin=_admin()
+        )
+        assert db.get_account_by_email(old_email) is None
+        assert db.get_account_by_email(new_email)["id"] == account_id
+    finally:
+        for email in (old_email, new_email):
+            db.delete_account(email)
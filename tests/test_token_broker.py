@@ -38,7 +38,7 @@ class FakeAsyncClient:
     async def __aexit__(self, exc_type, exc, tb):
         return False
 
-    async def post(self, _url: str, data: dict):
+    async def post(self, _url: str, data: dict, timeout=None):
         self._request_log.append(data)
         if not self._responses:
             raise AssertionError("no fake response left")
@@ -187,7 +187,7 @@ async def test_fallback_to_graph_scope_updates_provider_hint(
     broker = TokenBroker(
         db_module=fake_db,
         cache_module=fake_cache,
-        http_client_factory=lambda timeout=30.0: FakeAsyncClient(responses, request_log),
+        http_client_factory=lambda: FakeAsyncClient(responses, request_log),
         now_fn=lambda: fixed_now,
     )
 
@@ -227,7 +227,7 @@ async def test_probe_mode_does_not_persist_access_token(
     broker = TokenBroker(
         db_module=fake_db,
         cache_module=fake_cache,
-        http_client_factory=lambda timeout=30.0: FakeAsyncClient(responses, request_log),
+        http_client_factory=lambda: FakeAsyncClient(responses, request_log),
         now_fn=lambda: fixed_now,
     )
 
@@ -268,7 +268,7 @@ async def test_refresh_with_persist_false_does_not_update_account_state_on_fallb
     broker = TokenBroker(
         db_module=fake_db,
         cache_module=FakeCache(),
-        http_client_factory=lambda timeout=30.0: FakeAsyncClient(responses, request_log),
+        http_client_factory=lambda: FakeAsyncClient(responses, request_log),
         now_fn=lambda: fixed_now,
     )
 
@@ -294,7 +294,7 @@ async def test_persisted_fetch_updates_last_provider_used_even_when_provider_is_
     broker = TokenBroker(
         db_module=fake_db,
         cache_module=FakeCache(),
-        http_client_factory=lambda timeout=30.0: FakeAsyncClient(
+        http_client_factory=lambda: FakeAsyncClient(
             [
                 FakeResponse(
                     200,
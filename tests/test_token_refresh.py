@@ -39,7 +39,7 @@ class FakeAsyncClient:
     async def __aexit__(self, exc_type, exc, tb):
         return False
 
-    async def post(self, _url: str, data: dict):
+    async def post(self, _url: str, data: dict, timeout=None):
         self._request_log.append(data)
         if not self._responses:
             raise AssertionError("no fake response left")
@@ -128,7 +128,7 @@ async def test_refresh_access_token_returns_new_tokens_and_expiry(
     broker = TokenBroker(
         db_module=FakeDB(),
         cache_module=FakeCache(),
-        http_client_factory=lambda timeout=30.0: FakeAsyncClient(
+        http_client_factory=lambda: FakeAsyncClient(
             [
                 FakeResponse(
                     200,
@@ -167,7 +167,7 @@ async def test_refresh_access_token_reuses_existing_refresh_token_when_missing(
     broker = TokenBroker(
         db_module=FakeDB(),
         cache_module=FakeCache(),
-        http_client_factory=lambda timeout=30.0: FakeAsyncClient(
+        http_client_factory=lambda: FakeAsyncClient(
             [
                 FakeResponse(
                     200,
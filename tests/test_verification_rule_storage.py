@@ -1,4 +1,8 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
 import database as db
+from dao.verification_rule_dao import VerificationDetectionRecordDAO
 
 
 LEGACY_RULE_PAYLOAD = {
@@ -121,3 +125,120 @@ def test_legacy_rule_columns_migrate_to_matchers_and_extractors():
 
     assert matcher_count == 3
     assert extractor_count == 2
+
+
+def _detection_payload(source: str, page_source: str, code: str = "123456") -> dict:
+    return {
+        "email_account": "detect@example.com",
+        "message_id": "msg-1",
+        "detected_code": code,
+        "rule_id": None,
+        "rule_name": None,
+        "source": source,
+        "page_source": page_source,
+        "matched_sender": "noreply@example.com",
+        "matched_subject": "code",
+        "matched_body_excerpt": code,
+    }
+
+
+def _count_detection_records() -> int:
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM verification_detection_records")
+        return db._extract_scalar_value(cursor.fetchone())
+
+
+def test_repeated_detections_are_deduplicated_by_account_message_and_code():
+    first = db.create_verification_detection_record(_detection_payload("runtime", "list"))
+    again = db.create_verification_detection_record(_detection_payload("runtime", "detail"))
+    db.create_verification_detection_record(_detection_payload("refresh", "list"))
+
+    assert again["id"] == first["id"]
+    assert again["page_source"] == "list"
+    assert _count_detection_records() == 1
+
+    db.create_verification_detection_record(_detection_payload("runtime", "detail", code="654321"))
+    assert _count_detection_records() == 2
+
+
+def test_prune_expired_detection_records_deletes_in_batches():
+    old_time = (datetime.now() - timedelta(days=40)).isoformat()
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        for index in range(5):
+            cursor.execute(
+                """
+                INSERT INTO verification_detection_records
+                (email_account, message_id, detected_code, source, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                ("detect@example.com", f"old-{index}", "111111", "runtime", old_time),
+            )
+        conn.commit()
+    db.create_verification_detection_record(_detection_payload("runtime", "list"))
+
+    result = VerificationDetectionRecordDAO().prune_expired(retention_days=30, batch_size=2)
+
+    assert result["deleted_rows"] == 5
+    assert _count_detection_records() == 1
+
+
+def test_sqlite_dedup_key_migration_removes_existing_duplicates():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE verification_detection_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_account TEXT, message_id TEXT, detected_code TEXT, source TEXT
+        )
+        """
+    )
+    cursor.executemany(
+        "INSERT INTO verification_detection_records (email_account, message_id, detected_code, source) VALUES (?, ?, ?, ?)",
+        [
+            ("a@example.com", "m1", "1111", "list"),
+            ("a@example.com", "m1", "1111", "detail"),
+            ("a@example.com", "m1", "2222", "detail"),
+        ],
+    )
+
+    db._ensure_sqlite_detection_record_dedup_key(cursor)
+
+    cursor.execute("SELECT id, source FROM verification_detection_records ORDER BY id")
+    assert cursor.fetchall() == [(1, "list"), (3, "detail")]
+    # 再次执行不会重复迁移
+    db._ensure_sqlite_detection_record_dedup_key(cursor)
+    conn.close()
+
+
+class _PartitionCursor:
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.statements = []
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        normalized = " ".join(sql.split())
+        self.statements.append((normalized, params))
+        self._rows = [{"partition_name": name} for name in self.partitions] if "pg_inherits" in normalized else []
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_ensure_partitions_creates_missing_daily_partitions_and_default():
+    dao = VerificationDetectionRecordDAO()
+    cursor = _PartitionCursor(["verification_detection_records_p20260101"])
+
+    created = dao.ensure_partitions(cursor, date(2026, 1, 1), date(2026, 1, 3))
+
+    assert created == 2
+    creates = [sql for sql, _ in cursor.statements if sql.startswith("CREATE TABLE")]
+    assert creates[0].startswith("CREATE TABLE IF NOT EXISTS verification_detection_records_p20260102 PARTITION OF")
+    assert creates[1].startswith("CREATE TABLE IF NOT EXISTS verification_detection_records_p20260103 PARTITION OF")
+    assert creates[2].endswith("PARTITION OF verification_detection_records DEFAULT")
+    assert ("CREATE TABLE IF NOT EXISTS verification_detection_records_p20260102 PARTITION OF "
+            "verification_detection_records FOR VALUES FROM (%s) TO (%s)",
+            ("2026-01-02", "2026-01-03")) in cursor.statements